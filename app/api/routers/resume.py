@@ -5,11 +5,13 @@ resume creation, retrieval, optimization, PDF generation and deletion. It handle
 the interface between HTTP requests and the resume repository, and coordinates
 AI-powered resume optimization services.
 """
-import json
+import asyncio
+import hashlib
 import logging
 import os
 import secrets
 import tempfile
+import time
 import traceback
 from datetime import datetime
 from pathlib import Path
@@ -22,6 +24,7 @@ from fastapi import (
     File,
     Form,
     HTTPException,
+    Query,
     Request,
     UploadFile,
     status,
@@ -30,11 +33,45 @@ from fastapi.responses import FileResponse, Response
 from pydantic import BaseModel, EmailStr, Field
 
 from app.database.models.resume import Resume, ResumeData
+from app.database.repositories.prompt_repository import PromptRepository
 from app.database.repositories.resume_repository import ResumeRepository
 from app.services.ai.ats_scoring import ATSScorerLLM
-from app.services.ai.model_ai import AtsResumeOptimizer
+from app.services.ai.model_ai import (
+    AtsResumeOptimizer,
+    build_optimization_context,
+    load_optimization_prompt,
+)
+from app.services.ai.scheduler import LLMSchedulerRejectedError, Priority
+from app.services.ai.skill_gaps import (
+    estimate_missing_skills,
+    speculation_stats,
+    uncovered_skills,
+)
+from app.services.ai.token_budget import TokenBudgetExceededError
 from app.services.resume.latex_generator import LaTeXGenerator
-from app.utils.file_handling import create_temporary_pdf, extract_text_from_pdf
+from app.services.resume.text_renderer import render_resume_text
+from app.utils.file_handling import acreate_temporary_pdf, aextract_text_from_pdf
+from app.utils.request_context import (
+    ClientDisconnectedError,
+    DeadlineExceededError,
+    RequestContext,
+    get_request_budget,
+    request_scope,
+    run_until_disconnected,
+)
+from app.utils.singleflight import (
+    IdempotencyKeyConflictError,
+    make_flight_key,
+    request_flights,
+)
+from app.utils.stage_graph import (
+    Stage,
+    StageGraph,
+    make_cache_key,
+    recent_traces,
+    stage_cache,
+)
+from app.utils.tracing import span
 
 # Configure logging
 logging.basicConfig(
@@ -64,6 +101,15 @@ class OptimizeResumeRequest(BaseModel):
     temperature: float = Field(
         0.0, description="Temperature setting for the LLM (0.0-1.0) to control creativity", ge=0.0, le=1.0
     )
+    section_parallel: bool = Field(
+        False, description="Generate each resume section concurrently instead of the whole resume at once"
+    )
+    incremental: bool = Field(
+        True, description="Reuse sections of the previous optimization that the job description changes do not affect"
+    )
+    speculative: bool = Field(
+        False, description="Start optimizing from a locally estimated skill gap while the resume is scored; regenerated if the estimate missed skills"
+    )
 
 
 class ResumeSummary(BaseModel):
@@ -74,6 +120,9 @@ class ResumeSummary(BaseModel):
     ats_score: Optional[int] = Field(
         None, description="ATS score of the resume if optimized"
     )
+    original_ats_score: Optional[int] = Field(
+        None, description="ATS score of the resume before optimization"
+    )
     created_at: datetime = Field(..., description="When the resume was created")
     updated_at: datetime = Field(..., description="When the resume was last updated")
 
@@ -96,7 +145,9 @@ class OptimizationResponse(BaseModel):
         ..., description="Unique identifier for the optimized resume"
     )
     original_ats_score: int = Field(..., description="ATS score before optimization")
-    optimized_ats_score: int = Field(..., description="ATS score after optimization")
+    optimized_ats_score: Optional[int] = Field(
+        None, description="ATS score after optimization, None if re-scoring was skipped for lack of time"
+    )
     score_improvement: int = Field(
         ..., description="Score improvement after optimization"
     )
@@ -167,6 +218,104 @@ class ResumeScoreResponse(BaseModel):
 resume_router = APIRouter(prefix="/api/resume", tags=["Resume"])
 
 
+# Prompt versions are part of the coalescing key, so a prompt edit never
+# returns a result generated with the old prompt. They are re-read at most
+# once per PROMPT_VERSIONS_TTL seconds, and a slow database only delays a
+# request by PROMPT_VERSIONS_TIMEOUT seconds.
+PROMPT_VERSIONS_TTL = 60.0
+PROMPT_VERSIONS_TIMEOUT = 2.0
+_prompt_versions_cache: Dict[str, Any] = {"expires": 0.0, "versions": {}}
+
+
+async def _get_prompt_versions() -> Dict[str, int]:
+    """Return the current version of every prompt template by name.
+
+    Returns:
+    -------
+        Dict[str, int]: Prompt name to version, empty if prompts cannot be read
+    """
+    now = time.monotonic()
+    if now < _prompt_versions_cache["expires"]:
+        return _prompt_versions_cache["versions"]
+
+    versions: Dict[str, int] = {}
+    try:
+        prompts = await asyncio.wait_for(
+            PromptRepository().get_all_prompts(), timeout=PROMPT_VERSIONS_TIMEOUT
+        )
+        versions = {prompt["name"]: prompt.get("version", 1) for prompt in prompts if "name" in prompt}
+    except Exception as e:
+        logger.warning(f"Could not read prompt versions: {str(e)}")
+
+    _prompt_versions_cache.update(expires=now + PROMPT_VERSIONS_TTL, versions=versions)
+    return versions
+
+
+# Seconds of request budget an optional pipeline stage, such as re-scoring the
+# optimized resume, needs in order to run
+OPTIONAL_STAGE_MIN_BUDGET = float(os.getenv("OPTIONAL_STAGE_MIN_BUDGET_SECONDS", "30"))
+
+# Non-standard status used when the client closed the connection
+CLIENT_CLOSED_REQUEST = 499
+
+
+async def _run_request(request: Request, work):
+    """Run a request's work within its deadline, cancelling it on disconnect.
+
+    The work runs in a request context carrying the REQUEST_DEADLINE_SECONDS
+    budget, which the pipeline stages, LLM calls, pdflatex and OCR honor.
+
+    Args:
+        request: The incoming request, whose connection is watched if given
+        work: Coroutine function producing the response
+
+    Returns:
+    -------
+        The result of the work
+
+    Raises:
+    ------
+        HTTPException: If the client disconnected before the work finished
+    """
+    with request_scope(RequestContext(get_request_budget())):
+        if request is None:
+            return await work()
+        try:
+            return await run_until_disconnected(request, work())
+        except ClientDisconnectedError as e:
+            raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail=str(e))
+
+
+async def _run_coalesced(request: Request, key: str, fn):
+    """Run a scoring or optimization once for identical concurrent requests.
+
+    The shared work is cancelled when every client waiting for it has
+    disconnected.
+
+    Args:
+        request: The incoming request, whose Idempotency-Key header is honored
+        key: The coalescing key of the request
+        fn: Coroutine function running the actual work
+
+    Returns:
+    -------
+        The result of the shared work
+
+    Raises:
+    ------
+        HTTPException: If the idempotency key was used for a different request
+    """
+    try:
+        return await _run_request(
+            request,
+            lambda: request_flights.do(
+                key, fn, idempotency_key=request.headers.get("Idempotency-Key")
+            ),
+        )
+    except IdempotencyKeyConflictError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+
+
 async def get_resume_repository(request: Request) -> ResumeRepository:
     """Dependency for getting the resume repository instance.
 
@@ -226,7 +375,9 @@ async def create_resume(
             temp_file.write(pdf_content)
             temp_file_path = temp_file.name
         try:
-            resume_text = extract_text_from_pdf(temp_file_path)
+            resume_text = await _run_request(
+                request, lambda: aextract_text_from_pdf(temp_file_path)
+            )
         finally:
             os.unlink(temp_file_path)
 
@@ -244,6 +395,11 @@ async def create_resume(
                 detail="Failed to create resume",
             )
         return {"id": resume_id}
+    except DeadlineExceededError:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="Extracting the resume text did not finish in time",
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -312,20 +468,42 @@ async def get_resume(
 async def get_user_resumes(
     user_id: str,
     request: Request,
+    response: Response,
+    limit: int = Query(50, ge=1, le=200, description="Maximum number of resumes returned"),
+    cursor: Optional[str] = Query(
+        None, description="X-Next-Cursor header of the previous page"
+    ),
     repo: ResumeRepository = Depends(get_resume_repository),
 ):
-    """Get all resumes for a specific user.
+    """Get one page of the resumes of a specific user, newest first.
+
+    When more resumes follow, the cursor of the next page is returned in the
+    X-Next-Cursor header.
 
     Args:
         user_id: ID of the user whose resumes to retrieve
         request: The incoming request
+        response: The outgoing response, carrying the next page cursor
+        limit: Maximum number of resumes returned
+        cursor: Cursor of the page to retrieve, None for the first page
         repo: Resume repository instance
 
     Returns:
     -------
         List of resume summaries for the specified user
+
+    Raises:
+    ------
+        HTTPException: If the cursor is invalid
     """
-    resumes = await repo.get_resumes_by_user_id(user_id)
+    try:
+        resumes, next_cursor = await repo.get_resume_summaries_by_user_id(
+            user_id, limit=limit, cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     formatted_resumes = []
     for resume in resumes:
         formatted_resumes.append(
@@ -333,6 +511,7 @@ async def get_user_resumes(
                 "id": str(resume.get("_id")),
                 "title": resume.get("title"),
                 "ats_score": resume.get("ats_score"),
+                "original_ats_score": resume.get("original_ats_score"),
                 "created_at": resume.get("created_at"),
                 "updated_at": resume.get("updated_at"),
             }
@@ -424,6 +603,355 @@ async def delete_resume(
     return {"success": True}
 
 
+def _get_api_config(request: Request) -> tuple:
+    """Return the API key, API base URL and model name for the AI services.
+
+    Args:
+        request: The incoming request, whose app state is used when API_KEY is unset
+
+    Returns:
+    -------
+        tuple: The API key, API base URL and model name
+
+    Raises:
+    ------
+        HTTPException: If no API key is configured
+    """
+    logger.info("Retrieving API configuration")
+    api_key = os.getenv("API_KEY")
+    api_base_url = os.getenv("API_BASE")
+    model_name = os.getenv("MODEL_NAME")
+
+    logger.info(f"API configuration - model_name: {model_name or 'Not set'}")
+    logger.info(f"API configuration - api_base_url: {api_base_url or 'Not set'}")
+    logger.info(f"API Key present: {bool(api_key)}")
+
+    if not api_key:
+        logger.warning(
+            "API key not found in environment variables, attempting to get from app state"
+        )
+        try:
+            api_key = request.app.state.config.AI_API_KEY
+            logger.info("Successfully retrieved API key from app state")
+        except Exception as config_error:
+            logger.error(
+                f"Failed to retrieve API key from app state: {str(config_error)}"
+            )
+            logger.error(f"Config error details: {traceback.format_exc()}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="AI API key not configured",
+            )
+    return api_key, api_base_url, model_name
+
+
+def _extraction_cache_key(ats_scorer: ATSScorerLLM, kind: str, text: str) -> str:
+    """Return the stage cache key of a resume or job description extraction."""
+    chain = ats_scorer.resume_chain if kind == "resume" else ats_scorer.job_chain
+    return make_cache_key(
+        kind,
+        getattr(chain.last, "model_name", ats_scorer.model_name),
+        chain.first.template,
+        ats_scorer.temperature,
+        text,
+    )
+
+
+async def _load_resume(resume_id: str, repo: ResumeRepository) -> Dict[str, Any]:
+    """Load the resume to score or optimize.
+
+    The resume is loaded before the scorer and optimizer are built, so their
+    LLM calls are counted against the budget of the resume's owner.
+
+    Args:
+        resume_id: ID of the resume to load
+        repo: Resume repository instance
+
+    Returns:
+    -------
+        Dict[str, Any]: The resume document
+
+    Raises:
+    ------
+        HTTPException: If the resume cannot be loaded
+    """
+    logger.info(f"Retrieving resume with ID: {resume_id}")
+    try:
+        resume = await repo.get_resume_by_id(resume_id)
+        if not resume:
+            logger.warning(f"Resume not found with ID: {resume_id}")
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Resume with ID {resume_id} not found",
+            )
+    except Exception as e:
+        logger.error(f"Error retrieving resume with ID {resume_id}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error retrieving resume: {str(e)}",
+        )
+    logger.info(f"Successfully retrieved resume: {resume.get('title', 'Untitled')}")
+    return resume
+
+
+def _scoring_stages(
+    resume: Dict[str, Any],
+    ats_scorer: ATSScorerLLM,
+    job_description: str,
+    purpose: str,
+    use_stored_job_description: bool = False,
+) -> List[Stage]:
+    """Return the stages that score a resume against a job description.
+
+    The scorer prompts and the job description are loaded independently; the
+    resume and job description are then extracted concurrently and scored
+    against each other in the "original_score" stage. Extractions are cached
+    across requests.
+
+    Args:
+        resume: The resume to score, as loaded by _load_resume
+        ats_scorer: The scorer making the LLM calls
+        job_description: The job description from the request
+        purpose: What the job description is required for, used in errors
+        use_stored_job_description: Fall back to the job description stored
+            with the resume when the request has none
+
+    Returns:
+    -------
+        List[Stage]: The stages "resume", "scorer_prompts", "job_description",
+        "resume_info", "job_info" and "original_score"
+    """
+
+    async def load_resume():
+        return resume
+
+    async def load_scorer_prompts():
+        await ats_scorer.ensure_prompts()
+
+    async def resolve_job_description(resume=None):
+        resolved = job_description or (resume or {}).get("job_description", "")
+        logger.info(f"Job description length: {len(resolved)} characters")
+        if not resolved:
+            logger.warning("Job description is empty")
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Job description is required for {purpose}",
+            )
+        return resolved
+
+    async def extract_resume(resume, scorer_prompts):
+        return await ats_scorer.aextract_resume_info(
+            ats_scorer.compact_resume(resume["original_content"])
+        )
+
+    async def extract_job(job_description, scorer_prompts):
+        return await ats_scorer.aextract_job_info(ats_scorer.compact_job(job_description))
+
+    async def score_original(resume_info, job_info):
+        logger.info("Scoring original resume against job description")
+        score_result = await ats_scorer.ascore_analyses(resume_info, job_info)
+        logger.info(f"Original resume ATS score: {score_result['final_score']}")
+        return score_result
+
+    # The stored job description is only needed when the request has none, so
+    # the job description is otherwise extracted without waiting for the resume
+    job_description_deps = ("resume",) if use_stored_job_description and not job_description else ()
+    return [
+        Stage("resume", load_resume),
+        Stage("scorer_prompts", load_scorer_prompts),
+        Stage("job_description", resolve_job_description, deps=job_description_deps),
+        Stage(
+            "resume_info",
+            extract_resume,
+            deps=("resume", "scorer_prompts"),
+            cache_key=lambda resume, scorer_prompts: _extraction_cache_key(
+                ats_scorer, "resume", resume["original_content"]
+            ),
+        ),
+        Stage(
+            "job_info",
+            extract_job,
+            deps=("job_description", "scorer_prompts"),
+            cache_key=lambda job_description, scorer_prompts: _extraction_cache_key(
+                ats_scorer, "job", job_description
+            ),
+        ),
+        Stage("original_score", score_original, deps=("resume_info", "job_info")),
+    ]
+
+
+def _rescoring_stages(ats_scorer: ATSScorerLLM) -> List[Stage]:
+    """Return the stages that score the optimized resume.
+
+    The optimized resume is rendered to the same plain-text representation
+    that was scored for the original and scored against the job extraction of
+    the original scoring, so the job description is not extracted twice.
+    Re-scoring is optional: it is skipped when the request is running out of
+    time, and its failure leaves the optimization intact.
+
+    Args:
+        ats_scorer: The scorer making the LLM calls
+
+    Returns:
+    -------
+        List[Stage]: The stages "optimized_info" and "optimized_score"
+    """
+
+    async def extract_optimized(optimized_data, scorer_prompts):
+        logger.info("Rendering plain-text representation of the optimized resume")
+        optimized_resume_text = render_resume_text(optimized_data)
+        return await ats_scorer.aextract_resume_info(
+            ats_scorer.compact_resume(optimized_resume_text)
+        )
+
+    async def score_optimized(optimized_info, job_info):
+        logger.info("Scoring optimized resume against job description")
+        score_result = await ats_scorer.ascore_analyses(optimized_info, job_info)
+        logger.info(f"Optimized resume ATS score: {score_result['final_score']}")
+        return score_result
+
+    return [
+        Stage(
+            "optimized_info",
+            extract_optimized,
+            deps=("optimized_data", "scorer_prompts"),
+            optional=True,
+            min_budget=OPTIONAL_STAGE_MIN_BUDGET,
+        ),
+        Stage(
+            "optimized_score",
+            score_optimized,
+            deps=("optimized_info", "job_info"),
+            optional=True,
+        ),
+    ]
+
+
+async def _load_optimization_prompt() -> str:
+    """Load the optimization prompt template; an empty string selects the built-in one."""
+    return await load_optimization_prompt() or ""
+
+
+async def _run_pipeline(graph: StageGraph) -> Dict[str, Any]:
+    """Run a stage graph and record its trace.
+
+    Args:
+        graph: The pipeline to run
+
+    Returns:
+    -------
+        Dict[str, Any]: The output of every stage by name
+    """
+    outputs, trace = await graph.run()
+    recent_traces.append(trace)
+    logger.info(f"Pipeline trace: {trace.summary()}")
+    return outputs
+
+
+def _validate_optimization_result(result: Dict[str, Any]) -> ResumeData:
+    """Validate the optimizer's output into the ResumeData model.
+
+    Args:
+        result: The optimized resume returned by the optimizer
+
+    Returns:
+    -------
+        ResumeData: The validated resume. A fallback text response is turned
+        into a minimal valid structure.
+
+    Raises:
+    ------
+        HTTPException: If the result cannot be validated
+    """
+    logger.info("Parsing result into ResumeData model")
+    try:
+        # Check if the result contains raw_text_response, which indicates it's a fallback structured response
+        if "raw_text_response" in result:
+            logger.warning("Using fallback structured response from text. This may not contain all expected data.")
+            # We'll still try to validate it, but we'll log a warning
+
+        optimized_data = ResumeData.model_validate(result)
+        logger.info("Successfully validated result through Pydantic model")
+
+        # If this is a fallback response, add a note to the profile description
+        if "raw_text_response" in result:
+            # Add a note to the profile description
+            original_profile = optimized_data.user_information.profile_description
+            note = "\n\nNote: This resume was generated from a text response and may not be fully structured. Please review and edit as needed."
+            optimized_data.user_information.profile_description = original_profile + note
+
+    except Exception as validation_error:
+        logger.error(
+            f"Failed to parse result into ResumeData model: {str(validation_error)}"
+        )
+        logger.error(f"Validation error details: {traceback.format_exc()}")
+        logger.debug(f"Problematic data: {result}")
+
+        # Check if we have a raw text response we can use
+        if isinstance(result, dict) and "raw_text_response" in result:
+            logger.warning("Validation failed but raw text response is available. Creating minimal valid structure.")
+
+            # Create a minimal valid structure that will pass validation
+            minimal_result = {
+                "user_information": {
+                    "name": "",
+                    "main_job_title": "Generated from Text Response",
+                    "profile_description": "The AI generated a text response instead of structured data. Here's the beginning of that response:\n\n" +
+                                          result.get("raw_text_response", "")[:500] +
+                                          "\n\n(Note: This resume was generated from a text response and may not be fully structured. Please review and edit as needed.)",
+                    "email": "",
+                    "linkedin": "",
+                    "github": "",
+                    "experiences": [
+                        {
+                            "job_title": "See Profile Description",
+                            "company": "Text Response",
+                            "start_date": "",
+                            "end_date": "",
+                            "location": "",
+                            "four_tasks": [
+                                "Please see the profile description for the full text response.",
+                                "The AI generated a text response instead of structured data.",
+                                "You may want to try optimizing again with different settings.",
+                                "Or you can manually extract information from the text response."
+                            ]
+                        }
+                    ],
+                    "education": [],
+                    "skills": {
+                        "hard_skills": result.get("user_information", {}).get("skills", {}).get("hard_skills", []),
+                        "soft_skills": []
+                    },
+                    "hobbies": []
+                },
+                "projects": [],
+                "certificate": [],
+                "extra_curricular_activities": []
+            }
+
+            # Add ATS metrics if available
+            if "ats_metrics" in result:
+                minimal_result["ats_metrics"] = result["ats_metrics"]
+
+            try:
+                optimized_data = ResumeData.model_validate(minimal_result)
+                logger.info("Successfully created and validated minimal structure from raw text response")
+            except Exception as second_validation_error:
+                logger.error(f"Failed to create minimal valid structure: {str(second_validation_error)}")
+                raise HTTPException(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail=f"Error parsing AI response: {str(validation_error)}",
+                )
+        else:
+            # If we don't have a raw text response, raise the original error
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error parsing AI response: {str(validation_error)}",
+            )
+
+    return optimized_data
+
+
 @resume_router.post(
     "/{resume_id}/optimize",
     response_model=OptimizationResponse,
@@ -456,6 +984,42 @@ async def optimize_resume(
     ------
         HTTPException: If the resume is not found or optimization fails
     """
+    key = make_flight_key(
+        "optimize",
+        resume_id,
+        hashlib.sha256(optimization_request.job_description.encode("utf-8")).hexdigest(),
+        optimization_request.temperature,
+        optimization_request.section_parallel,
+        optimization_request.incremental,
+        optimization_request.speculative,
+        await _get_prompt_versions(),
+    )
+    return await _run_coalesced(
+        request,
+        key,
+        lambda: _optimize_resume(resume_id, optimization_request, request, repo),
+    )
+
+
+async def _optimize_resume(
+    resume_id: str,
+    optimization_request: OptimizeResumeRequest,
+    request: Request,
+    repo: ResumeRepository,
+):
+    """Run the optimization of a resume; see optimize_resume for the endpoint.
+
+    The resume is loaded first so the LLM calls count against its owner's
+    token budget. The optimization then runs as a stage graph: the scorer
+    prompts and the optimization prompt are loaded concurrently, the resume
+    and job description are extracted concurrently and scored once, and that
+    score is handed to the optimizer instead of being computed again. The
+    optimized resume is re-scored against the cached job extraction.
+
+    In speculative mode, generation starts right away from a local estimate
+    of the missing skills and the result is kept if it covers the skills the
+    LLM score finds missing; otherwise it is generated again.
+    """
     logger.info(f"Starting resume optimization for resume_id: {resume_id}")
 
     # Check if resume_id is "undefined" or invalid
@@ -466,86 +1030,19 @@ async def optimize_resume(
             detail="Invalid resume ID. Please provide a valid resume ID.",
         )
 
-    # 1. Retrieve resume
-    logger.info(f"Retrieving resume with ID: {resume_id}")
-    try:
-        resume = await repo.get_resume_by_id(resume_id)
-        if not resume:
-            logger.warning(f"Resume not found with ID: {resume_id}")
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Resume with ID {resume_id} not found",
-            )
-    except Exception as e:
-        logger.error(f"Error retrieving resume with ID {resume_id}: {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error retrieving resume: {str(e)}",
-        )
-    logger.info(f"Successfully retrieved resume: {resume.get('title', 'Untitled')}")
-
-    # 2. Get API configuration
-    logger.info("Retrieving API configuration")
-    api_key = os.getenv("API_KEY")
-    api_base_url = os.getenv("API_BASE")
-    model_name = os.getenv("MODEL_NAME")
+    api_key, api_base_url, model_name = _get_api_config(request)
+    resume = await _load_resume(resume_id, repo)
 
-    logger.info(f"API configuration - model_name: {model_name or 'Not set'}")
-    logger.info(f"API configuration - api_base_url: {api_base_url or 'Not set'}")
-    logger.info(f"API Key present: {bool(api_key)}")
-
-    if not api_key:
-        logger.warning(
-            "API key not found in environment variables, attempting to get from app state"
-        )
-        try:
-            api_key = request.app.state.config.AI_API_KEY
-            logger.info("Successfully retrieved API key from app state")
-        except Exception as config_error:
-            logger.error(
-                f"Failed to retrieve API key from app state: {str(config_error)}"
-            )
-            logger.error(f"Config error details: {traceback.format_exc()}")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="AI API key not configured",
-            )
-
-    # 3. Initialize ATS scorer
     logger.info("Initializing ATSScorerLLM for pre-optimization scoring")
     ats_scorer = ATSScorerLLM(
         model_name=model_name,
         api_key=api_key,
         api_base=api_base_url,
+        user_id=resume.get("user_id"),
+        priority=Priority.OPTIMIZE,
     )
 
-    # 4. Get job description
-    job_description = optimization_request.job_description or resume.get(
-        "job_description", ""
-    )
-    logger.info(f"Job description length: {len(job_description)} characters")
-
-    if not job_description:
-        logger.warning("Job description is empty")
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Job description is required for optimization",
-        )
-
-    try:
-        # 5. Score the original resume
-        logger.info("Scoring original resume against job description")
-        original_score_result = await ats_scorer.compute_match_score(
-            resume["original_content"], job_description
-        )
-        original_ats_score = int(original_score_result["final_score"])
-        logger.info(f"Original resume ATS score: {original_ats_score}")
-
-        # Extract missing skills to be addressed in optimization
-        missing_skills = original_score_result.get("missing_skills", [])
-        logger.info(f"Identified missing skills: {missing_skills}")
-
-        # 6. Initialize optimizer and generate optimized resume
+    async def run_optimizer(resume, job_description, score_results, optimization_prompt):
         logger.info(f"Initializing AtsResumeOptimizer with temperature: {optimization_request.temperature}")
         optimizer = AtsResumeOptimizer(
             model_name=model_name,
@@ -553,13 +1050,28 @@ async def optimize_resume(
             api_key=api_key,
             api_base=api_base_url,
             temperature=optimization_request.temperature,
+            user_id=resume.get("user_id"),
         )
 
         logger.info("Calling AI service to generate optimized resume")
-        result = await optimizer.generate_ats_optimized_resume_json(job_description)
-        # Note: The optimizer now automatically incorporates missing skills into the prompt
+        previous_result = None
+        previous_context = None
+        if optimization_request.incremental and resume.get("optimized_data"):
+            # The optimization summary is stored next to the optimized data
+            previous_result = dict(
+                resume["optimized_data"],
+                optimization_summary=resume.get("optimization_summary"),
+            )
+            previous_context = resume.get("optimization_context")
+        result = await optimizer.generate_ats_optimized_resume_json(
+            job_description,
+            section_parallel=optimization_request.section_parallel,
+            previous_result=previous_result,
+            previous_context=previous_context,
+            score_results=score_results,
+            prompt_template=optimization_prompt,
+        )
 
-        # 7. Check for errors in result
         if "error" in result:
             logger.error(f"AI service returned an error: {result.get('error')}")
             raise HTTPException(
@@ -567,141 +1079,87 @@ async def optimize_resume(
                 detail=f"AI optimization error: {result['error']}",
             )
 
-        # 8. Log the structure of the result (without exposing sensitive data)
+        # Log the structure of the result (without exposing sensitive data)
         logger.info("AI service returned result successfully")
         logger.info(
             f"Result keys: {list(result.keys() if isinstance(result, dict) else [])}"
         )
+        return {"result": result, "context": optimizer.optimization_context}
 
-        # 9. Parse and validate result
-        logger.info("Parsing result into ResumeData model")
-        try:
-            # Check if the result contains raw_text_response, which indicates it's a fallback structured response
-            if "raw_text_response" in result:
-                logger.warning("Using fallback structured response from text. This may not contain all expected data.")
-                # We'll still try to validate it, but we'll log a warning
-
-            optimized_data = ResumeData.model_validate(result)
-            logger.info("Successfully validated result through Pydantic model")
-
-            # If this is a fallback response, add a note to the profile description
-            if "raw_text_response" in result:
-                # Add a note to the profile description
-                original_profile = optimized_data.user_information.profile_description
-                note = "\n\nNote: This resume was generated from a text response and may not be fully structured. Please review and edit as needed."
-                optimized_data.user_information.profile_description = original_profile + note
-
-        except Exception as validation_error:
-            logger.error(
-                f"Failed to parse result into ResumeData model: {str(validation_error)}"
-            )
-            logger.error(f"Validation error details: {traceback.format_exc()}")
-            logger.debug(f"Problematic data: {result}")
-
-            # Check if we have a raw text response we can use
-            if isinstance(result, dict) and "raw_text_response" in result:
-                logger.warning("Validation failed but raw text response is available. Creating minimal valid structure.")
-
-                # Create a minimal valid structure that will pass validation
-                minimal_result = {
-                    "user_information": {
-                        "name": "",
-                        "main_job_title": "Generated from Text Response",
-                        "profile_description": "The AI generated a text response instead of structured data. Here's the beginning of that response:\n\n" +
-                                              result.get("raw_text_response", "")[:500] +
-                                              "\n\n(Note: This resume was generated from a text response and may not be fully structured. Please review and edit as needed.)",
-                        "email": "",
-                        "linkedin": "",
-                        "github": "",
-                        "experiences": [
-                            {
-                                "job_title": "See Profile Description",
-                                "company": "Text Response",
-                                "start_date": "",
-                                "end_date": "",
-                                "location": "",
-                                "four_tasks": [
-                                    "Please see the profile description for the full text response.",
-                                    "The AI generated a text response instead of structured data.",
-                                    "You may want to try optimizing again with different settings.",
-                                    "Or you can manually extract information from the text response."
-                                ]
-                            }
-                        ],
-                        "education": [],
-                        "skills": {
-                            "hard_skills": result.get("user_information", {}).get("skills", {}).get("hard_skills", []),
-                            "soft_skills": []
-                        },
-                        "hobbies": []
-                    },
-                    "projects": [],
-                    "certificate": [],
-                    "extra_curricular_activities": []
-                }
-
-                # Add ATS metrics if available
-                if "ats_metrics" in result:
-                    minimal_result["ats_metrics"] = result["ats_metrics"]
-
-                try:
-                    optimized_data = ResumeData.model_validate(minimal_result)
-                    logger.info("Successfully created and validated minimal structure from raw text response")
-                except Exception as second_validation_error:
-                    logger.error(f"Failed to create minimal valid structure: {str(second_validation_error)}")
-                    raise HTTPException(
-                        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                        detail=f"Error parsing AI response: {str(validation_error)}",
-                    )
-            else:
-                # If we don't have a raw text response, raise the original error
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail=f"Error parsing AI response: {str(validation_error)}",
-                )
+    async def optimize(resume, job_description, original_score, optimization_prompt):
+        return await run_optimizer(resume, job_description, original_score, optimization_prompt)
 
-        # 10. Score the optimized resume
-        logger.info("Generating JSON text representation of the optimized resume")
-        optimized_resume_text = json.dumps(result)
+    async def estimate_gaps(resume, job_description):
+        return estimate_missing_skills(resume["original_content"], job_description)
 
-        logger.info("Scoring optimized resume against job description")
-        optimized_score_result = await ats_scorer.compute_match_score(
-            optimized_resume_text, job_description
+    async def optimize_speculatively(resume, job_description, estimated_gaps, optimization_prompt):
+        logger.info(f"Starting speculative optimization with estimated missing skills: {estimated_gaps}")
+        return await run_optimizer(
+            resume, job_description, {"missing_skills": estimated_gaps}, optimization_prompt
         )
-        optimized_ats_score = int(optimized_score_result["final_score"])
-        logger.info(f"Optimized resume ATS score: {optimized_ats_score}")
 
-        score_improvement = optimized_ats_score - original_ats_score
-        logger.info(f"Score improvement: {score_improvement}")
+    async def resolve_speculation(
+        resume,
+        job_description,
+        original_score,
+        optimization_prompt,
+        estimated_gaps,
+        speculative_optimized,
+    ):
+        # Keep the speculative result if it covers the skills the LLM found missing
+        if speculative_optimized is None:
+            speculation_stats.record("failures")
+        else:
+            try:
+                speculative_data = ResumeData.model_validate(speculative_optimized["result"])
+                uncovered = uncovered_skills(
+                    original_score.get("missing_skills", []),
+                    estimated_gaps,
+                    render_resume_text(speculative_data),
+                )
+            except Exception as e:
+                logger.warning(f"Speculative result could not be checked: {str(e)}")
+                uncovered = None
+            if uncovered == []:
+                speculation_stats.record("hits")
+                logger.info("Speculative optimization covers the missing skills, keeping it")
+                result = speculative_optimized["result"]
+                result["ats_metrics"] = {
+                    "initial_score": original_score.get("final_score", 0),
+                    "matching_skills": original_score.get("matching_skills", []),
+                    "missing_skills": original_score.get("missing_skills", []),
+                    "recommendation": original_score.get("recommendation", ""),
+                }
+                return {
+                    "result": result,
+                    "context": build_optimization_context(
+                        resume["original_content"], original_score, result
+                    ),
+                }
+            speculation_stats.record("misses")
+            logger.info(f"Speculative optimization misses skills {uncovered}, regenerating")
+        return await run_optimizer(resume, job_description, original_score, optimization_prompt)
 
-        # 11. Update database
+    async def validate(optimized):
+        return _validate_optimization_result(optimized["result"])
+
+    async def save(optimized, optimized_data, original_score, optimized_score):
         logger.info(f"Updating resume {resume_id} with optimized data")
+        result = optimized["result"]
+        # Without a re-score the optimized resume keeps the original score
+        final_score = optimized_score or original_score
         try:
-            # Extract optimization summary if available
-            optimization_summary = None
-            if isinstance(result, dict) and "optimization_summary" in result:
-                optimization_summary = result["optimization_summary"]
-                logger.info("Found optimization summary in result")
-
-            # Handle different types of optimized_data (dict or Pydantic model)
-            if hasattr(optimized_data, 'model_dump') and callable(getattr(optimized_data, 'model_dump')):
-                # It's a Pydantic model
-                optimized_data_dict = optimized_data.model_dump()
-            elif isinstance(optimized_data, dict):
-                # It's already a dictionary
-                optimized_data_dict = optimized_data
-            else:
-                # Try to convert to dict if it has a __dict__ attribute
-                optimized_data_dict = vars(optimized_data) if hasattr(optimized_data, '__dict__') else optimized_data
-
             await repo.update_optimized_data(
-                resume_id, optimized_data_dict, optimized_ats_score,
-                original_ats_score=original_ats_score,
-                matching_skills=optimized_score_result.get("matching_skills", []),
-                missing_skills=optimized_score_result.get("missing_skills", []),
-                score_improvement=score_improvement,
-                recommendation=optimized_score_result.get("recommendation", ""),
-                optimization_summary=optimization_summary
+                resume_id,
+                optimized_data.model_dump(),
+                int(final_score["final_score"]),
+                original_ats_score=int(original_score["final_score"]),
+                matching_skills=final_score.get("matching_skills", []),
+                missing_skills=final_score.get("missing_skills", []),
+                score_improvement=int(final_score["final_score"]) - int(original_score["final_score"]),
+                recommendation=final_score.get("recommendation", ""),
+                optimization_summary=result.get("optimization_summary"),
+                optimization_context=optimized["context"],
             )
             logger.info("Successfully updated resume with optimized data")
         except Exception as db_error:
@@ -712,16 +1170,81 @@ async def optimize_resume(
                 detail=f"Database error during update: {str(db_error)}",
             )
 
-        # 12. Return success response with both scores and skill analysis
+    if optimization_request.speculative:
+        # Generation starts from a local estimate of the skill gaps while the
+        # resume is scored, and is redone only if the estimate missed skills
+        optimization_stages = [
+            Stage("estimated_gaps", estimate_gaps, deps=("resume", "job_description")),
+            Stage(
+                "speculative_optimized",
+                optimize_speculatively,
+                deps=("resume", "job_description", "estimated_gaps", "optimization_prompt"),
+                optional=True,
+            ),
+            Stage(
+                "optimized",
+                resolve_speculation,
+                deps=(
+                    "resume",
+                    "job_description",
+                    "original_score",
+                    "optimization_prompt",
+                    "estimated_gaps",
+                    "speculative_optimized",
+                ),
+            ),
+        ]
+    else:
+        optimization_stages = [
+            Stage(
+                "optimized",
+                optimize,
+                deps=("resume", "job_description", "original_score", "optimization_prompt"),
+            ),
+        ]
+
+    graph = StageGraph(
+        "optimize_resume",
+        [
+            *_scoring_stages(
+                resume,
+                ats_scorer,
+                optimization_request.job_description,
+                "optimization",
+                use_stored_job_description=True,
+            ),
+            Stage("optimization_prompt", _load_optimization_prompt),
+            *optimization_stages,
+            Stage("optimized_data", validate, deps=("optimized",)),
+            *_rescoring_stages(ats_scorer),
+            Stage(
+                "saved",
+                save,
+                deps=("optimized", "optimized_data", "original_score", "optimized_score"),
+            ),
+        ],
+        cache=stage_cache,
+    )
+
+    try:
+        outputs = await _run_pipeline(graph)
+
+        original_ats_score = int(outputs["original_score"]["final_score"])
+        optimized_score_result = outputs["optimized_score"]
+        optimized_ats_score = None
+        score_improvement = 0
+        if optimized_score_result:
+            optimized_ats_score = int(optimized_score_result["final_score"])
+            score_improvement = optimized_ats_score - original_ats_score
+            logger.info(f"Score improvement: {score_improvement}")
+        else:
+            logger.warning("The optimized resume was not re-scored")
+            optimized_score_result = outputs["original_score"]
+
         logger.info(
             f"Resume optimization completed successfully for resume_id: {resume_id}"
         )
-
-        # Extract optimization summary if available
-        optimization_summary = None
-        if isinstance(result, dict) and "optimization_summary" in result:
-            optimization_summary = result["optimization_summary"]
-
+        result = outputs["optimized"]["result"]
         return {
             "resume_id": resume_id,
             "original_ats_score": original_ats_score,
@@ -730,13 +1253,32 @@ async def optimize_resume(
             "matching_skills": optimized_score_result.get("matching_skills", []),
             "missing_skills": optimized_score_result.get("missing_skills", []),
             "recommendation": optimized_score_result.get("recommendation", ""),
-            "optimization_summary": optimization_summary,
+            "optimization_summary": result.get("optimization_summary"),
             "optimized_data": result,
         }
-
     except HTTPException:
         # Re-raise HTTP exceptions as they're already properly formatted
         raise
+    except DeadlineExceededError as e:
+        logger.warning(f"Resume optimization ran out of time: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="Resume optimization did not finish in time. Please try again later.",
+        )
+    except TokenBudgetExceededError as e:
+        logger.warning(f"Resume optimization over token budget: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"{str(e)}. The budget resets at midnight UTC.",
+            headers={"Retry-After": str(max(int(e.retry_after), 1))},
+        )
+    except LLMSchedulerRejectedError as e:
+        logger.warning(f"Resume optimization rejected by the LLM scheduler: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The AI service is busy. Please try again shortly.",
+            headers={"Retry-After": str(max(int(e.retry_after), 1))},
+        )
     except Exception as e:
         # Log the full stack trace for any other exception
         logger.error(f"Unexpected error during resume optimization: {str(e)}")
@@ -809,6 +1351,32 @@ async def score_resume(
     ------
         HTTPException: If the resume is not found or scoring fails
     """
+    key = make_flight_key(
+        "score",
+        resume_id,
+        hashlib.sha256(scoring_request.job_description.encode("utf-8")).hexdigest(),
+        scoring_request.temperature,
+        await _get_prompt_versions(),
+    )
+    return await _run_coalesced(
+        request,
+        key,
+        lambda: _score_resume(resume_id, scoring_request, request, repo),
+    )
+
+
+async def _score_resume(
+    resume_id: str,
+    scoring_request: ScoreResumeRequest,
+    request: Request,
+    repo: ResumeRepository,
+):
+    """Run the scoring of a resume; see score_resume for the endpoint.
+
+    Scoring runs as the same kind of stage graph as the optimization. The
+    optimization stages are optional: if they fail, the request still returns
+    the score of the original resume.
+    """
     logger.info(f"Starting resume scoring for resume_id: {resume_id}")
 
     # Check if resume_id is "undefined" or invalid
@@ -819,157 +1387,63 @@ async def score_resume(
             detail="Invalid resume ID. Please provide a valid resume ID.",
         )
 
-    # Retrieve resume
-    logger.info(f"Retrieving resume with ID: {resume_id}")
-    try:
-        resume = await repo.get_resume_by_id(resume_id)
-        if not resume:
-            logger.warning(f"Resume not found with ID: {resume_id}")
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Resume with ID {resume_id} not found",
-            )
-    except Exception as e:
-        logger.error(f"Error retrieving resume with ID {resume_id}: {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error retrieving resume: {str(e)}",
-        )
-
-    # Get API configuration
-    api_key = os.getenv("API_KEY")
-    api_base_url = os.getenv("API_BASE")
-    model_name = os.getenv("MODEL_NAME")
+    api_key, api_base_url, model_name = _get_api_config(request)
+    resume = await _load_resume(resume_id, repo)
 
-    if not api_key:
-        logger.warning(
-            "API key not found in environment variables, attempting to get from app state"
-        )
-        try:
-            api_key = request.app.state.config.AI_API_KEY
-        except Exception as config_error:
-            logger.error(
-                f"Failed to retrieve API key from app state: {str(config_error)}"
-            )
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="AI API key not configured",
-            )
-
-    # Initialize ATS scorer
-    try:
-        logger.info(f"Initializing ATSScorerLLM with temperature: {scoring_request.temperature}")
-        ats_scorer = ATSScorerLLM(
-            model_name=model_name,
-            api_key=api_key,
-            api_base=api_base_url,
-            temperature=scoring_request.temperature,
-        )
-
-        # Get job description
-        job_description = scoring_request.job_description
-        if not job_description:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Job description is required for scoring",
-            )
-
-        # Get resume content
-        resume_content = resume["original_content"]
-
-        # 1. Score the original resume
-        logger.info("Scoring original resume against job description")
-        score_result = await ats_scorer.compute_match_score(
-            resume_content, job_description
-        )
-        ats_score = int(score_result["final_score"])
-        logger.info(f"Original resume ATS score: {ats_score}")
-
-        # 2. Generate optimized version in the same step
-        logger.info("Generating optimized resume version")
+    logger.info(f"Initializing ATSScorerLLM with temperature: {scoring_request.temperature}")
+    ats_scorer = ATSScorerLLM(
+        model_name=model_name,
+        api_key=api_key,
+        api_base=api_base_url,
+        temperature=scoring_request.temperature,
+        user_id=resume.get("user_id"),
+    )
 
-        # Initialize optimizer
+    async def optimize(resume, job_description, original_score, optimization_prompt):
         logger.info(f"Initializing AtsResumeOptimizer with temperature: {scoring_request.temperature}")
         optimizer = AtsResumeOptimizer(
             model_name=model_name,
-            resume=resume_content,
+            resume=resume["original_content"],
             api_key=api_key,
             api_base=api_base_url,
             temperature=scoring_request.temperature,
+            user_id=resume.get("user_id"),
         )
+        logger.info("Calling AI service to generate optimized resume")
+        result = await optimizer.generate_ats_optimized_resume_json(
+            job_description,
+            score_results=original_score,
+            prompt_template=optimization_prompt,
+        )
+        if "error" in result:
+            raise RuntimeError(f"AI service returned an error during optimization: {result['error']}")
+        return {"result": result, "context": optimizer.optimization_context}
 
-        # Generate optimized resume
-        optimization_success = False
-        optimized_data = None
-        optimized_score = None
-        score_improvement = 0
-
-        try:
-            # Generate optimized resume
-            logger.info("Calling AI service to generate optimized resume")
-            optimization_result = await optimizer.generate_ats_optimized_resume_json(job_description)
-
-            # Check for errors in optimization result
-            if "error" in optimization_result:
-                logger.error(f"AI service returned an error during optimization: {optimization_result.get('error')}")
-                # Continue with scoring only, don't fail the whole request
-            else:
-                # Parse the optimized data
-                try:
-                    optimized_data = ResumeData.model_validate(optimization_result)
-                    logger.info("Successfully validated optimization result through Pydantic model")
-
-                    # Score the optimized resume
-                    logger.info("Scoring optimized resume")
-                    optimized_resume_text = json.dumps(optimization_result)
-                    optimized_score_result = await ats_scorer.compute_match_score(
-                        optimized_resume_text, job_description
-                    )
-                    optimized_score = int(optimized_score_result["final_score"])
-                    logger.info(f"Optimized resume ATS score: {optimized_score}")
-
-                    # Calculate improvement
-                    score_improvement = optimized_score - ats_score
-                    logger.info(f"Score improvement: {score_improvement}")
-
-                    # Extract optimization summary if available
-                    optimization_summary = None
-                    if isinstance(optimization_result, dict) and "optimization_summary" in optimization_result:
-                        optimization_summary = optimization_result["optimization_summary"]
-
-                    # Update database with optimized data
-                    logger.info(f"Updating resume {resume_id} with optimized data")
-                    # Handle different types of optimized_data (dict or Pydantic model)
-                    if hasattr(optimized_data, 'model_dump') and callable(getattr(optimized_data, 'model_dump')):
-                        # It's a Pydantic model
-                        optimized_data_dict = optimized_data.model_dump()
-                    else:
-                        # It's already a dictionary or something else
-                        optimized_data_dict = optimized_data
-
-                    await repo.update_optimized_data(
-                        resume_id, optimized_data_dict, optimized_score,
-                        original_ats_score=ats_score,
-                        matching_skills=score_result.get("matching_skills", []),
-                        missing_skills=score_result.get("missing_skills", []),
-                        score_improvement=score_improvement,
-                        recommendation=score_result.get("recommendation", ""),
-                        optimization_summary=optimization_summary
-                    )
-                    optimization_success = True
-                except Exception as validation_error:
-                    logger.error(f"Failed to process optimization result: {str(validation_error)}")
-                    logger.error(f"Error details: {traceback.format_exc()}")
-        except Exception as optimization_error:
-            logger.error(f"Error during resume optimization: {str(optimization_error)}")
-            logger.error(f"Error details: {traceback.format_exc()}")
-            # Continue with scoring only, don't fail the whole request
+    async def validate(optimized):
+        optimized_data = ResumeData.model_validate(optimized["result"])
+        logger.info("Successfully validated optimization result through Pydantic model")
+        return optimized_data
 
-        # Prepare enhanced recommendation
-        recommendation = score_result.get("recommendation", "")
-        if optimization_success and score_improvement > 0:
-            recommendation += f"\n\nYour optimized resume scores {score_improvement} points higher ({optimized_score}%). The optimized version is now available in your dashboard."
+    async def save_optimization(optimized, optimized_data, original_score, optimized_score):
+        logger.info(f"Updating resume {resume_id} with optimized data")
+        ats_score = int(original_score["final_score"])
+        # Without a re-score the optimized resume keeps the original score
+        final_score = int((optimized_score or original_score)["final_score"])
+        await repo.update_optimized_data(
+            resume_id,
+            optimized_data.model_dump(),
+            final_score,
+            original_ats_score=ats_score,
+            matching_skills=original_score.get("matching_skills", []),
+            missing_skills=original_score.get("missing_skills", []),
+            score_improvement=final_score - ats_score,
+            recommendation=original_score.get("recommendation", ""),
+            optimization_summary=optimized["result"].get("optimization_summary"),
+            optimization_context=optimized["context"],
+        )
+        return True
 
+    async def save_job_description(job_description, original_score):
         # Save the job description and temperature to the resume
         logger.info(f"Saving job description and temperature ({scoring_request.temperature}) to resume {resume_id}")
         await repo.update_resume(
@@ -980,10 +1454,59 @@ async def score_resume(
             }
         )
 
-        # Prepare optimization summary for response
-        response_optimization_summary = None
-        if optimization_success and optimization_summary:
-            response_optimization_summary = optimization_summary
+    graph = StageGraph(
+        "score_resume",
+        [
+            *_scoring_stages(resume, ats_scorer, scoring_request.job_description, "scoring"),
+            Stage("optimization_prompt", _load_optimization_prompt),
+            Stage(
+                "optimized",
+                optimize,
+                deps=("resume", "job_description", "original_score", "optimization_prompt"),
+                optional=True,
+                min_budget=OPTIONAL_STAGE_MIN_BUDGET,
+            ),
+            Stage("optimized_data", validate, deps=("optimized",), optional=True),
+            *_rescoring_stages(ats_scorer),
+            # The optimization is saved even when re-scoring was skipped or failed
+            Stage(
+                "saved_optimization",
+                save_optimization,
+                deps=("optimized", "optimized_data", "original_score"),
+                optional_deps=("optimized_score",),
+                optional=True,
+            ),
+            Stage(
+                "saved_job_description",
+                save_job_description,
+                deps=("job_description", "original_score"),
+            ),
+        ],
+        cache=stage_cache,
+    )
+
+    try:
+        outputs = await _run_pipeline(graph)
+
+        score_result = outputs["original_score"]
+        ats_score = int(score_result["final_score"])
+        optimization_success = bool(outputs["saved_optimization"])
+        optimized_score = None
+        score_improvement = 0
+        optimization_summary = None
+        if optimization_success:
+            optimization_summary = outputs["optimized"]["result"].get("optimization_summary")
+        if optimization_success and outputs["optimized_score"]:
+            optimized_score = int(outputs["optimized_score"]["final_score"])
+            score_improvement = optimized_score - ats_score
+            logger.info(f"Score improvement: {score_improvement}")
+        elif optimization_success:
+            logger.warning("The optimized resume was saved without a re-score")
+
+        # Prepare enhanced recommendation
+        recommendation = score_result.get("recommendation", "")
+        if optimization_success and score_improvement > 0:
+            recommendation += f"\n\nYour optimized resume scores {score_improvement} points higher ({optimized_score}%). The optimized version is now available in your dashboard."
 
         return {
             "resume_id": resume_id,
@@ -995,10 +1518,32 @@ async def score_resume(
             "job_requirements": score_result.get("job_requirements", []),
             "optimization_success": optimization_success,
             "optimized_score": optimized_score,
-            "score_improvement": score_improvement if optimization_success else 0,
-            "optimization_summary": response_optimization_summary
+            "score_improvement": score_improvement,
+            "optimization_summary": optimization_summary
         }
 
+    except HTTPException:
+        raise
+    except DeadlineExceededError as e:
+        logger.warning(f"Resume scoring ran out of time: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="Resume scoring did not finish in time. Please try again later.",
+        )
+    except TokenBudgetExceededError as e:
+        logger.warning(f"Resume scoring over token budget: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"{str(e)}. The budget resets at midnight UTC.",
+            headers={"Retry-After": str(max(int(e.retry_after), 1))},
+        )
+    except LLMSchedulerRejectedError as e:
+        logger.warning(f"Resume scoring rejected by the LLM scheduler: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The AI service is busy. Please try again shortly.",
+            headers={"Retry-After": str(max(int(e.retry_after), 1))},
+        )
     except Exception as e:
         logger.error(f"Error during resume scoring: {str(e)}")
         logger.error(f"Error details: {traceback.format_exc()}")
@@ -1098,13 +1643,14 @@ async def download_resume(
             generator.parse_json_from_string(json_data)
         else:
             generator.json_data = json_data
-        latex_content = generator.generate_from_template(template)
+        with span("latex.render", template=template):
+            latex_content = generator.generate_from_template(template)
         if not latex_content:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to generate LaTeX content",
             )
-        pdf_path = create_temporary_pdf(latex_content)
+        pdf_path = await _run_request(request, lambda: acreate_temporary_pdf(latex_content))
         if not pdf_path:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -1193,7 +1739,8 @@ async def download_resume_latex(
         else:
             generator.json_data = json_data
 
-        latex_content = generator.generate_from_template(template)
+        with span("latex.render", template=template):
+            latex_content = generator.generate_from_template(template)
         if not latex_content:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
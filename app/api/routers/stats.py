@@ -0,0 +1,47 @@
+"""Runtime statistics API router.
+
+This module provides an API endpoint reporting the counters that the LLM
+scheduler, the resilience layer, request coalescing, the pipelines, the token
+usage writer, the token budgets and the resume cache keep since startup.
+"""
+
+from typing import Any, Dict
+
+from fastapi import APIRouter
+
+from app.services.ai.resilience import resilient_invoker
+from app.services.ai.scheduler import llm_scheduler
+from app.services.ai.skill_gaps import speculation_stats
+from app.services.ai.token_budget import token_budgets
+from app.utils.resume_cache import resume_cache
+from app.utils.singleflight import request_flights
+from app.utils.stage_graph import recent_traces, stage_cache
+from app.utils.usage_writer import usage_writer
+
+router = APIRouter(
+    prefix="/api/stats",
+    tags=["stats"],
+    responses={404: {"description": "Not found"}},
+)
+
+
+@router.get("")
+async def get_stats() -> Dict[str, Any]:
+    """Get the runtime statistics of each subsystem.
+
+    Returns:
+        Dict[str, Any]: Counters of each subsystem, keyed by subsystem name
+    """
+    return {
+        "scheduler": llm_scheduler.get_stats(),
+        "resilience": resilient_invoker.get_stats(),
+        "coalescing": request_flights.get_stats(),
+        "pipelines": {
+            "stage_cache": stage_cache.get_stats(),
+            "speculation": speculation_stats.get_stats(),
+            "recent_runs": [trace.summary() for trace in recent_traces],
+        },
+        "usage_writer": usage_writer.get_stats(),
+        "budgets": token_budgets.get_stats(),
+        "resume_cache": resume_cache.get_stats(),
+    }
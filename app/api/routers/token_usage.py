@@ -4,12 +4,21 @@ This module provides API endpoints for accessing token usage data
 and analytics for OpenAI API calls throughout the application.
 """
 
+from datetime import datetime
 from typing import Dict, Optional
 
 from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 
 from app.database.models.token_usage import TokenUsageSummary
 from app.utils.token_tracker import TokenTracker
+from app.utils.usage_export import (
+    EXPORT_FORMATS,
+    MEDIA_TYPES,
+    gzip_chunks,
+    parse_fields,
+    serialize_batches,
+)
 
 router = APIRouter(
     prefix="/api/token-usage",
@@ -53,19 +62,55 @@ async def get_token_usage_summary(
 
 @router.get("/export")
 async def export_token_usage_data(
-    format: str = Query("json", description="Output format ('json' or 'dict')")
-) -> Dict:
+    format: str = Query("json", description="Output format ('ndjson', 'csv', 'json' or 'dict')"),
+    start: Optional[datetime] = Query(None, description="Earliest timestamp exported (optional)"),
+    end: Optional[datetime] = Query(None, description="Timestamp before which records are exported (optional)"),
+    feature: Optional[str] = Query(None, description="Filter by specific feature (optional)"),
+    user_id: Optional[str] = Query(None, description="Filter by specific user (optional)"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to export (optional)"),
+    gzip: bool = Query(False, description="Compress the ndjson/csv stream with gzip"),
+):
     """Export token usage data for external analysis.
 
-    This endpoint provides detailed token usage data in either JSON or dictionary format,
-    suitable for export and further analysis.
+    With format 'ndjson' or 'csv' the records are streamed from a database
+    cursor batch by batch, optionally gzip compressed, so exports of any size
+    use constant memory. The date range, feature, user and field filters
+    apply to these formats. The 'json' and 'dict' formats return the whole
+    export in one response body and are kept for compatibility.
 
     Args:
-        format: Output format ('json' or 'dict')
+        format: Output format ('ndjson', 'csv', 'json' or 'dict')
+        start: Earliest timestamp exported (optional)
+        end: Timestamp before which records are exported (optional)
+        feature: Filter by specific feature (optional)
+        user_id: Filter by specific user (optional)
+        fields: Comma-separated fields to export (optional)
+        gzip: Compress the ndjson/csv stream with gzip
 
     Returns:
-        Raw token usage data in the requested format
+        A streaming ndjson/csv response, or the raw token usage data in the
+        requested format
+
+    Raises:
+        HTTPException: If the field selection is invalid or the export fails
     """
+    if format in EXPORT_FORMATS:
+        try:
+            selected = parse_fields(fields)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        chunks = serialize_batches(
+            TokenTracker.iter_usage_records(start, end, feature, user_id, selected),
+            format,
+            selected,
+        )
+        headers = {"Content-Disposition": f'attachment; filename="token_usage.{format}"'}
+        if gzip:
+            chunks = gzip_chunks(chunks)
+            headers["Content-Encoding"] = "gzip"
+        return StreamingResponse(chunks, media_type=MEDIA_TYPES[format], headers=headers)
+
     try:
         data = await TokenTracker.export_usage_data(format=format)
         return {"data": data}
@@ -91,4 +136,29 @@ async def get_model_pricing() -> Dict:
     return {
         "model_pricing": MODEL_PRICING,
         "note": "Prices are in USD per 1000 tokens"
-    }
\ No newline at end of file
+    }
+
+
+@router.get("/models")
+async def get_model_routing() -> Dict:
+    """Get the model routing configuration and per-model health statistics.
+
+    This endpoint returns the model, max_tokens and timeout used for each
+    pipeline stage along with the latency percentiles and error rate observed
+    for every model since startup.
+
+    Returns:
+        Dict: Stage configurations and model statistics
+    """
+    from app.services.ai.model_router import PIPELINE_STAGES, model_router
+
+    return {
+        "stages": {
+            stage: {
+                **model_router.get_stage_config(stage).model_dump(),
+                "selected_model": model_router.select_model(stage),
+            }
+            for stage in PIPELINE_STAGES
+        },
+        "models": model_router.get_stats(),
+    }
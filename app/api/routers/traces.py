@@ -0,0 +1,63 @@
+"""Request trace API router.
+
+This module provides API endpoints for inspecting the tracing spans recorded
+for recent API requests: pipeline stages, LLM calls with their queue wait,
+tokens and cost, database operations, LaTeX rendering, pdflatex and OCR.
+"""
+
+from typing import Any, Dict, List
+
+from fastapi import APIRouter, HTTPException, Query
+
+from app.utils.tracing import recent_request_traces
+
+router = APIRouter(
+    prefix="/api/traces",
+    tags=["traces"],
+    responses={404: {"description": "Not found"}},
+)
+
+
+@router.get("")
+async def list_traces(
+    limit: int = Query(50, ge=1, le=1000, description="Maximum number of traces returned"),
+) -> List[Dict[str, Any]]:
+    """List the most recent request traces, newest first.
+
+    Args:
+        limit: Maximum number of traces returned
+
+    Returns:
+        List[Dict[str, Any]]: Request ID, name, duration and span count of each trace
+    """
+    return [trace.summary() for trace in recent_request_traces.list(limit)]
+
+
+@router.get("/{request_id}")
+async def get_trace(
+    request_id: str,
+    format: str = Query("json", description="Output format ('json' or 'otlp')"),
+) -> Dict[str, Any]:
+    """Get the spans recorded for a request.
+
+    The request ID is returned in the X-Request-ID header of every API
+    response. With format=otlp the trace is returned in the OpenTelemetry
+    OTLP/JSON format, which can be imported into Jaeger, Tempo or any other
+    OTLP-compatible trace viewer.
+
+    Args:
+        request_id: ID of the request
+        format: Output format ('json' or 'otlp')
+
+    Returns:
+        Dict[str, Any]: The trace and its spans
+
+    Raises:
+        HTTPException: If the trace is unknown or the format is invalid
+    """
+    if format not in ("json", "otlp"):
+        raise HTTPException(status_code=400, detail="Invalid format. Use 'json' or 'otlp'.")
+    trace = recent_request_traces.get(request_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail=f"No trace recorded for request {request_id}")
+    return trace.to_otlp() if format == "otlp" else trace.to_dict()
@@ -7,7 +7,7 @@ and API documentation.
 """
 
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from pydantic import EmailStr, Field, field_validator
 
@@ -180,6 +180,8 @@ class Resume(BaseSchema):
         missing_skills (Optional[List[str]]): Skills missing from resume but in job description
         score_improvement (Optional[int]): Difference between optimized and original scores
         recommendation (Optional[str]): AI recommendation for improving the resume
+        optimization_context (Optional[Dict]): Job analysis and per-section inputs of the
+            last optimization, used to regenerate only affected sections on re-optimization
         created_at (datetime): When the resume was created
         updated_at (datetime): When the resume was last updated
         latex_template (str): Name of LaTeX template to use for PDF generation
@@ -196,6 +198,7 @@ class Resume(BaseSchema):
     missing_skills: Optional[List[str]] = None  # Skills missing from resume but in job description
     score_improvement: Optional[int] = None  # Difference between optimized and original scores
     recommendation: Optional[str] = None  # AI recommendation for improving the resume
+    optimization_context: Optional[Dict] = None  # Inputs of the last optimization for incremental re-runs
     created_at: datetime = Field(default_factory=datetime.now)
     updated_at: datetime = Field(default_factory=datetime.now)
     latex_template: str = "resume_template.tex"
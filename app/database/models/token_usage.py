@@ -28,6 +28,7 @@ class TokenUsage(BaseSchema):
         prompt_tokens: Number of tokens used in the prompt/input
         completion_tokens: Number of tokens used in the completion/output
         total_tokens: Total tokens used (prompt + completion)
+        cached_prompt_tokens: Prompt tokens served from the provider's prompt cache
         request_id: Optional request ID for correlation
         user_id: Optional ID of the user who triggered the request
         feature: The feature or component using the API (e.g., "resume_optimization")
@@ -43,6 +44,7 @@ class TokenUsage(BaseSchema):
     prompt_tokens: int
     completion_tokens: int
     total_tokens: int
+    cached_prompt_tokens: int = 0
     request_id: Optional[str] = None
     user_id: Optional[str] = None
     feature: str
@@ -60,6 +62,7 @@ class TokenUsageSummary(BaseSchema):
     Attributes:
         total_api_calls: Total number of API calls made
         total_prompt_tokens: Total prompt tokens consumed
+        total_cached_prompt_tokens: Prompt tokens served from the provider's cache
         total_completion_tokens: Total completion tokens consumed
         total_tokens: Total tokens consumed
         total_cost_usd: Total estimated cost in USD
@@ -71,6 +74,7 @@ class TokenUsageSummary(BaseSchema):
 
     total_api_calls: int
     total_prompt_tokens: int
+    total_cached_prompt_tokens: int = 0
     total_completion_tokens: int
     total_tokens: int
     total_cost_usd: float
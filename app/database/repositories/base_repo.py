@@ -3,14 +3,109 @@
 This module provides the BaseRepository class which implements the repository pattern
 for database operations, offering common CRUD methods that other repository classes
 can inherit and extend.
+
+Repositories declare the indexes their queries rely on in ``INDEXES``, created at
+startup by ``ensure_indexes``, and representative filters of those queries in
+``query_shapes``, whose query plans ``check_query_plans`` reports so collection
+scans can be spotted (see scripts/check_query_plans.py).
+
+Batches of writes go through ``insert_many``, ``update_many`` and
+``bulk_write``, one round trip each; unlike the single-document methods they
+raise errors, so callers can retry or report the documents that failed.
+``WriteBatcher`` coalesces single writes issued concurrently into bulk writes.
 """
 
+import asyncio
 import os
-from typing import Dict, List, Optional
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
 from uuid import UUID
 
+from bson import Decimal128, ObjectId
 from bson.binary import Binary, UuidRepresentation
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+from pymongo.results import BulkWriteResult
 from app.database.connector import MongoConnectionManager
+from app.utils.tracing import span
+
+# An index specification: (field, direction) pairs, as taken by create_index
+IndexSpec = List[Tuple[str, int]]
+
+# A representative query: its filter and optional sort
+QueryShape = Tuple[Dict, Optional[List[tuple]]]
+
+
+# Types stored as they are; checked by exact type on the hot path
+_SCALAR_TYPES = frozenset(
+    {str, int, float, bool, type(None), datetime, ObjectId, Binary, bytes, Decimal128}
+)
+
+
+def to_mongodb(value: Any) -> Any:
+    """Convert the UUIDs in a value to BSON Binary, at any depth.
+
+    Dicts, lists and tuples are copied only if something inside them is
+    converted; otherwise the value itself is returned.
+
+    Args:
+        value (Any): A document, a value of a document or a query.
+
+    Returns:
+        Any: The value with its UUIDs converted.
+    """
+    value_type = type(value)
+    if value_type in _SCALAR_TYPES:
+        return value
+    if isinstance(value, dict):
+        converted = None
+        for key, item in value.items():
+            if type(item) in _SCALAR_TYPES:
+                continue
+            new_item = to_mongodb(item)
+            if new_item is not item:
+                if converted is None:
+                    converted = dict(value)
+                converted[key] = new_item
+        return value if converted is None else converted
+    if isinstance(value, (list, tuple)):
+        converted = None
+        for index, item in enumerate(value):
+            if type(item) in _SCALAR_TYPES:
+                continue
+            new_item = to_mongodb(item)
+            if new_item is not item:
+                if converted is None:
+                    converted = list(value)
+                converted[index] = new_item
+        return value if converted is None else converted
+    if isinstance(value, UUID):
+        return Binary.from_uuid(value, UuidRepresentation.STANDARD)
+    return value
+
+
+def plan_stages(explanation: Dict[str, Any]) -> List[str]:
+    """Return the stages of the winning plan of an explain() result, outermost first.
+
+    Args:
+        explanation (Dict[str, Any]): The output of a find explain().
+
+    Returns:
+        List[str]: Stage names such as "FETCH", "IXSCAN" or "COLLSCAN".
+    """
+    plan = explanation.get("queryPlanner", {}).get("winningPlan", {})
+    # Plans run by the slot-based engine nest the classic plan under queryPlan
+    plan = plan.get("queryPlan", plan)
+    stages = []
+    pending = [plan]
+    while pending:
+        node = pending.pop(0)
+        if "stage" in node:
+            stages.append(node["stage"])
+        if "inputStage" in node:
+            pending.append(node["inputStage"])
+        pending.extend(node.get("inputStages", []))
+    return stages
 
 
 class BaseRepository:
@@ -27,6 +122,9 @@ class BaseRepository:
         connection_manager: Instance of MongoDB connection manager
     """
 
+    # Indexes the repository's queries rely on, created by ensure_indexes
+    INDEXES: List[IndexSpec] = []
+
     def __init__(
         self,
         db_name: str,
@@ -44,6 +142,63 @@ class BaseRepository:
         self.collection_name = collection_name
         self.connection_manager = MongoConnectionManager(connection_string=connection_string)
 
+    async def ensure_indexes(self) -> None:
+        """Create the indexes declared in INDEXES.
+
+        Creating an existing index is a no-op, so this is safe to call on every
+        startup. Errors are raised to the caller.
+        """
+        if not self.INDEXES:
+            return
+        with span("db.create_indexes", db_collection=self.collection_name):
+            async with self.connection_manager.get_collection(
+                self.db_name, self.collection_name
+            ) as collection:
+                for keys in self.INDEXES:
+                    await collection.create_index(keys)
+
+    def query_shapes(self) -> Dict[str, QueryShape]:
+        """Return representative filters and sorts of the repository's queries, by name.
+
+        Returns:
+        -------
+            Dict[str, QueryShape]: The queries whose plans check_query_plans reports.
+        """
+        return {}
+
+    async def explain(self, query: Dict, sort: Optional[List[tuple]] = None) -> Dict:
+        """Return the query planner's output for a find.
+
+        Args:
+            query (Dict): The query to explain.
+            sort (Optional[List[tuple]]): Sorting criteria.
+
+        Returns:
+        -------
+            Dict: The query planner output, including the winning plan.
+        """
+        processed_query = self._process_document_for_mongodb(query)
+        async with self.connection_manager.get_collection(
+            self.db_name, self.collection_name
+        ) as collection:
+            cursor = collection.find(processed_query)
+            if sort:
+                cursor = cursor.sort(sort)
+            return await cursor.explain()
+
+    async def check_query_plans(self) -> Dict[str, List[str]]:
+        """Explain every query of query_shapes.
+
+        Returns:
+        -------
+            Dict[str, List[str]]: The winning plan stages of each query; a
+            "COLLSCAN" stage means the query scans the whole collection.
+        """
+        return {
+            name: plan_stages(await self.explain(query, sort))
+            for name, (query, sort) in self.query_shapes().items()
+        }
+
     async def find_one(self, query: Dict) -> Optional[Dict]:
         """Find a single document matching the query.
 
@@ -59,14 +214,15 @@ class BaseRepository:
             processed_query = self._process_document_for_mongodb(query)
 
             # Use context manager to handle connection lifecycle
-            async with self.connection_manager.get_collection(
-                self.db_name, self.collection_name
-            ) as collection:
-                # Execute query and convert MongoDB ObjectId to string
-                document = await collection.find_one(processed_query)
-                if document:
-                    document["_id"] = str(document["_id"])
-                return document
+            with span("db.find_one", db_collection=self.collection_name):
+                async with self.connection_manager.get_collection(
+                    self.db_name, self.collection_name
+                ) as collection:
+                    # Execute query and convert MongoDB ObjectId to string
+                    document = await collection.find_one(processed_query)
+                    if document:
+                        document["_id"] = str(document["_id"])
+                    return document
         except Exception as e:
             print(f"Error in find_one: {str(e)}")
             return None
@@ -86,27 +242,36 @@ class BaseRepository:
             processed_query = self._process_document_for_mongodb(query)
 
             # Establish database connection and execute query
-            async with self.connection_manager.get_collection(
-                self.db_name, self.collection_name
-            ) as collection:
-                cursor = collection.find(processed_query)
-                documents = await cursor.to_list(length=None)
-                # Convert MongoDB ObjectIds to strings for all documents
-                for doc in documents:
-                    doc["_id"] = str(doc["_id"])
-                return documents
+            with span("db.find", db_collection=self.collection_name):
+                async with self.connection_manager.get_collection(
+                    self.db_name, self.collection_name
+                ) as collection:
+                    cursor = collection.find(processed_query)
+                    documents = await cursor.to_list(length=None)
+                    # Convert MongoDB ObjectIds to strings for all documents
+                    for doc in documents:
+                        doc["_id"] = str(doc["_id"])
+                    return documents
         except Exception as e:
             print(f"Error in find: {str(e)}")
             return []
 
     async def find_many(
-        self, query: Dict, sort: Optional[List[tuple]] = None
+        self,
+        query: Dict,
+        sort: Optional[List[tuple]] = None,
+        projection: Optional[Dict] = None,
+        limit: int = 0,
+        batch_size: Optional[int] = None,
     ) -> List[Dict]:
         """Find multiple documents matching the query with optional sorting.
 
         Args:
             query (Dict): The query to match documents.
             sort (Optional[List[tuple]]): Sorting criteria.
+            projection (Optional[Dict]): Fields to return; all fields if None.
+            limit (int): Maximum number of documents to return; 0 for no limit.
+            batch_size (Optional[int]): Documents fetched per round trip.
 
         Returns:
         -------
@@ -116,20 +281,48 @@ class BaseRepository:
             # Process the query to handle UUIDs and other special types
             processed_query = self._process_document_for_mongodb(query)
 
-            async with self.connection_manager.get_collection(
-                self.db_name, self.collection_name
-            ) as collection:
-                cursor = collection.find(processed_query)
-                if sort:
-                    cursor.sort(sort)
-                documents = await cursor.to_list(length=None)
-                for doc in documents:
-                    doc["_id"] = str(doc["_id"])
-                return documents
+            with span("db.find_many", db_collection=self.collection_name):
+                async with self.connection_manager.get_collection(
+                    self.db_name, self.collection_name
+                ) as collection:
+                    cursor = collection.find(processed_query, projection)
+                    if sort:
+                        cursor.sort(sort)
+                    if limit:
+                        cursor.limit(limit)
+                    if batch_size:
+                        cursor.batch_size(batch_size)
+                    documents = await cursor.to_list(length=limit or None)
+                    for doc in documents:
+                        doc["_id"] = str(doc["_id"])
+                    return documents
         except Exception as e:
             print(f"Error in find_many: {str(e)}")
             return []
 
+    async def aggregate(self, pipeline: List[Dict]) -> List[Dict]:
+        """Run an aggregation pipeline on the collection.
+
+        Args:
+            pipeline (List[Dict]): The aggregation pipeline stages.
+
+        Returns:
+        -------
+            List[Dict]: The documents produced by the pipeline.
+        """
+        try:
+            processed_pipeline = [self._process_document_for_mongodb(stage) for stage in pipeline]
+
+            with span("db.aggregate", db_collection=self.collection_name):
+                async with self.connection_manager.get_collection(
+                    self.db_name, self.collection_name
+                ) as collection:
+                    cursor = collection.aggregate(processed_pipeline)
+                    return await cursor.to_list(length=None)
+        except Exception as e:
+            print(f"Error in aggregate: {str(e)}")
+            return []
+
     async def insert_one(self, document: Dict) -> str:
         """Insert a single document into the collection.
 
@@ -144,55 +337,87 @@ class BaseRepository:
             # Process the document to handle UUIDs and other special types
             processed_document = self._process_document_for_mongodb(document)
 
-            async with self.connection_manager.get_collection(
-                self.db_name, self.collection_name
-            ) as collection:
-                result = await collection.insert_one(processed_document)
-                return str(result.inserted_id)
+            with span("db.insert_one", db_collection=self.collection_name):
+                async with self.connection_manager.get_collection(
+                    self.db_name, self.collection_name
+                ) as collection:
+                    result = await collection.insert_one(processed_document)
+                    return str(result.inserted_id)
         except Exception as e:
             print(f"Error in insert_one: {str(e)}")
             return ""
 
+    async def insert_many(self, documents: List[Dict], ordered: bool = True) -> List[str]:
+        """Insert documents into the collection with a single round trip.
+
+        Args:
+            documents (List[Dict]): The documents to insert.
+            ordered (bool): If True, stop at the first failed document; if
+                False, insert all the others and report the failures at the end.
+
+        Returns:
+        -------
+            List[str]: The IDs of the inserted documents.
+
+        Raises:
+        ------
+            BulkWriteError: If some documents could not be inserted.
+        """
+        if not documents:
+            return []
+        processed_documents = [self._process_document_for_mongodb(document) for document in documents]
+        with span("db.insert_many", db_collection=self.collection_name, documents=len(documents)):
+            async with self.connection_manager.get_collection(
+                self.db_name, self.collection_name
+            ) as collection:
+                result = await collection.insert_many(processed_documents, ordered=ordered)
+                return [str(inserted_id) for inserted_id in result.inserted_ids]
+
+    async def bulk_write(self, operations: List[Any], ordered: bool = True) -> BulkWriteResult:
+        """Send a batch of write operations with a single round trip.
+
+        Operations are pymongo InsertOne, UpdateOne, UpdateMany, ReplaceOne,
+        DeleteOne or DeleteMany instances and are sent as they are; build their
+        documents with to_mongodb if they may contain UUIDs.
+
+        Args:
+            operations (List[Any]): The write operations.
+            ordered (bool): If True, operations run in order and stop at the
+                first error; if False, the server may run them in any order and
+                runs all of them.
+
+        Returns:
+        -------
+            BulkWriteResult: The counts of inserted, matched, modified, deleted
+            and upserted documents.
+
+        Raises:
+        ------
+            BulkWriteError: If some operations failed; its details list them.
+        """
+        with span("db.bulk_write", db_collection=self.collection_name, operations=len(operations)):
+            async with self.connection_manager.get_collection(
+                self.db_name, self.collection_name
+            ) as collection:
+                return await collection.bulk_write(operations, ordered=ordered)
+
     def _process_document_for_mongodb(self, document: Dict) -> Dict:
         """Process a document to make it compatible with MongoDB.
 
-        Converts UUIDs to BSON Binary objects with standard representation
-        and handles other special types.
+        Converts UUIDs, at any depth, to BSON Binary objects with standard
+        representation. Everything else is kept as is: subtrees without UUIDs
+        are shared with the input rather than rebuilt, so plain payloads such
+        as resume data cost one pass over their values.
 
         Args:
             document (Dict): The document to process.
 
         Returns:
-            Dict: The processed document.
-        """
-        processed = {}
-
-        for key, value in document.items():
-            # Handle UUIDs
-            if isinstance(value, UUID):
-                # Convert UUID to BSON Binary with standard representation
-                processed[key] = Binary.from_uuid(value, UuidRepresentation.STANDARD)
-            # Handle string UUIDs (already converted)
-            elif hasattr(value, 'hex') and callable(getattr(value, 'hex')):
-                # This is a fallback for other UUID-like objects
-                processed[key] = str(value)
-            # Handle nested dictionaries
-            elif isinstance(value, dict):
-                processed[key] = self._process_document_for_mongodb(value)
-            # Handle lists of dictionaries
-            elif isinstance(value, list) and all(isinstance(item, dict) for item in value):
-                processed[key] = [self._process_document_for_mongodb(item) for item in value]
-            # Handle lists that might contain UUIDs
-            elif isinstance(value, list):
-                processed[key] = [
-                    Binary.from_uuid(item, UuidRepresentation.STANDARD) if isinstance(item, UUID) else item
-                    for item in value
-                ]
-            # Handle other types
-            else:
-                processed[key] = value
-
-        return processed
+            Dict: The processed document, a new top-level dict.
+        """
+        processed = to_mongodb(document)
+        # Inserts add _id to the dict they are given; never the caller's
+        return dict(processed) if processed is document else processed
 
     async def update_one(self, query: Dict, update: Dict) -> bool:
         """Update a single document matching the query.
@@ -217,15 +442,36 @@ class BaseRepository:
                 else:
                     processed_update[operator] = value
 
-            async with self.connection_manager.get_collection(
-                self.db_name, self.collection_name
-            ) as collection:
-                result = await collection.update_one(processed_query, processed_update)
-                return result.modified_count > 0
+            with span("db.update_one", db_collection=self.collection_name):
+                async with self.connection_manager.get_collection(
+                    self.db_name, self.collection_name
+                ) as collection:
+                    result = await collection.update_one(processed_query, processed_update)
+                    return result.modified_count > 0
         except Exception as e:
             print(f"Error in update_one: {str(e)}")
             return False
 
+    async def update_many(self, query: Dict, update: Dict) -> int:
+        """Update all documents matching the query with a single round trip.
+
+        Args:
+            query (Dict): The query to match documents.
+            update (Dict): The update to apply.
+
+        Returns:
+        -------
+            int: The number of modified documents.
+        """
+        processed_query = self._process_document_for_mongodb(query)
+        processed_update = {operator: to_mongodb(value) for operator, value in update.items()}
+        with span("db.update_many", db_collection=self.collection_name):
+            async with self.connection_manager.get_collection(
+                self.db_name, self.collection_name
+            ) as collection:
+                result = await collection.update_many(processed_query, processed_update)
+                return result.modified_count
+
     async def delete_one(self, query: Dict) -> bool:
         """Delete a single document matching the query.
 
@@ -240,11 +486,113 @@ class BaseRepository:
             # Process the query to handle UUIDs and other special types
             processed_query = self._process_document_for_mongodb(query)
 
-            async with self.connection_manager.get_collection(
-                self.db_name, self.collection_name
-            ) as collection:
-                result = await collection.delete_one(processed_query)
-                return result.deleted_count > 0
+            with span("db.delete_one", db_collection=self.collection_name):
+                async with self.connection_manager.get_collection(
+                    self.db_name, self.collection_name
+                ) as collection:
+                    result = await collection.delete_one(processed_query)
+                    return result.deleted_count > 0
         except Exception as e:
             print(f"Error deleting document: {e}")
             return False
+
+
+class WriteBatcher:
+    """Coalesce single writes issued within a short window into bulk writes.
+
+    Concurrent tasks each awaiting one insert or update, such as the results of
+    a batch of scorings, share one unordered bulk_write per window instead of
+    a round trip each. A batch is sent when it reaches max_batch operations or
+    max_delay seconds after its first operation, whichever comes first.
+    """
+
+    def __init__(self, repository: BaseRepository, max_batch: int = 100, max_delay: float = 0.01):
+        """Initialize the batcher.
+
+        Args:
+            repository: The repository whose collection is written.
+            max_batch: Maximum number of operations per bulk write.
+            max_delay: Seconds a write waits for others to join its batch.
+        """
+        self.repository = repository
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._pending: List[Tuple[Any, asyncio.Future, Any]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushes: set = set()
+        self.stats = {"writes": 0, "batches": 0}
+
+    async def insert(self, document: Dict) -> str:
+        """Insert a document as part of the next batch and return its ID.
+
+        Raises:
+            BulkWriteError: If the document could not be inserted.
+        """
+        processed_document = self.repository._process_document_for_mongodb(document)
+        # The ID is assigned here, as insert_one would, so it is known even
+        # though bulk write results only count the inserted documents
+        processed_document.setdefault("_id", ObjectId())
+        return await self._submit(InsertOne(processed_document), str(processed_document["_id"]))
+
+    async def update(self, query: Dict, update: Dict, upsert: bool = False) -> None:
+        """Update one document as part of the next batch.
+
+        Raises:
+            BulkWriteError: If the update failed.
+        """
+        operation = UpdateOne(
+            self.repository._process_document_for_mongodb(query),
+            {operator: to_mongodb(value) for operator, value in update.items()},
+            upsert=upsert,
+        )
+        await self._submit(operation, None)
+
+    async def _submit(self, operation: Any, result: Any) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((operation, future, result))
+        self.stats["writes"] += 1
+        if len(self._pending) >= self.max_batch:
+            self._schedule_flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_delay, self._schedule_flush)
+        return await future
+
+    def _schedule_flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._write(batch))
+            # Keep a reference until the batch is written
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def _write(self, batch: List[Tuple[Any, asyncio.Future, Any]]) -> None:
+        """Send a batch and settle the future of each of its writes."""
+        self.stats["batches"] += 1
+        failures: Dict[int, Exception] = {}
+        try:
+            await self.repository.bulk_write([operation for operation, _, _ in batch], ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get("writeErrors", []):
+                failures[error["index"]] = BulkWriteError({"writeErrors": [error]})
+        except Exception as e:
+            failures = {index: e for index in range(len(batch))}
+        for index, (_, future, result) in enumerate(batch):
+            if future.done():
+                continue
+            if index in failures:
+                future.set_exception(failures[index])
+            else:
+                future.set_result(result)
+
+    async def flush(self) -> None:
+        """Send the pending writes now and wait for every batch in flight."""
+        self._schedule_flush()
+        if self._flushes:
+            await asyncio.gather(*list(self._flushes))
+
+    def get_stats(self) -> Dict[str, int]:
+        """Return the number of writes and of bulk writes they were sent in."""
+        return dict(self.stats)
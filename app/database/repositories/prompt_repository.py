@@ -11,9 +11,11 @@ from uuid import UUID
 
 from bson import ObjectId
 from fastapi import HTTPException, status
+from pymongo import ASCENDING
+from pymongo.errors import BulkWriteError
 
 from app.database.models.prompt import PromptTemplate, PromptUpdate
-from app.database.repositories.base_repo import BaseRepository
+from app.database.repositories.base_repo import BaseRepository, QueryShape
 
 
 class PromptRepository(BaseRepository):
@@ -23,6 +25,13 @@ class PromptRepository(BaseRepository):
     working with prompt templates in the database.
     """
 
+    # Prompts are looked up by ID, by name and listed by activity and component
+    INDEXES = [
+        [("id", ASCENDING)],
+        [("name", ASCENDING), ("is_active", ASCENDING)],
+        [("is_active", ASCENDING), ("component", ASCENDING)],
+    ]
+
     def __init__(
         self,
         db_name: str = os.getenv("DB_NAME", "myresumo"),
@@ -42,6 +51,15 @@ class PromptRepository(BaseRepository):
         # Pass the connection string to the base repository
         super().__init__(db_name, collection_name, connection_string=connection_string)
 
+    def query_shapes(self) -> Dict[str, QueryShape]:
+        """Return representative filters of the prompt queries, by name."""
+        return {
+            "get_prompt_by_id": ({"id": "prompt"}, None),
+            "get_prompt_by_name": ({"name": "prompt", "is_active": True}, None),
+            "get_prompts_by_component": ({"component": "component", "is_active": True}, None),
+            "get_all_prompts": ({"is_active": True}, None),
+        }
+
     async def create_prompt(self, prompt: PromptTemplate) -> str:
         """Create a new prompt template in the database.
 
@@ -270,13 +288,18 @@ class PromptRepository(BaseRepository):
                     ),
                 ]
 
-                # Insert default prompts
-                for prompt in default_prompts:
-                    try:
-                        prompt_id = await self.create_prompt(prompt)
-                        print(f"Created prompt: {prompt.name} with ID: {prompt_id}")
-                    except Exception as e:
-                        print(f"Error creating prompt {prompt.name}: {str(e)}")
+                # Insert default prompts with a single round trip; unordered,
+                # so one failed prompt does not prevent the others
+                prompt_dicts = [
+                    {**prompt.model_dump(), "id": str(prompt.id)} for prompt in default_prompts
+                ]
+                try:
+                    prompt_ids = await self.insert_many(prompt_dicts, ordered=False)
+                    print(f"Created {len(prompt_ids)} default prompts")
+                except BulkWriteError as e:
+                    for error in e.details.get("writeErrors", []):
+                        name = default_prompts[error["index"]].name
+                        print(f"Error creating prompt {name}: {error.get('errmsg')}")
             except Exception as e:
                 print(f"Error in prompt initialization: {str(e)}")
         except Exception as e:
@@ -3,16 +3,57 @@
 This module contains the implementation of ResumeRepository class which handles
 CRUD operations for resume data in the database, including storing, retrieving,
 updating, and deleting resume information.
+
+Resumes read by ID are served from the read-through resume cache
+(app/utils/resume_cache.py). Every update increments the resume's ``version``
+field and invalidates its cached copy for that version.
 """
 
+import base64
+import json
 import os
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
 from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
 
 from app.database.models.resume import Resume, ResumeData
-from app.database.repositories.base_repo import BaseRepository
+from app.database.repositories.base_repo import BaseRepository, QueryShape
+from app.utils.resume_cache import DELETED_VERSION, ResumeCache, resume_cache
+from app.utils.tracing import span
+
+# Fields of a resume listed on the dashboard
+RESUME_SUMMARY_PROJECTION = {
+    "title": 1,
+    "ats_score": 1,
+    "original_ats_score": 1,
+    "created_at": 1,
+    "updated_at": 1,
+}
+
+# Order of a user's resume list; _id breaks ties between equal creation times
+RESUME_LIST_SORT = [("created_at", DESCENDING), ("_id", DESCENDING)]
+
+
+def encode_cursor(document: Dict) -> str:
+    """Encode the position after a listed resume as an opaque page cursor."""
+    position = {"created_at": document["created_at"].isoformat(), "id": str(document["_id"])}
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """Decode a page cursor into the creation time and ID of the last listed resume.
+
+    Raises:
+        ValueError: If the cursor was not produced by encode_cursor.
+    """
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(position["created_at"]), ObjectId(position["id"])
+    except (InvalidId, KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
 
 
 class ResumeRepository(BaseRepository):
@@ -22,11 +63,15 @@ class ResumeRepository(BaseRepository):
     working with resume documents in the database.
     """
 
+    # A user's resumes are listed newest first
+    INDEXES = [[("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]]
+
     def __init__(
         self,
         db_name: str = os.getenv("DB_NAME", "myresumo"),
         collection_name: str = "resumes",
         connection_string: str = os.getenv("MONGODB_URL"),
+        cache: Optional[ResumeCache] = None,
     ):
         """Initialize the resume repository with database and collection names.
 
@@ -34,13 +79,26 @@ class ResumeRepository(BaseRepository):
             db_name (str): Name of the database. Defaults to environment variable or "myresumo".
             collection_name (str): Name of the collection. Defaults to "resumes".
             connection_string (str): MongoDB connection string. Defaults to environment variable or localhost.
+            cache (Optional[ResumeCache]): Cache of resumes read by ID. Defaults to
+                the shared resume cache.
         """
         # Store the connection string as an instance attribute so it can be accessed
         self.connection_string = connection_string
+        self.cache = cache or resume_cache
 
         # Pass the connection string to the base repository
         super().__init__(db_name, collection_name, connection_string=connection_string)
 
+    def query_shapes(self) -> Dict[str, QueryShape]:
+        """Return representative filters and sorts of the resume queries, by name."""
+        return {
+            "get_resumes_by_user_id": ({"user_id": "user"}, [("created_at", -1)]),
+            "get_resume_summaries_by_user_id": (
+                self._after({"user_id": "user"}, datetime.now(), ObjectId()),
+                RESUME_LIST_SORT,
+            ),
+        }
+
     async def create_resume(self, resume: Resume) -> str:
         """Create a new resume document in the database.
 
@@ -65,9 +123,16 @@ class ResumeRepository(BaseRepository):
             Optional[Dict]: Resume document if found, None otherwise.
         """
         try:
-            return await self.find_one({"_id": ObjectId(resume_id)})
+            object_id = ObjectId(resume_id)
         except Exception:
             return None
+        cached = await self.cache.get(resume_id)
+        if cached is not None:
+            return cached
+        document = await self.find_one({"_id": object_id})
+        if document:
+            await self.cache.fill(resume_id, document)
+        return document
 
     async def get_resumes_by_user_id(self, user_id: str) -> List[Dict]:
         """Retrieve all resumes belonging to a specific user.
@@ -81,6 +146,84 @@ class ResumeRepository(BaseRepository):
         """
         return await self.find_many({"user_id": user_id}, [("created_at", -1)])
 
+    @staticmethod
+    def _after(query: Dict, created_at: datetime, resume_id: ObjectId) -> Dict:
+        """Restrict a query to the resumes listed after the given one."""
+        return {
+            **query,
+            "$or": [
+                {"created_at": {"$lt": created_at}},
+                {"created_at": created_at, "_id": {"$lt": resume_id}},
+            ],
+        }
+
+    async def get_resume_summaries_by_user_id(
+        self, user_id: str, limit: int = 50, cursor: Optional[str] = None
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """Retrieve one page of a user's resumes, newest first, without their content.
+
+        Pages are read by keyset on (created_at, _id), so every page costs the
+        same regardless of how far into the list it is.
+
+        Args:
+            user_id (str): ID of the user whose resumes to retrieve.
+            limit (int): Maximum number of resumes on the page.
+            cursor (Optional[str]): The cursor returned with the previous page,
+                None for the first page.
+
+        Returns:
+        -------
+            Tuple[List[Dict], Optional[str]]: The resumes with only the
+            RESUME_SUMMARY_PROJECTION fields, and the cursor of the next page,
+            None on the last page.
+
+        Raises:
+        ------
+            ValueError: If the cursor is invalid.
+        """
+        query: Dict = {"user_id": user_id}
+        if cursor:
+            query = self._after(query, *decode_cursor(cursor))
+        # One extra resume tells whether there is a next page
+        resumes = await self.find_many(
+            query, RESUME_LIST_SORT, projection=RESUME_SUMMARY_PROJECTION, limit=limit + 1
+        )
+        if len(resumes) <= limit:
+            return resumes, None
+        resumes = resumes[:limit]
+        return resumes, encode_cursor(resumes[-1])
+
+    async def _update_versioned(self, resume_id: str, update: Dict) -> bool:
+        """Apply an update, increment the resume's version and invalidate its cached copy.
+
+        Args:
+            resume_id (str): ID of the resume to update.
+            update (Dict): The update operators to apply.
+
+        Returns:
+        -------
+            bool: True if the resume exists and was updated, False otherwise.
+        """
+        processed_update = {
+            operator: self._process_document_for_mongodb(value)
+            for operator, value in update.items()
+        }
+        processed_update["$inc"] = {"version": 1}
+        with span("db.find_one_and_update", db_collection=self.collection_name):
+            async with self.connection_manager.get_collection(
+                self.db_name, self.collection_name
+            ) as collection:
+                document = await collection.find_one_and_update(
+                    {"_id": ObjectId(resume_id)},
+                    processed_update,
+                    projection={"version": 1},
+                    return_document=ReturnDocument.AFTER,
+                )
+        if document is None:
+            return False
+        await self.cache.invalidate(resume_id, document["version"])
+        return True
+
     async def update_resume(self, resume_id: str, update_data: Dict) -> bool:
         """Update a resume document.
 
@@ -94,9 +237,9 @@ class ResumeRepository(BaseRepository):
         """
         try:
             update_data["updated_at"] = datetime.now()
-            return await self.update_one(
-                {"_id": ObjectId(resume_id)}, {"$set": update_data}
-            )
+            # The version is maintained by _update_versioned
+            update_data.pop("version", None)
+            return await self._update_versioned(resume_id, {"$set": update_data})
         except Exception:
             return False
 
@@ -107,7 +250,8 @@ class ResumeRepository(BaseRepository):
         missing_skills: Optional[List[str]] = None,
         score_improvement: Optional[int] = None,
         recommendation: Optional[str] = None,
-        optimization_summary: Optional[Dict] = None
+        optimization_summary: Optional[Dict] = None,
+        optimization_context: Optional[Dict] = None
     ) -> bool:
         """Update a resume with AI-optimized data and ATS scores.
 
@@ -121,6 +265,8 @@ class ResumeRepository(BaseRepository):
             score_improvement (Optional[int]): Difference between optimized and original scores.
             recommendation (Optional[str]): AI recommendation for improving the resume.
             optimization_summary (Optional[Dict]): Summary of changes made during optimization.
+            optimization_context (Optional[Dict]): Job analysis and per-section inputs used
+                for incremental re-optimization.
 
         Returns:
         -------
@@ -179,10 +325,10 @@ class ResumeRepository(BaseRepository):
             if optimization_summary is not None:
                 update_dict["optimization_summary"] = optimization_summary
 
-            return await self.update_one(
-                {"_id": ObjectId(resume_id)},
-                {"$set": update_dict},
-            )
+            if optimization_context is not None:
+                update_dict["optimization_context"] = optimization_context
+
+            return await self._update_versioned(resume_id, {"$set": update_dict})
         except Exception as e:
             print(f"Error updating optimized data: {e}")
             return False
@@ -198,6 +344,9 @@ class ResumeRepository(BaseRepository):
             bool: True if deletion was successful, False otherwise.
         """
         try:
-            return await self.delete_one({"_id": ObjectId(resume_id)})
+            deleted = await self.delete_one({"_id": ObjectId(resume_id)})
         except Exception:
             return False
+        if deleted:
+            await self.cache.invalidate(resume_id, DELETED_VERSION)
+        return deleted
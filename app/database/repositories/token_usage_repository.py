@@ -2,15 +2,60 @@
 
 This module provides the TokenUsageRepository class for managing token usage data
 in the database, including storing, retrieving, and analyzing token consumption.
+
+Records are stored either in a regular collection or, with
+USAGE_STORAGE=timeseries, in a MongoDB time-series collection with
+``timestamp`` as time field and the model, feature and user under the
+``meta`` field. The repository translates between the two layouts, so callers
+always see flat records.
+
+In the regular collection a record's UUID is also its ``_id``, so inserting a
+record twice fails with a duplicate key error and retried inserts are
+idempotent. Time-series collections have no unique indexes, so a retried
+insert there may store a record twice.
 """
 
 import os
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Union
+from typing import AsyncIterator, Dict, List, Optional, Union
 from uuid import UUID
 
+from pymongo import ASCENDING
+from pymongo.errors import OperationFailure
+
 from app.database.models.token_usage import TokenUsage, TokenUsageSummary
-from app.database.repositories.base_repo import BaseRepository
+from app.database.repositories.base_repo import BaseRepository, QueryShape
+
+# Storage backends of the raw records
+STORAGE_COLLECTION = "collection"
+STORAGE_TIMESERIES = "timeseries"
+
+# Fields stored under the metaField of the time-series collection
+META_FIELDS = ("llm_model", "feature", "user_id")
+
+# Indexes serving the summary's $match: the timestamp range alone, or
+# equality on feature and/or user_id followed by the timestamp range; and
+# lookups by record ID
+TOKEN_USAGE_INDEXES = [
+    [("timestamp", ASCENDING)],
+    [("feature", ASCENDING), ("timestamp", ASCENDING)],
+    [("user_id", ASCENDING), ("feature", ASCENDING), ("timestamp", ASCENDING)],
+    [("id", ASCENDING)],
+]
+
+
+def _usage_sums(cached: bool) -> Dict:
+    """Build the $group accumulators of a usage breakdown."""
+    sums = {
+        "calls": {"$sum": 1},
+        "prompt_tokens": {"$sum": "$prompt_tokens"},
+        "completion_tokens": {"$sum": "$completion_tokens"},
+        "total_tokens": {"$sum": "$total_tokens"},
+        "cost_usd": {"$sum": "$cost_usd"},
+    }
+    if cached:
+        sums["cached_prompt_tokens"] = {"$sum": "$cached_prompt_tokens"}
+    return sums
 
 
 class TokenUsageRepository(BaseRepository):
@@ -20,25 +65,147 @@ class TokenUsageRepository(BaseRepository):
     working with token usage records in the database.
     """
 
+    INDEXES = TOKEN_USAGE_INDEXES
+
     def __init__(
         self,
         db_name: str = os.getenv("DB_NAME", "myresumo"),
-        collection_name: str = "token_usage",
+        collection_name: Optional[str] = None,
         connection_string: str = os.getenv("MONGODB_URL"),
+        storage: Optional[str] = None,
     ):
         """Initialize the token usage repository with database and collection names.
 
         Args:
             db_name (str): Name of the database. Defaults to environment variable or "myresumo".
-            collection_name (str): Name of the collection. Defaults to "token_usage".
+            collection_name (Optional[str]): Name of the collection. Defaults to the
+                USAGE_COLLECTION env var, or "token_usage" for a regular collection
+                and "token_usage_ts" for a time-series collection.
             connection_string (str): MongoDB connection string. Defaults to environment variable.
+            storage (Optional[str]): "collection" or "timeseries". Defaults to the
+                USAGE_STORAGE env var or "collection".
         """
         # Store the connection string as an instance attribute so it can be accessed
         self.connection_string = connection_string
 
+        self.storage = storage or os.getenv("USAGE_STORAGE", STORAGE_COLLECTION)
+        if self.storage not in (STORAGE_COLLECTION, STORAGE_TIMESERIES):
+            raise ValueError(f"Unknown token usage storage: {self.storage}")
+        self.timeseries = self.storage == STORAGE_TIMESERIES
+        # Whether an insert may be retried after an unknown outcome without
+        # storing a record twice
+        self.idempotent_inserts = not self.timeseries
+        collection_name = collection_name or os.getenv(
+            "USAGE_COLLECTION", "token_usage_ts" if self.timeseries else "token_usage"
+        )
+
         # Pass the connection string to the base repository
         super().__init__(db_name, collection_name, connection_string=connection_string)
 
+    def _field(self, name: str) -> str:
+        """Return the stored path of a record field."""
+        return f"meta.{name}" if self.timeseries and name in META_FIELDS else name
+
+    def _to_document(self, token_usage: TokenUsage) -> Dict:
+        """Convert a record to the layout of the stored document."""
+        document = token_usage.model_dump()
+        if self.timeseries:
+            document["meta"] = {name: document.pop(name) for name in META_FIELDS}
+        else:
+            # The unique _id makes a retried insert of the record fail
+            # instead of storing it twice
+            document["_id"] = document["id"]
+        return document
+
+    def _from_document(self, document: Dict) -> Dict:
+        """Convert a stored document back to a flat record."""
+        document.pop("_id", None)
+        if self.timeseries:
+            document.update(document.pop("meta", None) or {})
+        return document
+
+    async def ensure_indexes(self) -> None:
+        """Create the collection and the indexes the usage queries rely on.
+
+        With USAGE_RAW_TTL_DAYS set, raw records expire after that many days;
+        summaries then come from the rollups. A regular collection expires
+        them through a TTL timestamp index, a time-series collection through
+        its expireAfterSeconds option. This is safe to call on every startup.
+        """
+        ttl_days = int(os.getenv("USAGE_RAW_TTL_DAYS", "0"))
+        if self.timeseries:
+            await self.ensure_timeseries_collection(ttl_days * 86400 or None)
+        async with self.connection_manager.get_collection(
+            self.db_name, self.collection_name
+        ) as collection:
+            for number, keys in enumerate(TOKEN_USAGE_INDEXES):
+                keys = [(self._field(name), direction) for name, direction in keys]
+                if number or not ttl_days or self.timeseries:
+                    await collection.create_index(keys)
+                    continue
+                ttl_seconds = ttl_days * 86400
+                try:
+                    await collection.create_index(keys, expireAfterSeconds=ttl_seconds)
+                except OperationFailure:
+                    # The index exists with another TTL or without one
+                    await collection.database.command(
+                        "collMod",
+                        self.collection_name,
+                        index={"keyPattern": dict(keys), "expireAfterSeconds": ttl_seconds},
+                    )
+
+    def query_shapes(self) -> Dict[str, QueryShape]:
+        """Return representative filters and sorts of the usage queries, by name."""
+        since = {"$gte": datetime.utcnow() - timedelta(days=30)}
+        feature, user_id = self._field("feature"), self._field("user_id")
+        return {
+            "get_token_usage_summary": ({"timestamp": since}, None),
+            "get_token_usage_summary(feature)": ({"timestamp": since, feature: "feature"}, None),
+            "get_token_usage_summary(user_id)": ({"timestamp": since, user_id: "user"}, None),
+            "iter_token_usages": ({"timestamp": since}, [("timestamp", ASCENDING)]),
+            "first_timestamp": ({}, [("timestamp", ASCENDING)]),
+            "get_token_usage_by_id": ({"id": "usage"}, None),
+        }
+
+    async def ensure_timeseries_collection(self, expire_after_seconds: Optional[int] = None) -> None:
+        """Create the time-series collection, or update its expiry if it exists.
+
+        Args:
+            expire_after_seconds (Optional[int]): Age after which records are
+                deleted; None keeps them.
+        """
+        async with self.connection_manager.get_collection(
+            self.db_name, self.collection_name
+        ) as collection:
+            database = collection.database
+            if self.collection_name not in await database.list_collection_names(
+                filter={"name": self.collection_name}
+            ):
+                options = {
+                    "timeseries": {
+                        "timeField": "timestamp",
+                        "metaField": "meta",
+                        "granularity": "seconds",
+                    }
+                }
+                if expire_after_seconds:
+                    options["expireAfterSeconds"] = expire_after_seconds
+                await database.create_collection(self.collection_name, **options)
+            else:
+                await database.command(
+                    "collMod",
+                    self.collection_name,
+                    expireAfterSeconds=expire_after_seconds or "off",
+                )
+
+    async def first_timestamp(self) -> Optional[datetime]:
+        """Return the timestamp of the oldest record, None if there are none."""
+        async with self.connection_manager.get_collection(
+            self.db_name, self.collection_name
+        ) as collection:
+            first = await collection.find_one({}, {"timestamp": 1}, sort=[("timestamp", ASCENDING)])
+            return first["timestamp"] if first else None
+
     async def create_token_usage(self, token_usage: TokenUsage) -> str:
         """Create a new token usage record in the database.
 
@@ -49,12 +216,31 @@ class TokenUsageRepository(BaseRepository):
             str: The ID of the created record.
         """
         # Convert the model to a dictionary
-        token_usage_dict = token_usage.model_dump()
+        token_usage_dict = self._to_document(token_usage)
 
         # Insert into database
         result = await self.insert_one(token_usage_dict)
         return str(result)
 
+    async def create_token_usages(self, token_usages: List[TokenUsage]) -> int:
+        """Insert a batch of token usage records with a single insert_many.
+
+        Unlike insert_one, errors are raised rather than swallowed, so the
+        usage writer can keep the batch and retry it. In the regular
+        collection, records stored by an earlier attempt fail with a
+        duplicate key error.
+
+        Args:
+            token_usages (List[TokenUsage]): The token usage records to create.
+
+        Returns:
+            int: The number of records inserted.
+        """
+        inserted_ids = await self.insert_many(
+            [self._to_document(token_usage) for token_usage in token_usages], ordered=False
+        )
+        return len(inserted_ids)
+
     async def get_token_usage_by_id(self, token_usage_id: Union[str, UUID]) -> Optional[Dict]:
         """Retrieve a token usage record by its ID.
 
@@ -67,6 +253,59 @@ class TokenUsageRepository(BaseRepository):
         token_usage_id_str = str(token_usage_id)
         return await self.find_one({"id": token_usage_id_str})
 
+    async def iter_token_usages(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        feature: Optional[str] = None,
+        user_id: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+        batch_size: int = 1000,
+    ) -> AsyncIterator[List[Dict]]:
+        """Iterate over token usage records in timestamp order, batch by batch.
+
+        The records are read from a cursor fetching ``batch_size`` documents per
+        round trip, so only one batch is held in memory at a time.
+
+        Args:
+            start (Optional[datetime]): Earliest timestamp included.
+            end (Optional[datetime]): Timestamp before which records are included.
+            feature (Optional[str]): Filter by specific feature.
+            user_id (Optional[str]): Filter by specific user.
+            fields (Optional[List[str]]): Fields returned; all fields if None.
+            batch_size (int): Records fetched and yielded per batch.
+
+        Yields:
+            List[Dict]: The next batch of records, without their MongoDB _id.
+        """
+        query: Dict = {}
+        if start or end:
+            query["timestamp"] = {}
+            if start:
+                query["timestamp"]["$gte"] = start
+            if end:
+                query["timestamp"]["$lt"] = end
+        if feature:
+            query[self._field("feature")] = feature
+        if user_id:
+            query[self._field("user_id")] = user_id
+        projection = {"_id": 0, **{self._field(field): 1 for field in fields}} if fields else {"_id": 0}
+
+        async with self.connection_manager.get_collection(
+            self.db_name, self.collection_name
+        ) as collection:
+            cursor = collection.find(query, projection, batch_size=batch_size).sort(
+                "timestamp", ASCENDING
+            )
+            batch = []
+            async for document in cursor:
+                batch.append(self._from_document(document))
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+
     async def get_token_usage_summary(
         self,
         days: int = 30,
@@ -89,69 +328,57 @@ class TokenUsageRepository(BaseRepository):
         # Build the query
         query = {"timestamp": {"$gte": period_start}}
         if feature:
-            query["feature"] = feature
+            query[self._field("feature")] = feature
         if user_id:
-            query["user_id"] = user_id
-
-        # Get all matching records
-        records = await self.find(query)
-
-        # Initialize counters
-        total_api_calls = len(records)
-        total_prompt_tokens = 0
-        total_completion_tokens = 0
-        total_tokens = 0
-        total_cost_usd = 0.0
-        usage_by_model = {}
-        usage_by_feature = {}
-
-        # Process records
-        for record in records:
-            # Update totals
-            total_prompt_tokens += record.get("prompt_tokens", 0)
-            total_completion_tokens += record.get("completion_tokens", 0)
-            total_tokens += record.get("total_tokens", 0)
-            total_cost_usd += record.get("cost_usd", 0.0)
-
-            # Update model usage
-            model = record.get("llm_model", "unknown")
-            if model not in usage_by_model:
-                usage_by_model[model] = {
-                    "calls": 0,
-                    "prompt_tokens": 0,
-                    "completion_tokens": 0,
-                    "total_tokens": 0,
-                    "cost_usd": 0.0,
-                }
-            usage_by_model[model]["calls"] += 1
-            usage_by_model[model]["prompt_tokens"] += record.get("prompt_tokens", 0)
-            usage_by_model[model]["completion_tokens"] += record.get("completion_tokens", 0)
-            usage_by_model[model]["total_tokens"] += record.get("total_tokens", 0)
-            usage_by_model[model]["cost_usd"] += record.get("cost_usd", 0.0)
-
-            # Update feature usage
-            feature = record.get("feature", "unknown")
-            if feature not in usage_by_feature:
-                usage_by_feature[feature] = {
-                    "calls": 0,
-                    "prompt_tokens": 0,
-                    "completion_tokens": 0,
-                    "total_tokens": 0,
-                    "cost_usd": 0.0,
-                }
-            usage_by_feature[feature]["calls"] += 1
-            usage_by_feature[feature]["prompt_tokens"] += record.get("prompt_tokens", 0)
-            usage_by_feature[feature]["completion_tokens"] += record.get("completion_tokens", 0)
-            usage_by_feature[feature]["total_tokens"] += record.get("total_tokens", 0)
-            usage_by_feature[feature]["cost_usd"] += record.get("cost_usd", 0.0)
+            query[self._field("user_id")] = user_id
+
+        # Compute the totals and both breakdowns in one round trip; the
+        # $match is served by the indexes from ensure_indexes
+        results = await self.aggregate(
+            [
+                {"$match": query},
+                {
+                    "$facet": {
+                        "totals": [{"$group": {"_id": None, **_usage_sums(cached=True)}}],
+                        "by_model": [
+                            {
+                                "$group": {
+                                    "_id": {"$ifNull": [f"${self._field('llm_model')}", "unknown"]},
+                                    **_usage_sums(cached=True),
+                                }
+                            }
+                        ],
+                        "by_feature": [
+                            {
+                                "$group": {
+                                    "_id": {"$ifNull": [f"${self._field('feature')}", "unknown"]},
+                                    **_usage_sums(cached=False),
+                                }
+                            }
+                        ],
+                    }
+                },
+            ]
+        )
+        facets = results[0] if results else {}
+        totals = (facets.get("totals") or [{}])[0]
+        usage_by_model = {
+            group["_id"]: {key: value for key, value in group.items() if key != "_id"}
+            for group in facets.get("by_model", [])
+        }
+        usage_by_feature = {
+            group["_id"]: {key: value for key, value in group.items() if key != "_id"}
+            for group in facets.get("by_feature", [])
+        }
 
         # Create and return the summary
         return TokenUsageSummary(
-            total_api_calls=total_api_calls,
-            total_prompt_tokens=total_prompt_tokens,
-            total_completion_tokens=total_completion_tokens,
-            total_tokens=total_tokens,
-            total_cost_usd=total_cost_usd,
+            total_api_calls=totals.get("calls", 0),
+            total_prompt_tokens=totals.get("prompt_tokens", 0),
+            total_cached_prompt_tokens=totals.get("cached_prompt_tokens", 0),
+            total_completion_tokens=totals.get("completion_tokens", 0),
+            total_tokens=totals.get("total_tokens", 0),
+            total_cost_usd=totals.get("cost_usd", 0.0),
             period_start=period_start,
             period_end=datetime.utcnow(),
             usage_by_model=usage_by_model,
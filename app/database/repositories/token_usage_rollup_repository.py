@@ -0,0 +1,456 @@
+"""Token usage rollup repository module.
+
+This module provides the TokenUsageRollupRepository class, which maintains
+pre-aggregated hourly and daily token usage buckets keyed by (model, feature,
+user, status). Each bucket holds the call count, token and cost sums and a
+latency sketch, so usage summaries over long windows read a few hundred
+buckets instead of every LLM call.
+
+Buckets are updated with ``$inc`` upserts by the token usage writer as records
+are written, and filled in for older records by a resumable backfill (see
+scripts/backfill_usage_rollups.py). Until the backfill has caught up with the
+moment the writer started maintaining buckets, summaries are computed from
+the raw records instead.
+"""
+
+import math
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import ASCENDING, UpdateOne
+
+from app.database.models.token_usage import TokenUsage, TokenUsageSummary
+from app.database.repositories.base_repo import BaseRepository, QueryShape
+from app.utils.tracing import span
+
+GRANULARITIES = ("hour", "day")
+
+# Relative accuracy of the latency sketch: a latency is counted in the
+# logarithmic bin ceil(log_gamma(ms)), so quantiles are within about 5%
+LATENCY_SKETCH_GAMMA = 1.1
+
+# Bucket fields that identify a bucket besides its granularity and start
+BUCKET_KEYS = ("llm_model", "feature", "user_id", "status")
+
+ROLLUP_INDEXES = [
+    [("granularity", ASCENDING), ("bucket_start", ASCENDING)]
+    + [(key, ASCENDING) for key in BUCKET_KEYS],
+    [("granularity", ASCENDING), ("feature", ASCENDING), ("bucket_start", ASCENDING)],
+    [("granularity", ASCENDING), ("user_id", ASCENDING), ("bucket_start", ASCENDING)],
+]
+
+# Document in the state collection tracking the live updates and the backfill
+STATE_ID = "token_usage_rollups"
+
+
+def bucket_start(timestamp: datetime, granularity: str) -> datetime:
+    """Return the start of the hour or day bucket containing a timestamp."""
+    if granularity == "day":
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def latency_bin(latency_ms: float) -> str:
+    """Return the latency sketch bin of a latency, as a field name."""
+    return str(math.ceil(math.log(max(latency_ms, 0.01)) / math.log(LATENCY_SKETCH_GAMMA)))
+
+
+def sketch_quantiles(
+    sketch: Dict[str, int], quantiles: Iterable[float] = (0.5, 0.95, 0.99)
+) -> Dict[str, float]:
+    """Estimate latency quantiles from a merged latency sketch.
+
+    Args:
+        sketch: Count of latencies per bin, as produced by latency_bin.
+        quantiles: The quantiles to estimate.
+
+    Returns:
+        Dict[str, float]: Latency in milliseconds per quantile, keyed "p50" etc.
+    """
+    bins = sorted((int(key), count) for key, count in sketch.items() if count)
+    total = sum(count for _, count in bins)
+    result = {}
+    if not total:
+        return result
+    for quantile in quantiles:
+        rank = quantile * total
+        seen = 0
+        for index, count in bins:
+            seen += count
+            if seen >= rank:
+                # Midpoint of the bin (gamma^(i-1), gamma^i]
+                upper = LATENCY_SKETCH_GAMMA**index
+                result[f"p{round(quantile * 100):g}"] = round(
+                    upper * 2 / (1 + LATENCY_SKETCH_GAMMA), 1
+                )
+                break
+    return result
+
+
+def _bucket_sums() -> Dict[str, Any]:
+    """Build the $group accumulators summing bucket counters."""
+    return {
+        field: {"$sum": f"${field}"}
+        for field in (
+            "calls",
+            "prompt_tokens",
+            "cached_prompt_tokens",
+            "completion_tokens",
+            "total_tokens",
+            "cost_usd",
+        )
+    }
+
+
+def rollup_updates(records: Iterable[TokenUsage]) -> List[UpdateOne]:
+    """Build the $inc upserts adding usage records to their buckets.
+
+    Records falling into the same bucket are combined first, so a batch of
+    records costs one update per distinct bucket.
+
+    Args:
+        records: The usage records.
+
+    Returns:
+        List[UpdateOne]: One upsert per hourly and daily bucket touched.
+    """
+    buckets: Dict[Tuple, Dict[str, Any]] = {}
+    for record in records:
+        latency_ms = (record.metadata or {}).get("latency_ms")
+        for granularity in GRANULARITIES:
+            key = (
+                granularity,
+                bucket_start(record.timestamp, granularity),
+                record.llm_model,
+                record.feature,
+                record.user_id,
+                record.status,
+            )
+            bucket = buckets.setdefault(key, {"inc": {}, "latency_ms_max": None})
+            inc = bucket["inc"]
+            for field, value in (
+                ("calls", 1),
+                ("prompt_tokens", record.prompt_tokens),
+                ("cached_prompt_tokens", record.cached_prompt_tokens),
+                ("completion_tokens", record.completion_tokens),
+                ("total_tokens", record.total_tokens),
+                ("cost_usd", record.cost_usd),
+            ):
+                inc[field] = inc.get(field, 0) + value
+            if isinstance(latency_ms, (int, float)):
+                sketch_field = f"latency_ms_sketch.{latency_bin(latency_ms)}"
+                inc[sketch_field] = inc.get(sketch_field, 0) + 1
+                inc["latency_ms_sum"] = inc.get("latency_ms_sum", 0) + latency_ms
+                bucket["latency_ms_max"] = max(bucket["latency_ms_max"] or 0, latency_ms)
+
+    updates = []
+    for (granularity, start, *values), bucket in buckets.items():
+        update = {"$inc": bucket["inc"]}
+        if bucket["latency_ms_max"] is not None:
+            update["$max"] = {"latency_ms_max": bucket["latency_ms_max"]}
+        updates.append(
+            UpdateOne(
+                {"granularity": granularity, "bucket_start": start, **dict(zip(BUCKET_KEYS, values))},
+                update,
+                upsert=True,
+            )
+        )
+    return updates
+
+
+class TokenUsageRollupRepository(BaseRepository):
+    """Repository for the hourly and daily token usage buckets.
+
+    This class extends BaseRepository to maintain the buckets and to build
+    usage summaries from them.
+    """
+
+    INDEXES = ROLLUP_INDEXES
+
+    def __init__(
+        self,
+        db_name: str = os.getenv("DB_NAME", "myresumo"),
+        collection_name: str = "token_usage_rollups",
+        connection_string: str = os.getenv("MONGODB_URL"),
+        state_collection_name: str = "token_usage_rollup_state",
+    ):
+        """Initialize the rollup repository with database and collection names.
+
+        Args:
+            db_name (str): Name of the database. Defaults to environment variable or "myresumo".
+            collection_name (str): Name of the bucket collection. Defaults to "token_usage_rollups".
+            connection_string (str): MongoDB connection string. Defaults to environment variable.
+            state_collection_name (str): Name of the collection holding the
+                backfill progress. Defaults to "token_usage_rollup_state".
+        """
+        self.connection_string = connection_string
+        self.state_collection_name = state_collection_name
+        super().__init__(db_name, collection_name, connection_string=connection_string)
+
+    async def ensure_indexes(self) -> None:
+        """Create the bucket key index the upserts rely on and the summary indexes."""
+        async with self.connection_manager.get_collection(
+            self.db_name, self.collection_name
+        ) as collection:
+            for number, keys in enumerate(self.INDEXES):
+                await collection.create_index(keys, unique=number == 0)
+
+    def query_shapes(self) -> Dict[str, QueryShape]:
+        """Return representative filters of the bucket queries, by name."""
+        today = bucket_start(datetime.utcnow(), "day")
+        since = today - timedelta(days=30)
+        period = {
+            "$or": [
+                {"granularity": "hour", "bucket_start": {"$gte": since, "$lt": today}},
+                {"granularity": "day", "bucket_start": {"$gte": today}},
+            ]
+        }
+        return {
+            "apply_records": (
+                {"granularity": "hour", "bucket_start": today, **{key: "key" for key in BUCKET_KEYS}},
+                None,
+            ),
+            "get_usage_summary": (period, None),
+            "get_usage_summary(feature)": ({**period, "feature": "feature"}, None),
+            "get_usage_summary(user_id)": ({**period, "user_id": "user"}, None),
+            "get_day_totals": ({"granularity": "day", "bucket_start": today}, None),
+        }
+
+    async def get_state(self) -> Dict[str, Any]:
+        """Return the live update and backfill progress.
+
+        Returns:
+            Dict[str, Any]: ``live_since``, the earliest time the writer updated
+            buckets, and ``backfilled_until``, the end of the backfilled range.
+        """
+        async with self.connection_manager.get_collection(
+            self.db_name, self.state_collection_name
+        ) as collection:
+            return await collection.find_one({"_id": STATE_ID}) or {}
+
+    async def _update_state(self, update: Dict[str, Any]) -> None:
+        async with self.connection_manager.get_collection(
+            self.db_name, self.state_collection_name
+        ) as collection:
+            await collection.update_one({"_id": STATE_ID}, update, upsert=True)
+
+    async def mark_live(self, since: datetime) -> None:
+        """Record that buckets are maintained for records from ``since`` on.
+
+        With several writers the earliest start wins, so the backfill never
+        overlaps records that were already added to the buckets.
+        """
+        await self._update_state({"$min": {"live_since": since}})
+
+    async def apply_records(self, records: List[TokenUsage]) -> int:
+        """Add usage records to their hourly and daily buckets.
+
+        Errors are raised, so the caller can retry the batch.
+
+        Args:
+            records: The usage records.
+
+        Returns:
+            int: The number of buckets updated.
+        """
+        updates = rollup_updates(records)
+        if not updates:
+            return 0
+        with span("db.bulk_write", db_collection=self.collection_name, operations=len(updates)):
+            async with self.connection_manager.get_collection(
+                self.db_name, self.collection_name
+            ) as collection:
+                await collection.bulk_write(updates, ordered=False)
+        return len(updates)
+
+    async def is_complete(self) -> bool:
+        """Return True once the buckets cover every raw record.
+
+        That is the case when the backfill reached the moment the writer
+        started maintaining buckets.
+        """
+        state = await self.get_state()
+        live_since = state.get("live_since")
+        backfilled_until = state.get("backfilled_until")
+        return bool(live_since and backfilled_until and backfilled_until >= live_since)
+
+    async def backfill(
+        self,
+        chunk: timedelta = timedelta(hours=24),
+        raw_repository=None,
+        progress=None,
+    ) -> int:
+        """Add the raw records written before buckets were maintained live.
+
+        The backfill walks the raw records in time chunks up to ``live_since``
+        and records its progress after every chunk, so an interrupted run
+        resumes where it stopped. A chunk interrupted between its bucket
+        updates and its checkpoint is applied again on resume.
+
+        Args:
+            chunk: Time range of raw records added per step.
+            raw_repository: TokenUsageRepository of the raw records. Defaults
+                to the configured token usage storage.
+            progress: Optional callable receiving the end of each finished chunk
+                and the number of records added so far.
+
+        Returns:
+            int: The number of raw records added to the buckets.
+        """
+        if raw_repository is None:
+            from app.database.repositories.token_usage_repository import (
+                TokenUsageRepository,
+            )
+
+            raw_repository = TokenUsageRepository(self.db_name, connection_string=self.connection_string)
+
+        state = await self.get_state()
+        if "live_since" not in state:
+            # No writer has maintained buckets yet: backfill up to now and let
+            # the writer's later start take over from there
+            await self.mark_live(datetime.utcnow())
+            state = await self.get_state()
+        live_since = state["live_since"]
+
+        position = state.get("backfilled_until")
+        if position is None:
+            position = await raw_repository.first_timestamp()
+            if position is None:
+                await self._update_state({"$set": {"backfilled_until": live_since}})
+                return 0
+
+        added = 0
+        while position < live_since:
+            end = min(position + chunk, live_since)
+            async for batch in raw_repository.iter_token_usages(start=position, end=end):
+                records = [TokenUsage.model_validate(document) for document in batch]
+                await self.apply_records(records)
+                added += len(records)
+            await self._update_state({"$set": {"backfilled_until": end}})
+            position = end
+            if progress:
+                progress(end, added)
+        return added
+
+    async def get_usage_summary(
+        self,
+        days: int = 30,
+        feature: Optional[str] = None,
+        user_id: Optional[str] = None,
+    ) -> TokenUsageSummary:
+        """Generate a summary of token usage for the specified period from buckets.
+
+        Whole days are read from daily buckets and the partial first day from
+        hourly buckets, so the period starts on the hour.
+
+        Args:
+            days (int): Number of days to include in the summary.
+            feature (Optional[str]): Filter by specific feature.
+            user_id (Optional[str]): Filter by specific user.
+
+        Returns:
+            TokenUsageSummary: Summary of token usage statistics, with latency
+            percentiles per model.
+        """
+        period_end = datetime.utcnow()
+        period_start = bucket_start(period_end - timedelta(days=days), "hour")
+        first_day = bucket_start(period_start, "day")
+        if first_day < period_start:
+            first_day += timedelta(days=1)
+
+        query: Dict[str, Any] = {
+            "$or": [
+                {"granularity": "hour", "bucket_start": {"$gte": period_start, "$lt": first_day}},
+                {"granularity": "day", "bucket_start": {"$gte": first_day}},
+            ]
+        }
+        if feature:
+            query["feature"] = feature
+        if user_id:
+            query["user_id"] = user_id
+
+        results = await self.aggregate(
+            [
+                {"$match": query},
+                {
+                    "$facet": {
+                        "totals": [{"$group": {"_id": None, **_bucket_sums()}}],
+                        "by_model": [{"$group": {"_id": "$llm_model", **_bucket_sums()}}],
+                        "by_feature": [{"$group": {"_id": "$feature", **_bucket_sums()}}],
+                        "latency_by_model": [
+                            {"$project": {"llm_model": 1, "bins": {"$objectToArray": "$latency_ms_sketch"}}},
+                            {"$unwind": "$bins"},
+                            {
+                                "$group": {
+                                    "_id": {"model": "$llm_model", "bin": "$bins.k"},
+                                    "count": {"$sum": "$bins.v"},
+                                }
+                            },
+                        ],
+                    }
+                },
+            ]
+        )
+        facets = results[0] if results else {}
+        totals = (facets.get("totals") or [{}])[0]
+
+        sketches: Dict[str, Dict[str, int]] = {}
+        for group in facets.get("latency_by_model", []):
+            sketches.setdefault(group["_id"]["model"], {})[group["_id"]["bin"]] = group["count"]
+
+        usage_by_model = {}
+        for group in facets.get("by_model", []):
+            model = group["_id"] or "unknown"
+            usage_by_model[model] = {key: value for key, value in group.items() if key != "_id"}
+            latency = sketch_quantiles(sketches.get(group["_id"], {}))
+            if latency:
+                usage_by_model[model]["latency_ms"] = latency
+        usage_by_feature = {
+            group["_id"] or "unknown": {
+                key: value
+                for key, value in group.items()
+                if key not in ("_id", "cached_prompt_tokens")
+            }
+            for group in facets.get("by_feature", [])
+        }
+
+        return TokenUsageSummary(
+            total_api_calls=totals.get("calls", 0),
+            total_prompt_tokens=totals.get("prompt_tokens", 0),
+            total_cached_prompt_tokens=totals.get("cached_prompt_tokens", 0),
+            total_completion_tokens=totals.get("completion_tokens", 0),
+            total_tokens=totals.get("total_tokens", 0),
+            total_cost_usd=totals.get("cost_usd", 0.0),
+            period_start=period_start,
+            period_end=period_end,
+            usage_by_model=usage_by_model,
+            usage_by_feature=usage_by_feature,
+        )
+
+    async def get_day_totals(self, day: datetime) -> Dict[str, Dict[str, int]]:
+        """Return the tokens used on a day per user and per feature.
+
+        Args:
+            day (datetime): Start of the day, as stored in the daily buckets.
+
+        Returns:
+            Dict[str, Dict[str, int]]: Total tokens by user ID under "users"
+            and by feature under "features".
+        """
+        results = await self.aggregate(
+            [
+                {"$match": {"granularity": "day", "bucket_start": day}},
+                {
+                    "$facet": {
+                        "users": [{"$group": {"_id": "$user_id", "tokens": {"$sum": "$total_tokens"}}}],
+                        "features": [{"$group": {"_id": "$feature", "tokens": {"$sum": "$total_tokens"}}}],
+                    }
+                },
+            ]
+        )
+        facets = results[0] if results else {}
+        return {
+            scope: {group["_id"]: group["tokens"] for group in facets.get(scope, []) if group["_id"]}
+            for scope in ("users", "features")
+        }
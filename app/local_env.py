@@ -0,0 +1,14 @@
+"""Load environment variables from .env.local for local development.
+
+Several modules read their configuration from the environment when they are
+imported, so app.main imports this module before any other part of the
+application.
+"""
+
+import pathlib
+
+env_local_path = pathlib.Path(__file__).parent.parent / '.env.local'
+if env_local_path.exists():
+    print(f"Loading environment variables from {env_local_path}")
+    from dotenv import load_dotenv
+    load_dotenv(env_local_path)
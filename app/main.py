@@ -6,22 +6,9 @@ coordination point for the entire application.
 """
 
 import os
-import pathlib
+from contextlib import asynccontextmanager
 from datetime import datetime
 
-# Import version information
-from app.version import __version__, get_version_info
-
-# Import debug script
-import app.debug_version
-
-# Load environment variables from .env.local if it exists (for local development)
-env_local_path = pathlib.Path(__file__).parent.parent / '.env.local'
-if env_local_path.exists():
-    print(f"Loading environment variables from {env_local_path}")
-    from dotenv import load_dotenv
-    load_dotenv(env_local_path)
-
 from fastapi import FastAPI, Request
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
@@ -30,13 +17,27 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
+# Import debug script
+import app.debug_version
+
+# Load environment variables from .env.local if it exists (for local
+# development), before the modules below read their configuration
+import app.local_env
+from app.api.routers.prompts import prompts_router
 from app.api.routers.resume import resume_router
+from app.api.routers.stats import router as stats_router
 from app.api.routers.token_usage import router as token_usage_router
-from app.api.routers.prompts import prompts_router
+from app.api.routers.traces import router as traces_router
 from app.database.connector import MongoConnectionManager
+from app.services.ai.token_budget import token_budgets
+from app.utils.resume_cache import resume_cache
+from app.utils.tracing import new_request_id, trace_request
+from app.utils.usage_writer import usage_writer
+from app.version import __version__, get_version_info
 from app.web.core import core_web_router
 from app.web.dashboard import web_router
 
+
 # Initialize Jinja2 templates for HTML rendering
 # Setup templates with custom context processor
 class CustomTemplates(Jinja2Templates):
@@ -70,11 +71,43 @@ async def startup_logic(app: FastAPI) -> None:
         app.openapi_schema = None
         print("OpenAPI schema cleared for regeneration")
 
+        # Start writing buffered token usage records in the background
+        usage_writer.start()
+
+        # Reconcile the token budget counters with the usage rollups
+        token_budgets.start()
+
+        # Drop resumes invalidated by other replicas from the local cache
+        resume_cache.start()
+
         # Initialize database connection
         connection_manager = MongoConnectionManager()
         app.state.mongo = connection_manager
         print("MongoDB connection manager initialized")
 
+        # Create the indexes every repository's queries rely on
+        from app.database.repositories.prompt_repository import PromptRepository
+        from app.database.repositories.resume_repository import ResumeRepository
+        from app.database.repositories.token_usage_repository import (
+            TokenUsageRepository,
+        )
+        from app.database.repositories.token_usage_rollup_repository import (
+            TokenUsageRollupRepository,
+        )
+
+        for repository_class in (
+            ResumeRepository,
+            PromptRepository,
+            TokenUsageRepository,
+            TokenUsageRollupRepository,
+        ):
+            repository = repository_class()
+            try:
+                await repository.ensure_indexes()
+                print(f"Indexes ensured for {repository.collection_name}")
+            except Exception as index_err:
+                print(f"Failed to create indexes for {repository.collection_name}: {index_err}")
+
         # Initialize default prompts
         try:
             from app.database.repositories.prompt_repository import PromptRepository
@@ -114,6 +147,16 @@ async def shutdown_logic(app: FastAPI) -> None:
     Args:
         app: The FastAPI application instance
     """
+    await token_budgets.close()
+    await resume_cache.close()
+
+    try:
+        # Write the token usage records still buffered before the connections close
+        await usage_writer.close()
+        print(f"Token usage writer flushed: {usage_writer.get_stats()}")
+    except Exception as e:
+        print(f"Error flushing token usage records: {e}")
+
     try:
         await app.state.mongo.close_all()
         print("Successfully closed all database connections")
@@ -123,6 +166,14 @@ async def shutdown_logic(app: FastAPI) -> None:
         print("Shutting down background tasks.")
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run the startup logic before serving requests and the shutdown logic after."""
+    await startup_logic(app)
+    yield
+    await shutdown_logic(app)
+
+
 app = FastAPI(
     title="MyResumo API",
     summary="",
@@ -131,6 +182,7 @@ app = FastAPI(
     """,
     license_info={"name": "MIT License", "url": "https://opensource.org/licenses/MIT"},
     version=__version__,
+    lifespan=lifespan,
     docs_url=None,
     # Ensure all routes are included in the OpenAPI schema
     openapi_url="/openapi.json",
@@ -174,7 +226,9 @@ async def http_exception_handler(request: Request, exc: StarletteHTTPException):
     # For API routes, return JSON error
     if request.url.path.startswith("/api"):
         return JSONResponse(
-            status_code=exc.status_code, content={"detail": str(exc.detail)}
+            status_code=exc.status_code,
+            content={"detail": str(exc.detail)},
+            headers=getattr(exc, "headers", None),
         )
 
     # For other errors on web routes, show a simple error page
@@ -239,6 +293,38 @@ async def add_response_headers(request: Request, call_next):
     return response
 
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Middleware to trace API requests.
+
+    Every API request runs in a trace identified by the X-Request-ID header,
+    or by a generated ID, which is returned in the X-Request-ID response header.
+
+    Args:
+        request: The incoming request
+        call_next: The next middleware or route handler
+
+    Returns:
+    -------
+        The response with the X-Request-ID header
+    """
+    if not request.url.path.startswith("/api/"):
+        return await call_next(request)
+
+    request_id = request.headers.get("X-Request-ID") or new_request_id()
+    with trace_request(
+        request_id, f"{request.method} {request.url.path}", http_method=request.method
+    ) as trace:
+        response = await call_next(request)
+        if trace is not None:
+            route = request.scope.get("route")
+            if route is not None:
+                trace.root.name = f"{request.method} {route.path}"
+            trace.root.set(http_status_code=response.status_code)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+
 # Add middleware and static file mounts
 app.add_middleware(
     CORSMiddleware,
@@ -567,13 +653,15 @@ async def initialize_default_prompts_direct():
 
     Returns:
     -------
-        JSONResponse: Success status
+        JSONResponse: Success status, or the names of the prompts that could
+        not be created
     """
     try:
         print("Starting initialization of default prompts")
         from app.database.repositories.prompt_repository import PromptRepository
         from app.database.models.prompt import PromptTemplate
         from uuid import uuid4
+        from pymongo.errors import BulkWriteError
 
         # Create repository with connection string from environment
         mongodb_url = os.getenv("MONGODB_URL")
@@ -648,24 +736,28 @@ async def initialize_default_prompts_direct():
                 )
             ]
 
-            # Insert default prompts
-            for prompt in default_prompts:
-                try:
-                    # Convert the model to a dictionary
-                    prompt_dict = prompt.model_dump()
-
-                    # Ensure the ID is a string
-                    prompt_dict["id"] = str(prompt_dict["id"])
-
-                    # Debug: Print the prompt dictionary before insertion
-                    print(f"Inserting prompt: {prompt.name}")
-                    print(f"ID type: {type(prompt_dict['id'])}")
-
-                    # Insert the document
-                    result = await repo.insert_one(prompt_dict)
-                    print(f"Created prompt: {prompt.name} with ID: {result}")
-                except Exception as e:
-                    print(f"Error creating prompt {prompt.name}: {str(e)}")
+            # Insert default prompts with a single round trip, with string IDs;
+            # unordered, so one failed prompt does not prevent the others
+            try:
+                result = await repo.insert_many(
+                    [{**prompt.model_dump(), "id": str(prompt.id)} for prompt in default_prompts],
+                    ordered=False,
+                )
+                print(f"Created {len(result)} default prompts")
+            except BulkWriteError as e:
+                write_errors = e.details.get("writeErrors", [])
+                failed_prompts = [default_prompts[error["index"]].name for error in write_errors]
+                for error, name in zip(write_errors, failed_prompts):
+                    print(f"Error creating prompt {name}: {error.get('errmsg')}")
+                if failed_prompts:
+                    return JSONResponse(
+                        status_code=500,
+                        content={
+                            "success": False,
+                            "detail": f"Failed to create default prompts: {', '.join(failed_prompts)}",
+                            "failed_prompts": failed_prompts,
+                        }
+                    )
 
             print("Default prompts created successfully")
             return {"success": True, "message": "Default prompts created successfully"}
@@ -900,6 +992,8 @@ async def refresh_openapi_schema():
 
 app.include_router(resume_router, include_in_schema=True)
 app.include_router(token_usage_router, include_in_schema=True)  # Add token usage tracking API endpoints
+app.include_router(traces_router, include_in_schema=True)  # Add request trace API endpoints
+app.include_router(stats_router, include_in_schema=True)  # Add runtime statistics API endpoint
 
 # Web routers
 app.include_router(core_web_router)
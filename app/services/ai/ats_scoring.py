@@ -4,16 +4,25 @@ This module provides the ATSScorerLLM class that leverages AI language models
 to analyze and score resumes based on job descriptions.
 """
 
+import asyncio
 import json
 import os
 import re
+import warnings
 from typing import List, Optional
 
 from langchain.output_parsers import PydanticOutputParser
 from langchain.prompts import PromptTemplate
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
 
-from app.utils.token_tracker import TokenTracker
+from app.services.ai.model_router import model_router
+from app.services.ai.resilience import (
+    FAIL_FAST_ERRORS,
+    classify_error,
+    resilient_invoker,
+)
+from app.services.ai.scheduler import Priority
+from app.utils.text_compaction import compact_text, get_token_budget
 
 
 class SkillsExtraction(BaseModel):
@@ -46,7 +55,15 @@ class ATSScorerLLM:
     All scoring, skill matching, and recommendations are 100% LLM-driven, making the system domain-agnostic and robust for any industry.
     """
 
-    def __init__(self, model_name="", api_key=None, api_base="", user_id=None, temperature=0.1):
+    def __init__(
+        self,
+        model_name="",
+        api_key=None,
+        api_base="",
+        user_id=None,
+        temperature=0.1,
+        priority=Priority.INTERACTIVE,
+    ):
         """Initialize the ATS scorer with API credentials and model configuration.
 
         Args:
@@ -55,6 +72,7 @@ class ATSScorerLLM:
             api_base (str, optional): Base URL for the API service. Falls back to API_BASE env var.
             user_id (str, optional): User ID for token tracking.
             temperature (float, optional): Temperature setting for the LLM (0.0-1.0) to control creativity.
+            priority (Priority, optional): Scheduling priority of this scorer's LLM calls.
 
         Raises:
             ValueError: If required credentials are missing after falling back to environment variables.
@@ -64,6 +82,10 @@ class ATSScorerLLM:
         self.model_name = model_name or os.getenv("MODEL_NAME")
         self.user_id = user_id
         self.temperature = temperature
+        self.priority = priority
+
+        # Token counts of the last inputs before and after compaction
+        self.compaction_stats = {}
 
         if not self.api_key:
             raise ValueError(
@@ -80,15 +102,18 @@ class ATSScorerLLM:
                 "An LLM model name is required. Provide it or set MODEL_NAME environment variable."
             )
 
-        # Use TokenTracker to create a tracked instance of the LLM
-        self.llm = TokenTracker.get_tracked_langchain_llm(
-            model_name=self.model_name,
-            temperature=self.temperature,
-            api_key=self.api_key,
-            api_base=self.api_base,
-            feature="ats_scoring",
-            user_id=self.user_id
-        )
+        # Each pipeline stage gets its own routed model, max_tokens and timeout
+        stage_llm_args = {
+            "default_model": self.model_name,
+            "api_key": self.api_key,
+            "api_base": self.api_base,
+            "temperature": self.temperature,
+            "feature": "ats_scoring",
+            "user_id": self.user_id,
+        }
+        self.resume_llm = model_router.get_llm("resume_extraction", **stage_llm_args)
+        self.job_llm = model_router.get_llm("job_extraction", **stage_llm_args)
+        self.matching_llm = model_router.get_llm("matching", **stage_llm_args)
 
         self.parser = PydanticOutputParser(pydantic_object=SkillsExtraction)
 
@@ -175,10 +200,10 @@ class ATSScorerLLM:
 
             Be inclusive rather than restrictive - capture everything that could potentially match a job requirement.
 
+            {format_instructions}
+
             RESUME TEXT:
             {resume_text}
-
-            {format_instructions}
             """,
             input_variables=["resume_text"],
             partial_variables={
@@ -200,10 +225,10 @@ class ATSScorerLLM:
             - Domain knowledge and industry expertise
             - Any other attributes that would make a candidate suitable
 
+            {format_instructions}
+
             JOB DESCRIPTION:
             {job_text}
-
-            {format_instructions}
             """,
             input_variables=["job_text"],
             partial_variables={
@@ -216,13 +241,7 @@ class ATSScorerLLM:
         self.matching_prompt = PromptTemplate(
             template="""
             You are an expert ATS (Applicant Tracking System) analyzer and recruiter.
-            Compare the candidate's skills and qualifications with the job requirements and provide an analysis.
-
-            CANDIDATE SKILLS AND QUALIFICATIONS:
-            {resume_skills}
-
-            JOB REQUIREMENTS:
-            {job_requirements}
+            Compare the candidate's skills and qualifications (given at the end) with the job requirements and provide an analysis.
 
             Based on a detailed analysis, provide:
             1. A scoring from 0-100 indicating how well the candidate's skills match the job requirements:
@@ -248,119 +267,258 @@ class ATSScorerLLM:
     "recommendation": string,
     "rationale": string
 }}}}
+
+            CANDIDATE SKILLS AND QUALIFICATIONS:
+            {resume_skills}
+
+            JOB REQUIREMENTS:
+            {job_requirements}
             """,
             input_variables=["resume_skills", "job_requirements"],
         )
 
     def setup_chains(self):
         """Set up the LangChain runnable chains for each task."""
-        self.resume_chain = self.resume_prompt | self.llm
+        self.resume_chain = self.resume_prompt | self.resume_llm
 
-        self.job_chain = self.job_prompt | self.llm
+        self.job_chain = self.job_prompt | self.job_llm
 
-        self.matching_chain = self.matching_prompt | self.llm
+        self.matching_chain = self.matching_prompt | self.matching_llm
 
-    def extract_resume_info(self, resume_text):
-        """Extract skills and qualifications from resume using LLM."""
+    def _parse_extraction(self, content: str):
+        """Parse an extraction response without calling the LLM again.
+
+        Output that the strict parser rejects is parsed leniently from the first
+        JSON object, filling missing lists. If that fails too, the raw text is
+        returned; the matching prompt accepts free text analyses.
+
+        Args:
+            content (str): The LLM response text.
+
+        Returns:
+            SkillsExtraction or str: The parsed extraction, or the raw text.
+        """
         try:
-            result = self.resume_chain.invoke({"resume_text": resume_text})
-            parsed_result = self.parser.parse(result.content)
-            return parsed_result
+            return self.parser.parse(content)
         except Exception as e:
-            print(f"Error extracting resume info: {e}")
-            result = self.resume_chain.invoke({"resume_text": resume_text})
-            return result
+            print(f"Could not parse extraction strictly ({classify_error(e).value} error): {e}")
+
+        json_match = re.search(r"\{.*\}", content, re.DOTALL)
+        if json_match:
+            try:
+                data = json.loads(json_match.group(0))
+                return SkillsExtraction(
+                    skills=data.get("skills") or [],
+                    experience_years=data.get("experience_years"),
+                    key_requirements=data.get("key_requirements") or [],
+                    domains=data.get("domains") or [],
+                )
+            except (json.JSONDecodeError, ValidationError, AttributeError):
+                pass
+        return content
+
+    @staticmethod
+    def _warn_sync_call(name: str, replacement: str) -> None:
+        """Warn that a deprecated synchronous method was called."""
+        warnings.warn(
+            f"ATSScorerLLM.{name} is deprecated and bypasses the LLM scheduler, "
+            f"circuit breakers and token budgets; use {replacement} instead",
+            DeprecationWarning,
+            stacklevel=3,
+        )
+
+    def extract_resume_info(self, resume_text):
+        """Extract skills and qualifications from resume using LLM.
+
+        Deprecated: the call bypasses the LLM scheduler; use aextract_resume_info.
+        """
+        self._warn_sync_call("extract_resume_info", "aextract_resume_info")
+        result = self.resume_chain.invoke({"resume_text": resume_text})
+        return self._parse_extraction(result.content)
 
     def extract_job_info(self, job_text):
-        """Extract requirements from job description using LLM."""
-        try:
-            result = self.job_chain.invoke({"job_text": job_text})
-            parsed_result = self.parser.parse(result.content)
-            return parsed_result
-        except Exception as e:
-            print(f"Error extracting job info: {e}")
-            result = self.job_chain.invoke({"job_text": job_text})
-            return result
+        """Extract requirements from job description using LLM.
+
+        Deprecated: the call bypasses the LLM scheduler; use aextract_job_info.
+        """
+        self._warn_sync_call("extract_job_info", "aextract_job_info")
+        result = self.job_chain.invoke({"job_text": job_text})
+        return self._parse_extraction(result.content)
+
+    async def _ainvoke(self, chain, inputs):
+        """Run a chain through the scheduler with retries and circuit breaking."""
+        return await resilient_invoker.ainvoke(chain, inputs, priority=self.priority)
+
+    async def aextract_resume_info(self, resume_text):
+        """Extract skills and qualifications from resume using LLM, asynchronously."""
+        result = await self._ainvoke(self.resume_chain, {"resume_text": resume_text})
+        return self._parse_extraction(result.content)
+
+    async def aextract_job_info(self, job_text):
+        """Extract requirements from job description using LLM, asynchronously."""
+        result = await self._ainvoke(self.job_chain, {"job_text": job_text})
+        return self._parse_extraction(result.content)
+
+    def compact_resume(self, resume_text: str) -> str:
+        """Normalize the resume text and fit it into its token budget.
+
+        Args:
+            resume_text (str): The candidate's resume text.
+
+        Returns:
+            str: The compacted resume text.
+        """
+        resume = compact_text(
+            resume_text, get_token_budget("resume_analysis"), self.model_name
+        )
+        self.compaction_stats.update(
+            resume_tokens_before=resume.tokens_before,
+            resume_tokens_after=resume.tokens_after,
+        )
+        return resume.text
+
+    def compact_job(self, job_text: str) -> str:
+        """Normalize the job description and fit it into its token budget.
+
+        Args:
+            job_text (str): The job description text.
+
+        Returns:
+            str: The compacted job description text.
+        """
+        job = compact_text(job_text, get_token_budget("job_analysis"), self.model_name)
+        self.compaction_stats.update(
+            job_tokens_before=job.tokens_before,
+            job_tokens_after=job.tokens_after,
+        )
+        return job.text
+
+    def compact_inputs(self, resume_text: str, job_text: str) -> tuple:
+        """Normalize the resume and job texts and fit them into their token budgets.
+
+        Args:
+            resume_text (str): The candidate's resume text.
+            job_text (str): The job description text.
+
+        Returns:
+            tuple: The compacted resume text and job description text.
+        """
+        self.compaction_stats = {}
+        return self.compact_resume(resume_text), self.compact_job(job_text)
 
     def calculate_keyword_overlap(self, resume_skills, job_skills):
         """[DEPRECATED] No longer used. All matching is now LLM-based for domain-agnostic optimization."""
         return 0.0
 
-    def analyze_match(self, resume_analysis, job_analysis):
-        """Have the LLM analyze the match between resume and job requirements."""
-        try:
-            if not isinstance(resume_analysis, str):
-                resume_analysis = str(resume_analysis.model_dump())
-            if not isinstance(job_analysis, str):
-                job_analysis = str(job_analysis.model_dump())
-
-            result = self.matching_chain.invoke({
-                "resume_skills": resume_analysis,
-                "job_requirements": job_analysis
-            })
-
-            json_match = re.search(r"\{.*\}", result.content, re.DOTALL)
-
-            if json_match:
-                try:
-                    json_str = json_match.group(0)
-                    parsed_result = json.loads(json_str)
-                    return parsed_result
-                except json.JSONDecodeError:
-                    pass
-
-            # If we can't parse as JSON, extract the fields manually
-            score_match = re.search(
-                r'["\']?score["\']?\s*:\s*(\d+)', result.content, re.IGNORECASE
-            )
-            score = (
-                int(score_match.group(1)) if score_match else 50
-            )
+    @staticmethod
+    def _match_inputs(resume_analysis, job_analysis) -> dict:
+        """Return the matching prompt inputs for the extracted analyses."""
+        if not isinstance(resume_analysis, str):
+            resume_analysis = str(resume_analysis.model_dump())
+        if not isinstance(job_analysis, str):
+            job_analysis = str(job_analysis.model_dump())
+        return {
+            "resume_skills": resume_analysis,
+            "job_requirements": job_analysis
+        }
 
-            matching_section = re.search(
-                r'["\']?matching_skills["\']?\s*:\s*\[(.*?)\]', result.content, re.DOTALL
-            )
-            matching_skills = []
-            if matching_section:
-                skills_text = matching_section.group(1)
-                matching_skills = re.findall(r'["\']([^"\']+)["\']', skills_text)
+    @staticmethod
+    def _parse_match_content(content: str) -> dict:
+        """Parse the matching analysis returned by the LLM."""
+        json_match = re.search(r"\{.*\}", content, re.DOTALL)
 
-            missing_section = re.search(
-                r'["\']?missing_skills["\']?\s*:\s*\[(.*?)\]', result.content, re.DOTALL
-            )
-            missing_skills = []
-            if missing_section:
-                skills_text = missing_section.group(1)
-                missing_skills = re.findall(r'["\']([^"\']+)["\']', skills_text)
-
-            # Extract recommendation
-            rec_match = re.search(
-                r'["\']?recommendation["\']?\s*:\s*["\']([^"\']+)["\']', result.content
-            )
-            recommendation = (
-                rec_match.group(1)
-                if rec_match
-                else "No specific recommendation provided."
-            )
+        if json_match:
+            try:
+                json_str = json_match.group(0)
+                parsed_result = json.loads(json_str)
+                return parsed_result
+            except json.JSONDecodeError:
+                pass
+
+        # If we can't parse as JSON, extract the fields manually
+        score_match = re.search(
+            r'["\']?score["\']?\s*:\s*(\d+)', content, re.IGNORECASE
+        )
+        score = (
+            int(score_match.group(1)) if score_match else 50
+        )
 
-            # Extract rationale
-            rationale_match = re.search(
-                r'["\']?rationale["\']?\s*:\s*["\']([^"\']+)["\']', result.content
-            )
-            rationale = (
-                rationale_match.group(1)
-                if rationale_match
-                else "No rationale provided."
+        matching_section = re.search(
+            r'["\']?matching_skills["\']?\s*:\s*\[(.*?)\]', content, re.DOTALL
+        )
+        matching_skills = []
+        if matching_section:
+            skills_text = matching_section.group(1)
+            matching_skills = re.findall(r'["\']([^"\']+)["\']', skills_text)
+
+        missing_section = re.search(
+            r'["\']?missing_skills["\']?\s*:\s*\[(.*?)\]', content, re.DOTALL
+        )
+        missing_skills = []
+        if missing_section:
+            skills_text = missing_section.group(1)
+            missing_skills = re.findall(r'["\']([^"\']+)["\']', skills_text)
+
+        # Extract recommendation
+        rec_match = re.search(
+            r'["\']?recommendation["\']?\s*:\s*["\']([^"\']+)["\']', content
+        )
+        recommendation = (
+            rec_match.group(1)
+            if rec_match
+            else "No specific recommendation provided."
+        )
+
+        # Extract rationale
+        rationale_match = re.search(
+            r'["\']?rationale["\']?\s*:\s*["\']([^"\']+)["\']', content
+        )
+        rationale = (
+            rationale_match.group(1)
+            if rationale_match
+            else "No rationale provided."
+        )
+
+        return {
+            "score": score,
+            "matching_skills": matching_skills,
+            "missing_skills": missing_skills,
+            "recommendation": recommendation,
+            "rationale": rationale,
+        }
+
+    def analyze_match(self, resume_analysis, job_analysis):
+        """Have the LLM analyze the match between resume and job requirements.
+
+        Deprecated: the call bypasses the LLM scheduler; use aanalyze_match.
+        """
+        self._warn_sync_call("analyze_match", "aanalyze_match")
+        try:
+            result = self.matching_chain.invoke(
+                self._match_inputs(resume_analysis, job_analysis)
             )
+            return self._parse_match_content(result.content)
 
+        except Exception as e:
+            print(f"Error analyzing match: {e}")
             return {
-                "score": score,
-                "matching_skills": matching_skills,
-                "missing_skills": missing_skills,
-                "recommendation": recommendation,
-                "rationale": rationale,
+                "score": 50,
+                "matching_skills": [],
+                "missing_skills": [],
+                "recommendation": "Error analyzing match. The candidate appears to have relevant skills but a detailed analysis could not be completed.",
+                "rationale": "Error during LLM analysis."
             }
 
+    async def aanalyze_match(self, resume_analysis, job_analysis):
+        """Have the LLM analyze the match between resume and job requirements, asynchronously."""
+        try:
+            result = await self._ainvoke(
+                self.matching_chain, self._match_inputs(resume_analysis, job_analysis)
+            )
+            return self._parse_match_content(result.content)
+
+        except FAIL_FAST_ERRORS:
+            raise
         except Exception as e:
             print(f"Error analyzing match: {e}")
             return {
@@ -371,32 +529,29 @@ class ATSScorerLLM:
                 "rationale": "Error during LLM analysis."
             }
 
-    async def compute_match_score(self, resume_text: str, job_text: str, weights: dict = None) -> dict:
-        """Calculate comprehensive match score between resume and job using LLM only.
+    async def ensure_prompts(self) -> None:
+        """Load the prompts from the database once, keeping the defaults on failure."""
+        if self.prompts_initialized:
+            return
+        try:
+            await self.setup_prompts()
+            self.prompts_initialized = True
+        except Exception as e:
+            print(f"Error loading prompts from database: {e}. Using default prompts.")
+            # Already using default prompts from __init__
+
+    async def ascore_analyses(self, resume_analysis, job_analysis) -> dict:
+        """Score already extracted resume and job analyses against each other.
 
         Args:
-            resume_text (str): The candidate's resume text.
-            job_text (str): The job description text.
-            weights (dict, optional): Ignored. Kept for backward compatibility.
+            resume_analysis: The extraction of the resume.
+            job_analysis: The extraction of the job description.
 
         Returns:
             dict: Scoring and skill analysis results, 100% LLM-driven.
         """
-        # Try to load prompts from database if not already initialized
-        if not self.prompts_initialized:
-            try:
-                await self.setup_prompts()
-                self.prompts_initialized = True
-            except Exception as e:
-                print(f"Error loading prompts from database: {e}. Using default prompts.")
-                # Already using default prompts from __init__
-
-        # Extract information using LLM
-        resume_analysis = self.extract_resume_info(resume_text)
-        job_analysis = self.extract_job_info(job_text)
-
         # Get LLM analysis of match (all scoring, matching, and rationale)
-        match_analysis = self.analyze_match(resume_analysis, job_analysis)
+        match_analysis = await self.aanalyze_match(resume_analysis, job_analysis)
         llm_score = match_analysis.get("score", 50) / 100  # Convert to 0-1 scale
         llm_score = max(llm_score, 0.45)  # Set a floor of 0.45 (45%) for LLM score
         final_score = llm_score  # 100% LLM-based
@@ -419,6 +574,30 @@ class ATSScorerLLM:
         }
         return result
 
+    async def compute_match_score(self, resume_text: str, job_text: str, weights: dict = None) -> dict:
+        """Calculate comprehensive match score between resume and job using LLM only.
+
+        Args:
+            resume_text (str): The candidate's resume text.
+            job_text (str): The job description text.
+            weights (dict, optional): Ignored. Kept for backward compatibility.
+
+        Returns:
+            dict: Scoring and skill analysis results, 100% LLM-driven.
+        """
+        # Try to load prompts from database if not already initialized
+        await self.ensure_prompts()
+
+        resume_text, job_text = self.compact_inputs(resume_text, job_text)
+
+        # Extract information using LLM; both extractions are independent
+        resume_analysis, job_analysis = await asyncio.gather(
+            self.aextract_resume_info(resume_text),
+            self.aextract_job_info(job_text),
+        )
+
+        return await self.ascore_analyses(resume_analysis, job_analysis)
+
     # Synchronous wrapper for backward compatibility
     def compute_match_score_sync(self, resume_text: str, job_text: str, weights: dict = None) -> dict:
         """Synchronous wrapper for compute_match_score.
@@ -426,6 +605,9 @@ class ATSScorerLLM:
         This method is provided for backward compatibility with code that expects
         a synchronous interface. It uses default prompts only.
 
+        Deprecated: its LLM calls bypass the scheduler, circuit breakers and
+        token budgets; use compute_match_score.
+
         Args:
             resume_text (str): The candidate's resume text.
             job_text (str): The job description text.
@@ -434,6 +616,9 @@ class ATSScorerLLM:
         Returns:
             dict: Scoring and skill analysis results, 100% LLM-driven.
         """
+        self._warn_sync_call("compute_match_score_sync", "compute_match_score")
+        resume_text, job_text = self.compact_inputs(resume_text, job_text)
+
         # Extract information using LLM with default prompts
         resume_analysis = self.extract_resume_info(resume_text)
         job_analysis = self.extract_job_info(job_text)
@@ -480,7 +665,7 @@ def demo_ats_scorer_llm():
     job_desc = """
     """
 
-    result = scorer.compute_match_score(resume, job_desc)
+    result = asyncio.run(scorer.compute_match_score(resume, job_desc))
 
     print("Resume Skills:", result["resume_skills"])
     print("Job Requirements:", result["job_requirements"])
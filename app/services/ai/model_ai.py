@@ -5,6 +5,8 @@ to analyze and optimize resumes based on job descriptions, improving compatibili
 with Applicant Tracking Systems (ATS).
 """
 
+import asyncio
+import hashlib
 import json
 import os
 import re
@@ -14,8 +16,332 @@ from langchain.prompts import PromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_openai import ChatOpenAI
 
+from app.database.models.resume import (
+    Certificate,
+    Education,
+    Experience,
+    ExtraCurricularActivity,
+    Project,
+    Skills,
+)
 from app.services.ai.ats_scoring import ATSScorerLLM
-from app.utils.token_tracker import TokenTracker
+from app.services.ai.model_router import model_router
+from app.services.ai.resilience import FAIL_FAST_ERRORS, resilient_invoker
+from app.services.ai.scheduler import Priority
+from app.utils.text_compaction import compact_text, get_token_budget
+
+# Sections generated independently in section-parallel mode. Each entry holds the
+# instructions specific to the section, the JSON skeleton the model must return,
+# and the Pydantic submodel used to validate list items (if any).
+RESUME_SECTIONS: Dict[str, Dict[str, Any]] = {
+    "user_information": {
+        "instructions": """Rewrite the candidate's header, professional summary, education and skills.
+        - Keep name, email, linkedin and github exactly as in the original resume
+        - Write a targeted professional summary using the job's exact terminology
+        - List hard and soft skills the candidate actually has, most job-relevant first""",
+        "skeleton": """{{
+            "name": "",
+            "main_job_title": "",
+            "profile_description": "",
+            "email": "",
+            "linkedin": "",
+            "github": "",
+            "education": [
+                {{
+                    "institution": "",
+                    "degree": "",
+                    "location": "",
+                    "description": "",
+                    "start_date": "",
+                    "end_date": ""
+                }}
+            ],
+            "skills": {{
+                "hard_skills": [],
+                "soft_skills": []
+            }},
+            "hobbies": []
+        }}""",
+        "model": None,
+    },
+    "experiences": {
+        "instructions": """Rewrite every work experience of the candidate.
+        - Order experiences by relevance to the job, most relevant first
+        - The "four_tasks" array must contain EXACTLY 4 items for each experience
+        - Quantify achievements with metrics where the original resume supports it""",
+        "skeleton": """[
+            {{
+                "job_title": "",
+                "company": "",
+                "start_date": "",
+                "end_date": "",
+                "location": "",
+                "four_tasks": []
+            }}
+        ]""",
+        "model": Experience,
+    },
+    "projects": {
+        "instructions": """Rewrite the candidate's projects.
+        - Keep only the 3-4 projects most relevant to the job
+        - The "two_goals_of_the_project" array must contain EXACTLY 2 items for each project""",
+        "skeleton": """[
+            {{
+                "project_name": "",
+                "project_link": "",
+                "two_goals_of_the_project": [],
+                "project_end_result": "",
+                "tech_stack": []
+            }}
+        ]""",
+        "model": Project,
+    },
+    "certificate": {
+        "instructions": """List the candidate's certificates, most job-relevant first.""",
+        "skeleton": """[
+            {{
+                "name": "",
+                "link" : "",
+                "institution": "",
+                "description": "",
+                "date": ""
+            }}
+        ]""",
+        "model": Certificate,
+    },
+    "extra_curricular_activities": {
+        "instructions": """List the candidate's extra-curricular activities, highlighting transferable skills.""",
+        "skeleton": """[
+            {{
+                "name": "",
+                "description": "",
+                "start_date": "",
+                "end_date": ""
+            }}
+        ]""",
+        "model": ExtraCurricularActivity,
+    },
+    "optimization_summary": {
+        "instructions": """Summarize the optimization strategy for this resume and job.
+        - "changes_made" should contain 3-5 specific changes
+        - "keywords_added" should list 5-10 keywords from the job description
+        - "overall_strategy" should be a 2-3 sentence summary""",
+        "skeleton": """{{
+            "changes_made": [],
+            "keywords_added": [],
+            "skills_emphasized": [],
+            "content_reorganized": [],
+            "achievements_quantified": [],
+            "overall_strategy": ""
+        }}""",
+        "model": None,
+    },
+}
+
+
+# Sections that summarize the whole requirement set and are therefore regenerated
+# whenever the job's skills change during incremental re-optimization.
+GLOBAL_SECTIONS = ("user_information", "optimization_summary")
+
+
+def _normalize_skill(skill: str) -> str:
+    """Normalize a skill name for comparison between job analyses."""
+    return " ".join(str(skill).lower().split())
+
+
+def _job_skills(score_results: Optional[Dict[str, Any]]) -> List[str]:
+    """Collect the normalized skills a job analysis asks for.
+
+    Args:
+        score_results: Results of an ATS scoring run.
+
+    Returns:
+        List[str]: Sorted, de-duplicated normalized skill names.
+    """
+    if not score_results:
+        return []
+    skills = list(score_results.get("job_requirements", [])) + list(
+        score_results.get("missing_skills", [])
+    )
+    return sorted({_normalize_skill(skill) for skill in skills if skill})
+
+
+def _section_text(value: Any) -> str:
+    """Join the values of a resume section into lowercase text, leaving out its keys."""
+    if isinstance(value, dict):
+        return " ".join(_section_text(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return " ".join(_section_text(item) for item in value)
+    return "" if value is None else str(value).lower()
+
+
+def _mentions(text: str, skill: str) -> bool:
+    """Return True if the section text mentions the skill as a whole word.
+
+    Word boundaries keep short skills such as "r", "go" or "sql" from matching
+    inside other words; they are checked with lookarounds so skills ending in
+    symbols, such as "c++", match too.
+    """
+    return re.search(rf"(?<!\w){re.escape(skill)}(?!\w)", text) is not None
+
+
+def _resume_hash(resume: str) -> str:
+    """Return a short stable hash of the original resume text."""
+    return hashlib.sha256((resume or "").encode("utf-8")).hexdigest()[:16]
+
+
+def split_resume_sections(resume_json: Dict[str, Any]) -> Dict[str, Any]:
+    """Split a ResumeData-shaped dict into the sections of RESUME_SECTIONS.
+
+    Args:
+        resume_json: An optimized resume in the ResumeData JSON layout.
+
+    Returns:
+        Dict[str, Any]: Mapping of section name to section value.
+    """
+    info = resume_json.get("user_information") or {}
+    return {
+        "user_information": {
+            key: value for key, value in info.items() if key != "experiences"
+        },
+        "experiences": info.get("experiences") or [],
+        "projects": resume_json.get("projects") or [],
+        "certificate": resume_json.get("certificate") or [],
+        "extra_curricular_activities": resume_json.get("extra_curricular_activities") or [],
+        "optimization_summary": resume_json.get("optimization_summary"),
+    }
+
+
+def build_optimization_context(
+    resume: str,
+    score_results: Optional[Dict[str, Any]],
+    resume_json: Dict[str, Any],
+) -> Dict[str, Any]:
+    """Build the context stored alongside optimized data for later re-optimization.
+
+    For every section the job skills that the generated section mentions are
+    recorded, so a later run can tell which sections a requirement change affects.
+
+    Args:
+        resume: The original resume text the optimization was based on.
+        score_results: The job analysis used for the optimization.
+        resume_json: The optimized resume in the ResumeData JSON layout.
+
+    Returns:
+        Dict[str, Any]: The optimization context.
+    """
+    job_skills = _job_skills(score_results)
+    sections = {}
+    for section, value in split_resume_sections(resume_json).items():
+        text = _section_text(value)
+        sections[section] = {
+            "relevant_skills": [skill for skill in job_skills if _mentions(text, skill)]
+        }
+
+    score_results = score_results or {}
+    return {
+        "resume_hash": _resume_hash(resume),
+        "job_skills": job_skills,
+        "job_requirements": score_results.get("job_requirements", []),
+        "matching_skills": score_results.get("matching_skills", []),
+        "missing_skills": score_results.get("missing_skills", []),
+        "sections": sections,
+    }
+
+
+def find_stale_sections(
+    previous_context: Dict[str, Any],
+    previous_result: Dict[str, Any],
+    score_results: Optional[Dict[str, Any]],
+) -> List[str]:
+    """Determine which sections must be regenerated for a new job analysis.
+
+    A section is stale when a skill it relied on is no longer required, or when a
+    newly required skill already appears in the section and should be emphasized.
+    The profile and summary sections are stale whenever the skill set changes.
+
+    Args:
+        previous_context: Context stored by the previous optimization.
+        previous_result: The previously optimized resume.
+        score_results: The new job analysis.
+
+    Returns:
+        List[str]: Names of the sections to regenerate, in RESUME_SECTIONS order.
+    """
+    old_skills = set(previous_context.get("job_skills", []))
+    new_skills = set(_job_skills(score_results))
+    if old_skills == new_skills:
+        return []
+
+    removed = old_skills - new_skills
+    added = new_skills - old_skills
+    previous_sections = split_resume_sections(previous_result)
+    stored_sections = previous_context.get("sections", {})
+
+    stale = []
+    for section in RESUME_SECTIONS:
+        if section in GLOBAL_SECTIONS:
+            stale.append(section)
+            continue
+        relevant = set(stored_sections.get(section, {}).get("relevant_skills", []))
+        text = _section_text(previous_sections.get(section))
+        if relevant & removed or any(_mentions(text, skill) for skill in added):
+            stale.append(section)
+    return stale
+
+
+async def load_optimization_prompt() -> Optional[str]:
+    """Attempt to load the resume optimization prompt template from the database.
+
+    Returns:
+        Optional[str]: The prompt template string if found, None otherwise.
+    """
+    try:
+        from app.database.repositories.prompt_repository import PromptRepository
+        repo = PromptRepository()
+
+        # Get resume optimization prompt
+        prompt = await repo.get_prompt_by_name("resume_optimization")
+        if prompt:
+            return prompt["template"]
+        return None
+    except Exception as e:
+        print(f"Error loading prompt from database: {e}")
+        return None
+
+
+def _parse_json_content(content: str) -> Any:
+    """Parse a JSON value out of an LLM response.
+
+    Tries the raw content first, then a markdown code block, then the outermost
+    JSON object or array found in the text.
+
+    Args:
+        content: The raw text returned by the model.
+
+    Returns:
+        The parsed JSON value.
+
+    Raises:
+        json.JSONDecodeError: If no valid JSON can be extracted.
+    """
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError:
+        pass
+
+    code_block = re.search(r"```(?:json)?\s*([\s\S]*?)\s*```", content)
+    if code_block:
+        try:
+            return json.loads(code_block.group(1))
+        except json.JSONDecodeError:
+            pass
+
+    json_like = re.search(r"(\{[\s\S]*\}|\[[\s\S]*\])", content)
+    if json_like:
+        return json.loads(json_like.group(1))
+
+    raise json.JSONDecodeError("No JSON value found in response", content, 0)
 
 
 class AtsResumeOptimizer:
@@ -66,6 +392,7 @@ class AtsResumeOptimizer:
         api_base: str = None,
         user_id: str = None,
         temperature: float = 0.0,
+        priority: Priority = Priority.OPTIMIZE,
     ) -> None:
         """Initialize the AI model for resume processing.
 
@@ -76,13 +403,23 @@ class AtsResumeOptimizer:
             api_base: Base URL for the OpenAI API.
             user_id: Optional user ID for token tracking.
             temperature: Temperature setting for the LLM (0.0-1.0) to control creativity.
+            priority: Scheduling priority of the optimizer's LLM calls.
         """
         self.model_name = model_name or os.getenv("MODEL_NAME")
         self.resume = resume
+        # Normalized resume text. It is never truncated: every section of it is
+        # rewritten, so a section cut to fit a budget would be lost
+        self.prompt_resume = compact_text(resume, model_name=self.model_name).text if resume else resume
         self.api_key = api_key or os.getenv("API_KEY")
         self.api_base = api_base or os.getenv("API_BASE")
         self.user_id = user_id
         self.temperature = temperature
+        self.priority = priority
+
+        # Context of the latest optimization, stored with the optimized data so that
+        # later runs against a similar job description can reuse unchanged sections
+        self.optimization_context: Optional[Dict[str, Any]] = None
+        self._last_score_results: Optional[Dict[str, Any]] = None
 
         # Initialize LLM component and output parser
         self.llm = self._get_openai_model()
@@ -98,6 +435,7 @@ class AtsResumeOptimizer:
                 api_base=self.api_base,
                 user_id=self.user_id,
                 temperature=self.temperature,
+                priority=self.priority,
             )
 
         self._setup_chain()
@@ -110,8 +448,9 @@ class AtsResumeOptimizer:
         """
         if self.model_name:
             # Create LLM instance with token tracking for usage monitoring
-            return TokenTracker.get_tracked_langchain_llm(
-                model_name=self.model_name,
+            return model_router.get_llm(
+                "optimization",
+                default_model=self.model_name,
                 temperature=self.temperature,
                 api_key=self.api_key,
                 api_base=self.api_base,
@@ -129,18 +468,7 @@ class AtsResumeOptimizer:
         Returns:
             Optional[str]: The prompt template string if found, None otherwise.
         """
-        try:
-            from app.database.repositories.prompt_repository import PromptRepository
-            repo = PromptRepository()
-
-            # Get resume optimization prompt
-            prompt = await repo.get_prompt_by_name("resume_optimization")
-            if prompt:
-                return prompt["template"]
-            return None
-        except Exception as e:
-            print(f"Error loading prompt from database: {e}")
-            return None
+        return await load_optimization_prompt()
 
     def _get_prompt_template(self, missing_skills: Optional[List[str]] = None) -> PromptTemplate:
         """Create the PromptTemplate for ATS resume optimization.
@@ -152,42 +480,20 @@ class AtsResumeOptimizer:
         Returns:
             PromptTemplate: A prompt template with instructions for resume optimization.
         """
-        # Create the recommended skills section if applicable
+        # Only the list of skills varies between requests; the instructions for
+        # using it are part of the static prefix
         recommended_skills_section = ""
-        if missing_skills and len(missing_skills) > 0:
+        if missing_skills:
             skills_list = ", ".join([f"'{skill}'" for skill in missing_skills])
-            recommended_skills_section = f"""
-        ## RECOMMENDED SKILLS TO ADD
-
-        The following skills were identified as potentially valuable for this position but may be missing or not prominently featured in the resume:
-
-        {skills_list}
-
-        If the candidate has any experience with these skills, even minor exposure:
-        - Highlight them prominently in the skills section
-        - Look for ways to showcase these skills in past experience descriptions
-        - Ensure you're using the exact terminology as listed
-        - Look for related skills or experience that could be reframed to match these requirements
-        - Reframe transferable or implied experience to match the job requirements where ethically possible
-        - Be assertive in surfacing any relevant experience, even if it is not an exact match, as long as it is truthful
-        - Do NOT fabricate experience with these skills, only highlight them if they exist
-        """
+            recommended_skills_section = f"""### RECOMMENDED SKILLS TO ADD:
+        {skills_list}"""
 
-        # Use the default template
-        template = f"""
+        # The static instructions come first and the request-specific input data
+        # last, so that the provider can cache the shared prompt prefix
+        template = """
         # ROLE: Expert ATS Resume Optimization Specialist
         You are an expert ATS (Applicant Tracking System) Resume Optimizer with specialized knowledge in resume writing, keyword optimization, and applicant tracking systems. Your task is to transform the candidate's existing resume into a highly optimized version tailored specifically to the provided job description, maximizing the candidate's chances of passing through ATS filters while maintaining honesty and accuracy.
 
-        ## INPUT DATA:
-
-        ### JOB DESCRIPTION:
-        {{job_description}}
-
-        ### CANDIDATE'S CURRENT RESUME:
-        {{resume}}
-
-        {recommended_skills_section}
-
         ## OPTIMIZATION PROCESS:
 
         1. **ANALYZE THE JOB DESCRIPTION**
@@ -245,7 +551,17 @@ class AtsResumeOptimizer:
             - Optimize language and presentation while maintaining accuracy
             - When appropriate, add context to existing skills to make them more relevant to the job
 
-        6. **CREATE A DETAILED SUMMARY OF CHANGES**
+        6. **RECOMMENDED SKILLS**
+            The input data may end with a list of RECOMMENDED SKILLS TO ADD, identified as potentially valuable for this position but missing or not prominently featured in the resume. If the candidate has any experience with these skills, even minor exposure:
+            - Highlight them prominently in the skills section
+            - Look for ways to showcase these skills in past experience descriptions
+            - Ensure you're using the exact terminology as listed
+            - Look for related skills or experience that could be reframed to match these requirements
+            - Reframe transferable or implied experience to match the job requirements where ethically possible
+            - Be assertive in surfacing any relevant experience, even if it is not an exact match, as long as it is truthful
+            - Do NOT fabricate experience with these skills, only highlight them if they exist
+
+        7. **CREATE A DETAILED SUMMARY OF CHANGES**
             - Document the specific changes made to the resume in detail
             - List the key keywords and phrases added from the job description (at least 5-10 keywords)
             - Explain how the professional summary was tailored to match the job requirements
@@ -273,8 +589,8 @@ class AtsResumeOptimizer:
 
         The JSON must follow this EXACT structure:
 
-        {{{{
-            "user_information": {{{{
+        {{
+            "user_information": {{
                 "name": "",
                 "main_job_title": "",
                 "profile_description": "",
@@ -282,66 +598,66 @@ class AtsResumeOptimizer:
                 "linkedin": "",
                 "github": "",
                 "experiences": [
-                    {{{{
+                    {{
                         "job_title": "",
                         "company": "",
                         "start_date": "",
                         "end_date": "",
                         "location": "",
                         "four_tasks": []
-                    }}}}
+                    }}
                 ],
                 "education": [
-                    {{{{
+                    {{
                         "institution": "",
                         "degree": "",
                         "location": "",
                         "description": "",
                         "start_date": "",
                         "end_date": ""
-                    }}}}
+                    }}
                 ],
-                "skills": {{{{
+                "skills": {{
                     "hard_skills": [],
                     "soft_skills": []
-                }}}},
+                }},
                 "hobbies": []
-            }}}},
+            }},
             "projects": [
-                {{{{
+                {{
                     "project_name": "",
                     "project_link": "",
                     "two_goals_of_the_project": [],
                     "project_end_result": "",
                     "tech_stack": []
-                }}}}
+                }}
             ],
             "certificate": [
-                {{{{
+                {{
                     "name": "",
                     "link" : "",
                     "institution": "",
                     "description": "",
                     "date": ""
-                }}}}
+                }}
             ],
             "extra_curricular_activities": [
-                {{{{
+                {{
                     "name": "",
                     "description": "",
                     "start_date": "",
                     "end_date": ""
-                }}}}
+                }}
             ],
-            "optimization_summary": {{{{
+            "optimization_summary": {{
                 "changes_made": [],
                 "keywords_added": [],
                 "skills_emphasized": [],
                 "content_reorganized": [],
                 "achievements_quantified": [],
                 "overall_strategy": ""
-            }}}}
-        }}}}
+            }}
+        }}
 
         IMPORTANT REQUIREMENTS:
         1. The "four_tasks" array must contain EXACTLY 4 items for each experience
@@ -359,9 +675,22 @@ class AtsResumeOptimizer:
         7. Your response MUST be a valid JSON object that can be parsed with json.loads()
         8. DO NOT wrap the JSON in markdown code blocks or any other formatting
 
+        ## INPUT DATA:
+
+        ### JOB DESCRIPTION:
+        {job_description}
+
+        ### CANDIDATE'S CURRENT RESUME:
+        {resume}
+
+        {recommended_skills_section}
+
         ⚠️ FINAL REMINDER: YOUR ENTIRE RESPONSE MUST BE ONLY THE JSON OBJECT ⚠️
         """
-        return PromptTemplate.from_template(template=template)
+        return PromptTemplate.from_template(
+            template=template,
+            partial_variables={"recommended_skills_section": recommended_skills_section},
+        )
 
     def _setup_chain(self, missing_skills: Optional[List[str]] = None) -> None:
         """Set up the processing pipeline for job descriptions and resumes.
@@ -376,8 +705,250 @@ class AtsResumeOptimizer:
         prompt_template = self._get_prompt_template(missing_skills)
         self.chain = prompt_template | self.llm
 
+    def _get_section_prompt_template(self, section: str) -> PromptTemplate:
+        """Create the PromptTemplate used to generate a single resume section.
+
+        Args:
+            section: Name of the section, a key of RESUME_SECTIONS.
+
+        Returns:
+            PromptTemplate: A prompt template for the requested section.
+        """
+        spec = RESUME_SECTIONS[section]
+        template = """
+        # ROLE: Expert ATS Resume Optimization Specialist
+        You are an expert ATS (Applicant Tracking System) Resume Optimizer. You are rewriting ONE section
+        of the candidate's resume so that it is tailored to the provided job description. Other sections
+        are rewritten separately, so only produce the section requested below.
+
+        ## ETHICAL GUIDELINES
+        - Only include truthful information from the original resume
+        - Do not fabricate experience, skills, or qualifications
+        - Reframe existing experience to highlight relevant skills
+        - Incorporate exact keywords from the job description in context, without keyword stuffing
+
+        ## SECTION: """ + section + """
+        """ + spec["instructions"] + """
+
+        ## OUTPUT FORMAT
+        Return ONLY valid JSON with no other text, following this EXACT structure:
+        """ + spec["skeleton"] + """
+
+        ## INPUT DATA
+
+        ### JOB ANALYSIS:
+        {job_analysis}
+
+        ### JOB DESCRIPTION:
+        {job_description}
+
+        ### CANDIDATE'S CURRENT RESUME:
+        {resume}
+        """
+        return PromptTemplate.from_template(template=template)
+
+    @staticmethod
+    def _format_job_analysis(score_results: Optional[Dict[str, Any]]) -> str:
+        """Format the shared job analysis context passed to every section prompt.
+
+        Args:
+            score_results: Results of the initial ATS scoring, if available.
+
+        Returns:
+            str: A short plain-text description of requirements and skill gaps.
+        """
+        if not score_results:
+            return "No prior analysis available."
+        lines = []
+        job_requirements = score_results.get("job_requirements", [])
+        if job_requirements:
+            lines.append("Required skills: " + ", ".join(job_requirements))
+        matching_skills = score_results.get("matching_skills", [])
+        if matching_skills:
+            lines.append("Skills to emphasize: " + ", ".join(matching_skills))
+        missing_skills = score_results.get("missing_skills", [])
+        if missing_skills:
+            lines.append(
+                "Missing skills (highlight only if the candidate has them): "
+                + ", ".join(missing_skills)
+            )
+        return "\n".join(lines) or "No prior analysis available."
+
+    @staticmethod
+    def _validate_section(section: str, value: Any) -> Any:
+        """Validate a generated section against its Pydantic submodel.
+
+        List items that fail validation are dropped rather than failing the whole
+        section, so one malformed experience does not discard the others.
+
+        Args:
+            section: Name of the section, a key of RESUME_SECTIONS.
+            value: The parsed JSON value returned by the model.
+
+        Returns:
+            The validated section value.
+
+        Raises:
+            ValueError: If the value does not have the expected shape.
+        """
+        model = RESUME_SECTIONS[section]["model"]
+
+        if model is not None:
+            if isinstance(value, dict) and isinstance(value.get(section), list):
+                value = value[section]
+            if not isinstance(value, list):
+                raise ValueError(f"Section '{section}' must be a JSON array")
+            items = []
+            for item in value:
+                try:
+                    items.append(model.model_validate(item).model_dump())
+                except Exception as e:
+                    print(f"Dropping invalid {section} item: {e}")
+            return items
+
+        if not isinstance(value, dict):
+            raise ValueError(f"Section '{section}' must be a JSON object")
+
+        if section == "user_information":
+            value["education"] = [
+                Education.model_validate(item).model_dump()
+                for item in value.get("education") or []
+            ]
+            value["skills"] = Skills.model_validate(
+                value.get("skills") or {"hard_skills": [], "soft_skills": []}
+            ).model_dump()
+            value["hobbies"] = value.get("hobbies") or []
+
+        return value
+
+    async def _generate_section(
+        self, section: str, job_description: str, job_analysis: str
+    ) -> Any:
+        """Generate and validate a single resume section.
+
+        Args:
+            section: Name of the section, a key of RESUME_SECTIONS.
+            job_description: The target job description.
+            job_analysis: Shared job analysis context.
+
+        Returns:
+            The validated section value.
+        """
+        chain = self._get_section_prompt_template(section) | self.llm
+        result = await resilient_invoker.ainvoke(
+            chain,
+            {
+                "job_analysis": job_analysis,
+                "job_description": job_description,
+                "resume": self.prompt_resume,
+            },
+            priority=self.priority,
+        )
+        content = result.content if hasattr(result, "content") else result
+        return self._validate_section(section, _parse_json_content(content))
+
+    @staticmethod
+    def _merge_sections(sections: Dict[str, Any]) -> Dict[str, Any]:
+        """Merge independently generated sections into a single ResumeData dict.
+
+        The merge is deterministic: keys are always emitted in the same order and
+        missing optional sections become empty lists.
+
+        Args:
+            sections: Mapping of section name to validated section value.
+
+        Returns:
+            Dict[str, Any]: The merged resume in the ResumeData JSON layout.
+        """
+        profile = sections["user_information"]
+        return {
+            "user_information": {
+                "name": profile.get("name", ""),
+                "main_job_title": profile.get("main_job_title", ""),
+                "profile_description": profile.get("profile_description", ""),
+                "email": profile.get("email", ""),
+                "linkedin": profile.get("linkedin", ""),
+                "github": profile.get("github", ""),
+                "experiences": sections.get("experiences") or [],
+                "education": profile.get("education", []),
+                "skills": profile.get("skills", {"hard_skills": [], "soft_skills": []}),
+                "hobbies": profile.get("hobbies", []),
+            },
+            "projects": sections.get("projects") or [],
+            "certificate": sections.get("certificate") or [],
+            "extra_curricular_activities": sections.get("extra_curricular_activities") or [],
+            "optimization_summary": sections.get("optimization_summary") or {
+                "changes_made": [],
+                "keywords_added": [],
+                "skills_emphasized": [],
+                "content_reorganized": [],
+                "achievements_quantified": [],
+                "overall_strategy": "Resume optimized for ATS compatibility.",
+            },
+        }
+
+    async def generate_resume_sections_json(
+        self,
+        job_description: str,
+        score_results: Optional[Dict[str, Any]] = None,
+        sections: Optional[List[str]] = None,
+        previous_result: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Generate an optimized resume by rewriting sections concurrently.
+
+        Each section in RESUME_SECTIONS is generated by its own LLM call sharing the
+        same job analysis context, so the overall latency is roughly that of the
+        longest section instead of the whole document.
+
+        Args:
+            job_description: The target job description.
+            score_results: Results of the initial ATS scoring used as shared context.
+            sections: Names of the sections to generate. Defaults to all sections.
+            previous_result: A previously optimized resume whose sections are reused
+                for every section that is not regenerated.
+
+        Returns:
+            Dict[str, Any]: The merged resume in the ResumeData JSON layout.
+
+        Raises:
+            Exception: If the user_information section cannot be generated, since
+                the resume is unusable without it, or if any section was refused
+                or ran out of time (see FAIL_FAST_ERRORS), in which case no
+                partial resume is merged.
+        """
+        job_analysis = self._format_job_analysis(score_results)
+        section_names = list(sections) if sections is not None else list(RESUME_SECTIONS)
+        results = await asyncio.gather(
+            *(
+                self._generate_section(section, job_description, job_analysis)
+                for section in section_names
+            ),
+            return_exceptions=True,
+        )
+
+        for result in results:
+            if isinstance(result, FAIL_FAST_ERRORS):
+                raise result
+
+        merged = split_resume_sections(previous_result) if previous_result else {}
+        for section, result in zip(section_names, results):
+            if isinstance(result, Exception):
+                if section == "user_information" and section not in merged:
+                    raise result
+                print(f"Section '{section}' failed, keeping previous value: {result}")
+                continue
+            merged[section] = result
+
+        return self._merge_sections(merged)
+
     async def generate_ats_optimized_resume_json(
-        self, job_description: str
+        self,
+        job_description: str,
+        section_parallel: bool = False,
+        previous_result: Optional[Dict[str, Any]] = None,
+        previous_context: Optional[Dict[str, Any]] = None,
+        score_results: Optional[Dict[str, Any]] = None,
+        prompt_template: Optional[str] = None,
     ) -> Dict[str, Any]:
         """Generate an ATS-optimized resume in JSON format.
 
@@ -388,48 +959,145 @@ class AtsResumeOptimizer:
 
         Args:
             job_description: The target job description.
+            section_parallel: Generate each resume section concurrently instead of the
+                whole document in one generation. Falls back to the single-shot
+                generation if the section-parallel run fails.
+            previous_result: The previously optimized resume, if any. Together with
+                previous_context it enables incremental re-optimization, in which
+                only the sections affected by changed job requirements are rewritten.
+            previous_context: The optimization context stored with previous_result.
+            score_results: The result of scoring the resume against the job
+                description, if the caller has already computed it. The resume
+                is scored first otherwise.
+            prompt_template: The optimization prompt template, if the caller has
+                already loaded it from the database. An empty string selects the
+                built-in prompt; None loads the template from the database.
 
         Returns:
         -------
             dict: The optimized resume in JSON format with additional ATS metrics.
+            The context of the run is available afterwards as optimization_context.
         """
+        self.optimization_context = None
+        result = await self._generate_optimized_resume_json(
+            job_description,
+            section_parallel,
+            previous_result,
+            previous_context,
+            score_results,
+            prompt_template,
+        )
+        if "error" not in result:
+            self.optimization_context = build_optimization_context(
+                self.resume, self._last_score_results, result
+            )
+        return result
+
+    async def _generate_optimized_resume_json(
+        self,
+        job_description: str,
+        section_parallel: bool,
+        previous_result: Optional[Dict[str, Any]],
+        previous_context: Optional[Dict[str, Any]],
+        score_results: Optional[Dict[str, Any]] = None,
+        prompt_template: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Run the optimization pipeline behind generate_ats_optimized_resume_json."""
+        self._last_score_results = None
         if not self.resume:
             return {"error": "Resume not provided"}
 
         try:
             missing_skills = []
-            score_results = {}
 
-            # Step 1: Analyze resume against job description to identify skill gaps
-            if self.ats_scorer:
-                try:
-                    # Use async compute_match_score if available
-                    if hasattr(self.ats_scorer, "compute_match_score") and callable(getattr(self.ats_scorer, "compute_match_score")):
+            # Step 1: Analyze resume against job description to identify skill gaps,
+            # unless the caller has already scored it
+            if score_results is None:
+                score_results = {}
+                if self.ats_scorer:
+                    try:
+                        # Scored through the LLM scheduler, like every other call
                         score_results = await self.ats_scorer.compute_match_score(
                             self.resume, job_description
                         )
-                    else:
-                        # Fall back to sync method if async not available
-                        score_results = self.ats_scorer.compute_match_score_sync(
-                            self.resume, job_description
-                        )
-
-                    missing_skills = score_results.get("missing_skills", [])
-                    matching_skills = score_results.get("matching_skills", [])
-
-                    # Reconfigure processing chain with identified missing skills
-                    self._setup_chain(missing_skills)
+                    except FAIL_FAST_ERRORS:
+                        raise
+                    except Exception as e:
+                        print(f"Warning: ATS scoring failed, proceeding without skill recommendations: {str(e)}")
+
+            if score_results:
+                missing_skills = score_results.get("missing_skills", [])
+                matching_skills = score_results.get("matching_skills", [])
+
+                # Reconfigure processing chain with identified missing skills
+                self._setup_chain(missing_skills)
+
+                print(f"Initial ATS Score: {score_results.get('final_score', 'N/A')}%")
+                print(f"Found {len(missing_skills)} missing skills to incorporate")
+                print(f"Found {len(matching_skills)} matching skills to emphasize")
+
+            self._last_score_results = score_results
+
+            # The scorer compacts its own inputs; the optimization prompts get the
+            # job description fitted to its token budget
+            prompt_job_description = compact_text(
+                job_description, get_token_budget("job_analysis"), self.model_name
+            ).text
+
+            # Step 2: Reuse the previous optimization where the job requirements allow
+            if (
+                previous_result
+                and previous_context
+                and previous_context.get("resume_hash") == _resume_hash(self.resume)
+            ):
+                try:
+                    stale = find_stale_sections(previous_context, previous_result, score_results)
+                    print(f"Incremental re-optimization, regenerating sections: {stale}")
+                    json_result = await self.generate_resume_sections_json(
+                        prompt_job_description,
+                        score_results,
+                        sections=stale,
+                        previous_result=previous_result,
+                    )
+                    if score_results:
+                        json_result["ats_metrics"] = {
+                            "initial_score": score_results.get("final_score", 0),
+                            "matching_skills": score_results.get("matching_skills", []),
+                            "missing_skills": score_results.get("missing_skills", []),
+                            "recommendation": score_results.get("recommendation", "")
+                        }
+                    return json_result
+                except (ValueError, KeyError, TypeError) as e:
+                    # Only unusable output or a malformed previous result is
+                    # worth a full regeneration; refusals, deadlines and
+                    # provider errors are raised as they are
+                    print(f"Incremental re-optimization failed, regenerating everything: {e}")
 
-                    print(f"Initial ATS Score: {score_results.get('final_score', 'N/A')}%")
-                    print(f"Found {len(missing_skills)} missing skills to incorporate")
-                    print(f"Found {len(matching_skills)} matching skills to emphasize")
+            if section_parallel:
+                try:
+                    json_result = await self.generate_resume_sections_json(
+                        prompt_job_description, score_results
+                    )
+                    if score_results:
+                        json_result["ats_metrics"] = {
+                            "initial_score": score_results.get("final_score", 0),
+                            "matching_skills": score_results.get("matching_skills", []),
+                            "missing_skills": score_results.get("missing_skills", []),
+                            "recommendation": score_results.get("recommendation", "")
+                        }
+                    return json_result
+                except FAIL_FAST_ERRORS:
+                    raise
                 except Exception as e:
-                    print(f"Warning: ATS scoring failed, proceeding without skill recommendations: {str(e)}")
-                    pass
+                    print(f"Section-parallel optimization failed, using single generation: {e}")
 
             # Try to load prompt from database
             try:
-                db_template = await self._get_prompt_template_from_db()
+                db_template = (
+                    prompt_template
+                    if prompt_template is not None
+                    else await self._get_prompt_template_from_db()
+                )
                 if db_template:
                     # Create a new prompt template with the database template
                     # but keep the recommended skills section
@@ -494,25 +1162,37 @@ class AtsResumeOptimizer:
 
                     try:
                         # Generate optimized resume using the custom chain
-                        result = custom_chain.invoke(
-                            {"job_description": job_description, "resume": self.resume}
+                        result = await resilient_invoker.ainvoke(
+                            custom_chain,
+                            {"job_description": prompt_job_description, "resume": self.prompt_resume},
+                            priority=self.priority,
                         )
+                    except FAIL_FAST_ERRORS:
+                        raise
                     except Exception as template_error:
                         print(f"Error using database prompt: {template_error}. Using default prompt.")
                         # Fall back to default chain
-                        result = self.chain.invoke(
-                            {"job_description": job_description, "resume": self.resume}
+                        result = await resilient_invoker.ainvoke(
+                            self.chain,
+                            {"job_description": prompt_job_description, "resume": self.prompt_resume},
+                            priority=self.priority,
                         )
                 else:
                     # Use the default chain
-                    result = self.chain.invoke(
-                        {"job_description": job_description, "resume": self.resume}
+                    result = await resilient_invoker.ainvoke(
+                        self.chain,
+                        {"job_description": prompt_job_description, "resume": self.prompt_resume},
+                        priority=self.priority,
                     )
+            except FAIL_FAST_ERRORS:
+                raise
             except Exception as e:
                 print(f"Error using database prompt: {e}. Using default prompt.")
                 # Fall back to default chain
-                result = self.chain.invoke(
-                    {"job_description": job_description, "resume": self.resume}
+                result = await resilient_invoker.ainvoke(
+                    self.chain,
+                    {"job_description": prompt_job_description, "resume": self.prompt_resume},
+                    priority=self.priority,
                 )
 
             # Step 3: Parse and format the LLM response
@@ -747,6 +1427,8 @@ class AtsResumeOptimizer:
                     "raw_response": str(result)[:500],
                 }
 
+        except FAIL_FAST_ERRORS:
+            raise
         except Exception as e:
             return {"error": f"Error processing request: {str(e)}"}
 
@@ -0,0 +1,304 @@
+"""Per-stage model routing for the resume pipeline.
+
+Skill extraction into the SkillsExtraction schema does not need the model used
+to rewrite a whole resume. This module maps each pipeline stage to its own
+model, max_tokens and timeout, and keeps a rolling record of the latency and
+error rate observed for every model so that traffic can move away from a
+failing model to the stage's fallbacks. Calls older than
+MODEL_ROUTER_STATS_SECONDS are forgotten, so a model that no longer gets
+traffic becomes healthy again and is retried.
+
+Stages are configured from the environment, falling back to MODEL_NAME:
+
+    MODEL_NAME_RESUME_EXTRACTION=gpt-4o-mini
+    MAX_TOKENS_RESUME_EXTRACTION=1024
+    TIMEOUT_RESUME_EXTRACTION=30
+    FALLBACK_MODELS_RESUME_EXTRACTION=gpt-3.5-turbo,gpt-4o
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_openai import ChatOpenAI
+from pydantic import BaseModel, Field
+
+from app.utils.token_tracker import TokenTracker
+
+logger = logging.getLogger(__name__)
+
+PIPELINE_STAGES = ("resume_extraction", "job_extraction", "matching", "optimization")
+
+# Defaults used when a stage has no MAX_TOKENS_<STAGE>/TIMEOUT_<STAGE> setting.
+# Extraction and matching answer with a short JSON object; optimization
+# rewrites the whole resume and is left unbounded.
+DEFAULT_STAGE_LIMITS = {
+    "resume_extraction": {"max_tokens": 1024, "timeout": 30.0},
+    "job_extraction": {"max_tokens": 1024, "timeout": 30.0},
+    "matching": {"max_tokens": 1024, "timeout": 45.0},
+    "optimization": {"max_tokens": None, "timeout": 120.0},
+}
+
+# Number of recent calls kept per model
+STATS_WINDOW = 100
+# Seconds a call counts towards a model's statistics
+STATS_MAX_AGE = 300.0
+# A model needs this many recent calls before its error rate is trusted
+MIN_SAMPLES = 5
+
+
+class StageConfig(BaseModel):
+    """Model settings for one pipeline stage.
+
+    Attributes:
+        stage: Name of the pipeline stage
+        model_name: Preferred model for the stage
+        fallback_models: Models to route to when the preferred model is unhealthy
+        max_tokens: Maximum completion tokens, None for the model default
+        timeout: Request timeout in seconds
+    """
+
+    stage: str
+    model_name: Optional[str] = None
+    fallback_models: List[str] = Field(default_factory=list)
+    max_tokens: Optional[int] = None
+    timeout: Optional[float] = None
+
+
+class ModelStats:
+    """Rolling latency and error statistics for a single model."""
+
+    def __init__(self, window: int = STATS_WINDOW, max_age: float = STATS_MAX_AGE):
+        """Initialize empty statistics over the given number of calls and seconds."""
+        self.max_age = max_age
+        # (time.monotonic() at the end of the call, latency, success)
+        self.calls = deque(maxlen=window)
+
+    def record(self, latency: float, success: bool) -> None:
+        """Record the latency in seconds and outcome of one call."""
+        self.calls.append((time.monotonic(), latency, success))
+
+    def recent(self) -> List[tuple]:
+        """Return the (latency, success) of the calls that have not expired."""
+        cutoff = time.monotonic() - self.max_age
+        return [(latency, success) for ended, latency, success in list(self.calls) if ended >= cutoff]
+
+    @property
+    def error_rate(self) -> float:
+        """Share of failed calls among the recent ones."""
+        calls = self.recent()
+        if not calls:
+            return 0.0
+        return sum(1 for _, success in calls if not success) / len(calls)
+
+    def latency_percentile(self, percentile: float) -> Optional[float]:
+        """Return a latency percentile of recent successful calls, in seconds."""
+        latencies = sorted(latency for latency, success in self.recent() if success)
+        if not latencies:
+            return None
+        index = min(int(round(percentile / 100 * (len(latencies) - 1))), len(latencies) - 1)
+        return latencies[index]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the statistics as a JSON-serializable dict."""
+        return {
+            "calls": len(self.recent()),
+            "error_rate": round(self.error_rate, 4),
+            "p50_latency": self.latency_percentile(50),
+            "p95_latency": self.latency_percentile(95),
+        }
+
+
+class ModelStatsCallback(BaseCallbackHandler):
+    """LangChain callback that reports call latency and errors to a router."""
+
+    def __init__(self, router: "ModelRouter", model_name: str):
+        """Initialize the callback for calls made to model_name."""
+        super().__init__()
+        self.router = router
+        self.model_name = model_name
+        self._started: Dict[Any, float] = {}
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        """Remember when the call started."""
+        self._started[kwargs.get("run_id")] = time.monotonic()
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        """Remember when the chat call started."""
+        self._started[kwargs.get("run_id")] = time.monotonic()
+
+    def on_llm_end(self, response, **kwargs):
+        """Record a successful call."""
+        self._finish(kwargs.get("run_id"), True)
+
+    def on_llm_error(self, error, **kwargs):
+        """Record a failed call."""
+        self._finish(kwargs.get("run_id"), False)
+
+    def _finish(self, run_id, success: bool) -> None:
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            self.router.record(self.model_name, time.monotonic() - started, success)
+
+
+class ModelRouter:
+    """Route each pipeline stage to a model and track per-model health.
+
+    A stage is served by its preferred model unless that model's recent error
+    rate exceeds max_error_rate, in which case the first healthy fallback is
+    used. When every candidate is unhealthy, the one with the lowest error rate
+    is chosen. Calls expire after stats_max_age seconds: an unhealthy model
+    gets no traffic, so it is routed to again once its failures have expired.
+    """
+
+    def __init__(self, max_error_rate: Optional[float] = None, stats_max_age: Optional[float] = None):
+        """Initialize the router.
+
+        Args:
+            max_error_rate: Error rate above which a model is considered unhealthy.
+                Defaults to the MODEL_ROUTER_MAX_ERROR_RATE env var or 0.5.
+            stats_max_age: Seconds a call counts towards a model's statistics.
+                Defaults to the MODEL_ROUTER_STATS_SECONDS env var or 300.
+        """
+        self.max_error_rate = (
+            max_error_rate
+            if max_error_rate is not None
+            else float(os.getenv("MODEL_ROUTER_MAX_ERROR_RATE", "0.5"))
+        )
+        self.stats_max_age = (
+            stats_max_age
+            if stats_max_age is not None
+            else float(os.getenv("MODEL_ROUTER_STATS_SECONDS", str(STATS_MAX_AGE)))
+        )
+        self._stats: Dict[str, ModelStats] = {}
+        self._lock = threading.Lock()
+
+    def get_stage_config(self, stage: str, default_model: Optional[str] = None) -> StageConfig:
+        """Return the configuration of a pipeline stage.
+
+        Args:
+            stage: One of PIPELINE_STAGES.
+            default_model: Model used when the stage has no model of its own,
+                usually the model the caller was configured with.
+
+        Returns:
+            StageConfig: The stage's model settings.
+        """
+        if stage not in PIPELINE_STAGES:
+            raise ValueError(f"Unknown pipeline stage: {stage}")
+
+        suffix = stage.upper()
+        limits = DEFAULT_STAGE_LIMITS[stage]
+        max_tokens = os.getenv(f"MAX_TOKENS_{suffix}")
+        timeout = os.getenv(f"TIMEOUT_{suffix}")
+        fallbacks = os.getenv(f"FALLBACK_MODELS_{suffix}", "")
+
+        return StageConfig(
+            stage=stage,
+            model_name=os.getenv(f"MODEL_NAME_{suffix}") or default_model or os.getenv("MODEL_NAME"),
+            fallback_models=[model.strip() for model in fallbacks.split(",") if model.strip()],
+            max_tokens=int(max_tokens) if max_tokens else limits["max_tokens"],
+            timeout=float(timeout) if timeout else limits["timeout"],
+        )
+
+    def is_healthy(self, model_name: str) -> bool:
+        """Return True unless the model's recent error rate is too high."""
+        stats = self._stats.get(model_name)
+        if stats is None or len(stats.recent()) < MIN_SAMPLES:
+            return True
+        return stats.error_rate <= self.max_error_rate
+
+    def select_model(self, stage: str, default_model: Optional[str] = None) -> Optional[str]:
+        """Choose the model that should serve a stage right now.
+
+        Args:
+            stage: One of PIPELINE_STAGES.
+            default_model: Model used when the stage has no model of its own.
+
+        Returns:
+            Optional[str]: The selected model name.
+        """
+        config = self.get_stage_config(stage, default_model)
+        candidates = [config.model_name, *config.fallback_models]
+        candidates = [model for model in dict.fromkeys(candidates) if model]
+        if not candidates:
+            return None
+
+        for model in candidates:
+            if self.is_healthy(model):
+                if model != candidates[0]:
+                    logger.warning(
+                        f"Routing stage {stage} to {model}: {candidates[0]} error rate is too high"
+                    )
+                return model
+        return min(
+            candidates,
+            key=lambda model: self._stats[model].error_rate if model in self._stats else 0.0,
+        )
+
+    def record(self, model_name: str, latency: float, success: bool) -> None:
+        """Record the latency and outcome of a call to a model."""
+        with self._lock:
+            if model_name not in self._stats:
+                self._stats[model_name] = ModelStats(max_age=self.stats_max_age)
+            self._stats[model_name].record(latency, success)
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return the latency and error statistics of every model seen."""
+        with self._lock:
+            return {model: stats.to_dict() for model, stats in self._stats.items()}
+
+    def get_llm(
+        self,
+        stage: str,
+        default_model: Optional[str] = None,
+        api_key: Optional[str] = None,
+        api_base: Optional[str] = None,
+        temperature: float = 0.0,
+        feature: str = "unspecified",
+        user_id: Optional[str] = None,
+        metadata: Optional[dict] = None,
+    ) -> ChatOpenAI:
+        """Create a token-tracked LLM for a pipeline stage.
+
+        Args:
+            stage: One of PIPELINE_STAGES.
+            default_model: Model used when the stage has no model of its own.
+            api_key: API key for the LLM service.
+            api_base: Base URL for the API service.
+            temperature: Temperature setting for the model.
+            feature: The feature recorded with the token usage.
+            user_id: Optional user ID for token tracking.
+            metadata: Additional context recorded with the token usage.
+
+        Returns:
+            ChatOpenAI: The configured LLM instance.
+        """
+        config = self.get_stage_config(stage, default_model)
+        model_name = self.select_model(stage, default_model)
+
+        # Rate limit retries are handled by the LLM scheduler, which honors
+        # Retry-After across all requests instead of per client
+        kwargs = {"timeout": config.timeout, "max_retries": 0}
+        if config.max_tokens:
+            kwargs["max_tokens"] = config.max_tokens
+
+        return TokenTracker.get_tracked_langchain_llm(
+            model_name=model_name,
+            api_key=api_key,
+            api_base=api_base,
+            temperature=temperature,
+            feature=feature,
+            user_id=user_id,
+            metadata={**(metadata or {}), "stage": stage},
+            extra_callbacks=[ModelStatsCallback(self, model_name)],
+            **kwargs,
+        )
+
+
+# Shared router so that health statistics cover every request
+model_router = ModelRouter()
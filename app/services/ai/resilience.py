@@ -0,0 +1,377 @@
+"""Resilient invocation of LLM chains.
+
+This module wraps the LLM scheduler with the policies that decide what to do
+when a call fails:
+
+- Errors are classified as transient (timeouts, connection errors, 5xx, 429),
+  auth (invalid or unauthorized API key), parse (the model answered but the
+  output could not be parsed) or fatal (anything else, e.g. a bad request).
+  Only transient errors are retried; parse errors are never retried because a
+  second call costs the same tokens and rarely parses better.
+- Transient errors are retried with full-jitter exponential backoff.
+- When a call runs longer than the model's observed p95 latency, a duplicate
+  "hedged" request can be started and the first answer wins.
+- Each provider/model key has a circuit breaker. After repeated transient
+  failures the circuit opens and calls fail fast until a probe succeeds.
+- Calls made on behalf of a request with a deadline (see
+  app/utils/request_context.py) are bounded by the time the request has
+  left, and are not retried once it has run out.
+
+Configured with LLM_MAX_ATTEMPTS, LLM_BACKOFF_BASE, LLM_BACKOFF_MAX,
+LLM_HEDGING, LLM_CIRCUIT_FAILURES and LLM_CIRCUIT_RESET_SECONDS.
+
+Before the first attempt, a call's estimated tokens are reserved against the
+daily budgets of its user and feature (see app/services/ai/token_budget.py).
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from enum import Enum
+from typing import Any, Dict, Optional
+
+from langchain_core.exceptions import OutputParserException
+from pydantic import ValidationError
+
+from app.services.ai.model_router import MIN_SAMPLES, model_router
+from app.services.ai.scheduler import (
+    LLMScheduler,
+    LLMSchedulerRejectedError,
+    Priority,
+    llm_scheduler,
+)
+from app.services.ai.token_budget import TokenBudgets, call_owner, token_budgets
+from app.utils.request_context import (
+    ClientDisconnectedError,
+    DeadlineExceededError,
+    current_deadline,
+)
+from app.utils.tracing import Span, current_span, span
+
+logger = logging.getLogger(__name__)
+
+
+class ErrorKind(str, Enum):
+    """Classes of LLM call failures."""
+
+    TRANSIENT = "transient"
+    AUTH = "auth"
+    PARSE = "parse"
+    FATAL = "fatal"
+
+
+class CircuitOpenError(LLMSchedulerRejectedError):
+    """Raised instead of calling a model whose circuit breaker is open."""
+
+
+# Failures that a fallback generation would only repeat: the call was refused
+# by the scheduler, a token budget or a circuit breaker, or the request has
+# run out of time. Callers re-raise these instead of trying another way.
+FAIL_FAST_ERRORS = (LLMSchedulerRejectedError, DeadlineExceededError, ClientDisconnectedError)
+
+
+def classify_error(error: BaseException) -> ErrorKind:
+    """Classify an exception raised while invoking or parsing an LLM call.
+
+    Args:
+        error: The exception to classify.
+
+    Returns:
+        ErrorKind: The class of the failure.
+    """
+    if isinstance(error, (OutputParserException, json.JSONDecodeError, ValidationError)):
+        return ErrorKind.PARSE
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return ErrorKind.TRANSIENT
+
+    response = getattr(error, "response", None)
+    status_code = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    if status_code in (401, 403):
+        return ErrorKind.AUTH
+    if status_code in (408, 409, 429) or (status_code is not None and status_code >= 500):
+        return ErrorKind.TRANSIENT
+
+    # OpenAI client errors raised before a response was received
+    name = type(error).__name__
+    if name in ("APITimeoutError", "APIConnectionError", "ReadTimeout", "ConnectTimeout", "RemoteProtocolError"):
+        return ErrorKind.TRANSIENT
+    if name in ("AuthenticationError", "PermissionDeniedError"):
+        return ErrorKind.AUTH
+    return ErrorKind.FATAL
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker for one provider/model key.
+
+    The circuit opens after ``failure_threshold`` consecutive transient
+    failures. While open, calls are refused until ``reset_timeout`` seconds
+    have passed; then a single probe call is let through (half-open), and its
+    outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """Initialize a closed circuit."""
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        """State of the circuit: "closed", "open" or "half_open"."""
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Return True if a call may be made now."""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def retry_after(self) -> float:
+        """Return the seconds until the circuit lets a probe through."""
+        if self.opened_at is None:
+            return 0.0
+        return max(self.reset_timeout - (time.monotonic() - self.opened_at), 1.0)
+
+    def record_success(self) -> None:
+        """Close the circuit after a successful call."""
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self) -> None:
+        """Count a transient failure and open the circuit when over the threshold."""
+        self.failures += 1
+        if self.probing or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self.probing = False
+
+
+class ResilientInvoker:
+    """Invoke chains through the scheduler with retries, hedging and circuit breakers."""
+
+    def __init__(
+        self,
+        scheduler: LLMScheduler = llm_scheduler,
+        max_attempts: Optional[int] = None,
+        backoff_base: Optional[float] = None,
+        backoff_max: Optional[float] = None,
+        hedging: Optional[bool] = None,
+        failure_threshold: Optional[int] = None,
+        reset_timeout: Optional[float] = None,
+        budgets: TokenBudgets = token_budgets,
+    ):
+        """Initialize the invoker; unset options are read from the environment.
+
+        Args:
+            scheduler: The scheduler calls are submitted to.
+            max_attempts: Attempts per call for transient errors (LLM_MAX_ATTEMPTS, 3).
+            backoff_base: First backoff ceiling in seconds (LLM_BACKOFF_BASE, 0.5).
+            backoff_max: Maximum backoff ceiling in seconds (LLM_BACKOFF_MAX, 8).
+            hedging: Whether to send hedged duplicates (LLM_HEDGING, off).
+            failure_threshold: Failures that open a circuit (LLM_CIRCUIT_FAILURES, 5).
+            reset_timeout: Seconds a circuit stays open (LLM_CIRCUIT_RESET_SECONDS, 30).
+            budgets: The token budgets calls are reserved against.
+        """
+        self.scheduler = scheduler
+        self.budgets = budgets
+        self.max_attempts = max_attempts or int(os.getenv("LLM_MAX_ATTEMPTS", "3"))
+        self.backoff_base = backoff_base or float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+        self.backoff_max = backoff_max or float(os.getenv("LLM_BACKOFF_MAX", "8"))
+        self.hedging = (
+            hedging
+            if hedging is not None
+            else os.getenv("LLM_HEDGING", "false").lower() in ("1", "true", "yes")
+        )
+        self.failure_threshold = failure_threshold or int(os.getenv("LLM_CIRCUIT_FAILURES", "5"))
+        self.reset_timeout = reset_timeout or float(os.getenv("LLM_CIRCUIT_RESET_SECONDS", "30"))
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self.stats = {"retries": 0, "hedged": 0, "hedge_wins": 0, "fast_failures": 0}
+
+    def get_breaker(self, key: str) -> CircuitBreaker:
+        """Return the circuit breaker of a provider/model key."""
+        if key not in self._breakers:
+            self._breakers[key] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+        return self._breakers[key]
+
+    def backoff(self, attempt: int) -> float:
+        """Return a full-jitter backoff delay for the given retry attempt."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def hedge_delay(self, chain: Any) -> Optional[float]:
+        """Return the p95 latency after which a hedged request is sent, if any."""
+        if not self.hedging:
+            return None
+        model_name = getattr(getattr(chain, "last", chain), "model_name", None)
+        stats = model_router.get_stats().get(model_name)
+        if not stats or stats["calls"] < MIN_SAMPLES:
+            return None
+        return stats["p95_latency"]
+
+    async def _call(self, chain: Any, inputs: Dict[str, Any], priority: int, deadline: Optional[float]) -> Any:
+        """Make one attempt bounded by the deadline."""
+        if deadline is None:
+            return await self._hedged_call(chain, inputs, priority, deadline)
+        return await asyncio.wait_for(
+            self._hedged_call(chain, inputs, priority, deadline),
+            timeout=max(deadline - time.monotonic(), 0.0),
+        )
+
+    async def _hedged_call(self, chain: Any, inputs: Dict[str, Any], priority: int, deadline: Optional[float]) -> Any:
+        """Make one attempt, hedging it if it runs past the p95 latency."""
+        first = asyncio.ensure_future(
+            self.scheduler.ainvoke(chain, inputs, priority=priority, deadline=deadline)
+        )
+        hedge_after = self.hedge_delay(chain)
+        pending = {first}
+        try:
+            if hedge_after is None:
+                return await first
+
+            done, _ = await asyncio.wait(pending, timeout=hedge_after)
+            if not done:
+                self.stats["hedged"] += 1
+                hedged_span = current_span()
+                if hedged_span:
+                    hedged_span.set(hedged=True)
+                pending.add(
+                    asyncio.ensure_future(
+                        self.scheduler.ainvoke(chain, inputs, priority=priority, deadline=deadline)
+                    )
+                )
+
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self.stats["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def ainvoke(
+        self,
+        chain: Any,
+        inputs: Dict[str, Any],
+        priority: int = Priority.INTERACTIVE,
+        deadline: Optional[float] = None,
+    ) -> Any:
+        """Invoke a chain with retries, hedging and circuit breaking.
+
+        Args:
+            chain: A ``prompt | llm`` runnable.
+            inputs: The input variables of the prompt.
+            priority: The scheduling priority of the call.
+            deadline: Optional ``time.monotonic()`` value by which the call must
+                finish. Defaults to the deadline of the current request.
+
+        Returns:
+            Any: The chain's result.
+
+        Raises:
+            DeadlineExceededError: If the deadline passes before the call succeeds.
+            CircuitOpenError: If the model's circuit breaker is open.
+            TokenBudgetExceededError: If the call would exceed the daily token
+                budget of its user or feature.
+            LLMSchedulerRejectedError: If the scheduler refuses the call.
+            Exception: The last error once it is not retryable or attempts run out.
+        """
+        if deadline is None:
+            deadline = current_deadline()
+        key = self.scheduler.get_key(chain)
+        # Budgets are checked once per call, before the first attempt; retries
+        # and hedges run under the same reservation
+        reservation = None
+        if self.budgets.enabled:
+            user_id, feature = call_owner(chain)
+            reservation = self.budgets.reserve(
+                user_id, feature, self.scheduler.estimate_tokens(chain, inputs)
+            )
+        try:
+            with span("llm.invoke", llm_key=key) as invoke_span:
+                return await self._invoke(chain, inputs, priority, deadline, key, invoke_span)
+        finally:
+            self.budgets.release(reservation)
+
+    async def _invoke(
+        self,
+        chain: Any,
+        inputs: Dict[str, Any],
+        priority: int,
+        deadline: Optional[float],
+        key: str,
+        invoke_span: Optional[Span],
+    ) -> Any:
+        """Make attempts until one succeeds or the failure is final."""
+        breaker = self.get_breaker(key)
+
+        attempt = 0
+        while True:
+            if invoke_span:
+                invoke_span.set(attempts=attempt + 1)
+            if deadline is not None and time.monotonic() >= deadline:
+                raise DeadlineExceededError(f"No time left for the call to {key}")
+            if not breaker.allow():
+                self.stats["fast_failures"] += 1
+                raise CircuitOpenError(
+                    f"Circuit breaker open for {key}", retry_after=breaker.retry_after()
+                )
+            try:
+                result = await self._call(chain, inputs, priority, deadline)
+            except (LLMSchedulerRejectedError, asyncio.CancelledError):
+                breaker.probing = False
+                raise
+            except Exception as e:
+                if deadline is not None and time.monotonic() >= deadline:
+                    # The request ran out of time; that says nothing about the model
+                    breaker.probing = False
+                    raise DeadlineExceededError(f"The call to {key} ran past the request deadline") from e
+                kind = classify_error(e)
+                if kind != ErrorKind.TRANSIENT:
+                    breaker.probing = False
+                    raise
+                breaker.record_failure()
+                attempt += 1
+                if attempt >= self.max_attempts:
+                    raise
+                delay = self.backoff(attempt)
+                if deadline is not None and time.monotonic() + delay >= deadline:
+                    raise DeadlineExceededError(f"No time left to retry the call to {key}") from e
+                self.stats["retries"] += 1
+                logger.warning(
+                    f"Transient LLM error for {key} ({type(e).__name__}), "
+                    f"retrying in {delay:.2f}s (attempt {attempt + 1}/{self.max_attempts})"
+                )
+                await asyncio.sleep(delay)
+                continue
+
+            breaker.record_success()
+            return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return retry and hedging counters and the state of every circuit."""
+        return {
+            **self.stats,
+            "circuits": {key: breaker.state for key, breaker in self._breakers.items()},
+        }
+
+
+# Shared invoker so that circuit breakers see every request
+resilient_invoker = ResilientInvoker()
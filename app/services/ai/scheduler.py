@@ -0,0 +1,395 @@
+"""Process-wide scheduler for LLM calls.
+
+Every LLM chain in the scoring and optimization services runs through the
+shared ``llm_scheduler``. Calls are grouped by key (the provider base URL and
+model) and each key gets two token buckets: one for requests per minute and one
+for tokens per minute, with the token cost of a call estimated from its prompt
+length plus its completion limit. Waiting calls are served by priority class
+(interactive scoring before optimization before batch work) and in arrival
+order within a class.
+
+The queue of each key is bounded, and a call with a deadline is rejected up
+front when the estimated wait would not leave it enough time. When the provider
+answers with HTTP 429, the key is paused for the Retry-After period and the call
+is queued again instead of every in-flight request retrying at once.
+
+Limits are configured with LLM_RPM_LIMIT, LLM_TPM_LIMIT, LLM_QUEUE_SIZE and
+LLM_RATE_LIMIT_RETRIES. A limit of 0 disables the corresponding bucket.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from email.utils import parsedate_to_datetime
+from enum import IntEnum
+from typing import Any, Dict, List, Optional
+
+from langchain_core.prompts import BasePromptTemplate
+
+from app.utils.text_compaction import count_tokens
+from app.utils.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Completion tokens assumed for a call whose LLM has no max_tokens setting
+DEFAULT_COMPLETION_TOKENS = 1000
+
+
+class Priority(IntEnum):
+    """Priority classes of LLM calls, lower values are served first."""
+
+    INTERACTIVE = 0
+    OPTIMIZE = 1
+    BATCH = 2
+
+
+class LLMSchedulerRejectedError(Exception):
+    """Raised when a call cannot be admitted or cannot start before its deadline.
+
+    Attributes:
+        retry_after: Suggested number of seconds before trying again
+    """
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        """Initialize the exception with a message and a retry hint in seconds."""
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at ``limit`` units per minute."""
+
+    def __init__(self, limit: int):
+        """Initialize a full bucket; a limit of 0 means unlimited."""
+        self.limit = limit
+        self.level = float(limit)
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.limit, self.level + (now - self.updated) * self.limit / 60)
+        self.updated = now
+
+    def time_until(self, amount: float) -> float:
+        """Return the seconds until ``amount`` units are available."""
+        if not self.limit:
+            return 0.0
+        # A call larger than the whole bucket waits for a full bucket
+        amount = min(amount, self.limit)
+        self._refill()
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) * 60 / self.limit
+
+    def consume(self, amount: float) -> None:
+        """Take ``amount`` units from the bucket."""
+        if self.limit:
+            self._refill()
+            self.level -= min(amount, self.limit)
+
+
+class _Waiter:
+    """A call waiting for its turn in a key's queue."""
+
+    def __init__(self, priority: int, sequence: int, tokens: int):
+        self.priority = priority
+        self.sequence = sequence
+        self.tokens = tokens
+        self.event = asyncio.Event()
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.sequence) < (other.priority, other.sequence)
+
+
+class _KeyState:
+    """Buckets, pause state and queue of one scheduler key."""
+
+    def __init__(self, rpm_limit: int, tpm_limit: int):
+        self.requests = TokenBucket(rpm_limit)
+        self.tokens = TokenBucket(tpm_limit)
+        self.paused_until = 0.0
+        self.waiters: List[_Waiter] = []
+
+    def delay(self, tokens: int) -> float:
+        """Return the seconds until a call of ``tokens`` tokens may start."""
+        return max(
+            self.paused_until - time.monotonic(),
+            self.requests.time_until(1),
+            self.tokens.time_until(tokens),
+            0.0,
+        )
+
+    def wake_head(self) -> None:
+        """Wake the highest priority waiter so it re-checks the buckets."""
+        if self.waiters:
+            self.waiters[0].event.set()
+
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """Return the Retry-After delay of a rate limit error, in seconds.
+
+    Args:
+        error: The exception raised by the LLM client.
+
+    Returns:
+        Optional[float]: The delay if the error is an HTTP 429, else None.
+    """
+    response = getattr(error, "response", None)
+    status_code = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    if status_code != 429:
+        return None
+
+    headers = getattr(response, "headers", None) or {}
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            try:
+                return max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0.0)
+            except (TypeError, ValueError):
+                pass
+    return 1.0
+
+
+class LLMScheduler:
+    """Rate-limit, prioritize and queue LLM calls across the whole process."""
+
+    def __init__(
+        self,
+        rpm_limit: Optional[int] = None,
+        tpm_limit: Optional[int] = None,
+        max_queue_size: Optional[int] = None,
+        rate_limit_retries: Optional[int] = None,
+    ):
+        """Initialize the scheduler.
+
+        Args:
+            rpm_limit: Requests per minute per key. Defaults to LLM_RPM_LIMIT or 500.
+            tpm_limit: Tokens per minute per key. Defaults to LLM_TPM_LIMIT or 200000.
+            max_queue_size: Maximum waiting calls per key. Defaults to LLM_QUEUE_SIZE or 100.
+            rate_limit_retries: Times a call is queued again after an HTTP 429.
+                Defaults to LLM_RATE_LIMIT_RETRIES or 3.
+        """
+        self.rpm_limit = rpm_limit if rpm_limit is not None else int(os.getenv("LLM_RPM_LIMIT", "500"))
+        self.tpm_limit = tpm_limit if tpm_limit is not None else int(os.getenv("LLM_TPM_LIMIT", "200000"))
+        self.max_queue_size = (
+            max_queue_size if max_queue_size is not None else int(os.getenv("LLM_QUEUE_SIZE", "100"))
+        )
+        self.rate_limit_retries = (
+            rate_limit_retries
+            if rate_limit_retries is not None
+            else int(os.getenv("LLM_RATE_LIMIT_RETRIES", "3"))
+        )
+        self._keys: Dict[str, _KeyState] = {}
+        self._sequence = itertools.count()
+        self.stats = {"admitted": 0, "rejected": 0, "rate_limited": 0}
+
+    def _state(self, key: str) -> _KeyState:
+        if key not in self._keys:
+            self._keys[key] = _KeyState(self.rpm_limit, self.tpm_limit)
+        return self._keys[key]
+
+    def estimate_wait(self, key: str, tokens: int, priority: int) -> float:
+        """Estimate how long a new call would wait before it starts.
+
+        The estimate covers the calls queued ahead of it (same or higher
+        priority) and the time for the buckets to refill for all of them.
+
+        Args:
+            key: The scheduler key of the call.
+            tokens: The estimated token cost of the call.
+            priority: The priority class of the call.
+
+        Returns:
+            float: The estimated wait in seconds.
+        """
+        state = self._state(key)
+        ahead = [waiter for waiter in state.waiters if waiter.priority <= priority]
+        requests = len(ahead) + 1
+        total_tokens = sum(waiter.tokens for waiter in ahead) + tokens
+
+        wait = max(state.paused_until - time.monotonic(), 0.0)
+        if self.rpm_limit:
+            wait = max(wait, state.requests.time_until(requests) + max(requests - self.rpm_limit, 0) * 60 / self.rpm_limit)
+        if self.tpm_limit:
+            wait = max(wait, state.tokens.time_until(total_tokens) + max(total_tokens - self.tpm_limit, 0) * 60 / self.tpm_limit)
+        return wait
+
+    async def acquire(
+        self,
+        key: str,
+        tokens: int,
+        priority: int = Priority.INTERACTIVE,
+        deadline: Optional[float] = None,
+    ) -> None:
+        """Wait until a call may start and take its cost from the buckets.
+
+        Args:
+            key: The scheduler key of the call.
+            tokens: The estimated token cost of the call.
+            priority: The priority class of the call.
+            deadline: Optional ``time.monotonic()`` value by which the call must start.
+
+        Raises:
+            LLMSchedulerRejectedError: If the queue is full, or the call cannot start
+                before its deadline.
+        """
+        state = self._state(key)
+
+        if len(state.waiters) >= self.max_queue_size:
+            self.stats["rejected"] += 1
+            raise LLMSchedulerRejectedError(
+                f"LLM queue for {key} is full ({self.max_queue_size} waiting calls)",
+                retry_after=self.estimate_wait(key, tokens, Priority.BATCH),
+            )
+        if deadline is not None:
+            wait = self.estimate_wait(key, tokens, priority)
+            if time.monotonic() + wait > deadline:
+                self.stats["rejected"] += 1
+                raise LLMSchedulerRejectedError(
+                    f"LLM call for {key} cannot start before its deadline "
+                    f"(estimated wait {wait:.1f}s)",
+                    retry_after=wait,
+                )
+
+        waiter = _Waiter(priority, next(self._sequence), tokens)
+        heapq.heappush(state.waiters, waiter)
+        try:
+            while True:
+                timeout = None
+                if state.waiters[0] is waiter:
+                    delay = state.delay(tokens)
+                    if delay <= 0:
+                        heapq.heappop(state.waiters)
+                        state.requests.consume(1)
+                        state.tokens.consume(tokens)
+                        self.stats["admitted"] += 1
+                        return
+                    timeout = delay
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.stats["rejected"] += 1
+                        raise LLMSchedulerRejectedError(
+                            f"LLM call for {key} timed out in the queue"
+                        )
+                    timeout = min(timeout, remaining) if timeout is not None else remaining
+
+                waiter.event.clear()
+                try:
+                    await asyncio.wait_for(waiter.event.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if waiter in state.waiters:
+                state.waiters.remove(waiter)
+                heapq.heapify(state.waiters)
+            state.wake_head()
+
+    def pause(self, key: str, seconds: float) -> None:
+        """Stop starting calls for a key for the given number of seconds."""
+        state = self._state(key)
+        state.paused_until = max(state.paused_until, time.monotonic() + seconds)
+        state.wake_head()
+
+    @staticmethod
+    def get_key(chain: Any) -> str:
+        """Return the scheduler key of a ``prompt | llm`` chain."""
+        llm = getattr(chain, "last", chain)
+        api_base = getattr(llm, "openai_api_base", None) or ""
+        model_name = getattr(llm, "model_name", None) or "default"
+        return f"{api_base}|{model_name}"
+
+    @staticmethod
+    def estimate_tokens(chain: Any, inputs: Dict[str, Any]) -> int:
+        """Estimate the token cost of running a chain on some inputs.
+
+        Args:
+            chain: A ``prompt | llm`` runnable.
+            inputs: The input variables of the prompt.
+
+        Returns:
+            int: Prompt tokens plus the completion limit of the LLM.
+        """
+        prompt = getattr(chain, "first", None)
+        llm = getattr(chain, "last", chain)
+        model_name = getattr(llm, "model_name", None)
+        try:
+            if isinstance(prompt, BasePromptTemplate):
+                text = prompt.format(**inputs)
+            else:
+                text = " ".join(str(value) for value in inputs.values())
+        except Exception:
+            text = " ".join(str(value) for value in inputs.values())
+
+        completion = getattr(llm, "max_tokens", None) or DEFAULT_COMPLETION_TOKENS
+        return count_tokens(text, model_name) + completion
+
+    async def ainvoke(
+        self,
+        chain: Any,
+        inputs: Dict[str, Any],
+        priority: int = Priority.INTERACTIVE,
+        deadline: Optional[float] = None,
+    ) -> Any:
+        """Run a chain once the scheduler admits it.
+
+        HTTP 429 responses pause the chain's key for the Retry-After period and
+        the call is queued again, up to ``rate_limit_retries`` times. The call
+        is recorded as an "llm.call" span with its queue wait; the token usage
+        callback adds the tokens and cost.
+
+        Args:
+            chain: A ``prompt | llm`` runnable.
+            inputs: The input variables of the prompt.
+            priority: The priority class of the call.
+            deadline: Optional ``time.monotonic()`` value by which the call must start.
+
+        Returns:
+            Any: The chain's result.
+        """
+        key = self.get_key(chain)
+        tokens = self.estimate_tokens(chain, inputs)
+
+        with span("llm.call", llm_key=key, priority=int(priority), estimated_tokens=tokens) as call_span:
+            attempt = 0
+            while True:
+                queued = time.monotonic()
+                await self.acquire(key, tokens, priority, deadline)
+                if call_span:
+                    call_span.add(queue_wait_ms=round((time.monotonic() - queued) * 1000, 2))
+                try:
+                    return await chain.ainvoke(inputs)
+                except Exception as e:
+                    retry_after = get_retry_after(e)
+                    if retry_after is None or attempt >= self.rate_limit_retries:
+                        raise
+                    attempt += 1
+                    self.stats["rate_limited"] += 1
+                    if call_span:
+                        call_span.set(rate_limited=attempt)
+                    logger.warning(
+                        f"Rate limited by provider for {key}, pausing for {retry_after:.1f}s "
+                        f"(retry {attempt}/{self.rate_limit_retries})"
+                    )
+                    self.pause(key, retry_after)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return scheduler counters and the queue length of each key."""
+        return {
+            **self.stats,
+            "queues": {key: len(state.waiters) for key, state in self._keys.items()},
+        }
+
+
+# Shared scheduler so that limits apply to every request in the process
+llm_scheduler = LLMScheduler()
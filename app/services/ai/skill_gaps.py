@@ -0,0 +1,171 @@
+"""Local, LLM-free estimate of the skills a resume is missing for a job.
+
+Speculative optimization starts generating the optimized resume before the
+LLM score is available, using the skill gaps estimated here. Once the LLM has
+identified the real missing skills, the speculative result is kept if it
+covers them and regenerated otherwise. SpeculationStats records how often the
+speculation pays off.
+
+The estimate looks for skill-like terms in the job description: entries of a
+vocabulary of common skills and tokens shaped like technology names (C++,
+Node.js, CI/CD, AWS, PostgreSQL), and reports those that do not appear in the
+resume.
+"""
+
+import re
+import threading
+from typing import Any, Dict, Iterable, List
+
+# Common skills whose names look like ordinary words and would not be caught
+# by the shape of the token
+COMMON_SKILLS = (
+    "agile", "scrum", "kanban", "machine learning", "deep learning", "data analysis",
+    "data science", "data engineering", "data modeling", "statistics", "etl",
+    "project management", "product management", "stakeholder management",
+    "communication", "leadership", "mentoring", "problem solving", "customer service",
+    "sales", "marketing", "seo", "copywriting", "budgeting", "forecasting",
+    "accounting", "auditing", "excel", "tableau", "power bi", "looker", "salesforce",
+    "jira", "confluence", "figma", "photoshop", "illustrator", "python", "java",
+    "javascript", "typescript", "go", "golang", "rust", "ruby", "php", "scala",
+    "kotlin", "swift", "sql", "nosql", "react", "angular", "vue", "django", "flask",
+    "fastapi", "spring", "rails", "docker", "kubernetes", "terraform", "ansible",
+    "jenkins", "git", "linux", "bash", "aws", "azure", "gcp", "microservices",
+    "rest", "graphql", "kafka", "spark", "hadoop", "airflow", "snowflake",
+    "mongodb", "postgresql", "mysql", "redis", "elasticsearch", "pandas", "numpy",
+    "pytorch", "tensorflow", "nlp", "computer vision", "devops", "security",
+    "networking", "testing", "unit testing", "automation", "ci/cd",
+)
+
+# Capitalized words that start sentences or name roles rather than skills
+STOPWORDS = {
+    "a", "an", "and", "the", "we", "you", "our", "your", "they", "this", "that",
+    "with", "for", "from", "into", "about", "must", "should", "will", "can",
+    "experience", "years", "year", "team", "teams", "role", "position", "job",
+    "company", "requirements", "responsibilities", "qualifications", "preferred",
+    "required", "plus", "bonus", "benefits", "who", "what", "join",
+    "us", "strong", "excellent", "ability", "knowledge", "skills", "work",
+    "working", "senior", "junior", "lead", "manager", "engineer", "developer",
+    "remote", "hybrid", "full", "time", "in", "of", "on", "or", "to", "as", "is",
+    "are", "be", "at", "by", "it", "if", "all", "any", "new", "other",
+}
+
+# Tokens shaped like technology names: with symbols (C++, C#, Node.js, CI/CD),
+# inner capitals (PostgreSQL, GraphQL) or all capitals (AWS, SQL, REST)
+TECH_TOKEN = re.compile(
+    r"(?<![\w.])("
+    r"[A-Za-z][A-Za-z0-9]*(?:[+#]+|\.[A-Za-z]{2,}|/[A-Za-z]{2,})"
+    r"|[A-Z][a-z]+[A-Z][A-Za-z]*"
+    r"|[A-Z]{2,}[0-9]*"
+    r")(?![\w])"
+)
+
+
+def normalize_skill(skill: str) -> str:
+    """Return a skill name lowercased with whitespace collapsed."""
+    return " ".join(skill.lower().split())
+
+
+def _contains(text: str, skill: str) -> bool:
+    """Return True if the normalized skill appears as a whole term in the text."""
+    return re.search(rf"(?<![\w]){re.escape(skill)}(?![\w+#])", text) is not None
+
+
+def extract_skill_terms(text: str) -> List[str]:
+    """Extract skill-like terms from a text, in order of first appearance.
+
+    Args:
+        text: The job description or resume text.
+
+    Returns:
+        List[str]: The skill terms found, without duplicates.
+    """
+    if not text:
+        return []
+    lowered = normalize_skill(text)
+    found: Dict[str, int] = {}
+
+    for skill in COMMON_SKILLS:
+        match = re.search(rf"(?<![\w]){re.escape(skill)}(?![\w+#])", lowered)
+        if match:
+            found.setdefault(skill, match.start())
+
+    for match in TECH_TOKEN.finditer(text):
+        term = match.group(1)
+        if normalize_skill(term) in STOPWORDS:
+            continue
+        found.setdefault(normalize_skill(term), len(text) + match.start())
+
+    # Vocabulary skills keep their position; pattern matches follow them
+    return sorted(found, key=found.get)
+
+
+def estimate_missing_skills(resume_text: str, job_text: str, limit: int = 20) -> List[str]:
+    """Estimate the skills required by a job that a resume does not mention.
+
+    Args:
+        resume_text: The resume text.
+        job_text: The job description text.
+        limit: Maximum number of skills returned.
+
+    Returns:
+        List[str]: Skill terms of the job description missing from the resume.
+    """
+    resume = normalize_skill(resume_text or "")
+    missing = [skill for skill in extract_skill_terms(job_text) if not _contains(resume, skill)]
+    return missing[:limit]
+
+
+def uncovered_skills(
+    missing_skills: Iterable[str], estimated_skills: Iterable[str], optimized_text: str
+) -> List[str]:
+    """Return the LLM-identified missing skills a speculative result does not cover.
+
+    A skill is covered if the speculative optimization was asked to address it
+    or if the optimized resume mentions it anyway.
+
+    Args:
+        missing_skills: Missing skills identified by the LLM score.
+        estimated_skills: Missing skills the speculative optimization used.
+        optimized_text: Plain text of the speculatively optimized resume.
+
+    Returns:
+        List[str]: The skills that are not covered.
+    """
+    estimated = {normalize_skill(skill) for skill in estimated_skills}
+    text = normalize_skill(optimized_text or "")
+    uncovered = []
+    for skill in missing_skills:
+        normalized = normalize_skill(skill)
+        if not normalized:
+            continue
+        if normalized in estimated or _contains(text, normalized):
+            continue
+        uncovered.append(skill)
+    return uncovered
+
+
+class SpeculationStats:
+    """Counters of speculative optimizations that were kept or regenerated."""
+
+    def __init__(self):
+        """Initialize empty counters."""
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "failures": 0}
+
+    def record(self, outcome: str) -> None:
+        """Count a speculation outcome: "hits", "misses" or "failures"."""
+        with self._lock:
+            self.stats[outcome] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return the counters and the share of speculations that were kept."""
+        with self._lock:
+            total = sum(self.stats.values())
+            return {
+                **self.stats,
+                "hit_rate": round(self.stats["hits"] / total, 4) if total else None,
+            }
+
+
+# Shared counters reported by the model routing endpoint
+speculation_stats = SpeculationStats()
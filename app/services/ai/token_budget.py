@@ -0,0 +1,309 @@
+"""Per-user and per-feature daily token budgets.
+
+Before an LLM call is dispatched, ``token_budgets.reserve`` sets aside the
+call's estimated tokens against the budget of the user and the feature making
+it, and refuses the call with ``TokenBudgetExceededError`` when that would go over
+either budget. The token usage callback records the actual tokens once the
+call ends, and the reservation is released when the call returns.
+
+Counters are kept in memory, so enforcement costs no database round trip. A
+background task periodically reconciles them with the daily token usage
+rollups, which include the usage of the other application instances; the
+higher of the two counts is enforced. Budgets reset at midnight UTC.
+
+Configured with TOKEN_BUDGET_USER_DAILY, TOKEN_BUDGET_FEATURE_DAILY,
+TOKEN_BUDGET_FEATURES (per-feature overrides such as
+"ats_scoring=2000000,resume_optimization=5000000") and
+TOKEN_BUDGET_RECONCILE_SECONDS. A budget of 0 is unlimited.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.services.ai.scheduler import LLMSchedulerRejectedError
+
+logger = logging.getLogger(__name__)
+
+USER = "user"
+FEATURE = "feature"
+
+
+class TokenBudgetExceededError(LLMSchedulerRejectedError):
+    """Raised when a call would take a user or feature over its daily budget.
+
+    Attributes:
+        scope: "user" or "feature"
+        name: The user ID or feature name
+        limit: The daily budget in tokens
+        used: Tokens used and reserved today
+        retry_after: Seconds until the budget resets
+    """
+
+    def __init__(self, scope: str, name: str, limit: int, used: int, retry_after: float):
+        """Initialize the exception; see the class attributes for the arguments."""
+        super().__init__(
+            f"Daily token budget of {scope} '{name}' exhausted: "
+            f"{used} of {limit} tokens used",
+            retry_after=retry_after,
+        )
+        self.scope = scope
+        self.name = name
+        self.limit = limit
+        self.used = used
+
+
+class Reservation:
+    """Tokens set aside for one call until it returns."""
+
+    def __init__(self, keys: List[Tuple[str, str]], tokens: int):
+        """Initialize the reservation.
+
+        Args:
+            keys: The (scope, name) budget keys the tokens are counted against.
+            tokens: The number of tokens set aside.
+        """
+        self.keys = keys
+        self.tokens = tokens
+
+
+def parse_feature_budgets(spec: str) -> Dict[str, int]:
+    """Parse per-feature budgets written as "feature=tokens,feature=tokens"."""
+    budgets = {}
+    for item in spec.split(","):
+        if "=" in item:
+            feature, _, limit = item.partition("=")
+            budgets[feature.strip()] = int(limit)
+    return budgets
+
+
+def call_owner(chain: Any) -> Tuple[Optional[str], Optional[str]]:
+    """Return the user ID and feature a ``prompt | llm`` chain is billed to.
+
+    They are taken from the token usage callback attached to the LLM.
+    """
+    llm = getattr(chain, "last", chain)
+    for callback in getattr(llm, "callbacks", None) or []:
+        if hasattr(callback, "feature") and hasattr(callback, "user_id"):
+            return callback.user_id, callback.feature
+    return None, None
+
+
+class TokenBudgets:
+    """In-memory daily token counters per user and per feature."""
+
+    def __init__(
+        self,
+        user_daily: Optional[int] = None,
+        feature_daily: Optional[int] = None,
+        feature_budgets: Optional[Dict[str, int]] = None,
+        reconcile_interval: Optional[float] = None,
+        rollup_factory: Optional[Callable[[], Any]] = None,
+    ):
+        """Initialize the budgets.
+
+        Args:
+            user_daily: Daily tokens per user. Defaults to TOKEN_BUDGET_USER_DAILY or 0.
+            feature_daily: Daily tokens per feature. Defaults to
+                TOKEN_BUDGET_FEATURE_DAILY or 0.
+            feature_budgets: Daily tokens of specific features, overriding
+                feature_daily. Defaults to TOKEN_BUDGET_FEATURES.
+            reconcile_interval: Seconds between reconciliations with the rollups.
+                Defaults to TOKEN_BUDGET_RECONCILE_SECONDS or 60.
+            rollup_factory: Callable returning the TokenUsageRollupRepository
+                the counters are reconciled with.
+        """
+        self.user_daily = (
+            user_daily if user_daily is not None else int(os.getenv("TOKEN_BUDGET_USER_DAILY", "0"))
+        )
+        self.feature_daily = (
+            feature_daily
+            if feature_daily is not None
+            else int(os.getenv("TOKEN_BUDGET_FEATURE_DAILY", "0"))
+        )
+        self.feature_budgets = (
+            feature_budgets
+            if feature_budgets is not None
+            else parse_feature_budgets(os.getenv("TOKEN_BUDGET_FEATURES", ""))
+        )
+        self.reconcile_interval = (
+            reconcile_interval
+            if reconcile_interval is not None
+            else float(os.getenv("TOKEN_BUDGET_RECONCILE_SECONDS", "60"))
+        )
+        self._rollup_factory = rollup_factory
+        # Calls are recorded from the callback threads of LangChain handlers
+        self._lock = threading.Lock()
+        self._day = self._today()
+        self._used: Dict[Tuple[str, str], int] = {}
+        self._reserved: Dict[Tuple[str, str], int] = {}
+        self._reconciled: Dict[Tuple[str, str], int] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"reserved": 0, "rejected": 0, "reconciliations": 0, "reconcile_failures": 0}
+
+    @property
+    def enabled(self) -> bool:
+        """Whether any budget is configured."""
+        return bool(self.user_daily or self.feature_daily or any(self.feature_budgets.values()))
+
+    @staticmethod
+    def _today():
+        return datetime.utcnow().date()
+
+    def _roll_day(self) -> None:
+        """Reset the counters at midnight UTC; called with the lock held."""
+        today = self._today()
+        if today != self._day:
+            self._day = today
+            self._used.clear()
+            self._reconciled.clear()
+
+    def limit(self, scope: str, name: str) -> int:
+        """Return the daily budget of a user or feature, 0 if unlimited."""
+        if scope == USER:
+            return self.user_daily
+        return self.feature_budgets.get(name, self.feature_daily)
+
+    def _usage(self, key: Tuple[str, str]) -> int:
+        return max(self._used.get(key, 0), self._reconciled.get(key, 0)) + self._reserved.get(key, 0)
+
+    @staticmethod
+    def _seconds_until_reset() -> float:
+        now = datetime.utcnow()
+        midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+        return (midnight - now).total_seconds()
+
+    def reserve(self, user_id: Optional[str], feature: Optional[str], tokens: int) -> Optional[Reservation]:
+        """Set aside the estimated tokens of a call.
+
+        Args:
+            user_id: The user the call is made for, if known.
+            feature: The feature making the call, if known.
+            tokens: The estimated token cost of the call.
+
+        Returns:
+            Optional[Reservation]: The reservation to release once the call
+            returns, None if no budget applies.
+
+        Raises:
+            TokenBudgetExceededError: If the call would exceed a budget.
+        """
+        keys = [
+            (scope, name)
+            for scope, name in ((USER, user_id), (FEATURE, feature))
+            if name and self.limit(scope, name)
+        ]
+        if not keys:
+            return None
+        with self._lock:
+            self._roll_day()
+            for key in keys:
+                limit = self.limit(*key)
+                used = self._usage(key)
+                if used + tokens > limit:
+                    self.stats["rejected"] += 1
+                    raise TokenBudgetExceededError(key[0], key[1], limit, used, self._seconds_until_reset())
+            for key in keys:
+                self._reserved[key] = self._reserved.get(key, 0) + tokens
+            self.stats["reserved"] += 1
+            return Reservation(keys, tokens)
+
+    def release(self, reservation: Optional[Reservation]) -> None:
+        """Give back the tokens set aside for a call that has returned."""
+        if reservation is None:
+            return
+        with self._lock:
+            for key in reservation.keys:
+                remaining = self._reserved.get(key, 0) - reservation.tokens
+                if remaining > 0:
+                    self._reserved[key] = remaining
+                else:
+                    self._reserved.pop(key, None)
+
+    def record(self, user_id: Optional[str], feature: Optional[str], tokens: int) -> None:
+        """Count the actual tokens of a finished call against the budgets."""
+        if not self.enabled or not tokens:
+            return
+        with self._lock:
+            self._roll_day()
+            for key in ((USER, user_id), (FEATURE, feature)):
+                if key[1]:
+                    self._used[key] = self._used.get(key, 0) + tokens
+
+    def _get_rollups(self):
+        if self._rollup_factory is None:
+            from app.database.repositories.token_usage_rollup_repository import (
+                TokenUsageRollupRepository,
+            )
+
+            self._rollup_factory = TokenUsageRollupRepository
+        return self._rollup_factory()
+
+    async def reconcile(self) -> None:
+        """Load today's token totals per user and feature from the daily rollups."""
+        day = self._today()
+        try:
+            totals = await self._get_rollups().get_day_totals(
+                datetime.combine(day, datetime.min.time())
+            )
+        except Exception as e:
+            self.stats["reconcile_failures"] += 1
+            logger.error(f"Failed to reconcile token budgets: {str(e)}")
+            return
+        with self._lock:
+            self._roll_day()
+            if day == self._day:
+                self._reconciled = {
+                    (scope, name): tokens
+                    for scope, by_name in ((USER, totals.get("users", {})), (FEATURE, totals.get("features", {})))
+                    for name, tokens in by_name.items()
+                    if name
+                }
+                self.stats["reconciliations"] += 1
+
+    async def _run(self) -> None:
+        while True:
+            await self.reconcile()
+            await asyncio.sleep(self.reconcile_interval)
+
+    def start(self) -> None:
+        """Start reconciling with the rollups in the background, if budgets are set."""
+        if not self.enabled or (self._task is not None and not self._task.done()):
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info("Token budget reconciliation started")
+
+    async def close(self) -> None:
+        """Stop the background reconciliation."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return the budgets, counters and today's usage of every budgeted key."""
+        with self._lock:
+            self._roll_day()
+            keys = set(self._used) | set(self._reserved) | set(self._reconciled)
+            return {
+                **self.stats,
+                "enabled": self.enabled,
+                "user_daily": self.user_daily,
+                "feature_daily": self.feature_daily,
+                "feature_budgets": dict(self.feature_budgets),
+                "usage": {
+                    f"{scope}:{name}": {"used": self._usage((scope, name)), "limit": self.limit(scope, name)}
+                    for scope, name in sorted(keys)
+                    if self.limit(scope, name)
+                },
+            }
+
+
+# Shared budgets enforced for every LLM call in the process
+token_budgets = TokenBudgets()
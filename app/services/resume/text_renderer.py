@@ -0,0 +1,152 @@
+"""Plain-text rendering of structured resume data.
+
+This module provides a canonical, compact plain-text rendering of ResumeData.
+Scoring an optimized resume with the same kind of plain text that was extracted
+from the original PDF keeps both scores comparable, and avoids spending prompt
+tokens on JSON keys, punctuation and metadata such as ats_metrics or the
+optimization summary. The same rendering is used wherever a resume needs a
+stable textual form, for example embeddings or cache keys.
+"""
+
+import hashlib
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from app.database.models.resume import ResumeData
+
+
+def _join(parts: Iterable[Optional[str]], separator: str = ", ") -> str:
+    """Join the non-empty, stripped parts with a separator."""
+    return separator.join(str(part).strip() for part in parts if part and str(part).strip())
+
+
+def _period(item: Dict[str, Any], start_key: str = "start_date", end_key: str = "end_date") -> str:
+    """Format a date range as "(start - end)", or an empty string if unknown."""
+    dates = _join([item.get(start_key), item.get(end_key)], " - ")
+    return f"({dates})" if dates else ""
+
+
+def _section(title: str, lines: List[str]) -> List[str]:
+    """Return a titled block of lines, or nothing if the block is empty."""
+    lines = [line for line in lines if line]
+    return [title, *lines, ""] if lines else []
+
+
+def render_resume_text(resume: Union[ResumeData, Dict[str, Any]]) -> str:
+    """Render resume data as compact plain text.
+
+    Only resume content is rendered; keys such as ats_metrics,
+    optimization_summary or raw_text_response are ignored. Empty fields are
+    skipped and the output is deterministic for a given input.
+
+    Args:
+        resume: A ResumeData model or a dict in the ResumeData JSON layout.
+
+    Returns:
+        str: The plain-text rendering of the resume.
+    """
+    if hasattr(resume, "model_dump"):
+        resume = resume.model_dump()
+
+    info = resume.get("user_information") or {}
+    lines = [
+        _join([info.get("name")]),
+        _join([info.get("main_job_title")]),
+        _join([info.get("email"), info.get("linkedin"), info.get("github")], " | "),
+        "",
+    ]
+
+    lines += _section("SUMMARY", [_join([info.get("profile_description")])])
+
+    experience_lines = []
+    for job in info.get("experiences") or []:
+        experience_lines.append(
+            _join(
+                [
+                    _join([job.get("job_title"), job.get("company"), job.get("location")]),
+                    _period(job),
+                ],
+                " ",
+            )
+        )
+        experience_lines += [f"- {task.strip()}" for task in job.get("four_tasks") or [] if task]
+    lines += _section("EXPERIENCE", experience_lines)
+
+    education_lines = []
+    for school in info.get("education") or []:
+        education_lines.append(
+            _join(
+                [
+                    _join([school.get("degree"), school.get("institution"), school.get("location")]),
+                    _period(school),
+                ],
+                " ",
+            )
+        )
+        education_lines.append(_join([school.get("description")]))
+    lines += _section("EDUCATION", education_lines)
+
+    skills = info.get("skills") or {}
+    lines += _section(
+        "SKILLS",
+        [
+            _join(skills.get("hard_skills") or []),
+            _join(skills.get("soft_skills") or []),
+        ],
+    )
+
+    project_lines = []
+    for project in resume.get("projects") or []:
+        tech_stack = _join(project.get("tech_stack") or [])
+        project_lines.append(
+            _join([project.get("project_name"), f"({tech_stack})" if tech_stack else ""], " ")
+        )
+        project_lines += [
+            f"- {goal.strip()}" for goal in project.get("two_goals_of_the_project") or [] if goal
+        ]
+        project_lines.append(_join([project.get("project_end_result")]))
+    lines += _section("PROJECTS", project_lines)
+
+    certificate_lines = []
+    for certificate in resume.get("certificate") or []:
+        certificate_lines.append(
+            _join(
+                [
+                    _join([certificate.get("name"), certificate.get("institution")]),
+                    f"({certificate['date']})" if certificate.get("date") else "",
+                ],
+                " ",
+            )
+        )
+        certificate_lines.append(_join([certificate.get("description")]))
+    lines += _section("CERTIFICATES", certificate_lines)
+
+    activity_lines = []
+    for activity in resume.get("extra_curricular_activities") or []:
+        activity_lines.append(_join([activity.get("name"), _period(activity)], " "))
+        activity_lines.append(_join([activity.get("description")]))
+    lines += _section("ACTIVITIES", activity_lines)
+
+    lines += _section("INTERESTS", [_join(info.get("hobbies") or [])])
+
+    # Collapse the blank lines left by empty header fields
+    text = "\n".join(lines).strip()
+    while "\n\n\n" in text:
+        text = text.replace("\n\n\n", "\n\n")
+    return text
+
+
+def resume_fingerprint(resume: Union[ResumeData, Dict[str, Any], str]) -> str:
+    """Return a stable fingerprint of a resume's content.
+
+    Two resumes that render to the same text share the same fingerprint, which
+    makes it suitable as a cache key regardless of metadata or key order.
+
+    Args:
+        resume: A ResumeData model, a dict in the ResumeData JSON layout, or an
+            already rendered resume text.
+
+    Returns:
+        str: A hex SHA-256 digest of the rendered text.
+    """
+    text = resume if isinstance(resume, str) else render_resume_text(resume)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
@@ -5,6 +5,7 @@ including file uploads, downloads, conversion between formats, and temporary
 file management for the MyResumo application.
 """
 
+import asyncio
 import os
 import subprocess
 import tempfile
@@ -15,6 +16,12 @@ import PyPDF2
 import pytesseract
 from pdf2image import convert_from_path
 
+from app.utils.request_context import DeadlineExceededError, current_context
+from app.utils.tracing import span
+
+# Seconds a single pdflatex run may take
+PDFLATEX_TIMEOUT = 30
+
 
 def extract_text_from_pdf(pdf_path: str) -> str:
     """Extract text content from a PDF file.
@@ -31,12 +38,7 @@ def extract_text_from_pdf(pdf_path: str) -> str:
         str: Extracted text content
     """
     try:
-        with open(pdf_path, "rb") as file:
-            reader = PyPDF2.PdfReader(file)
-            text = ""
-            for page_num in range(len(reader.pages)):
-                page = reader.pages[page_num]
-                text += page.extract_text() + "\n\n"
+        text = _read_text_layer(pdf_path)
 
         # If we got a reasonable amount of text, return it
         if len(text.strip()) > 100:
@@ -65,6 +67,77 @@ def extract_text_from_pdf(pdf_path: str) -> str:
         return f"Text extraction failed. Error: {str(e)}"
 
 
+def _read_text_layer(pdf_path: str) -> str:
+    """Return the embedded text of every page of a PDF file."""
+    with open(pdf_path, "rb") as file:
+        reader = PyPDF2.PdfReader(file)
+        text = ""
+        for page_num in range(len(reader.pages)):
+            page = reader.pages[page_num]
+            text += page.extract_text() + "\n\n"
+    return text
+
+
+async def aextract_text_from_pdf(pdf_path: str) -> str:
+    """Extract text content from a PDF file without blocking the event loop.
+
+    Works like extract_text_from_pdf, running the extraction and OCR in worker
+    threads. OCR goes page by page within the time budget of the current
+    request: it stops between pages once the request is cancelled, and each
+    tesseract run is limited to the time the request has left.
+
+    Args:
+        pdf_path: Path to the PDF file
+
+    Returns:
+    -------
+        str: Extracted text content
+
+    Raises:
+    ------
+        DeadlineExceededError: If the request deadline passes during OCR
+    """
+    context = current_context()
+    text = ""
+    try:
+        with span("pdf.text_layer") as text_span:
+            text = await asyncio.to_thread(_read_text_layer, pdf_path)
+            if text_span:
+                text_span.set(characters=len(text))
+
+        # If we got a reasonable amount of text, return it
+        if len(text.strip()) > 100:
+            return text
+    except Exception as e:
+        print(f"Direct PDF text extraction failed: {e}")
+        text = ""
+
+    # If direct extraction failed or didn't get enough text, try OCR
+    try:
+        context.check()
+        with span("pdf.rasterize"):
+            images = await asyncio.to_thread(convert_from_path, pdf_path)
+
+        ocr_text = ""
+        for page, image in enumerate(images, start=1):
+            context.check()
+            with span("ocr.page", page=page):
+                page_text = await asyncio.to_thread(
+                    pytesseract.image_to_string, image, timeout=context.timeout() or 0
+                )
+            ocr_text += page_text + "\n\n"
+
+        return ocr_text
+    except DeadlineExceededError:
+        raise
+    except Exception as e:
+        print(f"OCR extraction failed: {e}")
+        # If OCR fails but we have some text from direct extraction, use that
+        if text:
+            return text
+        return f"Text extraction failed. Error: {str(e)}"
+
+
 def save_pdf_file(content: bytes, filename: str, directory: str) -> str:
     """Save PDF content to a file in the specified directory.
 
@@ -116,7 +189,7 @@ def create_temporary_pdf(latex_content: str) -> Optional[str]:
                     cwd=temp_dir,
                     capture_output=True,
                     text=True,
-                    timeout=30,  # 30 seconds timeout
+                    timeout=PDFLATEX_TIMEOUT,
                 )
 
             # Check if PDF was created
@@ -142,3 +215,70 @@ def create_temporary_pdf(latex_content: str) -> Optional[str]:
         except Exception as e:
             print(f"PDF generation failed: {str(e)}")
             return None
+
+
+async def acreate_temporary_pdf(latex_content: str) -> Optional[str]:
+    """Generate a PDF from LaTeX content without blocking the event loop.
+
+    pdflatex runs as an asynchronous subprocess. Each run is limited to the
+    smaller of PDFLATEX_TIMEOUT and the time the current request has left, and
+    the process is killed if the request is cancelled.
+
+    Args:
+        latex_content: LaTeX source code
+
+    Returns:
+    -------
+        Optional[str]: Path to the generated PDF file, or None if generation fails
+    """
+    context = current_context()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        tex_path = Path(temp_dir) / "resume.tex"
+        with open(tex_path, "w", encoding="utf-8") as tex_file:
+            tex_file.write(latex_content)
+
+        try:
+            # Run pdflatex twice to ensure references are resolved
+            stderr = b""
+            for run in range(1, 3):
+                context.check()
+                with span("pdflatex", run=run):
+                    process = await asyncio.create_subprocess_exec(
+                        "pdflatex",
+                        "-interaction=nonstopmode",
+                        tex_path.name,
+                        cwd=temp_dir,
+                        stdout=asyncio.subprocess.PIPE,
+                        stderr=asyncio.subprocess.PIPE,
+                    )
+                    try:
+                        _, stderr = await asyncio.wait_for(
+                            process.communicate(), timeout=context.timeout(PDFLATEX_TIMEOUT)
+                        )
+                    finally:
+                        if process.returncode is None:
+                            process.kill()
+                            await process.wait()
+
+            pdf_path = Path(temp_dir) / "resume.pdf"
+            if not pdf_path.exists():
+                print(f"PDF generation failed: {stderr.decode(errors='replace')}")
+                return None
+
+            # Copy the PDF to a location that will
+            # persist after the temp directory is deleted
+            permanent_pdf = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
+            permanent_pdf.close()
+
+            with open(pdf_path, "rb") as src_file:
+                with open(permanent_pdf.name, "wb") as dest_file:
+                    dest_file.write(src_file.read())
+
+            return permanent_pdf.name
+
+        except (asyncio.TimeoutError, DeadlineExceededError):
+            print("PDF generation timed out")
+            return None
+        except Exception as e:
+            print(f"PDF generation failed: {str(e)}")
+            return None
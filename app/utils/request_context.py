@@ -0,0 +1,138 @@
+"""Deadline and cancellation context of a request.
+
+A RequestContext carries the time budget of the request that is being served.
+It is stored in a context variable, so it follows the request into every task
+spawned for it: the pipeline stages, the scorer and optimizer LLM calls, the
+PDF compilation and OCR. Code deep in the call stack can ask how much time is
+left, skip optional work when the budget runs low, and stop once it has run
+out.
+
+run_until_disconnected runs a request's work while polling the client
+connection, and cancels the work when the client goes away, so that no LLM
+calls or pdflatex runs are spent on responses nobody will read.
+
+Configured with REQUEST_DEADLINE_SECONDS and DISCONNECT_POLL_SECONDS.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineExceededError(Exception):
+    """Raised when the time budget of a request has been used up."""
+
+
+class ClientDisconnectedError(Exception):
+    """Raised when the client closed the connection before the response was ready."""
+
+
+class RequestContext:
+    """Time budget of one request."""
+
+    def __init__(self, budget: Optional[float] = None):
+        """Initialize the context.
+
+        Args:
+            budget: Seconds the request may take from now. None sets no deadline.
+        """
+        self.deadline = time.monotonic() + budget if budget else None
+
+    def remaining(self) -> Optional[float]:
+        """Return the seconds left before the deadline, or None without deadline."""
+        if self.deadline is None:
+            return None
+        return max(self.deadline - time.monotonic(), 0.0)
+
+    def has_budget(self, seconds: float) -> bool:
+        """Return True if at least the given number of seconds is left."""
+        remaining = self.remaining()
+        return remaining is None or remaining >= seconds
+
+    def check(self) -> None:
+        """Raise DeadlineExceededError if the deadline has passed."""
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            raise DeadlineExceededError("The request deadline has passed")
+
+    def timeout(self, default: Optional[float] = None) -> Optional[float]:
+        """Return the smaller of a default timeout and the remaining budget."""
+        remaining = self.remaining()
+        if remaining is None:
+            return default
+        if default is None:
+            return remaining
+        return min(default, remaining)
+
+
+_current_context: ContextVar[Optional[RequestContext]] = ContextVar(
+    "request_context", default=None
+)
+
+
+def current_context() -> RequestContext:
+    """Return the context of the current request, or one without deadline."""
+    return _current_context.get() or RequestContext()
+
+
+def current_deadline() -> Optional[float]:
+    """Return the ``time.monotonic()`` deadline of the current request, if any."""
+    context = _current_context.get()
+    return context.deadline if context else None
+
+
+def get_request_budget() -> Optional[float]:
+    """Return the configured request budget in seconds (REQUEST_DEADLINE_SECONDS, 300)."""
+    budget = float(os.getenv("REQUEST_DEADLINE_SECONDS", "300"))
+    return budget if budget > 0 else None
+
+
+@contextmanager
+def request_scope(context: RequestContext) -> Iterator[RequestContext]:
+    """Make a context the current one for the duration of a block.
+
+    Tasks created inside the block inherit the context.
+    """
+    token = _current_context.set(context)
+    try:
+        yield context
+    finally:
+        _current_context.reset(token)
+
+
+async def run_until_disconnected(
+    request: Any, work: Awaitable[Any], poll_interval: Optional[float] = None
+) -> Any:
+    """Await work while watching the client connection.
+
+    Args:
+        request: The Starlette request whose connection is watched.
+        work: The awaitable producing the response.
+        poll_interval: Seconds between connection checks. Defaults to the
+            DISCONNECT_POLL_SECONDS env var or 1.
+
+    Returns:
+        Any: The result of the work.
+
+    Raises:
+        ClientDisconnectedError: If the client disconnected; the work is cancelled.
+    """
+    interval = poll_interval or float(os.getenv("DISCONNECT_POLL_SECONDS", "1"))
+    task = asyncio.ensure_future(work)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                logger.info(f"Client disconnected from {request.url.path}, cancelling its work")
+                task.cancel()
+                raise ClientDisconnectedError(f"Client disconnected from {request.url.path}")
+    finally:
+        if not task.done():
+            task.cancel()
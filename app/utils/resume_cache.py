@@ -0,0 +1,281 @@
+"""Read-through cache of resume documents.
+
+``ResumeRepository.get_resume_by_id`` serves resumes from this cache and
+fills it on a miss, so the repeated reads of one resume during a session
+(view, optimize, score, downloads) skip MongoDB. Resumes are cached in an
+in-process LRU and, with RESUME_CACHE_REDIS_URL set, in Redis shared by all
+replicas.
+
+Every resume update increments the document's ``version`` field, and the
+writer then invalidates the cached copy by leaving a tombstone carrying the
+new version. A fill is accepted only for a version at least as new as the
+one cached, so a reader that loaded a resume before an update cannot put the
+old version back after the invalidation. Invalidations are published over
+Redis so the other replicas drop their local copies too.
+
+Configured with RESUME_CACHE_SIZE, RESUME_CACHE_TTL and RESUME_CACHE_REDIS_URL.
+"""
+
+import asyncio
+import copy
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import bson
+
+logger = logging.getLogger(__name__)
+
+# Version of the tombstone left by a deletion; above any real version
+DELETED_VERSION = 2 ** 53
+
+KEY_PREFIX = "resume-cache:"
+INVALIDATION_CHANNEL = "resume-cache:invalidations"
+
+# Stores a document unless a newer version is cached or was invalidated;
+# returns 0 only in that case
+FILL_SCRIPT = """
+local current = redis.call('HGET', KEYS[1], 'v')
+if current then
+    current = tonumber(current)
+    local version = tonumber(ARGV[1])
+    if current > version then
+        return 0
+    end
+    if current == version and redis.call('HEXISTS', KEYS[1], 'd') == 1 then
+        return 1
+    end
+end
+redis.call('HSET', KEYS[1], 'v', ARGV[1], 'd', ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+
+# Replaces the cached document with a tombstone and notifies the replicas
+INVALIDATE_SCRIPT = """
+local current = tonumber(redis.call('HGET', KEYS[1], 'v') or '-1')
+redis.call('HDEL', KEYS[1], 'd')
+redis.call('HSET', KEYS[1], 'v', math.max(current, tonumber(ARGV[1])))
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+redis.call('PUBLISH', ARGV[3], ARGV[4])
+return 1
+"""
+
+
+def redis_key(resume_id: str) -> str:
+    """Return the Redis key of a cached resume."""
+    return f"{KEY_PREFIX}{resume_id}"
+
+
+class ResumeCache:
+    """Versioned LRU cache of resumes with an optional Redis tier."""
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        ttl: Optional[float] = None,
+        redis_url: Optional[str] = None,
+    ):
+        """Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of resumes kept in process. Defaults to
+                the RESUME_CACHE_SIZE env var or 512; 0 disables the cache.
+            ttl: Seconds a resume is kept. Defaults to the RESUME_CACHE_TTL env
+                var or 300.
+            redis_url: URL of the Redis tier. Defaults to the
+                RESUME_CACHE_REDIS_URL env var; no Redis tier if unset.
+        """
+        self.max_entries = (
+            max_entries if max_entries is not None else int(os.getenv("RESUME_CACHE_SIZE", "512"))
+        )
+        self.ttl = ttl if ttl is not None else float(os.getenv("RESUME_CACHE_TTL", "300"))
+        self.redis_url = redis_url if redis_url is not None else os.getenv("RESUME_CACHE_REDIS_URL")
+        # Resume ID -> (expiry, version, document or None for a tombstone)
+        self._entries: "OrderedDict[str, Tuple[float, int, Optional[Dict]]]" = OrderedDict()
+        self._redis: Any = None
+        self._scripts: Dict[str, Any] = {}
+        self._listener: Optional[asyncio.Task] = None
+        self.stats = {
+            "hits": 0,
+            "redis_hits": 0,
+            "misses": 0,
+            "fills": 0,
+            "stale_fills": 0,
+            "invalidations": 0,
+            "redis_errors": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        """Whether the cache is enabled, i.e. its size is not 0."""
+        return self.max_entries > 0
+
+    def _get_redis(self) -> Any:
+        """Return the Redis client, or None without a Redis tier."""
+        if self._redis is None and self.redis_url:
+            try:
+                import redis.asyncio as redis
+            except ImportError:
+                logger.warning("RESUME_CACHE_REDIS_URL is set but redis is not installed")
+                self.redis_url = None
+                return None
+            self._redis = redis.from_url(self.redis_url)
+            self._scripts = {
+                "fill": self._redis.register_script(FILL_SCRIPT),
+                "invalidate": self._redis.register_script(INVALIDATE_SCRIPT),
+            }
+        return self._redis
+
+    def _local(self, resume_id: str) -> Optional[Tuple[float, int, Optional[Dict]]]:
+        entry = self._entries.get(resume_id)
+        if entry is not None and entry[0] <= time.monotonic():
+            self._entries.pop(resume_id)
+            return None
+        return entry
+
+    def _store(self, resume_id: str, version: int, document: Optional[Dict]) -> bool:
+        """Store a document or tombstone locally unless the cached one is newer."""
+        entry = self._local(resume_id)
+        if entry is not None and document is not None:
+            if entry[1] > version or (entry[1] == version and entry[2] is not None):
+                return False
+        if entry is not None and document is None:
+            version = max(version, entry[1])
+        self._entries[resume_id] = (time.monotonic() + self.ttl, version, document)
+        self._entries.move_to_end(resume_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return True
+
+    async def get(self, resume_id: str) -> Optional[Dict]:
+        """Return a copy of the cached resume, None on a miss."""
+        if not self.enabled:
+            return None
+        entry = self._local(resume_id)
+        if entry is not None and entry[2] is not None:
+            self._entries.move_to_end(resume_id)
+            self.stats["hits"] += 1
+            return copy.deepcopy(entry[2])
+
+        client = self._get_redis()
+        if client is not None:
+            try:
+                version, data = await client.hmget(redis_key(resume_id), "v", "d")
+            except Exception as e:
+                self.stats["redis_errors"] += 1
+                logger.warning(f"Resume cache read from Redis failed: {str(e)}")
+            else:
+                if data is not None:
+                    document = bson.decode(data)
+                    self._store(resume_id, int(version), document)
+                    self.stats["redis_hits"] += 1
+                    return copy.deepcopy(document)
+        self.stats["misses"] += 1
+        return None
+
+    async def fill(self, resume_id: str, document: Dict) -> None:
+        """Cache a resume read from the database after a miss.
+
+        The fill is dropped if a newer version, or an invalidation for a newer
+        version, is already cached.
+        """
+        if not self.enabled:
+            return
+        version = int(document.get("version", 0))
+        if not self._store(resume_id, version, copy.deepcopy(document)):
+            self.stats["stale_fills"] += 1
+            return
+        self.stats["fills"] += 1
+
+        client = self._get_redis()
+        if client is not None:
+            try:
+                stored = await self._scripts["fill"](
+                    keys=[redis_key(resume_id)],
+                    args=[version, bson.encode(document), int(self.ttl)],
+                )
+                if not stored:
+                    # Another replica cached or invalidated a newer version
+                    # that this replica has not heard of yet
+                    self.stats["stale_fills"] += 1
+                    if self._entries.get(resume_id, (0, None))[1] == version:
+                        self._entries.pop(resume_id)
+            except Exception as e:
+                self.stats["redis_errors"] += 1
+                logger.warning(f"Resume cache write to Redis failed: {str(e)}")
+
+    async def invalidate(self, resume_id: str, version: int) -> None:
+        """Drop the cached resume after a write that produced the given version.
+
+        Args:
+            resume_id: ID of the updated or deleted resume.
+            version: The resume's version after the write; DELETED_VERSION for
+                a deletion.
+        """
+        if not self.enabled:
+            return
+        self.stats["invalidations"] += 1
+        self._store(resume_id, version, None)
+
+        client = self._get_redis()
+        if client is not None:
+            try:
+                await self._scripts["invalidate"](
+                    keys=[redis_key(resume_id)],
+                    args=[version, int(self.ttl), INVALIDATION_CHANNEL, f"{resume_id} {version}"],
+                )
+            except Exception as e:
+                self.stats["redis_errors"] += 1
+                logger.warning(f"Resume cache invalidation in Redis failed: {str(e)}")
+
+    async def _listen(self) -> None:
+        """Apply the invalidations published by the other replicas."""
+        while True:
+            try:
+                pubsub = self._get_redis().pubsub()
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    resume_id, _, version = message["data"].decode().partition(" ")
+                    self._store(resume_id, int(version), None)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["redis_errors"] += 1
+                logger.warning(f"Resume cache invalidation listener failed: {str(e)}")
+                # Invalidations missed meanwhile expire with the entries' TTL
+                await asyncio.sleep(5)
+
+    def start(self) -> None:
+        """Start listening for invalidations of the other replicas, if Redis is used."""
+        if not self.enabled or self._get_redis() is None:
+            return
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+            logger.info("Resume cache invalidation listener started")
+
+    async def close(self) -> None:
+        """Stop the invalidation listener and close the Redis connection."""
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self._redis is not None:
+            close = getattr(self._redis, "aclose", None) or self._redis.close
+            await close()
+            self._redis = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return the hit, fill and invalidation counters and the local entry count."""
+        return {**self.stats, "entries": len(self._entries), "redis": bool(self.redis_url)}
+
+
+# Resume cache shared by the repositories of the process
+resume_cache = ResumeCache()
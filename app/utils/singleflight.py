@@ -0,0 +1,163 @@
+"""Coalescing of identical concurrent requests.
+
+Double-clicks and client retries often send the same scoring or optimization
+request twice while the first one is still running. SingleFlight runs the work
+once per key: concurrent callers with the same key await the same in-flight
+task, which is cancelled only once every caller has gone away. Results of
+requests that carried an idempotency key are also kept for a short window, so
+a retry with the same key gets the stored result instead of running the
+pipeline again.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class IdempotencyKeyConflictError(Exception):
+    """Raised when an idempotency key is reused for a different request."""
+
+
+def make_flight_key(*parts: Any) -> str:
+    """Build a stable coalescing key from JSON-serializable parts.
+
+    Args:
+        *parts: The values identifying a unit of work.
+
+    Returns:
+        str: A hex SHA-256 digest of the parts.
+    """
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """Run identical concurrent work once and replay idempotent results."""
+
+    def __init__(self, idempotency_ttl: Optional[float] = None, max_entries: int = 1000):
+        """Initialize the coalescer.
+
+        Args:
+            idempotency_ttl: Seconds a result is kept for its idempotency key.
+                Defaults to the IDEMPOTENCY_WINDOW_SECONDS env var or 300.
+            max_entries: Maximum number of stored idempotent results.
+        """
+        self.idempotency_ttl = (
+            idempotency_ttl
+            if idempotency_ttl is not None
+            else float(os.getenv("IDEMPOTENCY_WINDOW_SECONDS", "300"))
+        )
+        self.max_entries = max_entries
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._waiters: Dict[str, int] = {}
+        self._results: "OrderedDict[str, Tuple[float, str, Any]]" = OrderedDict()
+        self.stats = {"executed": 0, "coalesced": 0, "replayed": 0, "cancelled": 0}
+
+    def _get_stored(self, idempotency_key: str, key: str) -> Tuple[bool, Any]:
+        """Return (found, result) for an idempotency key, dropping expired entries."""
+        now = time.monotonic()
+        while self._results:
+            oldest_key, (expires, _, _) = next(iter(self._results.items()))
+            if expires > now:
+                break
+            self._results.pop(oldest_key)
+
+        stored = self._results.get(idempotency_key)
+        if stored is None:
+            return False, None
+        _, stored_key, result = stored
+        if stored_key != key:
+            raise IdempotencyKeyConflictError(
+                "Idempotency key was already used for a different request"
+            )
+        return True, result
+
+    def _store(self, idempotency_key: str, key: str, result: Any) -> None:
+        self._results[idempotency_key] = (time.monotonic() + self.idempotency_ttl, key, result)
+        self._results.move_to_end(idempotency_key)
+        while len(self._results) > self.max_entries:
+            self._results.popitem(last=False)
+
+    async def do(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[Any]],
+        idempotency_key: Optional[str] = None,
+    ) -> Any:
+        """Run ``fn`` once for all concurrent callers with the same key.
+
+        Args:
+            key: The coalescing key of the work.
+            fn: Coroutine function performing the work.
+            idempotency_key: Optional client-provided key; a successful result is
+                replayed for the same key within the idempotency window.
+
+        Returns:
+            Any: The result of the (possibly shared) work.
+
+        Raises:
+            IdempotencyKeyConflictError: If the idempotency key was used for a
+                request with a different coalescing key.
+        """
+        if idempotency_key:
+            found, result = self._get_stored(idempotency_key, key)
+            if found:
+                self.stats["replayed"] += 1
+                logger.info(f"Replaying stored result for idempotency key {idempotency_key}")
+                return result
+
+        future = self._in_flight.get(key)
+        if future is None:
+            self.stats["executed"] += 1
+            future = asyncio.ensure_future(fn())
+            self._in_flight[key] = future
+            self._waiters[key] = 0
+            future.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.stats["coalesced"] += 1
+            logger.info(f"Coalescing duplicate request {key[:12]} with the in-flight one")
+
+        # Shield the shared task so that one caller going away does not cancel
+        # the work for the others; it is cancelled once nobody waits for it
+        self._waiters[key] += 1
+        try:
+            result = await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if self._in_flight.get(key) is future:
+                self._waiters[key] -= 1
+                if self._waiters[key] == 0 and not future.done():
+                    self.stats["cancelled"] += 1
+                    logger.info(f"Cancelling request {key[:12]}: no caller is waiting for it")
+                    future.cancel()
+            raise
+        if idempotency_key:
+            self._store(idempotency_key, key, result)
+        return result
+
+    def _forget(self, key: str, future: asyncio.Future) -> None:
+        """Drop a finished task from the in-flight table."""
+        if self._in_flight.get(key) is future:
+            self._in_flight.pop(key)
+            self._waiters.pop(key, None)
+        if not future.cancelled():
+            # Mark the error as retrieved when every caller has gone away
+            future.exception()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return counters and the number of in-flight and stored entries."""
+        return {
+            **self.stats,
+            "in_flight": len(self._in_flight),
+            "stored_results": len(self._results),
+        }
+
+
+# Shared coalescer for the resume scoring and optimization endpoints
+request_flights = SingleFlight()
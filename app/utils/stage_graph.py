@@ -0,0 +1,340 @@
+"""Declarative execution of pipeline stages with explicit dependencies.
+
+A pipeline is a list of Stage objects, each naming the stages whose outputs it
+needs. StageGraph starts every stage as soon as its dependencies are done, so
+independent stages run concurrently and the end-to-end latency approaches the
+critical path of the graph. Every stage runs at most once per run and its
+output is shared by all of its dependents; stages that declare a cache key
+also share their output across runs through a StageCache.
+
+Each run produces a StageTrace with the timing of every stage and the
+critical path, i.e. the chain of dependencies that determined when the last
+stage finished. Every stage is also recorded as a span of the request's
+trace (app/utils/tracing.py).
+
+Runs honor the deadline of the current request (app/utils/request_context.py):
+no stage starts after the deadline, and optional stages are skipped when less
+than their min_budget is left.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from app.utils.request_context import current_context
+from app.utils.tracing import span
+
+logger = logging.getLogger(__name__)
+
+
+class Stage:
+    """A pipeline stage.
+
+    The stage function is called with the outputs of its dependencies as
+    keyword arguments named after the dependencies.
+
+    Attributes:
+        name: Unique name of the stage within its graph
+        fn: Coroutine function computing the stage's output
+        deps: Names of the stages whose outputs the stage needs
+        optional_deps: Names of stages the stage waits for and receives the
+            outputs of, None if they failed or were skipped; unlike deps,
+            their failure never skips the stage
+        cache_key: Optional function returning a key under which the output is
+            cached across runs; called with the same arguments as fn
+        optional: If True, a failure of the stage does not fail the run; the
+            stage's output is None, optional stages depending on it are
+            skipped and required ones receive None
+        min_budget: Seconds of request budget an optional stage needs; it is
+            skipped when less is left
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[..., Awaitable[Any]],
+        deps: Iterable[str] = (),
+        cache_key: Optional[Callable[..., Optional[str]]] = None,
+        optional: bool = False,
+        min_budget: float = 0.0,
+        optional_deps: Iterable[str] = (),
+    ):
+        """Initialize a stage; see the class attributes for the arguments."""
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.optional_deps = tuple(optional_deps)
+        self.cache_key = cache_key
+        self.optional = optional
+        self.min_budget = min_budget
+
+
+class StageTiming(BaseModel):
+    """Timing of one stage in a run, in seconds since the start of the run.
+
+    Attributes:
+        name: Name of the stage
+        status: "ok", "cached", "failed" or "skipped"
+        start: When the stage started running
+        end: When the stage finished
+        duration: Time spent in the stage itself
+        error: The error of a failed stage
+    """
+
+    name: str
+    status: str = "ok"
+    start: float = 0.0
+    end: float = 0.0
+    duration: float = 0.0
+    error: Optional[str] = None
+
+
+class StageTrace(BaseModel):
+    """Per-run trace of a stage graph.
+
+    Attributes:
+        pipeline: Name of the pipeline
+        total: End-to-end duration of the run in seconds
+        stages: Timing of every stage that started
+        critical_path: Stages on the longest dependency chain, in order
+    """
+
+    pipeline: str
+    total: float = 0.0
+    stages: Dict[str, StageTiming] = {}
+    critical_path: List[str] = []
+
+    def summary(self) -> str:
+        """Return a one-line description of the critical path."""
+        path = " -> ".join(
+            f"{name} {self.stages[name].duration * 1000:.0f}ms" for name in self.critical_path
+        )
+        return f"{self.pipeline} {self.total * 1000:.0f}ms, critical path: {path}"
+
+
+def make_cache_key(*parts: Any) -> str:
+    """Build a stage cache key from JSON-serializable parts.
+
+    Args:
+        *parts: The values that determine a stage's output.
+
+    Returns:
+        str: A hex SHA-256 digest of the parts.
+    """
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class StageCache:
+    """Bounded LRU cache of stage outputs with a time-to-live."""
+
+    def __init__(self, max_entries: Optional[int] = None, ttl: Optional[float] = None):
+        """Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of outputs kept. Defaults to the
+                STAGE_CACHE_SIZE env var or 256.
+            ttl: Seconds an output is kept. Defaults to the STAGE_CACHE_TTL env
+                var or 3600.
+        """
+        self.max_entries = (
+            max_entries if max_entries is not None else int(os.getenv("STAGE_CACHE_SIZE", "256"))
+        )
+        self.ttl = ttl if ttl is not None else float(os.getenv("STAGE_CACHE_TTL", "3600"))
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """Return (found, output) for a cache key."""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                self._entries.pop(key)
+            self.stats["misses"] += 1
+            return False, None
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return True, entry[1]
+
+    def set(self, key: str, value: Any) -> None:
+        """Store a stage output."""
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return hit and miss counters and the number of cached outputs."""
+        return {**self.stats, "entries": len(self._entries)}
+
+
+class StageGraph:
+    """Run a set of stages concurrently in dependency order."""
+
+    def __init__(self, name: str, stages: List[Stage], cache: Optional[StageCache] = None):
+        """Initialize and validate the graph.
+
+        Args:
+            name: Name of the pipeline, used in traces.
+            stages: The stages of the pipeline.
+            cache: Cache for the outputs of stages that declare a cache key.
+
+        Raises:
+            ValueError: If stage names repeat, a dependency is unknown or the
+                dependencies form a cycle.
+        """
+        self.name = name
+        self.cache = cache
+        self.stages: Dict[str, Stage] = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError(f"Duplicate stage: {stage.name}")
+            self.stages[stage.name] = stage
+        self.order = self._topological_order()
+
+    def _topological_order(self) -> List[str]:
+        order: List[str] = []
+        state: Dict[str, str] = {}
+
+        def visit(name: str, path: Tuple[str, ...]) -> None:
+            if state.get(name) == "done":
+                return
+            if state.get(name) == "visiting":
+                raise ValueError(f"Dependency cycle: {' -> '.join(path + (name,))}")
+            if name not in self.stages:
+                raise ValueError(f"Unknown stage {name} required by {path[-1]}")
+            state[name] = "visiting"
+            for dep in self.stages[name].deps + self.stages[name].optional_deps:
+                visit(dep, path + (name,))
+            state[name] = "done"
+            order.append(name)
+
+        for name in self.stages:
+            visit(name, ())
+        return order
+
+    async def run(self) -> Tuple[Dict[str, Any], StageTrace]:
+        """Run every stage once its dependencies have finished.
+
+        Returns:
+            Tuple[Dict[str, Any], StageTrace]: The output of every stage by name
+            (None for failed or skipped optional stages) and the run's trace.
+
+        Raises:
+            DeadlineExceededError: If the request deadline passes before a required
+                stage starts.
+            Exception: The error of the first required stage that failed. The
+                remaining stages are cancelled.
+        """
+        started = time.monotonic()
+        trace = StageTrace(pipeline=self.name)
+        outputs: Dict[str, Any] = {}
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_stage(stage: Stage) -> Any:
+            if stage.deps or stage.optional_deps:
+                await asyncio.gather(
+                    *(tasks[dep] for dep in stage.deps + stage.optional_deps)
+                )
+            with span(f"stage.{stage.name}", pipeline=self.name) as stage_span:
+                output = await execute_stage(stage)
+                if stage_span:
+                    timing = trace.stages[stage.name]
+                    stage_span.set(status=timing.status, cache_hit=timing.status == "cached")
+                    stage_span.error = timing.error
+            return output
+
+        async def execute_stage(stage: Stage) -> Any:
+            timing = StageTiming(name=stage.name, start=time.monotonic() - started)
+            trace.stages[stage.name] = timing
+
+            failed = [dep for dep in stage.deps if trace.stages[dep].status in ("failed", "skipped")]
+            context = current_context()
+            skip = None
+            if stage.optional and failed:
+                skip = f"stage {failed[0]} did not complete"
+            elif stage.optional and not context.has_budget(stage.min_budget):
+                skip = f"only {context.remaining():.1f}s of the request budget is left"
+            if skip:
+                logger.info(f"Skipping optional stage {stage.name} of {self.name}: {skip}")
+                timing.status = "skipped"
+                timing.end = timing.start
+                outputs[stage.name] = None
+                return None
+            context.check()
+
+            kwargs = {dep: outputs[dep] for dep in stage.deps + stage.optional_deps}
+            key = stage.cache_key(**kwargs) if stage.cache_key and self.cache else None
+            try:
+                if key is not None:
+                    found, output = self.cache.get(key)
+                    if found:
+                        timing.status = "cached"
+                        outputs[stage.name] = output
+                        return output
+                output = await stage.fn(**kwargs)
+                if key is not None:
+                    self.cache.set(key, output)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                timing.status = "failed"
+                timing.error = str(e)
+                if not stage.optional:
+                    raise
+                logger.warning(f"Optional stage {stage.name} of {self.name} failed: {str(e)}")
+                output = None
+            finally:
+                timing.end = time.monotonic() - started
+                timing.duration = timing.end - timing.start
+
+            outputs[stage.name] = output
+            return output
+
+        # Dependencies come first in topological order, so every task a stage
+        # waits for exists before the stage is scheduled
+        for name in self.order:
+            tasks[name] = asyncio.ensure_future(run_stage(self.stages[name]))
+
+        try:
+            await asyncio.gather(*tasks.values())
+        finally:
+            for task in tasks.values():
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    # Retrieve errors of dependents that re-raised the failure
+                    task.exception()
+            trace.total = time.monotonic() - started
+            trace.critical_path = self._critical_path(trace)
+
+        return outputs, trace
+
+    def _critical_path(self, trace: StageTrace) -> List[str]:
+        """Walk back from the last stage to finish through its latest dependency."""
+        if not trace.stages:
+            return []
+        path = []
+        current = max(trace.stages.values(), key=lambda timing: timing.end).name
+        while current is not None:
+            path.append(current)
+            stage = self.stages[current]
+            deps = [dep for dep in stage.deps + stage.optional_deps if dep in trace.stages]
+            current = max(deps, key=lambda dep: trace.stages[dep].end) if deps else None
+        return list(reversed(path))
+
+
+# Outputs of cacheable stages shared across requests
+stage_cache = StageCache()
+
+# Traces of the most recent pipeline runs
+recent_traces: "deque[StageTrace]" = deque(maxlen=50)
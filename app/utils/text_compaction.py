@@ -0,0 +1,306 @@
+"""Token-budgeted compaction of prompt inputs.
+
+Resume text extracted with PyPDF2 or OCR carries a lot of noise: runs of
+whitespace, headers and footers repeated on every page, page numbers and lines
+made only of symbols. This module normalizes such text before it is sent to the
+LLM and enforces a per-prompt token budget, truncating the least important
+sections first when the text does not fit.
+
+Token counts use tiktoken. When no tiktoken encoding is available (for example
+when the encoding files cannot be downloaded), a character-based estimate is
+used instead.
+"""
+
+import logging
+import os
+import re
+from collections import Counter
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+# Default token budget for the variable input of each prompt. A budget of 0
+# disables truncation. Override with TOKEN_BUDGET_<PROMPT_NAME>, for example
+# TOKEN_BUDGET_RESUME_ANALYSIS=3000. The resume given to the optimizer has no
+# budget: it is rewritten section by section, so nothing may be cut from it.
+DEFAULT_TOKEN_BUDGETS = {
+    "resume_analysis": 4000,
+    "job_analysis": 2500,
+}
+
+# Average characters per token used when tiktoken is unavailable
+CHARS_PER_TOKEN = 4
+
+# Section headings ordered by how much they matter to resume scoring and
+# optimization. Sections are truncated starting from the highest number.
+SECTION_PRIORITIES = [
+    (0, ("summary", "profile", "objective", "about me")),
+    (0, ("requirements", "qualifications", "skills", "competencies", "must have")),
+    (1, ("experience", "employment", "work history", "responsibilities", "what you will do", "what you'll do")),
+    (2, ("projects", "education", "certifications", "certificates", "preferred", "nice to have")),
+    (4, ("interests", "hobbies", "references", "benefits", "perks", "about us", "about the company", "equal opportunity")),
+]
+DEFAULT_SECTION_PRIORITY = 3
+
+PAGE_NUMBER_PATTERN = re.compile(
+    r"^(page\s*)?[-–—(\[]?\s*\d{1,3}\s*((of|/)\s*\d{1,3})?\s*[-–—)\]]?$", re.IGNORECASE
+)
+
+
+class CompactionResult(BaseModel):
+    """Result of compacting a prompt input.
+
+    Attributes:
+        text: The compacted text
+        tokens_before: Token count of the original text
+        tokens_after: Token count of the compacted text
+        truncated: Whether sections were cut to fit the token budget
+    """
+
+    text: str
+    tokens_before: int
+    tokens_after: int
+    truncated: bool = False
+
+
+@lru_cache(maxsize=16)
+def _get_encoding(model_name: Optional[str]):
+    """Return the tiktoken encoding for a model, or None if unavailable."""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+
+    try:
+        return tiktoken.encoding_for_model(model_name or "")
+    except Exception:
+        pass
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"tiktoken encoding unavailable, estimating token counts: {e}")
+        return None
+
+
+def count_tokens(text: str, model_name: Optional[str] = None) -> int:
+    """Count the tokens of a text for the given model.
+
+    Args:
+        text: The text to measure.
+        model_name: Name of the model the text is sent to.
+
+    Returns:
+        int: The number of tokens, estimated if no encoding is available.
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding(model_name)
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def get_token_budget(prompt_name: str) -> int:
+    """Return the configured token budget for a prompt's input.
+
+    Args:
+        prompt_name: Name of the prompt, e.g. "resume_analysis".
+
+    Returns:
+        int: The token budget, 0 meaning unlimited.
+    """
+    env_value = os.getenv(f"TOKEN_BUDGET_{prompt_name.upper()}")
+    if env_value:
+        try:
+            return max(int(env_value), 0)
+        except ValueError:
+            logger.warning(f"Ignoring invalid TOKEN_BUDGET_{prompt_name.upper()}={env_value!r}")
+    return DEFAULT_TOKEN_BUDGETS.get(prompt_name, 0)
+
+
+def _is_artifact_line(line: str) -> bool:
+    """Return True for page numbers and lines made only of symbols."""
+    if PAGE_NUMBER_PATTERN.match(line):
+        return True
+    return not any(char.isalnum() for char in line)
+
+
+def _page_edges(page: List[str]) -> List[int]:
+    """Return the indexes of the first and last content lines of a page."""
+    content = [index for index, line in enumerate(page) if line and not _is_artifact_line(line)]
+    return sorted({content[0], content[-1]}) if content else []
+
+
+def normalize_text(text: str) -> str:
+    """Normalize whitespace and strip page furniture and artifact lines.
+
+    Runs of spaces and tabs are collapsed, page numbers and symbol-only lines are
+    removed and consecutive blank lines are collapsed. Pages are separated by
+    form feeds; a line that is the first or last line of two or more pages is a
+    running header or footer and is kept only on the first of them. Lines
+    repeated anywhere else, such as a job title held at several employers, are
+    resume content and are always kept.
+
+    Args:
+        text: The raw extracted text.
+
+    Returns:
+        str: The normalized text.
+    """
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    pages = [
+        [re.sub(r"[ \t ]+", " ", line).strip() for line in page.split("\n")]
+        for page in text.split("\f")
+    ]
+
+    edges = [_page_edges(page) for page in pages]
+    # Number of pages each line starts or ends
+    edge_counts = Counter(
+        key
+        for page, page_edges in zip(pages, edges)
+        for key in {page[index].lower() for index in page_edges}
+    )
+    seen_edges = set()
+    compacted = []
+    for page, page_edges in zip(pages, edges):
+        for index, line in enumerate(page):
+            if not line:
+                if compacted and compacted[-1]:
+                    compacted.append("")
+                continue
+            if _is_artifact_line(line):
+                continue
+            key = line.lower()
+            if index in page_edges and edge_counts[key] >= 2:
+                if key in seen_edges:
+                    continue
+                seen_edges.add(key)
+            compacted.append(line)
+        if compacted and compacted[-1]:
+            compacted.append("")
+
+    return "\n".join(compacted).strip()
+
+
+def _section_priority(heading: str) -> int:
+    """Return the truncation priority of a section from its heading."""
+    heading = heading.lower()
+    for priority, keywords in SECTION_PRIORITIES:
+        if any(keyword in heading for keyword in keywords):
+            return priority
+    return DEFAULT_SECTION_PRIORITY
+
+
+def _is_heading(line: str) -> bool:
+    """Return True if a line looks like a section heading."""
+    stripped = line.strip().rstrip(":")
+    if not stripped or len(stripped) > 40 or len(stripped.split()) > 5:
+        return False
+    if stripped.isupper() and any(char.isalpha() for char in stripped):
+        return True
+    return line.strip().endswith(":") or _section_priority(stripped) != DEFAULT_SECTION_PRIORITY
+
+
+def split_sections(text: str) -> List[Tuple[str, List[str]]]:
+    """Split text into sections at heading-like lines.
+
+    Args:
+        text: Normalized text.
+
+    Returns:
+        List[Tuple[str, List[str]]]: (heading, lines) pairs in document order. The
+        first section holds the lines before any heading and has an empty heading.
+    """
+    sections: List[Tuple[str, List[str]]] = [("", [])]
+    for line in text.split("\n"):
+        if _is_heading(line):
+            sections.append((line.strip(), [line]))
+        else:
+            sections[-1][1].append(line)
+    return [section for section in sections if section[1]]
+
+
+def truncate_to_budget(text: str, max_tokens: int, model_name: Optional[str] = None) -> str:
+    """Truncate text to a token budget, dropping the least important sections first.
+
+    The untitled leading section (usually the candidate's header) is kept first,
+    then sections are kept in priority order. The section that no longer fits is
+    cut at a line boundary. Kept sections are emitted in their original order.
+
+    Args:
+        text: Normalized text.
+        max_tokens: The token budget.
+        model_name: Name of the model the text is sent to.
+
+    Returns:
+        str: Text that fits in the budget.
+    """
+    sections = split_sections(text)
+    order = sorted(
+        range(len(sections)),
+        key=lambda i: (-1 if not sections[i][0] else _section_priority(sections[i][0]), i),
+    )
+
+    remaining = max_tokens
+    kept = {}
+    for index in order:
+        if remaining <= 0:
+            break
+        lines = sections[index][1]
+        section_tokens = count_tokens("\n".join(lines), model_name) + 1
+        if section_tokens <= remaining:
+            kept[index] = lines
+            remaining -= section_tokens
+            continue
+        partial = []
+        for line in lines:
+            line_tokens = count_tokens(line, model_name) + 1
+            if line_tokens > remaining:
+                break
+            partial.append(line)
+            remaining -= line_tokens
+        if partial:
+            kept[index] = partial
+
+    return "\n".join("\n".join(kept[index]) for index in sorted(kept)).strip()
+
+
+def compact_text(
+    text: str,
+    max_tokens: Optional[int] = None,
+    model_name: Optional[str] = None,
+) -> CompactionResult:
+    """Normalize a prompt input and fit it into a token budget.
+
+    Args:
+        text: The raw input text.
+        max_tokens: The token budget. None or 0 disables truncation.
+        model_name: Name of the model the text is sent to.
+
+    Returns:
+        CompactionResult: The compacted text and token counts before and after.
+    """
+    text = text or ""
+    tokens_before = count_tokens(text, model_name)
+    compacted = normalize_text(text)
+
+    truncated = False
+    if max_tokens and count_tokens(compacted, model_name) > max_tokens:
+        compacted = truncate_to_budget(compacted, max_tokens, model_name)
+        truncated = True
+
+    result = CompactionResult(
+        text=compacted,
+        tokens_before=tokens_before,
+        tokens_after=count_tokens(compacted, model_name),
+        truncated=truncated,
+    )
+    if result.tokens_before:
+        logger.info(
+            f"Compacted prompt input: {result.tokens_before} -> {result.tokens_after} tokens"
+            + (" (truncated)" if truncated else "")
+        )
+    return result
@@ -7,25 +7,38 @@ monitoring, usage optimization, and analytics.
 
 import json
 import logging
+import os
 import time
-import uuid
+from collections import deque
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Union
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
 
 from langchain_core.callbacks import BaseCallbackHandler
 from langchain_openai import ChatOpenAI
 
 from app.database.models.token_usage import TokenUsage, TokenUsageSummary
 from app.database.repositories.token_usage_repository import TokenUsageRepository
+from app.database.repositories.token_usage_rollup_repository import (
+    TokenUsageRollupRepository,
+)
+from app.services.ai.token_budget import token_budgets
+from app.utils.tracing import current_request_id, current_span
+from app.utils.usage_writer import usage_writer
 
 # Configure logger
 logger = logging.getLogger(__name__)
 
 
-# Define pricing constants for different OpenAI models (price per 1M tokens)
+# Define pricing constants for different OpenAI models (price per 1M tokens).
+# "cached_input" is the discounted price of prompt tokens served from the
+# provider's prompt cache; models without it bill cached tokens as input.
 MODEL_PRICING = {
     # GPT-4o models
     "chatgpt-4o-latest": {"input": 5.00, "output": 15.00},
+    "gpt-4o": {"input": 2.50, "cached_input": 1.25, "output": 10.00},
+    "gpt-4o-2024-08-06": {"input": 2.50, "cached_input": 1.25, "output": 10.00},
+    "gpt-4o-mini": {"input": 0.15, "cached_input": 0.075, "output": 0.60},
+    "gpt-4o-mini-2024-07-18": {"input": 0.15, "cached_input": 0.075, "output": 0.60},
 
     # GPT-4 Turbo models
     "gpt-4-turbo": {"input": 10.00, "output": 30.00},
@@ -69,7 +82,9 @@ class TokenUsageCallback(BaseCallbackHandler):
     """LangChain callback handler for tracking token usage.
 
     This callback handler captures token usage data from LangChain's
-    LLM interactions and logs it for analysis and cost tracking.
+    LLM interactions and logs it for analysis and cost tracking. The latency,
+    tokens and cost of each call are also added to the current tracing span,
+    and records are correlated with the request being served.
     """
 
     def __init__(
@@ -84,87 +99,164 @@ class TokenUsageCallback(BaseCallbackHandler):
         Args:
             feature: The feature or component using the LLM (e.g., "resume_optimization")
             user_id: Optional ID of the user who triggered the request
-            request_id: Optional request ID for correlation
+            request_id: Optional request ID for correlation. Defaults to the ID
+                of the request each call is made for.
             metadata: Additional context about the request
         """
         super().__init__()
         self.feature = feature
         self.user_id = user_id
-        self.request_id = request_id or str(uuid.uuid4())
+        self.request_id = request_id
         self.metadata = metadata or {}
         self.start_time = time.time()
-        self.tokens = {"prompt": 0, "completion": 0, "total": 0}
+        # Start time and model of each concurrent call by LangChain run ID;
+        # the section-parallel and hedged calls of one LLM share this handler
+        self._started: Dict[Any, Tuple[float, Optional[str]]] = {}
+        # Model recorded for calls whose start did not report one
         self.model_name = "unknown"
-        self.status = "success"
 
     def on_llm_start(self, serialized, prompts, **kwargs):
         """Called when LLM starts processing."""
+        self._start(**kwargs)
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        """Called when a chat model starts processing."""
+        self._start(**kwargs)
+
+    def _start(self, **kwargs) -> None:
         self.start_time = time.time()
-        if "model_name" in kwargs.get("invocation_params", {}):
-            self.model_name = kwargs["invocation_params"]["model_name"]
+        model_name = kwargs.get("invocation_params", {}).get("model_name")
+        self._started[kwargs.get("run_id")] = (time.perf_counter(), model_name)
 
     def on_llm_end(self, response, **kwargs):
         """Called when LLM finishes processing."""
-        token_usage = getattr(response, "llm_output", {}).get("token_usage", {})
-
-        # Extract token counts
-        self.tokens["prompt"] = token_usage.get("prompt_tokens", 0)
-        self.tokens["completion"] = token_usage.get("completion_tokens", 0)
-        self.tokens["total"] = token_usage.get("total_tokens", 0)
-
-        # Make sure model name is captured
-        if not self.model_name or self.model_name == "unknown":
-            self.model_name = getattr(response, "model_name", "unknown")
+        started, model_name = self._started.pop(kwargs.get("run_id"), (None, None))
+        latency_ms = round((time.perf_counter() - started) * 1000, 2) if started else None
+        llm_output = getattr(response, "llm_output", None) or {}
+        token_usage = llm_output.get("token_usage", {})
+
+        # Token counts and model of this call only; other calls sharing the
+        # handler may finish concurrently in other threads
+        tokens = {
+            "prompt": token_usage.get("prompt_tokens", 0),
+            "completion": token_usage.get("completion_tokens", 0),
+            "total": token_usage.get("total_tokens", 0),
+            "cached_prompt": self._get_cached_prompt_tokens(response, token_usage),
+        }
+        if not model_name:
+            model_name = (
+                self.model_name
+                if self.model_name != "unknown"
+                else llm_output.get("model_name") or getattr(response, "model_name", "unknown")
+            )
 
         # Calculate cost
-        cost = self._calculate_cost()
-
-        # Create a TokenUsage record directly
+        cost = self._calculate_cost(model_name, tokens)
+        request_id = self.request_id or current_request_id()
+
+        call_span = current_span()
+        if call_span:
+            call_span.set(
+                llm_model=model_name,
+                llm_stage=self.metadata.get("stage"),
+                feature=self.feature,
+                llm_latency_ms=latency_ms,
+            )
+            call_span.add(
+                prompt_tokens=tokens["prompt"],
+                cached_prompt_tokens=tokens["cached_prompt"],
+                completion_tokens=tokens["completion"],
+                cost_usd=cost,
+            )
+
+        # Create a TokenUsage record directly; on_llm_end is only called for
+        # calls that succeeded
         token_usage = TokenUsage(
             endpoint="langchain_llm",
-            llm_model=self.model_name,
-            prompt_tokens=self.tokens["prompt"],
-            completion_tokens=self.tokens["completion"],
-            total_tokens=self.tokens["total"],
-            request_id=self.request_id,
+            llm_model=model_name,
+            prompt_tokens=tokens["prompt"],
+            completion_tokens=tokens["completion"],
+            total_tokens=tokens["total"],
+            cached_prompt_tokens=tokens["cached_prompt"],
+            request_id=request_id,
             user_id=self.user_id,
             feature=self.feature,
-            status=self.status,
+            status="success",
             cost_usd=cost,
-            metadata=self.metadata
+            metadata={**self.metadata, "latency_ms": latency_ms}
         )
 
-        # Store the usage record in memory (we can't use async here)
-        TokenTracker._token_usage_records.append(token_usage)
+        # Keep the record in memory and queue it for the batched database
+        # writer; neither does any I/O on the LLM call path
+        TokenTracker._record(token_usage)
+        token_budgets.record(self.user_id, self.feature, tokens["total"])
 
         # Log the usage for monitoring
         logger.info(
-            f"Token usage: {self.model_name} | {self.feature} | "
-            f"Tokens: {self.tokens['total']} | Cost: ${cost:.6f}"
+            f"Token usage: {model_name} | {self.feature} | "
+            f"Tokens: {tokens['total']} (cached: {tokens['cached_prompt']}) | "
+            f"Cost: ${cost:.6f}"
         )
 
+    @staticmethod
+    def _get_cached_prompt_tokens(response, token_usage: dict) -> int:
+        """Extract the number of prompt tokens served from the provider's cache.
+
+        OpenAI-compatible APIs report them in prompt_tokens_details.cached_tokens;
+        LangChain also exposes them as cache_read in the message usage metadata.
+
+        Args:
+            response: The LLMResult passed to on_llm_end
+            token_usage: The token_usage dict from the response's llm_output
+
+        Returns:
+            int: The number of cached prompt tokens, 0 if not reported
+        """
+        details = token_usage.get("prompt_tokens_details") or {}
+        cached = details.get("cached_tokens") or 0
+        if cached:
+            return cached
+
+        for generations in getattr(response, "generations", None) or []:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                cached += (usage.get("input_token_details") or {}).get("cache_read") or 0
+        return cached
+
     def on_llm_error(self, error, **kwargs):
         """Called when LLM encounters an error."""
-        self.status = "error"
+        self._started.pop(kwargs.get("run_id"), None)
 
-    def _calculate_cost(self) -> float:
-        """Calculate the estimated cost based on token usage and model.
+    @staticmethod
+    def _calculate_cost(model_name: str, tokens: Dict[str, int]) -> float:
+        """Calculate the estimated cost of one call based on its token usage and model.
 
         This method converts the pricing from per 1M tokens to per token
         and then calculates the cost based on actual token usage.
 
+        Args:
+            model_name: The model that served the call
+            tokens: The call's "prompt", "cached_prompt" and "completion" token counts
+
         Returns:
             float: The calculated cost in USD
         """
-        model_prices = MODEL_PRICING.get(self.model_name, MODEL_PRICING["default"])
+        model_prices = MODEL_PRICING.get(model_name, MODEL_PRICING["default"])
 
         # Convert from price per 1M tokens to price per token
         input_price_per_token = model_prices["input"] / 1_000_000
+        cached_input_price_per_token = (
+            model_prices.get("cached_input", model_prices["input"]) / 1_000_000
+        )
         output_price_per_token = model_prices["output"] / 1_000_000
 
-        # Calculate cost in USD
-        prompt_cost = self.tokens["prompt"] * input_price_per_token
-        completion_cost = self.tokens["completion"] * output_price_per_token
+        # Calculate cost in USD, billing cached prompt tokens at the cached rate
+        cached_prompt_tokens = min(tokens["cached_prompt"], tokens["prompt"])
+        prompt_cost = (
+            (tokens["prompt"] - cached_prompt_tokens) * input_price_per_token
+            + cached_prompt_tokens * cached_input_price_per_token
+        )
+        completion_cost = tokens["completion"] * output_price_per_token
 
         return prompt_cost + completion_cost
 
@@ -176,12 +268,25 @@ class TokenTracker:
     OpenAI API calls, calculate costs, and generate usage reports.
     """
 
-    # In-memory store for token usage data as a fallback
-    _token_usage_records: List[TokenUsage] = []
+    # In-memory store of the most recent token usage records, used as a
+    # fallback when the database is unavailable
+    _token_usage_records: "deque[TokenUsage]" = deque(
+        maxlen=int(os.getenv("USAGE_MEMORY_RECORDS", "10000"))
+    )
 
     # Flag to indicate whether to use the database repository
     _use_database: bool = True
 
+    # Set once the usage rollups have been backfilled, so summaries read them
+    _rollups_complete: bool = False
+
+    @classmethod
+    def _record(cls, token_usage: TokenUsage) -> None:
+        """Store a usage record in memory and queue it for the database writer."""
+        cls._token_usage_records.append(token_usage)
+        if cls._use_database:
+            usage_writer.submit(token_usage)
+
     @classmethod
     def create_langchain_callback(
         cls,
@@ -219,6 +324,7 @@ class TokenTracker:
         user_id: Optional[str] = None,
         request_id: Optional[str] = None,
         metadata: Optional[dict] = None,
+        extra_callbacks: Optional[list] = None,
         **kwargs
     ) -> ChatOpenAI:
         """Create a LangChain ChatOpenAI instance with token tracking.
@@ -235,6 +341,7 @@ class TokenTracker:
             user_id: Optional user ID
             request_id: Optional request correlation ID
             metadata: Additional context
+            extra_callbacks: Additional callback handlers to attach
             **kwargs: Additional arguments to pass to ChatOpenAI
 
         Returns:
@@ -254,7 +361,7 @@ class TokenTracker:
             temperature=temperature,
             openai_api_key=api_key,
             openai_api_base=api_base,
-            callbacks=[callback],
+            callbacks=[callback, *(extra_callbacks or [])],
             **kwargs
         )
 
@@ -271,7 +378,8 @@ class TokenTracker:
         user_id: Optional[str] = None,
         request_id: Optional[str] = None,
         status: str = "success",
-        metadata: Optional[dict] = None
+        metadata: Optional[dict] = None,
+        cached_prompt_tokens: int = 0
     ) -> None:
         """Log token usage from an API call.
 
@@ -284,9 +392,11 @@ class TokenTracker:
             feature: The feature or component using the API
             cost_usd: Estimated cost in USD
             user_id: Optional ID of the user who triggered the request
-            request_id: Optional request ID for correlation
+            request_id: Optional request ID for correlation. Defaults to the ID
+                of the current request.
             status: Success or error status
             metadata: Additional context about the request
+            cached_prompt_tokens: Prompt tokens served from the provider's cache
         """
         # Create a TokenUsage record
         token_usage = TokenUsage(
@@ -295,7 +405,8 @@ class TokenTracker:
             prompt_tokens=prompt_tokens,
             completion_tokens=completion_tokens,
             total_tokens=total_tokens,
-            request_id=request_id,
+            cached_prompt_tokens=cached_prompt_tokens,
+            request_id=request_id or current_request_id(),
             user_id=user_id,
             feature=feature,
             status=status,
@@ -303,21 +414,8 @@ class TokenTracker:
             metadata=metadata
         )
 
-        # Store the usage record in the database if enabled
-        if cls._use_database:
-            try:
-                # Create a repository instance
-                repo = TokenUsageRepository()
-
-                # Save to database
-                await repo.create_token_usage(token_usage)
-            except Exception as e:
-                # Log the error but continue with in-memory storage as fallback
-                logger.error(f"Failed to save token usage to database: {str(e)}")
-                cls._token_usage_records.append(token_usage)
-        else:
-            # Use in-memory storage
-            cls._token_usage_records.append(token_usage)
+        # Queue the record for the batched database writer
+        cls._record(token_usage)
 
         # Log the usage for monitoring
         logger.info(
@@ -345,10 +443,14 @@ class TokenTracker:
         # Use the database repository if enabled
         if cls._use_database:
             try:
-                # Create a repository instance
-                repo = TokenUsageRepository()
+                # Read the hourly/daily rollups once they cover every record,
+                # otherwise aggregate the raw records
+                rollups = TokenUsageRollupRepository()
+                if cls._rollups_complete or await rollups.is_complete():
+                    cls._rollups_complete = True
+                    return await rollups.get_usage_summary(days, feature, user_id)
 
-                # Get summary from database
+                repo = TokenUsageRepository()
                 return await repo.get_token_usage_summary(days, feature, user_id)
             except Exception as e:
                 # Log the error but continue with in-memory fallback
@@ -370,6 +472,7 @@ class TokenTracker:
         # Initialize counters
         total_api_calls = len(filtered_records)
         total_prompt_tokens = sum(r.prompt_tokens for r in filtered_records)
+        total_cached_prompt_tokens = sum(r.cached_prompt_tokens for r in filtered_records)
         total_completion_tokens = sum(r.completion_tokens for r in filtered_records)
         total_tokens = sum(r.total_tokens for r in filtered_records)
         total_cost_usd = sum(r.cost_usd for r in filtered_records)
@@ -384,6 +487,7 @@ class TokenTracker:
                 usage_by_model[record.llm_model] = {
                     "calls": 0,
                     "prompt_tokens": 0,
+                    "cached_prompt_tokens": 0,
                     "completion_tokens": 0,
                     "total_tokens": 0,
                     "cost_usd": 0.0
@@ -391,6 +495,7 @@ class TokenTracker:
 
             usage_by_model[record.llm_model]["calls"] += 1
             usage_by_model[record.llm_model]["prompt_tokens"] += record.prompt_tokens
+            usage_by_model[record.llm_model]["cached_prompt_tokens"] += record.cached_prompt_tokens
             usage_by_model[record.llm_model]["completion_tokens"] += record.completion_tokens
             usage_by_model[record.llm_model]["total_tokens"] += record.total_tokens
             usage_by_model[record.llm_model]["cost_usd"] += record.cost_usd
@@ -415,6 +520,7 @@ class TokenTracker:
         return TokenUsageSummary(
             total_api_calls=total_api_calls,
             total_prompt_tokens=total_prompt_tokens,
+            total_cached_prompt_tokens=total_cached_prompt_tokens,
             total_completion_tokens=total_completion_tokens,
             total_tokens=total_tokens,
             total_cost_usd=total_cost_usd,
@@ -440,8 +546,10 @@ class TokenTracker:
                 # Create a repository instance
                 repo = TokenUsageRepository()
 
-                # Get all records from database
-                all_records = await repo.find({})
+                # Get all records from database, flattened from the storage layout
+                all_records = [
+                    record async for batch in repo.iter_token_usages() for record in batch
+                ]
 
                 # Convert to dictionaries
                 records = []
@@ -479,6 +587,61 @@ class TokenTracker:
         else:
             return records
 
+    @classmethod
+    async def iter_usage_records(
+        cls,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        feature: Optional[str] = None,
+        user_id: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+        batch_size: int = 1000,
+    ) -> AsyncIterator[List[Dict]]:
+        """Iterate over token usage records in batches, for streaming exports.
+
+        Args:
+            start: Earliest timestamp included (optional)
+            end: Timestamp before which records are included (optional)
+            feature: Filter by specific feature (optional)
+            user_id: Filter by specific user (optional)
+            fields: Fields returned; all fields if None
+            batch_size: Records per batch
+
+        Yields:
+            Batches of records as dictionaries
+        """
+        # Use the database repository if enabled
+        if cls._use_database:
+            started = False
+            try:
+                repo = TokenUsageRepository()
+                async for batch in repo.iter_token_usages(
+                    start, end, feature, user_id, fields, batch_size
+                ):
+                    started = True
+                    yield batch
+                return
+            except Exception as e:
+                # Once records were sent, falling back would duplicate them
+                if started:
+                    raise
+                logger.error(f"Failed to export token usage data from database: {str(e)}")
+                # Fall through to in-memory implementation
+
+        # In-memory fallback implementation
+        records = [
+            r for r in list(cls._token_usage_records)
+            if (start is None or r.timestamp >= start) and
+            (end is None or r.timestamp < end) and
+            (feature is None or r.feature == feature) and
+            (user_id is None or r.user_id == user_id)
+        ]
+        for offset in range(0, len(records), batch_size):
+            yield [
+                record.model_dump(include=set(fields) if fields else None)
+                for record in records[offset:offset + batch_size]
+            ]
+
     @classmethod
     def clear_usage_data(cls) -> None:
         """Clear all stored token usage data.
@@ -487,4 +650,4 @@ class TokenTracker:
         In a production environment, this would typically be handled by
         database retention policies.
         """
-        cls._token_usage_records = []
\ No newline at end of file
+        cls._token_usage_records = deque(maxlen=int(os.getenv("USAGE_MEMORY_RECORDS", "10000")))
\ No newline at end of file
@@ -0,0 +1,310 @@
+"""Per-request tracing spans.
+
+Every API request gets a trace identified by its request ID, taken from the
+X-Request-ID header or generated. Work done on behalf of the request opens
+spans with ``span(name, **attributes)``: pipeline stages, LLM calls (with
+queue wait, tokens, cost and the model stage), database operations, LaTeX
+rendering, pdflatex and OCR. Spans nest through a context variable, so spans
+opened in tasks spawned for the request (pipeline stages, hedged calls)
+attach to the span that spawned them.
+
+Finished traces are kept in a bounded in-memory store and can be exported in
+the OpenTelemetry (OTLP/JSON) trace format, so they load into Jaeger, Tempo or
+any other OTLP-compatible viewer.
+
+Configured with TRACING_ENABLED and TRACE_BUFFER_SIZE.
+"""
+
+import logging
+import os
+import secrets
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "myresumo"
+
+
+class Span:
+    """A timed operation within a trace.
+
+    Attributes:
+        name: Name of the operation, e.g. "stage.job_info" or "llm.call"
+        trace_id: 32 hex digit ID of the trace the span belongs to
+        span_id: 16 hex digit ID of the span
+        parent_id: ID of the enclosing span, None for the root span
+        start_ns: Start time in nanoseconds since the epoch
+        end_ns: End time in nanoseconds since the epoch, None while running
+        attributes: Attributes of the operation
+        error: The error the operation failed with, if any
+    """
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None, **attributes: Any):
+        """Start a span; see the class attributes for the arguments."""
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self._started = time.perf_counter()
+        self.end_ns: Optional[int] = None
+        self.duration = 0.0
+        self.attributes: Dict[str, Any] = {k: v for k, v in attributes.items() if v is not None}
+        self.error: Optional[str] = None
+
+    def set(self, **attributes: Any) -> None:
+        """Set attributes of the span, ignoring None values."""
+        self.attributes.update({k: v for k, v in attributes.items() if v is not None})
+
+    def add(self, **amounts: float) -> None:
+        """Add to numeric attributes of the span, e.g. tokens over several calls."""
+        for key, amount in amounts.items():
+            self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        """End the span."""
+        self.duration = time.perf_counter() - self._started
+        self.end_ns = self.start_ns + int(self.duration * 1e9)
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the span as a plain dict with its duration in milliseconds."""
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "duration_ms": round(self.duration * 1000, 2),
+            "attributes": dict(self.attributes),
+            "error": self.error,
+        }
+
+
+class Trace:
+    """The spans recorded for one request."""
+
+    def __init__(self, request_id: str, name: str, **attributes: Any):
+        """Start a trace and its root span.
+
+        Args:
+            request_id: ID correlating the trace with logs and token usage.
+            name: Name of the root span, e.g. "POST /api/resume/{resume_id}/optimize".
+            **attributes: Attributes of the root span.
+        """
+        self.request_id = request_id
+        self.trace_id = uuid.uuid4().hex
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+        self.root = self.start_span(name, None, request_id=request_id, **attributes)
+
+    def start_span(self, name: str, parent_id: Optional[str], **attributes: Any) -> Span:
+        """Start a span in this trace."""
+        span = Span(name, self.trace_id, parent_id, **attributes)
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    def summary(self) -> Dict[str, Any]:
+        """Return the request ID, root span name, duration and span count."""
+        return {
+            "request_id": self.request_id,
+            "trace_id": self.trace_id,
+            "name": self.root.name,
+            "start_ns": self.root.start_ns,
+            "duration_ms": round(self.root.duration * 1000, 2),
+            "spans": len(self.spans),
+            "status": self.root.attributes.get("http_status_code"),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the trace with all of its spans as plain dicts."""
+        return {**self.summary(), "spans": [span.to_dict() for span in self.spans]}
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """Return the trace in the OTLP/JSON ``ExportTraceServiceRequest`` format."""
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": _otlp_attributes({"service.name": SERVICE_NAME})},
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": __name__},
+                            "spans": [_otlp_span(span) for span in self.spans if span.end_ns is not None],
+                        }
+                    ],
+                }
+            ]
+        }
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_otlp_value(item) for item in value]}}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items()]
+
+
+def _otlp_span(span: Span) -> Dict[str, Any]:
+    otlp = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        # SPAN_KIND_SERVER for the request, SPAN_KIND_INTERNAL otherwise
+        "kind": 2 if span.parent_id is None else 1,
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": _otlp_attributes(span.attributes),
+        # STATUS_CODE_ERROR or STATUS_CODE_UNSET
+        "status": {"code": 2, "message": span.error} if span.error else {"code": 0},
+    }
+    if span.parent_id:
+        otlp["parentSpanId"] = span.parent_id
+    return otlp
+
+
+class TraceStore:
+    """Bounded store of the most recent finished traces, by request ID."""
+
+    def __init__(self, max_traces: Optional[int] = None):
+        """Initialize the store.
+
+        Args:
+            max_traces: Number of traces kept. Defaults to the TRACE_BUFFER_SIZE
+                env var or 200.
+        """
+        self.max_traces = (
+            max_traces if max_traces is not None else int(os.getenv("TRACE_BUFFER_SIZE", "200"))
+        )
+        self._traces: "OrderedDict[str, Trace]" = OrderedDict()
+
+    def add(self, trace: Trace) -> None:
+        """Store a finished trace, evicting the oldest beyond the limit."""
+        if self.max_traces <= 0:
+            return
+        self._traces[trace.request_id] = trace
+        self._traces.move_to_end(trace.request_id)
+        while len(self._traces) > self.max_traces:
+            self._traces.popitem(last=False)
+
+    def get(self, request_id: str) -> Optional[Trace]:
+        """Return the trace of a request, if it is still stored."""
+        return self._traces.get(request_id)
+
+    def list(self, limit: int = 50) -> List[Trace]:
+        """Return the most recent traces, newest first."""
+        return list(reversed(self._traces.values()))[:limit]
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("span", default=None)
+_current_request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+
+def tracing_enabled() -> bool:
+    """Return True unless tracing is disabled with TRACING_ENABLED=false."""
+    return os.getenv("TRACING_ENABLED", "true").lower() in ("true", "1", "yes")
+
+
+def new_request_id() -> str:
+    """Return a new random request ID."""
+    return uuid.uuid4().hex
+
+
+def current_request_id() -> str:
+    """Return the ID of the current request.
+
+    Outside of a request, e.g. in background jobs, each call returns a new ID
+    so that records are never left uncorrelated.
+    """
+    return _current_request_id.get() or new_request_id()
+
+
+def current_span() -> Optional[Span]:
+    """Return the innermost open span of the current request, if any."""
+    return _current_span.get()
+
+
+@contextmanager
+def trace_request(request_id: str, name: str, **attributes: Any) -> Iterator[Optional[Trace]]:
+    """Trace the block as the request with the given ID.
+
+    The request ID is set even when tracing is disabled, so that token usage
+    and logs stay correlated.
+
+    Args:
+        request_id: ID of the request.
+        name: Name of the root span.
+        **attributes: Attributes of the root span.
+
+    Yields:
+        Optional[Trace]: The trace, or None if tracing is disabled.
+    """
+    id_token = _current_request_id.set(request_id)
+    trace = Trace(request_id, name, **attributes) if tracing_enabled() else None
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(trace.root if trace else None)
+    error = None
+    try:
+        yield trace
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        _current_request_id.reset(id_token)
+        if trace is not None:
+            trace.root.finish(error)
+            recent_request_traces.add(trace)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """Record the block as a span of the current request's trace.
+
+    Outside of a traced request the block runs untraced and None is yielded,
+    so callers guard attribute updates with ``if s:``.
+
+    Args:
+        name: Name of the operation.
+        **attributes: Attributes of the span.
+
+    Yields:
+        Optional[Span]: The span.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    parent = _current_span.get()
+    current = trace.start_span(name, parent.span_id if parent else None, **attributes)
+    token = _current_span.set(current)
+    error = None
+    try:
+        yield current
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _current_span.reset(token)
+        current.finish(error)
+
+
+# Traces of the most recent requests, served by the trace endpoints
+recent_request_traces = TraceStore()
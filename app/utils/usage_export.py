@@ -0,0 +1,113 @@
+"""Streaming serialization of token usage exports.
+
+Token usage records are exported as newline-delimited JSON or CSV, produced
+chunk by chunk from an async iterator of record batches, optionally gzip
+compressed on the fly. Only one batch is held in memory at a time, so the
+memory used by an export does not depend on its size.
+"""
+
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+from uuid import UUID
+
+from bson.binary import UUID_SUBTYPE, Binary
+
+from app.database.models.token_usage import TokenUsage
+
+EXPORT_FORMATS = ("ndjson", "csv")
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+# Fields of a token usage record, in export column order
+EXPORT_FIELDS = list(TokenUsage.model_fields)
+
+
+def parse_fields(fields: Optional[str]) -> List[str]:
+    """Parse a comma-separated field selection.
+
+    Args:
+        fields: Field names separated by commas, or None for all fields.
+
+    Returns:
+        List[str]: The selected fields in export column order.
+
+    Raises:
+        ValueError: If a field is not a token usage field.
+    """
+    if not fields:
+        return list(EXPORT_FIELDS)
+    selected = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = selected - set(EXPORT_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return [field for field in EXPORT_FIELDS if field in selected]
+
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, Binary) and value.subtype == UUID_SUBTYPE:
+        return str(value.as_uuid())
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_plain(item) for item in value]
+    return value
+
+
+def to_export_record(document: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+    """Return the selected fields of a stored record as JSON-compatible values."""
+    return {field: _plain(document.get(field)) for field in fields}
+
+
+async def serialize_batches(
+    batches: AsyncIterator[Iterable[Dict[str, Any]]], format: str, fields: List[str]
+) -> AsyncIterator[bytes]:
+    """Serialize batches of records, yielding one chunk per batch.
+
+    Args:
+        batches: Batches of stored token usage records.
+        format: "ndjson" or "csv".
+        fields: The fields exported, in column order.
+
+    Yields:
+        bytes: The serialized records; for CSV the first chunk is the header.
+    """
+    if format == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(fields)
+        yield buffer.getvalue().encode("utf-8")
+        async for batch in batches:
+            buffer.seek(0)
+            buffer.truncate()
+            for document in batch:
+                record = to_export_record(document, fields)
+                writer.writerow(
+                    [
+                        json.dumps(value) if isinstance(value, (dict, list)) else ("" if value is None else value)
+                        for value in record.values()
+                    ]
+                )
+            yield buffer.getvalue().encode("utf-8")
+    else:
+        async for batch in batches:
+            yield "".join(
+                json.dumps(to_export_record(document, fields)) + "\n" for document in batch
+            ).encode("utf-8")
+
+
+async def gzip_chunks(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Compress a stream of chunks into a single gzip stream."""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,310 @@
+"""Batched, asynchronous writer of token usage records.
+
+LLM callbacks hand their usage records to ``usage_writer.submit``, which only
+appends to a bounded in-memory ring buffer and costs no I/O on the LLM call
+path. A background task drains the buffer to MongoDB with ``insert_many``
+whenever a batch is full or the flush interval has passed, and the buffer is
+flushed once more on shutdown. Every written batch is also added to the hourly
+and daily usage rollups with ``$inc`` upserts.
+
+When MongoDB cannot keep up or is unreachable, the buffer holds at most
+USAGE_BUFFER_SIZE records; beyond that the oldest records are dropped and
+counted, so memory stays bounded and the loss is visible in the stats.
+
+A failed batch is retried only when that cannot store a record twice: when
+no server was reached, or when the repository's inserts are idempotent
+(records keyed by their UUID). A batch whose outcome is unknown is otherwise
+dropped and counted as unconfirmed, and records the database rejected are
+dropped and counted as rejected, rather than retried forever.
+
+Configured with USAGE_BUFFER_SIZE, USAGE_BATCH_SIZE, USAGE_FLUSH_SECONDS and
+USAGE_ROLLUPS_ENABLED.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pymongo.errors import BulkWriteError, ServerSelectionTimeoutError
+
+from app.database.models.token_usage import TokenUsage
+
+logger = logging.getLogger(__name__)
+
+# Code of the write error for a document whose _id is already stored
+DUPLICATE_KEY_ERROR = 11000
+
+
+class TokenUsageWriter:
+    """Ring buffer of token usage records drained to MongoDB in batches."""
+
+    def __init__(
+        self,
+        max_buffer: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        repository_factory: Optional[Callable[[], Any]] = None,
+        rollup_factory: Optional[Callable[[], Any]] = None,
+        rollups_enabled: Optional[bool] = None,
+    ):
+        """Initialize the writer.
+
+        Args:
+            max_buffer: Maximum number of records waiting to be written.
+                Defaults to the USAGE_BUFFER_SIZE env var or 10000.
+            batch_size: Records written per insert_many, and the buffer size
+                that triggers an early flush. Defaults to USAGE_BATCH_SIZE or 100.
+            flush_interval: Maximum seconds a record waits before it is written.
+                Defaults to USAGE_FLUSH_SECONDS or 5.
+            repository_factory: Callable returning the TokenUsageRepository the
+                records are written with. Defaults to TokenUsageRepository.
+            rollup_factory: Callable returning the TokenUsageRollupRepository the
+                written records are added to. Defaults to TokenUsageRollupRepository.
+            rollups_enabled: Whether written records are added to the rollups.
+                Defaults to the USAGE_ROLLUPS_ENABLED env var or True.
+        """
+        self.max_buffer = (
+            max_buffer if max_buffer is not None else int(os.getenv("USAGE_BUFFER_SIZE", "10000"))
+        )
+        self.batch_size = (
+            batch_size if batch_size is not None else int(os.getenv("USAGE_BATCH_SIZE", "100"))
+        )
+        self.flush_interval = (
+            flush_interval
+            if flush_interval is not None
+            else float(os.getenv("USAGE_FLUSH_SECONDS", "5"))
+        )
+        self.rollups_enabled = (
+            rollups_enabled
+            if rollups_enabled is not None
+            else os.getenv("USAGE_ROLLUPS_ENABLED", "true").lower() in ("true", "1", "yes")
+        )
+        self._repository_factory = repository_factory
+        self._repository = None
+        self._rollup_factory = rollup_factory
+        self._rollups = None
+        self._rollups_live = False
+        # Written batches whose rollup update failed, retried on the next flush
+        self._rollup_backlog: "deque[List[TokenUsage]]" = deque()
+        # Records may be submitted from the callback threads LangChain runs
+        # synchronous handlers in, so the buffer is guarded by a lock
+        self._lock = threading.Lock()
+        self._buffer: "deque[TokenUsage]" = deque()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self.stats = {
+            "submitted": 0,
+            "written": 0,
+            "dropped": 0,
+            "batches": 0,
+            "failed_flushes": 0,
+            "rejected": 0,
+            "unconfirmed": 0,
+            "rollup_failures": 0,
+            "rollups_dropped": 0,
+        }
+
+    def _get_repository(self):
+        if self._repository is None:
+            if self._repository_factory is None:
+                from app.database.repositories.token_usage_repository import (
+                    TokenUsageRepository,
+                )
+
+                self._repository_factory = TokenUsageRepository
+            self._repository = self._repository_factory()
+        return self._repository
+
+    def _get_rollups(self):
+        if self._rollups is None:
+            if self._rollup_factory is None:
+                from app.database.repositories.token_usage_rollup_repository import (
+                    TokenUsageRollupRepository,
+                )
+
+                self._rollup_factory = TokenUsageRollupRepository
+            self._rollups = self._rollup_factory()
+        return self._rollups
+
+    async def _apply_rollups(self, batch: List[TokenUsage]) -> bool:
+        """Add a written batch to the rollups, keeping it for a retry on failure.
+
+        Returns:
+            bool: True if the rollups were updated.
+        """
+        try:
+            rollups = self._get_rollups()
+            if not self._rollups_live:
+                # Records older than the first batch are left to the backfill
+                await rollups.mark_live(min(record.timestamp for record in batch))
+                self._rollups_live = True
+            await rollups.apply_records(batch)
+        except Exception as e:
+            self.stats["rollup_failures"] += 1
+            logger.error(f"Failed to update token usage rollups: {str(e)}")
+            self._rollup_backlog.append(batch)
+            while sum(len(pending) for pending in self._rollup_backlog) > self.max_buffer:
+                self.stats["rollups_dropped"] += len(self._rollup_backlog.popleft())
+            return False
+        return True
+
+    def submit(self, record: TokenUsage) -> None:
+        """Queue a usage record for writing; never blocks and never raises.
+
+        Args:
+            record: The usage record.
+        """
+        with self._lock:
+            self.stats["submitted"] += 1
+            if len(self._buffer) >= self.max_buffer:
+                self._buffer.popleft()
+                self.stats["dropped"] += 1
+            self._buffer.append(record)
+            full = len(self._buffer) >= self.batch_size
+        if full and self._loop is not None and self._wake is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._wake.set)
+            except RuntimeError:
+                # The loop has been closed
+                pass
+
+    def _take_batch(self) -> List[TokenUsage]:
+        with self._lock:
+            count = min(self.batch_size, len(self._buffer))
+            return [self._buffer.popleft() for _ in range(count)]
+
+    @staticmethod
+    def _split_failed(
+        batch: List[TokenUsage], error: BulkWriteError
+    ) -> Tuple[List[TokenUsage], List[TokenUsage]]:
+        """Split a batch whose unordered insert partly failed.
+
+        Returns:
+            Tuple[List[TokenUsage], List[TokenUsage]]: The records that are
+            stored and the records the database rejected. Records failing as
+            duplicates were stored by an earlier attempt whose outcome was
+            unknown, so they count as stored.
+        """
+        rejected_indexes = {
+            write_error["index"]
+            for write_error in error.details.get("writeErrors", [])
+            if write_error.get("code") != DUPLICATE_KEY_ERROR
+        }
+        stored = [record for index, record in enumerate(batch) if index not in rejected_indexes]
+        rejected = [batch[index] for index in sorted(rejected_indexes)]
+        return stored, rejected
+
+    @staticmethod
+    def _can_retry(repository: Optional[Any], error: Exception) -> bool:
+        """Return True if retrying a failed insert cannot store a record twice."""
+        if repository is None or getattr(repository, "idempotent_inserts", False):
+            return True
+        # Nothing was sent when no server could be selected
+        return isinstance(error, ServerSelectionTimeoutError)
+
+    def _requeue(self, batch: List[TokenUsage]) -> None:
+        """Put a batch that could not be written back at the front of the buffer."""
+        with self._lock:
+            room = self.max_buffer - len(self._buffer)
+            if room < len(batch):
+                self.stats["dropped"] += len(batch) - max(room, 0)
+                batch = batch[len(batch) - max(room, 0):]
+            self._buffer.extendleft(reversed(batch))
+
+    async def flush(self) -> int:
+        """Write every buffered record.
+
+        Returns:
+            int: The number of records written. When a batch fails and may be
+            retried, it is put back into the buffer and the flush stops until
+            the next attempt.
+        """
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        written = 0
+        async with self._flush_lock:
+            while self._rollup_backlog:
+                if not await self._apply_rollups(self._rollup_backlog.popleft()):
+                    break
+            while True:
+                batch = self._take_batch()
+                if not batch:
+                    return written
+                repository = None
+                try:
+                    repository = self._get_repository()
+                    await repository.create_token_usages(batch)
+                except BulkWriteError as e:
+                    # The insert is unordered, so only the records listed in
+                    # writeErrors were not stored
+                    batch, rejected = self._split_failed(batch, e)
+                    self.stats["rejected"] += len(rejected)
+                    if rejected:
+                        logger.error(f"Dropped {len(rejected)} token usage records the database rejected: {str(e)}")
+                except Exception as e:
+                    self.stats["failed_flushes"] += 1
+                    if not self._can_retry(repository, e):
+                        # The records may have been stored; writing them again
+                        # could count them twice
+                        self.stats["unconfirmed"] += len(batch)
+                        logger.error(f"Dropped {len(batch)} token usage records after an unknown write outcome: {str(e)}")
+                        continue
+                    logger.error(f"Failed to write {len(batch)} token usage records: {str(e)}")
+                    self._requeue(batch)
+                    return written
+                written += len(batch)
+                self.stats["written"] += len(batch)
+                self.stats["batches"] += 1
+                if self.rollups_enabled and batch:
+                    await self._apply_rollups(batch)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    def start(self) -> None:
+        """Start the background flush task on the running event loop."""
+        if self._task is not None and not self._task.done():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = self._loop.create_task(self._run())
+        logger.info("Token usage writer started")
+
+    async def close(self) -> None:
+        """Stop the background task and write the remaining records."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        self._loop = None
+        self._wake = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return write counters and the number of buffered records."""
+        with self._lock:
+            return {
+                **self.stats,
+                "buffered": len(self._buffer),
+                "rollup_backlog": sum(len(batch) for batch in self._rollup_backlog),
+                "running": self._task is not None and not self._task.done(),
+            }
+
+
+# Shared writer fed by the token usage callbacks
+usage_writer = TokenUsageWriter()
@@ -6,13 +6,16 @@ images, processing those images, and extracting structured text content.
 """
 
 import os
-from typing import List
+from typing import List, Optional
 
 import cv2
 import pytesseract
 from pdf2image import convert_from_bytes, convert_from_path
 from PIL import Image
 
+from app.utils.request_context import current_context
+from app.utils.tracing import span
+
 
 class OCRVision:
     """OCR utility class for extracting text from PDF documents.
@@ -105,12 +108,14 @@ class OCRVision:
         return None
 
     @staticmethod
-    def ocr_image(image_path: str, lang: str = "eng") -> str:
+    def ocr_image(image_path: str, lang: str = "eng", timeout: Optional[float] = None) -> str:
         """Perform OCR on a single image file to extract text.
 
         Args:
             image_path (str): Path to the image file to process.
             lang (str, optional): Language code for OCR. Defaults to 'eng'.
+            timeout (float, optional): Seconds tesseract may run. Defaults to the
+                time the current request has left, unbounded outside requests.
 
         Returns:
         -------
@@ -123,7 +128,12 @@ class OCRVision:
             thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)[1]
 
             custom_config = r"--oem 3 --psm 6"
-            text = pytesseract.image_to_string(thresh, lang=lang, config=custom_config)
+            if timeout is None:
+                timeout = current_context().timeout()
+            with span("ocr.image", lang=lang):
+                text = pytesseract.image_to_string(
+                    thresh, lang=lang, config=custom_config, timeout=timeout or 0
+                )
             return text
         except Exception as e:
             print(f"Error in OCR for {image_path}: {e}")
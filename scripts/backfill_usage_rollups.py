@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""Backfill the hourly/daily token usage rollups from the raw usage records.
+
+The token usage writer adds records to the rollups as it writes them; this
+job adds the records written before that, chunk by chunk. Progress is stored
+in MongoDB after every chunk, so an interrupted run picks up where it stopped
+when started again. Once the backfill has caught up, usage summaries are read
+from the rollups instead of the raw records.
+
+Usage:
+    python scripts/backfill_usage_rollups.py --chunk-hours 24
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+from datetime import timedelta
+from pathlib import Path
+from typing import List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from app.database.repositories.token_usage_rollup_repository import (  # noqa: E402
+    TokenUsageRollupRepository,
+)
+
+logger = logging.getLogger("backfill_usage_rollups")
+
+
+async def backfill(chunk_hours: int) -> int:
+    """Run the backfill and return the number of records added."""
+    rollups = TokenUsageRollupRepository()
+    await rollups.ensure_indexes()
+    state = await rollups.get_state()
+    if state.get("backfilled_until"):
+        logger.info(f"Resuming from {state['backfilled_until'].isoformat()}")
+
+    def progress(until, added):
+        logger.info(f"Backfilled until {until.isoformat()} ({added} records)")
+
+    added = await rollups.backfill(chunk=timedelta(hours=chunk_hours), progress=progress)
+    state = await rollups.get_state()
+    logger.info(
+        f"Backfill complete: {added} records added, rollups cover everything "
+        f"before {state['live_since'].isoformat()} and live updates after it"
+    )
+    return added
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the backfill and return the process exit status."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--chunk-hours", type=int, default=24, help="Hours of raw records added per step")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    asyncio.run(backfill(args.chunk_hours))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
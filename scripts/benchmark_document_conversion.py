@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""Microbenchmark of BaseRepository._process_document_for_mongodb.
+
+Times the conversion of the documents the resume repository writes: a new
+resume with its optimized data, the ``$set`` of update_optimized_data and a
+lookup query. Each is timed with the current converter and with the previous
+implementation, which rebuilt every dict and list of the document, so the CPU
+saved per write is visible. The sample resume in data/sample_responses can be
+scaled up to model heavy resumes.
+
+Usage:
+    python scripts/benchmark_document_conversion.py --iterations 2000 --experiences 12
+"""
+
+import argparse
+import copy
+import json
+import logging
+import sys
+import timeit
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from uuid import UUID
+
+from bson import ObjectId
+from bson.binary import Binary, UuidRepresentation
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from app.database.models.resume import Resume, ResumeData  # noqa: E402
+from app.database.repositories.base_repo import BaseRepository  # noqa: E402
+
+logger = logging.getLogger("benchmark_document_conversion")
+
+
+def legacy_process_document(document: Dict) -> Dict:
+    """The previous implementation, which rebuilt every dict of the document."""
+    processed = {}
+    for key, value in document.items():
+        if isinstance(value, UUID):
+            processed[key] = Binary.from_uuid(value, UuidRepresentation.STANDARD)
+        elif isinstance(value, (int, float)):
+            processed[key] = value
+        elif hasattr(value, "hex") and callable(getattr(value, "hex")):
+            processed[key] = str(value)
+        elif isinstance(value, dict):
+            processed[key] = legacy_process_document(value)
+        elif isinstance(value, list) and all(isinstance(item, dict) for item in value):
+            processed[key] = [legacy_process_document(item) for item in value]
+        elif isinstance(value, list):
+            processed[key] = [
+                Binary.from_uuid(item, UuidRepresentation.STANDARD) if isinstance(item, UUID) else item
+                for item in value
+            ]
+        else:
+            processed[key] = value
+    return processed
+
+
+def sample_resume_data(experiences: int) -> Dict:
+    """Load the sample optimized resume with the given number of experiences."""
+    data = json.loads((ROOT / "data/sample_responses/example.json").read_text(encoding="utf-8"))
+    sample = data["user_information"]["experiences"]
+    data["user_information"]["experiences"] = [
+        copy.deepcopy(sample[number % len(sample)]) for number in range(experiences)
+    ]
+    return ResumeData.model_validate(data).model_dump()
+
+
+def sample_documents(experiences: int) -> Dict[str, Dict]:
+    """Build the documents written and queried by the resume repository."""
+    optimized_data = sample_resume_data(experiences)
+    resume = Resume(
+        user_id="benchmark-user",
+        title="Benchmark resume",
+        original_content=(ROOT / "data/sample_resumes/resume.txt").read_text(encoding="utf-8"),
+        job_description=(ROOT / "data/sample_descriptions/job_description_1.txt").read_text(
+            encoding="utf-8"
+        ),
+        optimized_data=optimized_data,
+        ats_score=82,
+    )
+    return {
+        "create_resume": resume.model_dump(by_alias=True),
+        "update_optimized_data": {
+            "optimized_data": optimized_data,
+            "ats_score": 88,
+            "matching_skills": ["Python", "SQL", "Docker"] * 5,
+            "missing_skills": ["Kubernetes", "Terraform"],
+            "optimization_summary": {"changes_made": ["Reworded experience"] * 8},
+        },
+        "get_resume_by_id": {"_id": ObjectId()},
+    }
+
+
+def time_per_call(function: Callable[[Dict], Dict], document: Dict, iterations: int) -> float:
+    """Return the best time of one call in microseconds over five repeats."""
+    timings = timeit.repeat(lambda: function(document), number=iterations, repeat=5)
+    return min(timings) / iterations * 1e6
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the benchmark and return the process exit status."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--iterations", type=int, default=2000, help="Calls per timing")
+    parser.add_argument(
+        "--experiences", type=int, default=4, help="Experiences in the sample resume"
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    repository = BaseRepository("benchmark", "resumes")
+    logger.info(f"{'document':<24}{'previous µs':>14}{'current µs':>14}{'speedup':>10}")
+    for name, document in sample_documents(args.experiences).items():
+        previous = time_per_call(legacy_process_document, document, args.iterations)
+        current = time_per_call(repository._process_document_for_mongodb, document, args.iterations)
+        logger.info(f"{name:<24}{previous:>14.2f}{current:>14.2f}{previous / current:>9.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""Check that the repository queries are served by indexes.
+
+Runs explain() on a representative filter of every repository query (see
+``BaseRepository.query_shapes``) and prints the stages of its winning plan.
+Queries whose plan scans the whole collection (COLLSCAN) are flagged, and the
+exit status is 1 if there are any, so the check can run in CI against a
+database with the application's indexes.
+
+Usage:
+    python scripts/check_query_plans.py --ensure-indexes
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from app.database.repositories.prompt_repository import PromptRepository  # noqa: E402
+from app.database.repositories.resume_repository import ResumeRepository  # noqa: E402
+from app.database.repositories.token_usage_repository import (  # noqa: E402
+    TokenUsageRepository,
+)
+from app.database.repositories.token_usage_rollup_repository import (  # noqa: E402
+    TokenUsageRollupRepository,
+)
+
+logger = logging.getLogger("check_query_plans")
+
+REPOSITORIES = (
+    ResumeRepository,
+    PromptRepository,
+    TokenUsageRepository,
+    TokenUsageRollupRepository,
+)
+
+
+async def check(ensure_indexes: bool) -> int:
+    """Explain every repository query and return the number of collection scans."""
+    scans = 0
+    for repository_class in REPOSITORIES:
+        repository = repository_class()
+        if ensure_indexes:
+            await repository.ensure_indexes()
+        for name, stages in (await repository.check_query_plans()).items():
+            plan = " <- ".join(stages) or "unknown"
+            if "COLLSCAN" in stages:
+                scans += 1
+                logger.warning(f"COLLSCAN {repository.collection_name}.{name}: {plan}")
+            else:
+                logger.info(f"ok       {repository.collection_name}.{name}: {plan}")
+    return scans
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the check and return the process exit status."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--ensure-indexes",
+        action="store_true",
+        help="Create the declared indexes before explaining the queries",
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    scans = asyncio.run(check(args.ensure_indexes))
+    if scans:
+        logger.warning(f"{scans} queries scan their whole collection")
+        return 1
+    logger.info("Every query is served by an index")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
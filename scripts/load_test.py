@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""Load-test harness driving the real FastAPI app against the mock LLM server.
+
+The harness starts scripts/mock_llm_server.py on a local port (or uses one
+that is already running), points the application at it, seeds one resume per
+request and fires score and optimize requests at the app in-process through
+an ASGI transport. It reports:
+
+- throughput (requests per second) and status codes,
+- latency percentiles per endpoint,
+- latency percentiles per pipeline stage, from the stage graph traces,
+- event-loop lag, i.e. how late a periodic timer fires on the app's loop.
+
+MongoDB is the one configured by ``--mongodb-url`` (a throwaway database is
+used and dropped afterwards), or an in-memory stand-in with ``--in-memory-db``,
+which needs the optional ``mongomock-motor`` package.
+
+Usage:
+    python scripts/load_test.py --requests 200 --concurrency 20 \
+        --mix score=1,optimize=1 --latency lognormal:0.8,0.5 --in-memory-db
+
+For CI, ``--max-p95-ms`` and ``--max-error-rate`` make the run exit with a
+non-zero status when the thresholds are exceeded, and ``--output`` writes the
+report as JSON.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "scripts"))
+
+from mock_llm_server import add_arguments, config_from_args, create_app  # noqa: E402
+
+logger = logging.getLogger("load_test")
+
+SAMPLE_RESUME = ROOT / "data" / "sample_resumes" / "resume.txt"
+SAMPLE_JOBS = sorted((ROOT / "data" / "sample_descriptions").glob("*.txt"))
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    """Return count, mean, p50, p90, p95, p99 and max of values in milliseconds."""
+    if not values:
+        return {"count": 0, "mean": None, "p50": None, "p90": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(values)
+
+    def rank(q: float) -> float:
+        return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))]
+
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered) * 1000, 1),
+        "p50": round(rank(0.50) * 1000, 1),
+        "p90": round(rank(0.90) * 1000, 1),
+        "p95": round(rank(0.95) * 1000, 1),
+        "p99": round(rank(0.99) * 1000, 1),
+        "max": round(ordered[-1] * 1000, 1),
+    }
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """Parse an endpoint mix such as ``score=1,optimize=2`` into weights."""
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("score", "optimize"):
+            raise ValueError(f"Unknown endpoint in mix: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class LoopLagMonitor:
+    """Measure how late a periodic timer fires on the running event loop."""
+
+    def __init__(self, interval: float = 0.05):
+        """Initialize the monitor.
+
+        Args:
+            interval: Seconds between timer ticks.
+        """
+        self.interval = interval
+        self.lags: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, loop.time() - expected))
+
+    def start(self) -> None:
+        """Start sampling."""
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        """Stop sampling."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+class MockServerThread:
+    """Run the mock LLM server with uvicorn on a background thread.
+
+    The server gets its own event loop, so its simulated latency does not
+    compete with the application for the loop being measured.
+    """
+
+    def __init__(self, app, host: str = "127.0.0.1", port: Optional[int] = None):
+        """Initialize the server; a free port is picked if none is given."""
+        import uvicorn
+
+        if port is None:
+            with socket.socket() as sock:
+                sock.bind((host, 0))
+                port = sock.getsockname()[1]
+        self.url = f"http://{host}:{port}/v1"
+        self.server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self) -> "MockServerThread":
+        """Start the server and wait until it accepts connections."""
+        self.thread.start()
+        deadline = time.monotonic() + 10
+        while not self.server.started:
+            if time.monotonic() > deadline or not self.thread.is_alive():
+                raise RuntimeError("Mock LLM server did not start")
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Stop the server and wait for its thread to finish."""
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+
+def configure_environment(args: argparse.Namespace, llm_url: str) -> None:
+    """Point the application at the mock server and the load-test database.
+
+    Must run before the application is imported, since several modules read
+    their configuration at import time.
+    """
+    os.environ["API_KEY"] = "mock-key"
+    os.environ["API_BASE"] = llm_url
+    os.environ["MODEL_NAME"] = args.model
+    os.environ["DB_NAME"] = args.db_name
+    if args.mongodb_url:
+        os.environ["MONGODB_URL"] = args.mongodb_url
+
+
+def use_in_memory_database() -> None:
+    """Replace the MongoDB client with an in-memory mongomock-motor client."""
+    try:
+        from mongomock_motor import AsyncMongoMockClient
+    except ImportError:
+        sys.exit("--in-memory-db requires the mongomock-motor package (pip install mongomock-motor)")
+
+    from app.database.connector import MongoConnectionManager
+
+    class InMemoryClient(AsyncMongoMockClient):
+        # Mongomock rejects the UUID codec options the connector passes; UUIDs
+        # are already converted to binary by the repositories
+        def get_database(self, name=None, codec_options=None, **kwargs):
+            return super().get_database(name, **kwargs)
+
+    MongoConnectionManager._clients["default"] = InMemoryClient()
+
+
+async def seed_resumes(count: int) -> List[str]:
+    """Create one resume per request so that no two requests coalesce."""
+    from app.database.models.resume import Resume
+    from app.database.repositories.resume_repository import ResumeRepository
+
+    repo = ResumeRepository()
+    text = SAMPLE_RESUME.read_text(encoding="utf-8")
+    ids = []
+    for index in range(count):
+        resume_id = await repo.create_resume(
+            Resume(user_id="load-test", title=f"Load test {index}", original_content=text, job_description="")
+        )
+        if not resume_id:
+            raise RuntimeError("Could not seed resumes; is MongoDB reachable?")
+        ids.append(resume_id)
+    return ids
+
+
+async def run_load(args: argparse.Namespace) -> Dict[str, Any]:
+    """Seed the database, run the requests and build the report."""
+    import httpx
+
+    import app.api.routers.resume as resume_module
+    from app.main import app
+
+    # Keep every pipeline trace instead of the most recent ones
+    traces: deque = deque()
+    resume_module.recent_traces = traces
+
+    if args.in_memory_db:
+        use_in_memory_database()
+
+    resume_ids = await seed_resumes(args.requests)
+    jobs = [path.read_text(encoding="utf-8") for path in SAMPLE_JOBS] or ["Python developer"]
+    rng = random.Random(args.seed)
+    mix = parse_mix(args.mix)
+    endpoints = rng.choices(list(mix), weights=list(mix.values()), k=args.requests)
+
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    statuses: Dict[str, Counter] = defaultdict(Counter)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    monitor = LoopLagMonitor()
+
+    async def send(client: httpx.AsyncClient, index: int) -> None:
+        endpoint = endpoints[index]
+        # A distinct job description per request keeps the stage cache cold,
+        # as it is for real traffic
+        body = {"job_description": f"{jobs[index % len(jobs)]}\n\nReference: load-test-{index}"}
+        if endpoint == "optimize":
+            body["speculative"] = args.speculative
+            body["section_parallel"] = args.section_parallel
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await client.post(f"/api/resume/{resume_ids[index]}/{endpoint}", json=body)
+                status = str(response.status_code)
+            except Exception as e:
+                status = type(e).__name__
+            latencies[endpoint].append(time.perf_counter() - started)
+            statuses[endpoint][status] += 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://load-test", timeout=None) as client:
+        monitor.start()
+        started = time.perf_counter()
+        await asyncio.gather(*(send(client, index) for index in range(args.requests)))
+        elapsed = time.perf_counter() - started
+        await monitor.stop()
+
+    stage_durations: Dict[str, List[float]] = defaultdict(list)
+    for trace in traces:
+        for name, timing in trace.stages.items():
+            if timing.status in ("ok", "cached"):
+                stage_durations[f"{trace.pipeline}.{name}"].append(timing.duration)
+
+    total_errors = sum(
+        count for counter in statuses.values() for status, count in counter.items() if status != "200"
+    )
+    return {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "elapsed_seconds": round(elapsed, 3),
+        "rps": round(args.requests / elapsed, 2) if elapsed else None,
+        "error_rate": round(total_errors / args.requests, 4) if args.requests else 0.0,
+        "statuses": {endpoint: dict(counter) for endpoint, counter in statuses.items()},
+        "latency_ms": {endpoint: percentiles(values) for endpoint, values in latencies.items()},
+        "stage_latency_ms": {name: percentiles(values) for name, values in sorted(stage_durations.items())},
+        "event_loop_lag_ms": percentiles(monitor.lags),
+    }
+
+
+async def drop_database(args: argparse.Namespace) -> None:
+    """Drop the load-test database and close the MongoDB clients."""
+    from app.database.connector import MongoConnectionManager
+
+    manager = MongoConnectionManager()
+    try:
+        client = await manager.get_client()
+        await client.drop_database(args.db_name)
+    except Exception as e:
+        logger.warning(f"Could not drop the load-test database: {str(e)}")
+    await manager.close_all()
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    """Render the report as a human-readable table."""
+    lines = [
+        f"{report['requests']} requests, concurrency {report['concurrency']}: "
+        f"{report['rps']} req/s over {report['elapsed_seconds']}s, error rate {report['error_rate']:.2%}",
+        f"statuses: {report['statuses']}",
+    ]
+    if "mock_llm" in report:
+        lines.append(f"mock LLM: {report['mock_llm']}")
+    header = f"{'':40} {'count':>6} {'p50':>9} {'p90':>9} {'p95':>9} {'p99':>9} {'max':>9}"
+
+    def row(name: str, stats: Dict[str, Any]) -> str:
+        cells = " ".join(f"{stats[key] if stats[key] is not None else '-':>9}" for key in ("p50", "p90", "p95", "p99", "max"))
+        return f"{name:40} {stats['count']:>6} {cells}"
+
+    lines += ["", "latency (ms)", header]
+    lines += [row(name, stats) for name, stats in report["latency_ms"].items()]
+    lines += ["", "stage latency (ms)", header]
+    lines += [row(name, stats) for name, stats in report["stage_latency_ms"].items()]
+    lines += ["", "event-loop lag (ms)", header, row("loop", report["event_loop_lag_ms"])]
+    return "\n".join(lines)
+
+
+def check_thresholds(report: Dict[str, Any], args: argparse.Namespace) -> List[str]:
+    """Return the CI thresholds the run exceeded."""
+    failures = []
+    if args.max_error_rate is not None and report["error_rate"] > args.max_error_rate:
+        failures.append(f"error rate {report['error_rate']:.2%} exceeds {args.max_error_rate:.2%}")
+    if args.max_p95_ms is not None:
+        for endpoint, stats in report["latency_ms"].items():
+            if stats["p95"] is not None and stats["p95"] > args.max_p95_ms:
+                failures.append(f"{endpoint} p95 {stats['p95']}ms exceeds {args.max_p95_ms}ms")
+    return failures
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--requests", type=int, default=100, help="Total number of requests")
+    parser.add_argument("--concurrency", type=int, default=10, help="Requests in flight at once")
+    parser.add_argument("--mix", default="score=1,optimize=1", help="Endpoint weights, e.g. score=3,optimize=1")
+    parser.add_argument("--speculative", action="store_true", help="Send optimize requests with speculative=true")
+    parser.add_argument("--section-parallel", action="store_true", help="Send optimize requests with section_parallel=true")
+    parser.add_argument("--llm-url", default=None, help="Use an already running mock server instead of starting one")
+    parser.add_argument("--model", default="mock-model", help="Model name sent to the mock server")
+    parser.add_argument("--mongodb-url", default=None, help="MongoDB to use (default: MONGODB_URL)")
+    parser.add_argument("--db-name", default="myresumo_load_test", help="Throwaway database name")
+    parser.add_argument("--in-memory-db", action="store_true", help="Use mongomock-motor instead of MongoDB")
+    parser.add_argument("--output", default=None, help="Write the report as JSON to this file")
+    parser.add_argument("--max-p95-ms", type=float, default=None, help="Fail if any endpoint's p95 latency exceeds this")
+    parser.add_argument("--max-error-rate", type=float, default=None, help="Fail if the share of non-200 responses exceeds this")
+    add_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the load test and return the process exit status."""
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s - %(levelname)s - %(message)s")
+    logger.setLevel(logging.INFO)
+
+    async def run(llm_url: str) -> Dict[str, Any]:
+        configure_environment(args, llm_url)
+        try:
+            return await run_load(args)
+        finally:
+            await drop_database(args)
+
+    if args.llm_url:
+        report = asyncio.run(run(args.llm_url))
+    else:
+        mock_app = create_app(config_from_args(args))
+        with MockServerThread(mock_app) as server:
+            logger.info(f"Mock LLM server running at {server.url}")
+            report = asyncio.run(run(server.url))
+        report["mock_llm"] = dict(mock_app.state.stats)
+
+    print(format_report(report))
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    failures = check_thresholds(report, args)
+    for failure in failures:
+        logger.error(failure)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
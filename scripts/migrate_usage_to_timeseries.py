@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Copy token usage records into a MongoDB time-series collection.
+
+Creates the time-series collection (``timestamp`` as time field, model,
+feature and user as meta field, with the USAGE_RAW_TTL_DAYS expiry) and copies
+the records of the regular collection into it, one time window at a time.
+Progress is stored after every window, so an interrupted migration resumes
+where it stopped when started again; a window interrupted between its insert
+and its checkpoint is copied again on resume.
+
+Once the copy is complete, switch the application over with
+``USAGE_STORAGE=timeseries`` (and ``USAGE_COLLECTION`` if the target is not
+named ``token_usage_ts``). The source collection is left untouched.
+
+Usage:
+    python scripts/migrate_usage_to_timeseries.py --source token_usage --target token_usage_ts
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from app.database.models.token_usage import TokenUsage  # noqa: E402
+from app.database.repositories.token_usage_repository import (  # noqa: E402
+    STORAGE_COLLECTION,
+    STORAGE_TIMESERIES,
+    TokenUsageRepository,
+)
+
+logger = logging.getLogger("migrate_usage_to_timeseries")
+
+STATE_COLLECTION = "token_usage_migration_state"
+
+
+async def migrate(source_name: str, target_name: str, chunk_hours: int, batch_size: int) -> int:
+    """Copy the records not copied yet and return how many were copied."""
+    source = TokenUsageRepository(collection_name=source_name, storage=STORAGE_COLLECTION)
+    target = TokenUsageRepository(collection_name=target_name, storage=STORAGE_TIMESERIES)
+    await target.ensure_indexes()
+
+    state_id = f"{source_name}->{target_name}"
+    async with target.connection_manager.get_collection(target.db_name, STATE_COLLECTION) as state:
+        progress = await state.find_one({"_id": state_id}) or {}
+        position = progress.get("copied_until") or await source.first_timestamp()
+        if position is None:
+            logger.info(f"{source_name} is empty, nothing to copy")
+            return 0
+        if progress.get("copied_until"):
+            logger.info(f"Resuming from {position.isoformat()}")
+
+        # Records written while the migration runs are copied up to its start;
+        # run it again after switching USAGE_STORAGE to copy the rest
+        until = datetime.utcnow()
+        copied = 0
+        while position < until:
+            end = min(position + timedelta(hours=chunk_hours), until)
+            async for batch in source.iter_token_usages(start=position, end=end, batch_size=batch_size):
+                copied += await target.create_token_usages(
+                    [TokenUsage.model_validate(document) for document in batch]
+                )
+            await state.update_one({"_id": state_id}, {"$set": {"copied_until": end}}, upsert=True)
+            position = end
+            logger.info(f"Copied until {end.isoformat()} ({copied} records)")
+    return copied
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the migration and return the process exit status."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--source", default="token_usage", help="Regular collection to copy from")
+    parser.add_argument(
+        "--target",
+        default=os.getenv("USAGE_COLLECTION", "token_usage_ts"),
+        help="Time-series collection to copy into",
+    )
+    parser.add_argument("--chunk-hours", type=int, default=24, help="Hours of records copied per step")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Records per insert_many")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    copied = asyncio.run(migrate(args.source, args.target, args.chunk_hours, args.batch_size))
+    logger.info(f"Migration complete: {copied} records copied to {args.target}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""OpenAI-compatible mock LLM server for local load and performance testing.
+
+The server answers ``POST /v1/chat/completions`` with canned responses built
+from ``data/sample_responses/example.json``, so the scoring and optimization
+pipelines can be exercised end to end without paying a real provider. The
+kind of response is picked from the prompt:
+
+- resume section prompts (``## SECTION: <name>``) get that section of the
+  sample resume,
+- whole-resume optimization prompts get the complete sample resume,
+- matching prompts (those asking for ``matching_skills``) get a score,
+- everything else is treated as a resume or job extraction.
+
+Latency, token usage, server errors and rate limiting are configurable, so
+the harness in scripts/load_test.py can measure throughput under realistic
+and adverse provider behavior.
+
+Usage:
+    python scripts/mock_llm_server.py --port 8001 --latency lognormal:0.8,0.5 \
+        --error-rate 0.01 --rate-limit-rate 0.02
+
+Then point the application at it with ``API_BASE=http://localhost:8001/v1``.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import re
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESPONSES = Path(__file__).resolve().parent.parent / "data" / "sample_responses" / "example.json"
+
+# Sections of the resume generated by separate calls in section-parallel mode
+RESUME_SECTIONS = (
+    "user_information",
+    "experiences",
+    "projects",
+    "certificate",
+    "extra_curricular_activities",
+    "optimization_summary",
+)
+
+OPTIMIZATION_SUMMARY = {
+    "changes_made": ["Reworded experience bullets around the job requirements"],
+    "keywords_added": ["Python", "Machine Learning"],
+    "skills_emphasized": ["Python", "SQL"],
+    "content_reorganized": [],
+    "achievements_quantified": [],
+    "overall_strategy": "Resume optimized for ATS compatibility.",
+}
+
+
+class LatencyDistribution:
+    """Random response latency in seconds.
+
+    Specified as ``kind:params``:
+
+    - ``fixed:0.5`` always waits 0.5s
+    - ``uniform:0.2,1.5`` waits between 0.2s and 1.5s
+    - ``lognormal:0.8,0.5`` waits a log-normal time with a median of 0.8s and a
+      shape (sigma) of 0.5, the usual heavy-tailed shape of LLM latency
+    - ``exponential:0.5`` waits an exponential time with a mean of 0.5s
+    """
+
+    KINDS = {"fixed": 1, "uniform": 2, "lognormal": 2, "exponential": 1}
+
+    def __init__(self, spec: str = "fixed:0"):
+        """Parse a latency specification.
+
+        Args:
+            spec: The distribution as described in the class docstring.
+
+        Raises:
+            ValueError: If the specification cannot be parsed.
+        """
+        kind, _, params = spec.partition(":")
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown latency distribution: {kind}")
+        try:
+            values = [float(value) for value in params.split(",")] if params else []
+        except ValueError:
+            raise ValueError(f"Invalid latency parameters: {params}")
+        if len(values) != self.KINDS[kind]:
+            raise ValueError(f"{kind} latency needs {self.KINDS[kind]} parameter(s)")
+        self.kind = kind
+        self.params = values
+        self.spec = spec
+
+    def sample(self, rng: random.Random) -> float:
+        """Draw a latency in seconds."""
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return rng.uniform(*self.params)
+        if self.kind == "lognormal":
+            median, sigma = self.params
+            return rng.lognormvariate(0, sigma) * median
+        return rng.expovariate(1 / self.params[0]) if self.params[0] > 0 else 0.0
+
+
+class MockConfig:
+    """Behavior of the mock server.
+
+    Attributes:
+        latency: Latency of successful responses
+        error_rate: Share of requests answered with a 500 error
+        rate_limit_rate: Share of requests answered with a 429 error
+        retry_after: Retry-After seconds sent with 429 responses
+        prompt_tokens: Fixed prompt token count; estimated from the prompt if None
+        completion_tokens: Fixed completion token count; estimated if None
+        responses: The sample resume the canned responses are built from
+        seed: Seed of the random generator, for reproducible runs
+    """
+
+    def __init__(
+        self,
+        latency: str = "fixed:0",
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        retry_after: float = 1.0,
+        prompt_tokens: Optional[int] = None,
+        completion_tokens: Optional[int] = None,
+        responses_path: Optional[str] = None,
+        seed: Optional[int] = None,
+    ):
+        """Initialize the configuration; see the class attributes for the arguments."""
+        self.latency = LatencyDistribution(latency)
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        with open(responses_path or DEFAULT_RESPONSES, encoding="utf-8") as f:
+            self.responses = json.load(f)
+        self.responses.setdefault("optimization_summary", OPTIMIZATION_SUMMARY)
+        self.seed = seed
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of a text at about four characters per token."""
+    return max(1, len(text) // 4)
+
+
+def _resume_skills(resume: Dict[str, Any]) -> List[str]:
+    skills = resume.get("user_information", {}).get("skills", {})
+    return list(skills.get("hard_skills", [])) + list(skills.get("soft_skills", []))
+
+
+def canned_response(prompt: str, resume: Dict[str, Any], rng: random.Random) -> str:
+    """Return the canned completion for a prompt.
+
+    Args:
+        prompt: The prompt text, i.e. the concatenated message contents.
+        resume: The sample resume the responses are built from.
+        rng: Random generator used to vary scores.
+
+    Returns:
+        str: The completion text.
+    """
+    section = re.search(r"## SECTION:\s*(\w+)", prompt)
+    if section and section.group(1) in RESUME_SECTIONS:
+        name = section.group(1)
+        info = resume.get("user_information", {})
+        if name == "user_information":
+            value = {key: item for key, item in info.items() if key != "experiences"}
+        elif name == "experiences":
+            value = info.get("experiences", [])
+        else:
+            value = resume.get(name, [])
+        return json.dumps(value)
+
+    if "user_information" in prompt and "experiences" in prompt:
+        return json.dumps(resume)
+
+    skills = _resume_skills(resume)
+    if "matching_skills" in prompt:
+        split = max(1, len(skills) * 3 // 4)
+        return json.dumps(
+            {
+                "score": rng.randint(55, 90),
+                "matching_skills": skills[:split],
+                "missing_skills": skills[split:] or ["Kubernetes"],
+                "recommendation": "Highlight the projects that use the missing skills.",
+                "rationale": "Most of the core requirements are met.",
+            }
+        )
+
+    return json.dumps(
+        {
+            "skills": skills,
+            "experience_years": 2,
+            "key_requirements": skills[:5],
+            "domains": ["Artificial Intelligence", "Data Science"],
+        }
+    )
+
+
+def _error(status_code: int, message: str, error_type: str, headers=None) -> JSONResponse:
+    return JSONResponse(
+        status_code=status_code,
+        content={"error": {"message": message, "type": error_type, "code": None}},
+        headers=headers,
+    )
+
+
+def create_app(config: Optional[MockConfig] = None) -> FastAPI:
+    """Create the mock server application.
+
+    Args:
+        config: Behavior of the server. Defaults to instant, error-free responses.
+
+    Returns:
+        FastAPI: The application, whose ``state.stats`` counts the requests served.
+    """
+    config = config or MockConfig()
+    rng = random.Random(config.seed)
+    app = FastAPI(title="Mock LLM server")
+    app.state.config = config
+    app.state.stats = {"requests": 0, "errors": 0, "rate_limited": 0, "completion_tokens": 0}
+
+    @app.get("/v1/models")
+    async def list_models():
+        return {"object": "list", "data": [{"id": "mock-model", "object": "model", "owned_by": "mock"}]}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats = app.state.stats
+        stats["requests"] += 1
+
+        roll = rng.random()
+        if roll < config.rate_limit_rate:
+            stats["rate_limited"] += 1
+            return _error(
+                429,
+                "Rate limit reached for requests",
+                "rate_limit_exceeded",
+                headers={"retry-after": str(config.retry_after)},
+            )
+        if roll < config.rate_limit_rate + config.error_rate:
+            stats["errors"] += 1
+            return _error(500, "The server had an error processing the request", "server_error")
+
+        await asyncio.sleep(config.latency.sample(rng))
+
+        messages = body.get("messages", [])
+        prompt = "\n".join(
+            message["content"] if isinstance(message.get("content"), str) else json.dumps(message.get("content"))
+            for message in messages
+        )
+        content = canned_response(prompt, config.responses, rng)
+        prompt_tokens = config.prompt_tokens or estimate_tokens(prompt)
+        completion_tokens = config.completion_tokens or estimate_tokens(content)
+        stats["completion_tokens"] += completion_tokens
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock-model"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    @app.get("/stats")
+    async def get_stats():
+        return app.state.stats
+
+    return app
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the mock server options to an argument parser."""
+    parser.add_argument("--latency", default="lognormal:0.8,0.5", help="Latency distribution, e.g. fixed:0.5, uniform:0.2,1.5, lognormal:0.8,0.5, exponential:0.5")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests failing with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of requests failing with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds of 429 responses")
+    parser.add_argument("--prompt-tokens", type=int, default=None, help="Fixed prompt token count (default: estimated)")
+    parser.add_argument("--completion-tokens", type=int, default=None, help="Fixed completion token count (default: estimated)")
+    parser.add_argument("--responses", default=None, help="Sample resume JSON the responses are built from")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for reproducible runs")
+
+
+def config_from_args(args: argparse.Namespace) -> MockConfig:
+    """Build a MockConfig from parsed command line arguments."""
+    return MockConfig(
+        latency=args.latency,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        prompt_tokens=args.prompt_tokens,
+        completion_tokens=args.completion_tokens,
+        responses_path=args.responses,
+        seed=args.seed,
+    )
+
+
+def main() -> None:
+    """Run the mock server with uvicorn."""
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    logger.info(f"Mock LLM server listening on http://{args.host}:{args.port}/v1")
+    uvicorn.run(create_app(config_from_args(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
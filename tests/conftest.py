@@ -0,0 +1,53 @@
+"""Fixtures shared by the test modules."""
+from contextlib import asynccontextmanager
+from datetime import datetime
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.database.models.token_usage import TokenUsage
+
+
+@pytest.fixture
+def make_usage():
+    """Return a factory of token usage records.
+
+    The record built for n has n prompt tokens, n + 1 total tokens and a
+    timestamp n minutes after noon on 2026-03-01; keyword arguments override
+    any field.
+    """
+
+    def make(n=0, **fields):
+        return TokenUsage(
+            **{
+                "timestamp": datetime(2026, 3, 1, 12, n),
+                "endpoint": "test",
+                "llm_model": "gpt-4o-mini",
+                "prompt_tokens": n,
+                "completion_tokens": 1,
+                "total_tokens": n + 1,
+                "feature": "ats_scoring",
+                "cost_usd": 0.01,
+                "metadata": {"latency_ms": 120},
+                **fields,
+            }
+        )
+
+    return make
+
+
+class FakeConnectionManager:
+    """Connection manager handing out one mocked collection."""
+
+    def __init__(self):
+        self.collection = AsyncMock()
+
+    @asynccontextmanager
+    async def get_collection(self, db_name, collection_name):
+        yield self.collection
+
+
+@pytest.fixture
+def connection_manager():
+    """Return a connection manager whose collections are one AsyncMock."""
+    return FakeConnectionManager()
@@ -0,0 +1,127 @@
+"""Test cases for the base repository."""
+import asyncio
+import json
+from unittest.mock import AsyncMock
+from uuid import uuid4
+
+import pytest
+from bson.binary import Binary, UuidRepresentation
+from pymongo.errors import BulkWriteError
+
+from app.database.repositories.base_repo import BaseRepository, WriteBatcher
+from app.database.repositories.prompt_repository import PromptRepository
+
+
+def make_repository():
+    """Build a base repository; no connection is opened."""
+    return BaseRepository("test", "documents")
+
+
+def test_binary_values_are_not_stringified():
+    """Bytes and BSON Binary values are stored as they are."""
+    document = {"pdf": b"%PDF-1.7", "digest": Binary(b"\x00\x01", 0)}
+
+    processed = make_repository()._process_document_for_mongodb(document)
+
+    assert processed == document
+    assert isinstance(processed["digest"], Binary)
+
+
+def test_uuids_are_converted_at_any_depth():
+    """UUIDs nested in lists and dicts are converted; other subtrees are shared."""
+    user_id, tag_id = uuid4(), uuid4()
+    experiences = [{"job_title": "Engineer", "four_tasks": ["a", "b", "c", "d"]}]
+    document = {
+        "owner": {"id": user_id},
+        "tags": [[tag_id]],
+        "optimized_data": {"experiences": experiences},
+    }
+
+    processed = make_repository()._process_document_for_mongodb(document)
+
+    assert processed["owner"]["id"] == Binary.from_uuid(user_id, UuidRepresentation.STANDARD)
+    assert processed["tags"] == [[Binary.from_uuid(tag_id, UuidRepresentation.STANDARD)]]
+    assert processed["optimized_data"] is document["optimized_data"]
+    # The input is left untouched
+    assert document["owner"]["id"] == user_id
+
+
+def test_plain_documents_are_copied_at_the_top_only():
+    """The caller's dict never receives the _id an insert adds."""
+    document = {"title": "Resume", "scores": [70, 85.5]}
+
+    processed = make_repository()._process_document_for_mongodb(document)
+
+    assert processed == document and processed is not document
+    assert processed["scores"] is document["scores"]
+
+
+@pytest.mark.asyncio
+async def test_write_batcher_coalesces_concurrent_writes(monkeypatch):
+    """Writes issued together share one unordered bulk write."""
+    repo = make_repository()
+    bulk_write = AsyncMock()
+    monkeypatch.setattr(repo, "bulk_write", bulk_write)
+    batcher = WriteBatcher(repo, max_batch=10, max_delay=0.01)
+
+    results = await asyncio.gather(
+        *[batcher.insert({"score": n}) for n in range(3)],
+        batcher.update({"name": "a"}, {"$set": {"score": 1}}, upsert=True),
+    )
+
+    bulk_write.assert_awaited_once()
+    operations = bulk_write.await_args.args[0]
+    assert len(operations) == 4 and bulk_write.await_args.kwargs == {"ordered": False}
+    assert results[0] == str(operations[0]._doc["_id"])
+    assert results[3] is None
+    assert batcher.get_stats() == {"writes": 4, "batches": 1}
+
+
+@pytest.mark.asyncio
+async def test_write_batcher_fails_only_the_failed_writes(monkeypatch):
+    """A write error is raised to the writer of that document alone."""
+    repo = make_repository()
+    error = BulkWriteError({"writeErrors": [{"index": 1, "code": 11000, "errmsg": "duplicate key"}]})
+    monkeypatch.setattr(repo, "bulk_write", AsyncMock(side_effect=error))
+    batcher = WriteBatcher(repo, max_batch=2, max_delay=10)
+
+    results = await asyncio.gather(
+        batcher.insert({"n": 1}), batcher.insert({"n": 2}), return_exceptions=True
+    )
+
+    assert isinstance(results[0], str)
+    assert isinstance(results[1], BulkWriteError)
+
+
+@pytest.mark.asyncio
+async def test_default_prompts_are_inserted_in_one_round_trip(monkeypatch):
+    """initialize_default_prompts sends all default prompts with one insert_many."""
+    repo = PromptRepository()
+    monkeypatch.setattr(repo, "get_all_prompts", AsyncMock(return_value=[]))
+    insert_many = AsyncMock(return_value=["1", "2", "3", "4"])
+    monkeypatch.setattr(repo, "insert_many", insert_many)
+
+    await repo.initialize_default_prompts()
+
+    insert_many.assert_awaited_once()
+    prompts = insert_many.await_args.args[0]
+    assert [prompt["name"] for prompt in prompts][:2] == ["resume_analysis", "job_analysis"]
+    assert all(isinstance(prompt["id"], str) for prompt in prompts)
+    assert insert_many.await_args.kwargs == {"ordered": False}
+
+
+@pytest.mark.asyncio
+async def test_prompt_initialization_endpoint_reports_failed_prompts(monkeypatch):
+    """The direct initialization endpoint names the prompts that were not created."""
+    from app.main import initialize_default_prompts_direct
+
+    error = BulkWriteError({"writeErrors": [{"index": 1, "code": 121, "errmsg": "validation failed"}]})
+    monkeypatch.setattr(PromptRepository, "get_all_prompts", AsyncMock(return_value=[]))
+    monkeypatch.setattr(PromptRepository, "insert_many", AsyncMock(side_effect=error))
+
+    response = await initialize_default_prompts_direct()
+
+    assert response.status_code == 500
+    body = json.loads(response.body)
+    assert body["success"] is False
+    assert body["failed_prompts"] == ["ats_scoring"]
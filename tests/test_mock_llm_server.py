@@ -0,0 +1,79 @@
+"""Test cases for the mock LLM server used by the load-test harness."""
+import importlib.util
+import json
+import random
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+SCRIPT = Path(__file__).resolve().parent.parent / "scripts" / "mock_llm_server.py"
+spec = importlib.util.spec_from_file_location("mock_llm_server", SCRIPT)
+mock_llm_server = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(mock_llm_server)
+
+
+def chat(client, prompt):
+    """Send a single-message chat completion request."""
+    return client.post(
+        "/v1/chat/completions",
+        json={"model": "mock-model", "messages": [{"role": "user", "content": prompt}]},
+    )
+
+
+def test_canned_responses_follow_the_prompt():
+    """Section, matching and extraction prompts get matching canned responses."""
+    config = mock_llm_server.MockConfig(seed=1)
+    resume = config.responses
+    rng = random.Random(1)
+
+    section = json.loads(mock_llm_server.canned_response("## SECTION: experiences\n...", resume, rng))
+    assert section == resume["user_information"]["experiences"]
+
+    match = json.loads(
+        mock_llm_server.canned_response('Return "score" and "matching_skills"', resume, rng)
+    )
+    assert 55 <= match["score"] <= 90
+    assert match["missing_skills"]
+
+    extraction = json.loads(mock_llm_server.canned_response("RESUME TEXT: ...", resume, rng))
+    assert set(extraction) == {"skills", "experience_years", "key_requirements", "domains"}
+
+
+def test_chat_completion_reports_usage():
+    """Responses follow the OpenAI chat completion shape, with token usage."""
+    client = TestClient(mock_llm_server.create_app(mock_llm_server.MockConfig(completion_tokens=42)))
+
+    response = chat(client, "JOB DESCRIPTION: Python developer")
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["choices"][0]["message"]["role"] == "assistant"
+    assert body["usage"]["completion_tokens"] == 42
+    assert body["usage"]["total_tokens"] == body["usage"]["prompt_tokens"] + 42
+
+
+def test_rate_limit_and_error_injection():
+    """Injected 429 responses carry Retry-After, injected errors are 500s."""
+    limited = TestClient(
+        mock_llm_server.create_app(mock_llm_server.MockConfig(rate_limit_rate=1.0, retry_after=2))
+    )
+    response = chat(limited, "hi")
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "2"
+
+    failing = mock_llm_server.create_app(mock_llm_server.MockConfig(error_rate=1.0))
+    assert chat(TestClient(failing), "hi").status_code == 500
+    assert failing.state.stats["errors"] == 1
+
+
+def test_latency_distribution():
+    """Latency specifications are validated and sampled."""
+    rng = random.Random(1)
+    assert mock_llm_server.LatencyDistribution("fixed:0.5").sample(rng) == 0.5
+    assert 0.2 <= mock_llm_server.LatencyDistribution("uniform:0.2,0.4").sample(rng) <= 0.4
+    assert mock_llm_server.LatencyDistribution("lognormal:0.8,0.5").sample(rng) > 0
+    with pytest.raises(ValueError):
+        mock_llm_server.LatencyDistribution("normal:1")
+    with pytest.raises(ValueError):
+        mock_llm_server.LatencyDistribution("uniform:1")
@@ -0,0 +1,237 @@
+"""Test cases for the ATS resume optimizer."""
+import json
+from pathlib import Path
+
+import pytest
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+from app.database.models.resume import ResumeData
+from app.services.ai.model_ai import (
+    RESUME_SECTIONS,
+    AtsResumeOptimizer,
+    build_optimization_context,
+    find_stale_sections,
+)
+from app.services.ai.scheduler import LLMSchedulerRejectedError, Priority
+from app.utils.request_context import DeadlineExceededError
+
+SAMPLE_RESPONSE = json.loads(
+    (Path(__file__).parent.parent / "data/sample_responses/example.json").read_text()
+)
+
+SAMPLE_SUMMARY = {
+    "changes_made": ["Tailored the summary"],
+    "keywords_added": ["Python"],
+    "skills_emphasized": [],
+    "content_reorganized": [],
+    "achievements_quantified": [],
+    "overall_strategy": "Focus on AI experience.",
+}
+
+
+def sample_section(section):
+    """Return the sample resume value for a section."""
+    if section == "user_information":
+        return {
+            key: value
+            for key, value in SAMPLE_RESPONSE["user_information"].items()
+            if key != "experiences"
+        }
+    if section == "experiences":
+        return SAMPLE_RESPONSE["user_information"]["experiences"]
+    if section == "optimization_summary":
+        return SAMPLE_SUMMARY
+    return SAMPLE_RESPONSE.get(section, [])
+
+
+def make_optimizer(respond):
+    """Build an optimizer whose LLM answers prompts with ``respond(section)``."""
+
+    def fake_llm(prompt):
+        text = prompt.to_string()
+        section = next(s for s in RESUME_SECTIONS if f"## SECTION: {s}\n" in text)
+        return AIMessage(content=respond(section))
+
+    optimizer = AtsResumeOptimizer.__new__(AtsResumeOptimizer)
+    optimizer.resume = "Original resume text"
+    optimizer.prompt_resume = optimizer.resume
+    optimizer.priority = Priority.OPTIMIZE
+    optimizer.llm = RunnableLambda(fake_llm)
+    return optimizer
+
+
+@pytest.mark.asyncio
+async def test_section_parallel_merges_into_resume_data():
+    """Sections generated separately are merged into a valid ResumeData."""
+    optimizer = make_optimizer(
+        lambda section: "```json\n" + json.dumps(sample_section(section)) + "\n```"
+    )
+
+    result = await optimizer.generate_resume_sections_json(
+        "Job description", {"missing_skills": ["SQL"]}
+    )
+
+    ResumeData.model_validate(result)
+    assert list(result) == [
+        "user_information",
+        "projects",
+        "certificate",
+        "extra_curricular_activities",
+        "optimization_summary",
+    ]
+    assert [e["job_title"] for e in result["user_information"]["experiences"]] == [
+        e["job_title"] for e in sample_section("experiences")
+    ]
+    assert result["optimization_summary"] == SAMPLE_SUMMARY
+
+
+@pytest.mark.asyncio
+async def test_section_parallel_drops_invalid_items_and_failed_sections():
+    """Invalid list items are dropped and failing optional sections become empty."""
+
+    def respond(section):
+        if section == "experiences":
+            experiences = sample_section("experiences")
+            broken = dict(experiences[0], four_tasks=["only one"])
+            return json.dumps(experiences + [broken])
+        if section == "projects":
+            return "not json at all"
+        return json.dumps(sample_section(section))
+
+    result = await make_optimizer(respond).generate_resume_sections_json("Job")
+
+    assert len(result["user_information"]["experiences"]) == len(
+        sample_section("experiences")
+    )
+    assert result["projects"] == []
+
+
+@pytest.mark.asyncio
+async def test_section_parallel_requires_user_information():
+    """A failed user_information section fails the whole section-parallel run."""
+
+    def respond(section):
+        if section == "user_information":
+            return "[]"
+        return json.dumps(sample_section(section))
+
+    with pytest.raises(ValueError):
+        await make_optimizer(respond).generate_resume_sections_json("Job")
+
+
+@pytest.mark.asyncio
+async def test_section_parallel_fails_fast_when_a_section_is_refused():
+    """A refused section fails the run instead of a single-shot regeneration."""
+
+    def respond(section):
+        if section == "projects":
+            raise LLMSchedulerRejectedError("queue full", retry_after=5)
+        return json.dumps(sample_section(section))
+
+    optimizer = make_optimizer(respond)
+    optimizer.model_name = "gpt-4o"
+
+    with pytest.raises(LLMSchedulerRejectedError):
+        await optimizer.generate_ats_optimized_resume_json(
+            "Job", section_parallel=True, score_results={}, prompt_template=""
+        )
+
+
+@pytest.mark.asyncio
+async def test_expired_deadline_is_raised_instead_of_an_error_result():
+    """A deadline hit while scoring reaches the caller instead of an error dict."""
+
+    class ExpiredScorer:
+        async def compute_match_score(self, resume, job_description):
+            raise DeadlineExceededError("out of time")
+
+    optimizer = make_optimizer(lambda section: "{}")
+    optimizer.ats_scorer = ExpiredScorer()
+
+    with pytest.raises(DeadlineExceededError):
+        await optimizer.generate_ats_optimized_resume_json("Job")
+
+
+def previous_optimization():
+    """Return a previous optimization result and its stored context."""
+    previous_result = dict(SAMPLE_RESPONSE, optimization_summary=SAMPLE_SUMMARY)
+    score_results = {"job_requirements": ["Python", "SQL"], "missing_skills": ["Docker"]}
+    context = build_optimization_context(
+        "Original resume text", score_results, previous_result
+    )
+    return previous_result, context
+
+
+def test_find_stale_sections_without_requirement_changes():
+    """Nothing is regenerated when the job asks for the same skills."""
+    previous_result, context = previous_optimization()
+    score_results = {"job_requirements": ["sql", "Python "], "missing_skills": ["Docker"]}
+
+    assert find_stale_sections(context, previous_result, score_results) == []
+
+
+def test_find_stale_sections_only_affected_sections():
+    """Only global sections and sections mentioning changed skills are regenerated."""
+    previous_result, context = previous_optimization()
+    score_results = {"job_requirements": ["Python", "SQL"], "missing_skills": ["Airflow"]}
+
+    stale = find_stale_sections(context, previous_result, score_results)
+
+    assert "user_information" in stale
+    assert "optimization_summary" in stale
+    assert "experiences" in stale  # the experiences mention Airflow
+    assert "certificate" not in stale
+
+
+def test_short_skills_only_match_whole_words():
+    """Short skills and JSON keys do not make every section relevant or stale."""
+    previous_result, context = previous_optimization()
+    score_results = {"job_requirements": ["Python", "SQL"], "missing_skills": ["Docker", "R", "Go"]}
+
+    relevant = build_optimization_context("Original resume text", score_results, previous_result)
+
+    assert all("r" not in section["relevant_skills"] for section in relevant["sections"].values())
+    assert "certificate" not in find_stale_sections(context, previous_result, score_results)
+
+
+@pytest.mark.asyncio
+async def test_incremental_reoptimization_reuses_unchanged_sections():
+    """Sections not listed as stale are copied from the previous result."""
+    previous_result, _ = previous_optimization()
+    generated = []
+
+    def respond(section):
+        generated.append(section)
+        return json.dumps(sample_section(section))
+
+    result = await make_optimizer(respond).generate_resume_sections_json(
+        "Job",
+        sections=["optimization_summary"],
+        previous_result=previous_result,
+    )
+
+    assert generated == ["optimization_summary"]
+    assert result["projects"] == previous_result["projects"]
+    assert result["user_information"]["name"] == SAMPLE_RESPONSE["user_information"]["name"]
+
+
+@pytest.mark.asyncio
+async def test_incremental_reoptimization_fails_fast_when_refused():
+    """A refused incremental run is not retried as a full regeneration."""
+    previous_result, context = previous_optimization()
+
+    def respond(section):
+        raise LLMSchedulerRejectedError("queue full", retry_after=5)
+
+    optimizer = make_optimizer(respond)
+    optimizer.model_name = "gpt-4o"
+
+    with pytest.raises(LLMSchedulerRejectedError):
+        await optimizer.generate_ats_optimized_resume_json(
+            "Job",
+            previous_result=previous_result,
+            previous_context=context,
+            score_results={"job_requirements": ["Python", "SQL"], "missing_skills": ["Airflow"]},
+            prompt_template="",
+        )
@@ -0,0 +1,93 @@
+"""Test cases for per-stage model routing."""
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.routers.stats import router as stats_router
+from app.api.routers.token_usage import router as token_usage_router
+from app.services.ai.model_router import MIN_SAMPLES, ModelRouter
+
+
+def test_stage_config_from_environment(monkeypatch):
+    """Stages use their own settings and fall back to the caller's model."""
+    monkeypatch.setenv("MODEL_NAME_RESUME_EXTRACTION", "small-model")
+    monkeypatch.setenv("MAX_TOKENS_RESUME_EXTRACTION", "512")
+    monkeypatch.setenv("FALLBACK_MODELS_RESUME_EXTRACTION", "backup-a, backup-b")
+    router = ModelRouter()
+
+    extraction = router.get_stage_config("resume_extraction", default_model="big-model")
+    optimization = router.get_stage_config("optimization", default_model="big-model")
+
+    assert extraction.model_name == "small-model"
+    assert extraction.max_tokens == 512
+    assert extraction.fallback_models == ["backup-a", "backup-b"]
+    assert optimization.model_name == "big-model"
+    assert optimization.max_tokens is None
+
+    with pytest.raises(ValueError):
+        router.get_stage_config("unknown")
+
+
+def test_unhealthy_model_shifts_traffic_to_fallback(monkeypatch):
+    """A model with a high error rate is skipped in favour of a fallback."""
+    monkeypatch.setenv("FALLBACK_MODELS_MATCHING", "backup")
+    router = ModelRouter(max_error_rate=0.5)
+
+    assert router.select_model("matching", default_model="primary") == "primary"
+
+    for _ in range(MIN_SAMPLES):
+        router.record("primary", 1.0, success=False)
+    assert router.select_model("matching", default_model="primary") == "backup"
+
+    for _ in range(MIN_SAMPLES):
+        router.record("backup", 1.0, success=False)
+    for _ in range(MIN_SAMPLES * 2):
+        router.record("primary", 0.5, success=True)
+    assert router.select_model("matching", default_model="primary") == "primary"
+
+
+def test_unhealthy_model_recovers_once_its_failures_expire(monkeypatch):
+    """A model that lost its traffic is routed to again after its failures expire."""
+    monkeypatch.setenv("FALLBACK_MODELS_MATCHING", "backup")
+    router = ModelRouter(max_error_rate=0.5, stats_max_age=0.05)
+
+    for _ in range(MIN_SAMPLES):
+        router.record("primary", 1.0, success=False)
+    assert router.select_model("matching", default_model="primary") == "backup"
+
+    time.sleep(0.1)
+
+    assert router.select_model("matching", default_model="primary") == "primary"
+    assert router.get_stats()["primary"]["calls"] == 0
+
+
+def test_stats_report_latency_and_error_rate():
+    """Per-model statistics include percentiles of successful calls."""
+    router = ModelRouter()
+    for latency in (0.1, 0.2, 0.3, 0.4):
+        router.record("model", latency, success=True)
+    router.record("model", 5.0, success=False)
+
+    stats = router.get_stats()["model"]
+
+    assert stats["calls"] == 5
+    assert stats["error_rate"] == 0.2
+    assert stats["p50_latency"] in (0.2, 0.3)
+    assert stats["p95_latency"] == 0.4
+
+
+def test_models_endpoint_reports_routing_only():
+    """Routing is served by /models; the other subsystems report under /api/stats."""
+    app = FastAPI()
+    app.include_router(token_usage_router)
+    app.include_router(stats_router)
+    client = TestClient(app)
+
+    routing = client.get("/api/token-usage/models").json()
+    stats = client.get("/api/stats").json()
+
+    assert set(routing) == {"stages", "models"}
+    assert "matching" in routing["stages"]
+    assert {"scheduler", "resilience", "budgets", "resume_cache"} <= set(stats)
@@ -0,0 +1,58 @@
+"""Test cases for the repository index declarations and query plan checks."""
+import pytest
+
+from app.database.repositories.base_repo import plan_stages
+from app.database.repositories.prompt_repository import PromptRepository
+from app.database.repositories.resume_repository import ResumeRepository
+
+
+def test_plan_stages_walks_classic_and_nested_plans():
+    """Stages are listed outermost first, including $or branches and SBE plans."""
+    classic = {
+        "queryPlanner": {
+            "winningPlan": {
+                "stage": "SUBPLAN",
+                "inputStage": {
+                    "stage": "OR",
+                    "inputStages": [{"stage": "IXSCAN"}, {"stage": "COLLSCAN"}],
+                },
+            }
+        }
+    }
+    sbe = {"queryPlanner": {"winningPlan": {"queryPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}}}}}
+
+    assert plan_stages(classic) == ["SUBPLAN", "OR", "IXSCAN", "COLLSCAN"]
+    assert plan_stages(sbe) == ["FETCH", "IXSCAN"]
+
+
+@pytest.mark.asyncio
+async def test_ensure_indexes_creates_the_declared_indexes(connection_manager):
+    """The user/created_at/_id index backing the resume list is created."""
+    repo = ResumeRepository()
+    repo.connection_manager = connection_manager
+
+    await repo.ensure_indexes()
+
+    repo.connection_manager.collection.create_index.assert_awaited_once_with(
+        [("user_id", 1), ("created_at", -1), ("_id", -1)]
+    )
+
+
+@pytest.mark.asyncio
+async def test_check_query_plans_reports_each_query(monkeypatch):
+    """Every declared prompt query is explained with its filter."""
+    repo = PromptRepository()
+    explained = []
+
+    async def explain(query, sort=None):
+        explained.append(query)
+        stage = "COLLSCAN" if query == {"is_active": True} else "IXSCAN"
+        return {"queryPlanner": {"winningPlan": {"stage": stage}}}
+
+    monkeypatch.setattr(repo, "explain", explain)
+
+    plans = await repo.check_query_plans()
+
+    assert plans["get_prompt_by_name"] == ["IXSCAN"]
+    assert plans["get_all_prompts"] == ["COLLSCAN"]
+    assert {"name": "prompt", "is_active": True} in explained
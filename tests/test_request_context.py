@@ -0,0 +1,181 @@
+"""Test cases for request deadlines and cancellation on client disconnect."""
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage
+from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import RunnableLambda
+
+from app.services.ai.ats_scoring import ATSScorerLLM
+from app.services.ai.resilience import ResilientInvoker
+from app.services.ai.scheduler import LLMScheduler
+from app.utils.request_context import (
+    ClientDisconnectedError,
+    DeadlineExceededError,
+    RequestContext,
+    current_deadline,
+    request_scope,
+    run_until_disconnected,
+)
+from app.utils.singleflight import SingleFlight
+from app.utils.stage_graph import Stage, StageGraph
+
+
+def test_request_context_budget():
+    """The context reports its remaining budget and raises once it is spent."""
+    unlimited = RequestContext()
+    assert unlimited.remaining() is None
+    assert unlimited.has_budget(1000)
+    assert unlimited.timeout(5) == 5
+    unlimited.check()
+
+    context = RequestContext(10)
+    assert context.has_budget(5)
+    assert not context.has_budget(60)
+    assert context.timeout(30) <= 10
+    with request_scope(context):
+        assert current_deadline() == context.deadline
+    assert current_deadline() is None
+
+    context.deadline -= 20
+    with pytest.raises(DeadlineExceededError):
+        context.check()
+
+
+@pytest.mark.asyncio
+async def test_optional_stage_is_skipped_when_budget_is_low():
+    """Optional stages needing more than the remaining budget do not run."""
+    calls = []
+
+    async def step(name, **kwargs):
+        calls.append(name)
+        return name
+
+    graph = StageGraph(
+        "test",
+        [
+            Stage("required", lambda: step("required")),
+            Stage("extra", lambda required: step("extra"), deps=("required",), optional=True, min_budget=60),
+            Stage("final", lambda extra: step("final"), deps=("extra",)),
+        ],
+    )
+    with request_scope(RequestContext(10)):
+        outputs, trace = await graph.run()
+
+    assert calls == ["required", "final"]
+    assert outputs["extra"] is None
+    assert trace.stages["extra"].status == "skipped"
+
+
+@pytest.mark.asyncio
+async def test_stage_graph_stops_at_the_deadline():
+    """No stage starts once the deadline has passed."""
+    context = RequestContext(10)
+    context.deadline -= 20
+
+    async def never():
+        raise AssertionError("stage should not run")
+
+    with request_scope(context):
+        with pytest.raises(DeadlineExceededError):
+            await StageGraph("test", [Stage("only", never)]).run()
+
+
+@pytest.mark.asyncio
+async def test_shared_work_is_cancelled_when_every_caller_leaves():
+    """Coalesced work keeps running for remaining callers and stops without any."""
+    flights = SingleFlight()
+    started = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def work():
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    first = asyncio.ensure_future(flights.do("key", work))
+    second = asyncio.ensure_future(flights.do("key", work))
+    await started.wait()
+
+    first.cancel()
+    await asyncio.sleep(0.01)
+    assert not cancelled.is_set()
+
+    second.cancel()
+    await asyncio.wait_for(cancelled.wait(), timeout=1)
+    assert flights.stats["cancelled"] == 1
+
+
+@pytest.mark.asyncio
+async def test_llm_call_is_not_started_after_the_deadline():
+    """The invoker raises DeadlineExceededError instead of calling the LLM late."""
+    calls = []
+
+    def answer(prompt):
+        calls.append(prompt)
+        return AIMessage(content="ok")
+
+    chain = PromptTemplate.from_template("{text}") | RunnableLambda(answer)
+    invoker = ResilientInvoker(scheduler=LLMScheduler(rpm_limit=0, tpm_limit=0))
+    context = RequestContext(10)
+    context.deadline -= 20
+
+    with request_scope(context):
+        with pytest.raises(DeadlineExceededError):
+            await invoker.ainvoke(chain, {"text": "hi"})
+    assert calls == []
+
+
+class FakeRequest:
+    """Request stand-in whose client disconnects after a number of checks."""
+
+    class url:
+        path = "/api/resume/1/optimize"
+
+    def __init__(self, connected_checks):
+        self.connected_checks = connected_checks
+
+    async def is_disconnected(self):
+        self.connected_checks -= 1
+        return self.connected_checks < 0
+
+
+@pytest.mark.asyncio
+async def test_work_is_cancelled_when_the_client_disconnects():
+    """The request's work is cancelled once the client has gone away."""
+    cancelled = asyncio.Event()
+
+    async def work():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    with pytest.raises(ClientDisconnectedError):
+        await run_until_disconnected(FakeRequest(1), work(), poll_interval=0.01)
+    await asyncio.wait_for(cancelled.wait(), timeout=1)
+
+    async def quick():
+        return "done"
+
+    assert await run_until_disconnected(FakeRequest(0), quick(), poll_interval=0.01) == "done"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("error", [DeadlineExceededError, ClientDisconnectedError])
+async def test_match_analysis_raises_instead_of_a_default_score(error):
+    """A deadline or disconnect is raised rather than scored as a 50."""
+    scorer = ATSScorerLLM.__new__(ATSScorerLLM)
+    scorer.matching_chain = None
+
+    async def ainvoke(chain, inputs):
+        raise error("stopped")
+
+    scorer._ainvoke = ainvoke
+
+    with pytest.raises(error):
+        await scorer.aanalyze_match("Python", "Python and SQL")
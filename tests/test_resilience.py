@@ -0,0 +1,156 @@
+"""Test cases for retries, hedging and circuit breaking of LLM calls."""
+import asyncio
+from unittest.mock import MagicMock
+
+import httpx
+import openai
+import pytest
+from langchain.output_parsers import PydanticOutputParser
+from langchain_core.exceptions import OutputParserException
+from langchain_core.messages import AIMessage
+from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import RunnableLambda
+
+from app.services.ai.ats_scoring import ATSScorerLLM, SkillsExtraction
+from app.services.ai.resilience import (
+    CircuitOpenError,
+    ErrorKind,
+    ResilientInvoker,
+    classify_error,
+)
+from app.services.ai.scheduler import LLMScheduler, Priority
+
+
+def api_error(status_code):
+    """Build an OpenAI API error with the given HTTP status."""
+    request = httpx.Request("POST", "https://api.example.com/v1/chat/completions")
+    response = httpx.Response(status_code, request=request)
+    return openai.APIStatusError("error", response=response, body=None)
+
+
+def make_chain(answer, variable="text"):
+    """Build a ``prompt | llm`` chain whose LLM calls ``answer()``."""
+    return PromptTemplate.from_template(f"{{{variable}}}") | RunnableLambda(
+        lambda prompt: answer()
+    )
+
+
+def make_invoker(**kwargs):
+    """Build an invoker with an unlimited scheduler and no real backoff."""
+    kwargs.setdefault("backoff_base", 0.001)
+    return ResilientInvoker(scheduler=LLMScheduler(rpm_limit=0, tpm_limit=0), **kwargs)
+
+
+def test_classify_error():
+    """Errors are split into transient, auth, parse and fatal failures."""
+    assert classify_error(api_error(503)) == ErrorKind.TRANSIENT
+    assert classify_error(api_error(429)) == ErrorKind.TRANSIENT
+    assert classify_error(asyncio.TimeoutError()) == ErrorKind.TRANSIENT
+    assert classify_error(api_error(401)) == ErrorKind.AUTH
+    assert classify_error(OutputParserException("bad")) == ErrorKind.PARSE
+    assert classify_error(api_error(400)) == ErrorKind.FATAL
+
+
+@pytest.mark.asyncio
+async def test_transient_errors_are_retried_and_fatal_errors_are_not():
+    """Only transient failures are retried."""
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise api_error(502)
+        return AIMessage(content="ok")
+
+    invoker = make_invoker(max_attempts=3)
+    result = await invoker.ainvoke(make_chain(flaky), {"text": "hi"})
+    assert result.content == "ok"
+    assert invoker.stats["retries"] == 2
+
+    def bad_request():
+        calls.append(1)
+        raise api_error(400)
+
+    calls.clear()
+    with pytest.raises(openai.APIStatusError):
+        await invoker.ainvoke(make_chain(bad_request), {"text": "hi"})
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_circuit_opens_and_fails_fast():
+    """Repeated transient failures open the circuit for the model."""
+    calls = []
+
+    def down():
+        calls.append(1)
+        raise api_error(503)
+
+    invoker = make_invoker(max_attempts=1, failure_threshold=2, reset_timeout=60)
+    chain = make_chain(down)
+    for _ in range(2):
+        with pytest.raises(openai.APIStatusError):
+            await invoker.ainvoke(chain, {"text": "hi"})
+
+    with pytest.raises(CircuitOpenError):
+        await invoker.ainvoke(chain, {"text": "hi"})
+    assert len(calls) == 2
+    assert list(invoker.get_stats()["circuits"].values()) == ["open"]
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_wins_over_slow_call(monkeypatch):
+    """A duplicate request is sent after the p95 latency and the first answer wins."""
+    delays = [0.5, 0.0]
+
+    async def answer(prompt):
+        await asyncio.sleep(delays.pop(0))
+        return AIMessage(content="done")
+
+    chain = PromptTemplate.from_template("{text}") | RunnableLambda(answer)
+    invoker = make_invoker(hedging=True)
+    monkeypatch.setattr(invoker, "hedge_delay", lambda chain: 0.01)
+
+    result = await asyncio.wait_for(invoker.ainvoke(chain, {"text": "hi"}), timeout=0.3)
+
+    assert result.content == "done"
+    assert invoker.stats["hedge_wins"] == 1
+
+
+@pytest.mark.asyncio
+async def test_extraction_parse_errors_do_not_call_the_llm_again(monkeypatch):
+    """Unparseable extractions are parsed leniently instead of re-invoking the chain."""
+    calls = []
+
+    def answer():
+        calls.append(1)
+        return AIMessage(content='Here you go: {"skills": ["Python"], "domains": ["AI"]}')
+
+    scorer = ATSScorerLLM.__new__(ATSScorerLLM)
+    scorer.priority = Priority.INTERACTIVE
+    scorer.parser = PydanticOutputParser(pydantic_object=SkillsExtraction)
+    scorer.resume_chain = make_chain(answer, "resume_text")
+    monkeypatch.setattr(
+        "app.services.ai.ats_scoring.resilient_invoker", make_invoker()
+    )
+
+    result = await scorer.aextract_resume_info("resume")
+
+    assert len(calls) == 1
+    assert isinstance(result, SkillsExtraction)
+    assert result.skills == ["Python"]
+    assert result.key_requirements == []
+    assert scorer._parse_extraction("no json here") == "no json here"
+
+
+def test_sync_extraction_is_deprecated():
+    """The synchronous extraction bypasses the scheduler and warns about it."""
+    scorer = ATSScorerLLM.__new__(ATSScorerLLM)
+    scorer.parser = PydanticOutputParser(pydantic_object=SkillsExtraction)
+    scorer.resume_chain = MagicMock()
+    scorer.resume_chain.invoke.return_value = AIMessage(content='{"skills": ["Python"]}')
+
+    with pytest.warns(DeprecationWarning, match="aextract_resume_info"):
+        result = scorer.extract_resume_info("resume")
+
+    assert result.skills == ["Python"]
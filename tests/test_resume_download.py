@@ -64,16 +64,19 @@ SAMPLE_RESUME_DATA = {
     }
 }
 
-def test_download_resume_pdf_endpoint():
+def test_download_resume_pdf_endpoint(tmp_path):
     """Test the PDF resume download endpoint."""
+    pdf_path = tmp_path / "test_resume.pdf"
+    pdf_path.write_bytes(b"%PDF-1.7")
+
     with patch("app.api.routers.resume.ResumeRepository") as mock_repo, \
          patch("app.api.routers.resume.LaTeXGenerator") as mock_generator, \
-         patch("app.api.routers.resume.create_temporary_pdf") as mock_create_pdf:
+         patch("app.api.routers.resume.acreate_temporary_pdf", new_callable=AsyncMock) as mock_create_pdf:
 
         # Setup mocks
         mock_repo.return_value.get_resume_by_id = AsyncMock(return_value=SAMPLE_RESUME_DATA)
         mock_generator.return_value.generate_from_template.return_value = "Sample LaTeX content"
-        mock_create_pdf.return_value = "/tmp/test_resume.pdf"
+        mock_create_pdf.return_value = str(pdf_path)
 
         # Test the endpoint
         response = client.get("/api/resume/test_resume_id/download?use_optimized=true")
@@ -86,7 +89,7 @@ def test_download_resume_pdf_endpoint():
         # Verify mocks were called correctly
         mock_repo.return_value.get_resume_by_id.assert_called_once_with("test_resume_id")
         mock_generator.return_value.generate_from_template.assert_called_once()
-        mock_create_pdf.assert_called_once_with("Sample LaTeX content")
+        mock_create_pdf.assert_awaited_once_with("Sample LaTeX content")
 
 def test_download_resume_latex_endpoint():
     """Test the LaTeX resume download endpoint."""
@@ -0,0 +1,114 @@
+"""Test cases for the resume repository."""
+from datetime import datetime
+from unittest.mock import AsyncMock
+
+import pytest
+from bson import ObjectId
+
+from app.database.repositories.resume_repository import (
+    RESUME_SUMMARY_PROJECTION,
+    ResumeRepository,
+    decode_cursor,
+)
+from app.utils.resume_cache import ResumeCache
+
+
+def make_repository(monkeypatch, connection_manager, document):
+    """Build a repository with its own cache whose find_one returns a document."""
+    repo = ResumeRepository(cache=ResumeCache(max_entries=10, ttl=60, redis_url=""))
+    repo.connection_manager = connection_manager
+    find_one = AsyncMock(side_effect=lambda query: dict(document))
+    monkeypatch.setattr(repo, "find_one", find_one)
+    return repo, find_one
+
+
+def make_summaries(count):
+    """Build resume summaries as returned by find_many, newest first."""
+    return [
+        {"_id": str(ObjectId()), "title": f"Resume {n}", "created_at": datetime(2026, 3, 1, 12, 59 - n)}
+        for n in range(count)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_summaries_are_paged_by_keyset(monkeypatch):
+    """A page reads one extra summary and continues after the last one listed."""
+    repo = ResumeRepository()
+    summaries = make_summaries(3)
+    find_many = AsyncMock(return_value=summaries)
+    monkeypatch.setattr(repo, "find_many", find_many)
+
+    page, cursor = await repo.get_resume_summaries_by_user_id("u1", limit=2)
+
+    assert page == summaries[:2]
+    query, sort = find_many.await_args.args
+    assert query == {"user_id": "u1"}
+    assert sort == [("created_at", -1), ("_id", -1)]
+    assert find_many.await_args.kwargs == {"projection": RESUME_SUMMARY_PROJECTION, "limit": 3}
+    assert decode_cursor(cursor) == (summaries[1]["created_at"], ObjectId(summaries[1]["_id"]))
+
+    find_many.return_value = summaries[2:]
+    page, next_cursor = await repo.get_resume_summaries_by_user_id("u1", limit=2, cursor=cursor)
+
+    assert page == summaries[2:] and next_cursor is None
+    after = find_many.await_args.args[0]["$or"]
+    assert after[0] == {"created_at": {"$lt": summaries[1]["created_at"]}}
+    assert after[1]["_id"] == {"$lt": ObjectId(summaries[1]["_id"])}
+
+
+@pytest.mark.asyncio
+async def test_invalid_cursor_is_rejected():
+    """Cursors that were not issued by the repository raise ValueError."""
+    with pytest.raises(ValueError):
+        await ResumeRepository().get_resume_summaries_by_user_id("u1", cursor="not-a-cursor")
+
+
+@pytest.mark.asyncio
+async def test_hot_resume_reads_skip_the_database(monkeypatch, connection_manager):
+    """Repeated reads of a resume are served from the cache, as copies."""
+    resume_id = str(ObjectId())
+    repo, find_one = make_repository(
+        monkeypatch, connection_manager, {"_id": resume_id, "title": "Resume"}
+    )
+
+    first = await repo.get_resume_by_id(resume_id)
+    first["title"] = "Changed by the caller"
+    second = await repo.get_resume_by_id(resume_id)
+
+    assert find_one.await_count == 1
+    assert second["title"] == "Resume"
+    assert repo.cache.get_stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_updates_invalidate_the_cached_resume(monkeypatch, connection_manager):
+    """An update bumps the version, so the next read goes to the database."""
+    resume_id = str(ObjectId())
+    repo, find_one = make_repository(
+        monkeypatch, connection_manager, {"_id": resume_id, "title": "Resume"}
+    )
+    update = repo.connection_manager.collection.find_one_and_update
+    update.return_value = {"_id": ObjectId(resume_id), "version": 1}
+
+    await repo.get_resume_by_id(resume_id)
+    assert await repo.update_resume(resume_id, {"title": "New title", "version": 7})
+    await repo.get_resume_by_id(resume_id)
+
+    assert find_one.await_count == 2
+    operators = update.await_args.args[1]
+    assert operators["$inc"] == {"version": 1}
+    assert "version" not in operators["$set"]
+
+
+@pytest.mark.asyncio
+async def test_stale_fills_do_not_overwrite_invalidations():
+    """A resume read before an update cannot be cached after its invalidation."""
+    cache = ResumeCache(max_entries=10, ttl=60, redis_url="")
+
+    await cache.invalidate("r1", 2)
+    await cache.fill("r1", {"title": "old", "version": 1})
+    assert await cache.get("r1") is None
+    assert cache.stats["stale_fills"] == 1
+
+    await cache.fill("r1", {"title": "new", "version": 2})
+    assert (await cache.get("r1"))["title"] == "new"
@@ -1,10 +1,15 @@
 """Test cases for the resume router."""
+import json
+from pathlib import Path
+
 import pytest
 from fastapi import FastAPI
 from fastapi.testclient import TestClient
-from app.api.routers.resume import resume_router
+from app.api.routers import resume as resume_module
+from app.api.routers.resume import get_resume_repository, resume_router
 from app.database.models.resume import ResumeData
 from app.services.ai.ats_scoring import ATSScorerLLM
+from app.services.ai.token_budget import token_budgets
 from unittest.mock import AsyncMock, MagicMock, patch
 
 # Test setup
@@ -121,4 +126,96 @@ def test_route_parameters_match_expected():
             assert route.methods == set(route_params[route.path]["methods"])
             for param in route_params[route.path]["params"]:
                 assert any(p.name == param for p in route.dependant.path_params), \
-                    f"Missing expected parameter {param} in {route.path}"
\ No newline at end of file
+                    f"Missing expected parameter {param} in {route.path}"
+
+
+SAMPLE_RESPONSE = json.loads(
+    (Path(__file__).parent.parent / "data/sample_responses/example.json").read_text()
+)
+
+
+class FakeScorer:
+    """Scorer that scores the original resume and fails to re-score the optimized one."""
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+
+    async def ensure_prompts(self):
+        pass
+
+    def compact_resume(self, text):
+        return text
+
+    def compact_job(self, text):
+        return text
+
+    async def aextract_resume_info(self, text):
+        return {"text": text}
+
+    async def aextract_job_info(self, text):
+        return {"text": text}
+
+    async def ascore_analyses(self, resume_info, job_info):
+        if resume_info["text"] != "Original resume":
+            raise RuntimeError("re-scoring failed")
+        return {"final_score": 70, "matching_skills": ["Python"], "missing_skills": ["SQL"]}
+
+
+class FakeOptimizer:
+    """Optimizer returning the sample optimized resume."""
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.optimization_context = {"resume_hash": "hash"}
+
+    async def generate_ats_optimized_resume_json(self, job_description, **kwargs):
+        return dict(SAMPLE_RESPONSE)
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """Run the score and optimize pipelines against a mocked repository."""
+    monkeypatch.setenv("API_KEY", "test-key")
+    monkeypatch.setenv("API_BASE", "http://127.0.0.1:9/v1")
+    monkeypatch.setenv("MODEL_NAME", "gpt-4o")
+    monkeypatch.setattr(resume_module, "_get_prompt_versions", AsyncMock(return_value={}))
+    monkeypatch.setattr(resume_module, "_load_optimization_prompt", AsyncMock(return_value=""))
+    monkeypatch.setattr(resume_module, "_extraction_cache_key", lambda *args: None)
+    repo = MagicMock()
+    repo.get_resume_by_id = AsyncMock(
+        return_value={"_id": "r1", "user_id": "u1", "original_content": "Original resume"}
+    )
+    repo.update_optimized_data = AsyncMock(return_value=True)
+    repo.update_resume = AsyncMock(return_value=True)
+    app.dependency_overrides[get_resume_repository] = lambda: repo
+    yield repo
+    app.dependency_overrides.clear()
+
+
+def test_score_saves_the_optimization_without_a_rescore(pipeline, monkeypatch):
+    """An optimization whose re-score failed is saved with the original score."""
+    monkeypatch.setattr(resume_module, "ATSScorerLLM", FakeScorer)
+    monkeypatch.setattr(resume_module, "AtsResumeOptimizer", FakeOptimizer)
+
+    response = client.post("/api/resume/score-no-rescore/score", json={"job_description": "Job"})
+
+    assert response.status_code == 200
+    assert response.json()["optimization_success"] is True
+    assert response.json()["optimized_score"] is None
+    pipeline.update_optimized_data.assert_awaited_once()
+    args, kwargs = pipeline.update_optimized_data.await_args
+    assert args[2] == 70 and kwargs["score_improvement"] == 0
+
+
+def test_score_is_refused_once_the_user_is_over_budget(pipeline, monkeypatch):
+    """Scoring calls count against the resume owner's daily token budget."""
+    monkeypatch.setattr(token_budgets, "user_daily", 1)
+    monkeypatch.setattr(token_budgets, "feature_daily", 0)
+    monkeypatch.setattr(token_budgets, "feature_budgets", {})
+    monkeypatch.setattr(ATSScorerLLM, "ensure_prompts", AsyncMock())
+
+    response = client.post("/api/resume/over-budget/score", json={"job_description": "Job"})
+
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert "u1" in response.json()["detail"]
@@ -0,0 +1,93 @@
+"""Test cases for the process-wide LLM scheduler."""
+import asyncio
+import time
+
+import httpx
+import openai
+import pytest
+from langchain_core.messages import AIMessage
+from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import RunnableLambda
+
+from app.services.ai.scheduler import (
+    LLMScheduler,
+    LLMSchedulerRejectedError,
+    Priority,
+    get_retry_after,
+)
+
+
+def rate_limit_error(retry_after="0.05"):
+    """Build an OpenAI 429 error carrying a Retry-After header."""
+    request = httpx.Request("POST", "https://api.example.com/v1/chat/completions")
+    response = httpx.Response(429, headers={"retry-after": retry_after}, request=request)
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+
+@pytest.mark.asyncio
+async def test_waiting_calls_are_served_by_priority():
+    """Interactive calls overtake queued batch and optimize calls."""
+    scheduler = LLMScheduler(rpm_limit=60, tpm_limit=0)
+    order = []
+
+    async def call(name, priority):
+        await scheduler.acquire("key", 10, priority)
+        order.append(name)
+
+    # Drain the request bucket so every call has to queue
+    scheduler._state("key").requests.level = 0
+    tasks = [
+        asyncio.create_task(call("batch", Priority.BATCH)),
+        asyncio.create_task(call("optimize", Priority.OPTIMIZE)),
+        asyncio.create_task(call("interactive", Priority.INTERACTIVE)),
+    ]
+    await asyncio.sleep(0)
+    scheduler._state("key").requests.level = 3
+    scheduler._state("key").wake_head()
+    await asyncio.gather(*tasks)
+
+    assert order == ["interactive", "optimize", "batch"]
+
+
+@pytest.mark.asyncio
+async def test_admission_rejects_full_queue_and_missed_deadlines():
+    """Calls are refused when the queue is full or the wait exceeds the deadline."""
+    scheduler = LLMScheduler(rpm_limit=0, tpm_limit=6000, max_queue_size=1)
+    scheduler._state("key").tokens.level = 0
+
+    with pytest.raises(LLMSchedulerRejectedError) as excinfo:
+        await scheduler.acquire("key", 1000, deadline=time.monotonic() + 1)
+    assert excinfo.value.retry_after == pytest.approx(10, rel=0.05)
+
+    waiting = asyncio.create_task(scheduler.acquire("key", 1000))
+    await asyncio.sleep(0)
+    with pytest.raises(LLMSchedulerRejectedError):
+        await scheduler.acquire("key", 10)
+    waiting.cancel()
+    assert scheduler.stats["rejected"] == 2
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_call_is_retried_after_retry_after():
+    """A 429 pauses the key for Retry-After and the call is queued again."""
+    scheduler = LLMScheduler(rpm_limit=0, tpm_limit=0)
+    attempts = []
+
+    def fake_llm(prompt):
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise rate_limit_error("0.05")
+        return AIMessage(content="ok")
+
+    chain = PromptTemplate.from_template("Say {word}") | RunnableLambda(fake_llm)
+    result = await scheduler.ainvoke(chain, {"word": "ok"})
+
+    assert result.content == "ok"
+    assert attempts[1] - attempts[0] >= 0.05
+    assert scheduler.stats["rate_limited"] == 1
+
+
+def test_get_retry_after():
+    """Retry-After is read only from rate limit errors."""
+    assert get_retry_after(rate_limit_error("7")) == 7.0
+    assert get_retry_after(ValueError("not an HTTP error")) is None
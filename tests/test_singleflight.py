@@ -0,0 +1,75 @@
+"""Test cases for coalescing of identical concurrent requests."""
+import asyncio
+
+import pytest
+
+from app.utils.singleflight import IdempotencyKeyConflictError, SingleFlight, make_flight_key
+
+
+def test_make_flight_key_is_stable():
+    """Equal parts give equal keys regardless of dict ordering."""
+    assert make_flight_key("score", {"a": 1, "b": 2}) == make_flight_key("score", {"b": 2, "a": 1})
+    assert make_flight_key("score", "r1") != make_flight_key("optimize", "r1")
+
+
+@pytest.mark.asyncio
+async def test_concurrent_duplicates_run_once():
+    """Callers with the same key share one execution."""
+    flights = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"score": 80}
+
+    results = await asyncio.gather(*(flights.do("key", work) for _ in range(5)))
+
+    assert len(calls) == 1
+    assert results == [{"score": 80}] * 5
+    assert flights.get_stats()["coalesced"] == 4
+    assert flights.get_stats()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_idempotency_key_replays_result_and_rejects_reuse():
+    """A repeated idempotency key replays the result; reuse for other work conflicts."""
+    flights = SingleFlight(idempotency_ttl=60)
+    calls = []
+
+    async def work():
+        calls.append(1)
+        return len(calls)
+
+    assert await flights.do("key", work, idempotency_key="abc") == 1
+    assert await flights.do("key", work, idempotency_key="abc") == 1
+    assert await flights.do("key", work) == 2
+    assert flights.stats["replayed"] == 1
+
+    with pytest.raises(IdempotencyKeyConflictError):
+        await flights.do("other", work, idempotency_key="abc")
+
+
+@pytest.mark.asyncio
+async def test_errors_are_shared_but_not_stored():
+    """A failure reaches every waiting caller and is not replayed later."""
+    flights = SingleFlight()
+    attempts = []
+
+    async def failing():
+        attempts.append(1)
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    results = await asyncio.gather(
+        flights.do("key", failing, idempotency_key="abc"),
+        flights.do("key", failing),
+        return_exceptions=True,
+    )
+    assert all(isinstance(result, ValueError) for result in results)
+    assert len(attempts) == 1
+
+    async def succeeding():
+        return "ok"
+
+    assert await flights.do("key", succeeding, idempotency_key="abc") == "ok"
@@ -0,0 +1,51 @@
+"""Test cases for the local skill gap estimate used by speculative optimization."""
+from app.services.ai.skill_gaps import (
+    SpeculationStats,
+    estimate_missing_skills,
+    extract_skill_terms,
+    uncovered_skills,
+)
+
+JOB = (
+    "We are hiring a Senior Engineer. Requirements: Python, Kubernetes and AWS, "
+    "PostgreSQL, Node.js, C++ and CI/CD pipelines. Experience with Terraform is a plus."
+)
+
+
+def test_extract_skill_terms_finds_vocabulary_and_tech_tokens():
+    """Common skills and technology-shaped tokens are found; filler words are not."""
+    terms = extract_skill_terms(JOB)
+
+    for skill in ("python", "kubernetes", "aws", "postgresql", "node.js", "c++", "ci/cd", "terraform"):
+        assert skill in terms
+    assert "senior" not in terms
+    assert "requirements" not in terms
+
+
+def test_estimate_missing_skills_ignores_skills_in_the_resume():
+    """Skills already mentioned in the resume are not reported as missing."""
+    missing = estimate_missing_skills("Python developer using aws and Terraform daily", JOB)
+
+    assert "python" not in missing
+    assert "aws" not in missing
+    assert "kubernetes" in missing
+    assert "c++" in missing
+
+
+def test_uncovered_skills():
+    """LLM missing skills are covered by the estimate or by the optimized text."""
+    uncovered = uncovered_skills(
+        ["Kubernetes", "Docker", "GraphQL"],
+        ["kubernetes"],
+        "Built services with Docker and Python",
+    )
+    assert uncovered == ["GraphQL"]
+
+
+def test_speculation_stats_hit_rate():
+    """The hit rate is the share of kept speculative results."""
+    stats = SpeculationStats()
+    assert stats.get_stats()["hit_rate"] is None
+    for outcome in ("hits", "hits", "misses", "failures"):
+        stats.record(outcome)
+    assert stats.get_stats()["hit_rate"] == 0.5
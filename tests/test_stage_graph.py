@@ -0,0 +1,131 @@
+"""Test cases for the declarative pipeline stage graph."""
+import asyncio
+import time
+
+import pytest
+
+from app.utils.stage_graph import Stage, StageCache, StageGraph
+
+
+def sleeper(delay, value):
+    """Build a stage function that sleeps and returns value."""
+
+    async def run(**deps):
+        await asyncio.sleep(delay)
+        return value
+
+    return run
+
+
+@pytest.mark.asyncio
+async def test_independent_stages_run_concurrently():
+    """Latency follows the critical path, not the sum of the stages."""
+    graph = StageGraph(
+        "test",
+        [
+            Stage("resume", sleeper(0.05, "r")),
+            Stage("job", sleeper(0.1, "j")),
+            Stage("prompt", sleeper(0.02, "p")),
+            Stage("score", sleeper(0.05, "s"), deps=("resume", "job")),
+            Stage("optimize", sleeper(0.01, "o"), deps=("score", "prompt")),
+        ],
+    )
+
+    started = time.monotonic()
+    outputs, trace = await graph.run()
+
+    assert time.monotonic() - started < 0.2
+    assert outputs == {"resume": "r", "job": "j", "prompt": "p", "score": "s", "optimize": "o"}
+    assert trace.critical_path == ["job", "score", "optimize"]
+    assert trace.stages["score"].start >= trace.stages["job"].end
+
+
+@pytest.mark.asyncio
+async def test_stage_receives_dependency_outputs_and_is_cached():
+    """Dependency outputs are passed by name and cacheable outputs are reused."""
+    calls = []
+
+    async def extract(text):
+        calls.append(text)
+        return text.upper()
+
+    def build():
+        return StageGraph(
+            "test",
+            [
+                Stage("text", sleeper(0, "python")),
+                Stage("skills", extract, deps=("text",), cache_key=lambda text: text),
+            ],
+            cache=cache,
+        )
+
+    cache = StageCache(max_entries=10, ttl=60)
+    first, _ = await build().run()
+    second, trace = await build().run()
+
+    assert first["skills"] == second["skills"] == "PYTHON"
+    assert calls == ["python"]
+    assert trace.stages["skills"].status == "cached"
+    assert cache.get_stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_optional_failures_skip_dependents_and_required_failures_raise():
+    """An optional stage failure only skips its dependents."""
+
+    async def fail(**deps):
+        raise ValueError("boom")
+
+    outputs, trace = await StageGraph(
+        "test",
+        [
+            Stage("score", sleeper(0, 80)),
+            Stage("optimize", fail, deps=("score",), optional=True),
+            Stage("rescore", sleeper(0, 90), deps=("optimize",), optional=True),
+        ],
+    ).run()
+    assert outputs == {"score": 80, "optimize": None, "rescore": None}
+    assert trace.stages["optimize"].status == "failed"
+    assert trace.stages["rescore"].status == "skipped"
+
+    with pytest.raises(ValueError):
+        await StageGraph(
+            "test", [Stage("score", fail), Stage("save", sleeper(0, True), deps=("score",))]
+        ).run()
+
+
+@pytest.mark.asyncio
+async def test_optional_dependencies_never_skip_the_stage():
+    """A stage waits for its optional dependencies and receives None if they failed."""
+    received = {}
+
+    async def fail(**deps):
+        raise ValueError("boom")
+
+    async def save(optimize, rescore):
+        received.update(optimize=optimize, rescore=rescore)
+        return True
+
+    outputs, trace = await StageGraph(
+        "test",
+        [
+            Stage("optimize", sleeper(0, "o"), optional=True),
+            Stage("rescore", fail, deps=("optimize",), optional=True),
+            Stage("save", save, deps=("optimize",), optional_deps=("rescore",), optional=True),
+        ],
+    ).run()
+
+    assert outputs["save"] is True
+    assert received == {"optimize": "o", "rescore": None}
+    assert trace.stages["save"].start >= trace.stages["rescore"].end
+
+
+def test_invalid_graphs_are_rejected():
+    """Unknown dependencies and cycles are detected up front."""
+    with pytest.raises(ValueError):
+        StageGraph("test", [Stage("a", sleeper(0, 1), deps=("missing",))])
+    with pytest.raises(ValueError):
+        StageGraph(
+            "test",
+            [Stage("a", sleeper(0, 1), deps=("b",)), Stage("b", sleeper(0, 1), deps=("a",))],
+        )
@@ -0,0 +1,108 @@
+"""Test cases for token-budgeted prompt input compaction."""
+from unittest.mock import patch
+
+import pytest
+
+from app.services.ai.model_ai import AtsResumeOptimizer
+from app.utils import text_compaction
+from app.utils.text_compaction import (
+    compact_text,
+    count_tokens,
+    get_token_budget,
+    normalize_text,
+)
+
+
+@pytest.fixture(autouse=True)
+def estimated_token_counts():
+    """Use the character-based token estimate so tests never download encodings."""
+    with patch.object(text_compaction, "_get_encoding", return_value=None):
+        yield
+
+
+def test_normalize_text_collapses_whitespace_and_strips_artifacts():
+    """Whitespace runs, page numbers and symbol-only lines are removed."""
+    raw = (
+        "Jane   Doe\t\tData Engineer\r\n\n\n\n"
+        "Page 1 of 2\n"
+        "-----\n"
+        "SKILLS\n"
+        "Python,  SQL\n"
+        "\f2\n"
+        "C\n"
+    )
+
+    assert normalize_text(raw) == "Jane Doe Data Engineer\n\nSKILLS\nPython, SQL\n\nC"
+
+
+def test_normalize_text_drops_repeated_headers():
+    """Long lines repeated across pages are kept once."""
+    header = "Jane Doe | jane@example.com | +1 555 0100"
+    raw = f"{header}\nEXPERIENCE\nBuilt pipelines\n\f{header}\nEDUCATION\nBSc"
+
+    assert normalize_text(raw).count(header) == 1
+    assert "EDUCATION" in normalize_text(raw)
+
+
+def test_normalize_text_keeps_repeated_resume_content():
+    """Titles and bullets repeated within the pages are not page furniture."""
+    header = "Jane Doe | jane@example.com | +1 555 0100"
+    bullet = "Built and maintained data pipelines for reporting"
+    raw = (
+        f"{header}\nEXPERIENCE\nSoftware Engineer\nAcme\n{bullet}\nSoftware Engineer\nGlobex\n"
+        f"\f{header}\nSoftware Engineer\nInitech\n{bullet}\nEDUCATION\nBSc"
+    )
+
+    normalized = normalize_text(raw)
+
+    assert normalized.count(header) == 1
+    assert normalized.count("Software Engineer") == 3
+    assert normalized.count(bullet) == 2
+
+
+def test_optimizer_input_is_never_truncated():
+    """The resume to optimize is normalized but keeps every section."""
+    raw = "\n".join(
+        ["Jane Doe", "EXPERIENCE", *[f"Delivered project number {i} on time" for i in range(3000)]]
+    )
+
+    optimizer = AtsResumeOptimizer(
+        model_name="gpt-4o", resume=raw, api_key="key", api_base="http://127.0.0.1:9/v1"
+    )
+
+    assert "Delivered project number 2999 on time" in optimizer.prompt_resume
+
+
+def test_compact_text_keeps_high_priority_sections_within_budget():
+    """Low priority sections are truncated before skills and experience."""
+    raw = "\n".join(
+        [
+            "Jane Doe",
+            "SKILLS",
+            "Python, SQL, Airflow",
+            "EXPERIENCE",
+            "Built data pipelines at Acme",
+            "INTERESTS",
+            *[f"Hobby number {i} with a long description" for i in range(50)],
+        ]
+    )
+
+    result = compact_text(raw, max_tokens=40)
+
+    assert result.truncated
+    assert result.tokens_after <= 40
+    assert result.tokens_before == count_tokens(raw)
+    assert "Python, SQL, Airflow" in result.text
+    assert "Built data pipelines at Acme" in result.text
+    assert result.text.index("SKILLS") < result.text.index("EXPERIENCE")
+    assert "Hobby number 49" not in result.text
+
+
+def test_get_token_budget_env_override(monkeypatch):
+    """Budgets can be overridden per prompt from the environment."""
+    monkeypatch.setenv("TOKEN_BUDGET_RESUME_ANALYSIS", "1234")
+    monkeypatch.setenv("TOKEN_BUDGET_JOB_ANALYSIS", "not a number")
+
+    assert get_token_budget("resume_analysis") == 1234
+    assert get_token_budget("job_analysis") == text_compaction.DEFAULT_TOKEN_BUDGETS["job_analysis"]
+    assert get_token_budget("unknown") == 0
@@ -0,0 +1,52 @@
+"""Test cases for the plain-text resume renderer."""
+import json
+from pathlib import Path
+
+from app.database.models.resume import ResumeData
+from app.services.resume.text_renderer import render_resume_text, resume_fingerprint
+
+SAMPLE_RESPONSE = json.loads(
+    (Path(__file__).parent.parent / "data/sample_responses/example.json").read_text()
+)
+
+
+def test_render_resume_text_contains_resume_content():
+    """Every section of the resume is rendered as plain text."""
+    text = render_resume_text(SAMPLE_RESPONSE)
+    info = SAMPLE_RESPONSE["user_information"]
+
+    assert text.startswith(info["name"])
+    assert "EXPERIENCE" in text
+    assert info["experiences"][0]["four_tasks"][0] in text
+    assert info["skills"]["hard_skills"][0] in text
+    assert "{" not in text and '"' not in text
+
+
+def test_render_resume_text_ignores_metadata():
+    """Scoring metadata and the optimization summary are not rendered."""
+    with_metadata = dict(
+        SAMPLE_RESPONSE,
+        ats_metrics={"initial_score": 42, "missing_skills": ["Kubernetes"]},
+        optimization_summary={"overall_strategy": "Add keywords"},
+    )
+
+    assert render_resume_text(with_metadata) == render_resume_text(SAMPLE_RESPONSE)
+    assert "Kubernetes" not in render_resume_text(with_metadata)
+
+
+def test_render_resume_text_accepts_models_and_is_shorter_than_json():
+    """Models and dicts render identically and the text is more compact than JSON."""
+    model = ResumeData.model_validate(SAMPLE_RESPONSE)
+
+    assert render_resume_text(model) == render_resume_text(model.model_dump())
+    assert len(render_resume_text(model)) < len(json.dumps(SAMPLE_RESPONSE))
+
+
+def test_resume_fingerprint_is_stable():
+    """The fingerprint only depends on the rendered content."""
+    reordered = dict(reversed(list(SAMPLE_RESPONSE.items())))
+
+    assert resume_fingerprint(SAMPLE_RESPONSE) == resume_fingerprint(reordered)
+    assert resume_fingerprint(SAMPLE_RESPONSE) == resume_fingerprint(
+        render_resume_text(SAMPLE_RESPONSE)
+    )
@@ -0,0 +1,80 @@
+"""Test cases for the per-user and per-feature token budgets."""
+import pytest
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.prompts import PromptTemplate
+
+from app.services.ai.resilience import ResilientInvoker
+from app.services.ai.scheduler import LLMScheduler
+from app.services.ai.token_budget import TokenBudgetExceededError, TokenBudgets
+from app.utils.token_tracker import TokenTracker, TokenUsageCallback
+
+
+class FakeRollups:
+    """Rollup repository returning fixed day totals."""
+
+    def __init__(self, totals):
+        self.totals = totals
+
+    async def get_day_totals(self, day):
+        return self.totals
+
+
+def test_reservations_count_until_released():
+    """Reserved and recorded tokens count against the budget."""
+    budgets = TokenBudgets(user_daily=100, feature_daily=0, feature_budgets={})
+
+    reservation = budgets.reserve("u1", "ats_scoring", 60)
+    with pytest.raises(TokenBudgetExceededError) as excinfo:
+        budgets.reserve("u1", "ats_scoring", 50)
+    assert excinfo.value.scope == "user" and excinfo.value.used == 60
+    assert excinfo.value.retry_after > 0
+
+    budgets.release(reservation)
+    budgets.record("u1", "ats_scoring", 70)
+    budgets.reserve("u1", "ats_scoring", 30)
+    with pytest.raises(TokenBudgetExceededError):
+        budgets.reserve("u1", "ats_scoring", 1)
+    # Other users and unbudgeted features are not affected
+    assert budgets.reserve("u2", "ats_scoring", 100) is not None
+    assert budgets.stats["rejected"] == 2
+
+
+@pytest.mark.asyncio
+async def test_reconciled_totals_raise_the_local_counters():
+    """Usage of other instances read from the rollups counts against the budget."""
+    budgets = TokenBudgets(
+        user_daily=0,
+        feature_daily=0,
+        feature_budgets={"ats_scoring": 1000},
+        rollup_factory=lambda: FakeRollups({"users": {}, "features": {"ats_scoring": 990}}),
+    )
+    budgets.record(None, "ats_scoring", 50)
+
+    await budgets.reconcile()
+
+    with pytest.raises(TokenBudgetExceededError) as excinfo:
+        budgets.reserve(None, "ats_scoring", 20)
+    assert excinfo.value.scope == "feature" and excinfo.value.limit == 1000
+    assert budgets.get_stats()["usage"]["feature:ats_scoring"] == {"used": 990, "limit": 1000}
+
+
+@pytest.mark.asyncio
+async def test_invoker_refuses_calls_over_budget(monkeypatch):
+    """Calls over budget fail before reaching the LLM; others release their reservation."""
+    monkeypatch.setattr(TokenTracker, "_use_database", False)
+    budgets = TokenBudgets(user_daily=10000, feature_daily=0, feature_budgets={})
+    invoker = ResilientInvoker(scheduler=LLMScheduler(rpm_limit=0, tpm_limit=0), budgets=budgets)
+    llm = FakeListChatModel(
+        responses=["ok", "again"], callbacks=[TokenUsageCallback("ats_scoring", user_id="u1")]
+    )
+    chain = PromptTemplate.from_template("{text}") | llm
+
+    result = await invoker.ainvoke(chain, {"text": "hi"})
+    assert result.content == "ok"
+    assert budgets.stats["reserved"] == 1
+    assert budgets.get_stats()["usage"] == {}
+
+    budgets.record("u1", "ats_scoring", 10000)
+    with pytest.raises(TokenBudgetExceededError):
+        await invoker.ainvoke(chain, {"text": "hi"})
+    assert llm.i == 1
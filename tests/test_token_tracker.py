@@ -0,0 +1,115 @@
+"""Test cases for token usage tracking."""
+from uuid import uuid4
+
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+
+from app.services.ai.ats_scoring import ATSScorerLLM
+from app.services.ai.model_ai import AtsResumeOptimizer
+from app.utils.token_tracker import MODEL_PRICING, TokenTracker, TokenUsageCallback
+
+
+def make_result(token_usage, usage_metadata=None):
+    """Build an LLMResult carrying the given usage information."""
+    message = AIMessage(content="{}", usage_metadata=usage_metadata)
+    return LLMResult(
+        generations=[[ChatGeneration(message=message)]],
+        llm_output={"token_usage": token_usage, "model_name": "gpt-4o-mini"},
+    )
+
+
+def test_cached_prompt_tokens_are_priced_separately(monkeypatch):
+    """Cached prompt tokens are recorded and billed at the cached input rate."""
+    monkeypatch.setattr(TokenTracker, "_token_usage_records", [])
+    callback = TokenUsageCallback(feature="ats_scoring")
+    callback.model_name = "gpt-4o-mini"
+
+    callback.on_llm_end(
+        make_result(
+            {
+                "prompt_tokens": 2000,
+                "completion_tokens": 100,
+                "total_tokens": 2100,
+                "prompt_tokens_details": {"cached_tokens": 1536},
+            }
+        )
+    )
+
+    record = TokenTracker._token_usage_records[-1]
+    prices = MODEL_PRICING["gpt-4o-mini"]
+    expected = (
+        464 * prices["input"] + 1536 * prices["cached_input"] + 100 * prices["output"]
+    ) / 1_000_000
+    assert record.cached_prompt_tokens == 1536
+    assert abs(record.cost_usd - expected) < 1e-12
+
+
+def test_cached_prompt_tokens_from_usage_metadata(monkeypatch):
+    """Cached tokens are read from the message usage metadata as a fallback."""
+    monkeypatch.setattr(TokenTracker, "_token_usage_records", [])
+    callback = TokenUsageCallback(feature="ats_scoring")
+
+    callback.on_llm_end(
+        make_result(
+            {"prompt_tokens": 1200, "completion_tokens": 10, "total_tokens": 1210},
+            {
+                "input_tokens": 1200,
+                "output_tokens": 10,
+                "total_tokens": 1210,
+                "input_token_details": {"cache_read": 1024},
+            },
+        )
+    )
+
+    assert TokenTracker._token_usage_records[-1].cached_prompt_tokens == 1024
+
+
+def test_concurrent_calls_are_recorded_separately(monkeypatch):
+    """Overlapping calls on one handler keep their own model and tokens."""
+    monkeypatch.setattr(TokenTracker, "_token_usage_records", [])
+    callback = TokenUsageCallback(feature="resume_optimization")
+    first, second, failed = uuid4(), uuid4(), uuid4()
+
+    callback.on_llm_start({}, [], run_id=first, invocation_params={"model_name": "gpt-4o"})
+    callback.on_llm_start({}, [], run_id=second, invocation_params={"model_name": "gpt-4o-mini"})
+    callback.on_llm_start({}, [], run_id=failed, invocation_params={"model_name": "gpt-4o"})
+    callback.on_llm_error(RuntimeError("boom"), run_id=failed)
+    callback.on_llm_end(
+        make_result({"prompt_tokens": 10, "completion_tokens": 1, "total_tokens": 11}), run_id=second
+    )
+    callback.on_llm_end(
+        make_result({"prompt_tokens": 500, "completion_tokens": 50, "total_tokens": 550}), run_id=first
+    )
+
+    records = TokenTracker._token_usage_records
+    assert [(record.llm_model, record.total_tokens) for record in records] == [
+        ("gpt-4o-mini", 11),
+        ("gpt-4o", 550),
+    ]
+    assert all(record.status == "success" for record in records)
+
+
+def test_prompt_variables_come_after_static_prefix():
+    """Request-specific input is placed after the shared instructions."""
+    optimizer = AtsResumeOptimizer.__new__(AtsResumeOptimizer)
+    with_skills = optimizer._get_prompt_template(["Kubernetes"]).format(
+        job_description="JOB-TEXT", resume="RESUME-TEXT"
+    )
+    without_skills = optimizer._get_prompt_template().format(
+        job_description="OTHER-JOB", resume="OTHER-RESUME"
+    )
+
+    prefix = with_skills[: with_skills.index("JOB-TEXT")]
+    assert without_skills.startswith(prefix)
+    assert "IMPORTANT REQUIREMENTS" in prefix
+    assert with_skills.index("RESUME-TEXT") < with_skills.index("Kubernetes")
+
+    scorer = ATSScorerLLM.__new__(ATSScorerLLM)
+    scorer.parser = type("Parser", (), {"get_format_instructions": lambda self: "FORMAT"})()
+    scorer._setup_default_prompts()
+    resume_prompt = scorer.resume_prompt.format(resume_text="RESUME-TEXT")
+    matching_prompt = scorer.matching_prompt.format(
+        resume_skills="SKILLS", job_requirements="REQUIREMENTS"
+    )
+    assert resume_prompt.index("FORMAT") < resume_prompt.index("RESUME-TEXT")
+    assert matching_prompt.index("rationale") < matching_prompt.index("SKILLS")
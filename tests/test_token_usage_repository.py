@@ -0,0 +1,122 @@
+"""Test cases for the token usage repository."""
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.database.models.token_usage import TokenUsage
+from app.database.repositories.token_usage_repository import TokenUsageRepository
+
+
+@pytest.mark.asyncio
+async def test_summary_is_computed_by_one_aggregation(monkeypatch):
+    """The summary comes from a single $match/$facet pipeline, not a find."""
+    repo = TokenUsageRepository()
+    aggregate = AsyncMock(
+        return_value=[
+            {
+                "totals": [
+                    {
+                        "_id": None,
+                        "calls": 3,
+                        "prompt_tokens": 300,
+                        "cached_prompt_tokens": 100,
+                        "completion_tokens": 30,
+                        "total_tokens": 330,
+                        "cost_usd": 0.5,
+                    }
+                ],
+                "by_model": [{"_id": "gpt-4o-mini", "calls": 3, "cost_usd": 0.5}],
+                "by_feature": [{"_id": "ats_scoring", "calls": 3, "cost_usd": 0.5}],
+            }
+        ]
+    )
+    find = AsyncMock()
+    monkeypatch.setattr(repo, "aggregate", aggregate)
+    monkeypatch.setattr(repo, "find", find)
+
+    summary = await repo.get_token_usage_summary(days=7, feature="ats_scoring", user_id="u1")
+
+    find.assert_not_called()
+    pipeline = aggregate.await_args.args[0]
+    match = pipeline[0]["$match"]
+    assert match["feature"] == "ats_scoring" and match["user_id"] == "u1"
+    assert "$gte" in match["timestamp"]
+    assert set(pipeline[1]["$facet"]) == {"totals", "by_model", "by_feature"}
+    assert summary.total_api_calls == 3
+    assert summary.total_cached_prompt_tokens == 100
+    assert summary.total_cost_usd == 0.5
+    assert summary.usage_by_model == {"gpt-4o-mini": {"calls": 3, "cost_usd": 0.5}}
+    assert summary.usage_by_feature == {"ats_scoring": {"calls": 3, "cost_usd": 0.5}}
+
+
+@pytest.mark.asyncio
+async def test_summary_of_empty_window_is_zero(monkeypatch):
+    """An empty $facet result yields a zero summary."""
+    repo = TokenUsageRepository()
+    monkeypatch.setattr(
+        repo, "aggregate", AsyncMock(return_value=[{"totals": [], "by_model": [], "by_feature": []}])
+    )
+
+    summary = await repo.get_token_usage_summary()
+
+    assert summary.total_api_calls == 0
+    assert summary.total_cost_usd == 0.0
+    assert summary.usage_by_model == {}
+
+
+def test_numbers_are_stored_as_numbers():
+    """Costs stay floats so the aggregation can sum them."""
+    repo = TokenUsageRepository()
+
+    document = repo._process_document_for_mongodb({"cost_usd": 0.25, "total_tokens": 10})
+
+    assert document == {"cost_usd": 0.25, "total_tokens": 10}
+
+
+def test_collection_layout_keys_records_by_their_uuid(make_usage):
+    """Records are stored with their UUID as _id, so retried inserts cannot duplicate them."""
+    usage = make_usage()
+
+    document = TokenUsageRepository(storage="collection")._to_document(usage)
+
+    assert document["_id"] == usage.id
+    assert TokenUsageRepository(storage="collection").idempotent_inserts
+    assert not TokenUsageRepository(storage="timeseries").idempotent_inserts
+
+
+def test_timeseries_layout_moves_dimensions_to_meta():
+    """The time-series backend stores model, feature and user under meta."""
+    repo = TokenUsageRepository(storage="timeseries")
+    usage = TokenUsage(
+        endpoint="test",
+        llm_model="gpt-4o-mini",
+        prompt_tokens=1,
+        completion_tokens=1,
+        total_tokens=2,
+        feature="ats_scoring",
+        user_id="u1",
+        cost_usd=0.1,
+    )
+
+    document = repo._to_document(usage)
+
+    assert repo.collection_name == "token_usage_ts"
+    assert document["meta"] == {"llm_model": "gpt-4o-mini", "feature": "ats_scoring", "user_id": "u1"}
+    assert "feature" not in document
+    assert repo._from_document({"_id": "x", **document}) == usage.model_dump()
+
+
+@pytest.mark.asyncio
+async def test_timeseries_summary_filters_and_groups_on_meta(monkeypatch):
+    """Summary queries address the meta fields of the time-series layout."""
+    repo = TokenUsageRepository(storage="timeseries")
+    aggregate = AsyncMock(return_value=[])
+    monkeypatch.setattr(repo, "aggregate", aggregate)
+
+    await repo.get_token_usage_summary(feature="ats_scoring", user_id="u1")
+
+    pipeline = aggregate.await_args.args[0]
+    assert pipeline[0]["$match"]["meta.feature"] == "ats_scoring"
+    assert pipeline[0]["$match"]["meta.user_id"] == "u1"
+    by_model = pipeline[1]["$facet"]["by_model"][0]["$group"]["_id"]
+    assert by_model == {"$ifNull": ["$meta.llm_model", "unknown"]}
@@ -0,0 +1,94 @@
+"""Test cases for the hourly/daily token usage rollups."""
+import random
+from datetime import datetime
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.database.models.token_usage import TokenUsageSummary
+from app.database.repositories.token_usage_rollup_repository import (
+    TokenUsageRollupRepository,
+    latency_bin,
+    rollup_updates,
+    sketch_quantiles,
+)
+from app.utils.token_tracker import TokenTracker
+
+
+def test_records_in_same_bucket_become_one_upsert(make_usage):
+    """A batch costs one $inc upsert per hourly and daily bucket it touches."""
+    records = [
+        make_usage(
+            timestamp=datetime(2026, 3, 1, 9, 5), total_tokens=110, cost_usd=0.25,
+            metadata={"latency_ms": 800},
+        ),
+        make_usage(
+            timestamp=datetime(2026, 3, 1, 9, 55), total_tokens=110, cost_usd=0.25,
+            metadata={"latency_ms": 1200},
+        ),
+        make_usage(
+            timestamp=datetime(2026, 3, 1, 14, 0), total_tokens=110, cost_usd=0.25, metadata=None
+        ),
+    ]
+
+    updates = {
+        (op._filter["granularity"], op._filter["bucket_start"]): op._doc
+        for op in rollup_updates(records)
+    }
+
+    assert sorted(updates) == [
+        ("day", datetime(2026, 3, 1)),
+        ("hour", datetime(2026, 3, 1, 9)),
+        ("hour", datetime(2026, 3, 1, 14)),
+    ]
+    nine = updates[("hour", datetime(2026, 3, 1, 9))]
+    assert nine["$inc"]["calls"] == 2
+    assert nine["$inc"]["total_tokens"] == 220
+    assert nine["$inc"]["cost_usd"] == 0.5
+    assert nine["$inc"][f"latency_ms_sketch.{latency_bin(800)}"] == 1
+    assert nine["$max"] == {"latency_ms_max": 1200}
+    assert "$max" not in updates[("hour", datetime(2026, 3, 1, 14))]
+    assert updates[("day", datetime(2026, 3, 1))]["$inc"]["calls"] == 3
+
+
+def test_sketch_quantiles_are_within_sketch_accuracy():
+    """Quantiles estimated from the sketch are within about 5% of the exact ones."""
+    rng = random.Random(7)
+    latencies = sorted(rng.lognormvariate(0, 0.6) * 900 for _ in range(5000))
+    sketch = {}
+    for latency in latencies:
+        sketch[latency_bin(latency)] = sketch.get(latency_bin(latency), 0) + 1
+
+    estimates = sketch_quantiles(sketch)
+
+    for name, quantile in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99)):
+        exact = latencies[int(quantile * len(latencies)) - 1]
+        assert abs(estimates[name] - exact) / exact < 0.06
+
+
+@pytest.mark.asyncio
+async def test_summary_reads_rollups_once_backfilled(monkeypatch):
+    """get_usage_summary reads the buckets once they cover every raw record."""
+    summary = TokenUsageSummary(
+        total_api_calls=1,
+        total_prompt_tokens=1,
+        total_completion_tokens=1,
+        total_tokens=2,
+        total_cost_usd=0.1,
+        period_start=datetime(2026, 3, 1),
+        period_end=datetime(2026, 3, 2),
+        usage_by_model={},
+        usage_by_feature={},
+    )
+    raw_summary = AsyncMock()
+    monkeypatch.setattr(TokenTracker, "_use_database", True)
+    monkeypatch.setattr(TokenTracker, "_rollups_complete", False)
+    monkeypatch.setattr(TokenUsageRollupRepository, "is_complete", AsyncMock(return_value=True))
+    monkeypatch.setattr(TokenUsageRollupRepository, "get_usage_summary", AsyncMock(return_value=summary))
+    monkeypatch.setattr(
+        "app.database.repositories.token_usage_repository.TokenUsageRepository.get_token_usage_summary",
+        raw_summary,
+    )
+
+    assert await TokenTracker.get_usage_summary(days=90) is summary
+    raw_summary.assert_not_called()
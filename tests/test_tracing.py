@@ -0,0 +1,100 @@
+"""Test cases for per-request tracing spans."""
+import asyncio
+from uuid import uuid4
+
+import pytest
+from fastapi.testclient import TestClient
+from langchain_core.outputs import LLMResult
+
+from app.main import app
+from app.utils.stage_graph import Stage, StageCache, StageGraph
+from app.utils.token_tracker import TokenTracker, TokenUsageCallback
+from app.utils.tracing import current_request_id, recent_request_traces, span, trace_request
+
+
+@pytest.mark.asyncio
+async def test_spans_nest_across_tasks_and_export_to_otlp():
+    """Spans opened in spawned tasks attach to the span that spawned them."""
+    async def child():
+        with span("child", step=1):
+            await asyncio.sleep(0)
+
+    with trace_request("req-nesting", "GET /test") as trace:
+        with span("parent") as parent:
+            await asyncio.gather(asyncio.ensure_future(child()))
+
+    spans = {s.name: s for s in trace.spans}
+    assert spans["parent"].parent_id == trace.root.span_id
+    assert spans["child"].parent_id == parent.span_id
+    assert recent_request_traces.get("req-nesting") is trace
+
+    otlp = trace.to_otlp()["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    child_span = next(s for s in otlp if s["name"] == "child")
+    assert child_span["parentSpanId"] == parent.span_id
+    assert child_span["attributes"] == [{"key": "step", "value": {"intValue": "1"}}]
+    assert int(child_span["endTimeUnixNano"]) >= int(child_span["startTimeUnixNano"])
+
+
+def test_request_id_is_always_populated():
+    """Outside of a request spans are skipped but a request ID is still provided."""
+    with span("untraced") as untraced:
+        assert untraced is None
+    assert current_request_id()
+    with trace_request("req-id", "GET /test"):
+        assert current_request_id() == "req-id"
+
+
+def test_llm_usage_is_added_to_the_current_span():
+    """The token usage callback records tokens and cost on the active span."""
+    callback = TokenUsageCallback(feature="ats_scoring", metadata={"stage": "matching"})
+    run_id = uuid4()
+    response = LLMResult(
+        generations=[],
+        llm_output={"token_usage": {"prompt_tokens": 100, "completion_tokens": 20, "total_tokens": 120}},
+    )
+
+    with trace_request("req-usage", "POST /test"):
+        with span("llm.call") as call_span:
+            callback.on_llm_start({}, ["prompt"], run_id=run_id, invocation_params={"model_name": "gpt-4o-mini"})
+            callback.on_llm_end(response, run_id=run_id)
+
+    assert call_span.attributes["prompt_tokens"] == 100
+    assert call_span.attributes["completion_tokens"] == 20
+    assert call_span.attributes["llm_stage"] == "matching"
+    assert call_span.attributes["cost_usd"] > 0
+    record = TokenTracker._token_usage_records[-1]
+    assert record.request_id == "req-usage"
+    assert record.metadata["latency_ms"] is not None
+
+
+@pytest.mark.asyncio
+async def test_stage_spans_record_cache_hits():
+    """Every pipeline stage gets a span telling whether it was served from cache."""
+    async def extract():
+        return "skills"
+
+    cache = StageCache()
+    stages = [Stage("extract", extract, cache_key=lambda: "key")]
+    with trace_request("req-stages", "POST /test") as trace:
+        await StageGraph("test", stages, cache).run()
+        await StageGraph("test", stages, cache).run()
+
+    stage_spans = [s for s in trace.spans if s.name == "stage.extract"]
+    assert [s.attributes["cache_hit"] for s in stage_spans] == [False, True]
+    assert stage_spans[0].attributes["pipeline"] == "test"
+
+
+def test_api_requests_are_traced_and_viewable():
+    """API responses carry their request ID and the trace is served by the trace endpoint."""
+    client = TestClient(app)
+
+    response = client.get("/api/traces", headers={"X-Request-ID": "req-endpoint"})
+    assert response.headers["X-Request-ID"] == "req-endpoint"
+
+    trace = client.get("/api/traces/req-endpoint").json()
+    assert trace["name"] == "GET /api/traces"
+    assert trace["status"] == 200
+
+    otlp = client.get("/api/traces/req-endpoint", params={"format": "otlp"}).json()
+    assert otlp["resourceSpans"][0]["scopeSpans"][0]["spans"][0]["name"] == "GET /api/traces"
+    assert client.get("/api/traces/unknown").status_code == 404
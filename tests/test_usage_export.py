@@ -0,0 +1,85 @@
+"""Test cases for the streaming token usage export."""
+import csv
+import gzip
+import io
+import json
+from collections import deque
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.routers.token_usage import router
+from app.utils.token_tracker import TokenTracker
+from app.utils.usage_export import gzip_chunks, parse_fields, serialize_batches
+
+
+async def batches_of(*batches):
+    """Yield the given batches of records as an async iterator."""
+    for batch in batches:
+        yield [record.model_dump() for record in batch]
+
+
+async def collect(chunks):
+    """Join an async iterator of byte chunks."""
+    return b"".join([chunk async for chunk in chunks])
+
+
+@pytest.mark.asyncio
+async def test_ndjson_yields_one_chunk_per_batch(make_usage):
+    """Every batch becomes one chunk of JSON lines with the selected fields."""
+    chunks = [
+        chunk
+        async for chunk in serialize_batches(
+            batches_of([make_usage(1), make_usage(2)], [make_usage(3)]),
+            "ndjson",
+            ["timestamp", "total_tokens"],
+        )
+    ]
+
+    assert len(chunks) == 2
+    lines = b"".join(chunks).decode().splitlines()
+    assert json.loads(lines[0]) == {"timestamp": "2026-03-01T12:01:00", "total_tokens": 2}
+    assert len(lines) == 3
+
+
+@pytest.mark.asyncio
+async def test_gzip_csv_round_trips(make_usage):
+    """The gzip stream decompresses to a CSV with a header row."""
+    fields = parse_fields("feature,total_tokens,metadata")
+    data = await collect(
+        gzip_chunks(serialize_batches(batches_of([make_usage(1), make_usage(2)]), "csv", fields))
+    )
+
+    rows = list(csv.reader(io.StringIO(gzip.decompress(data).decode())))
+
+    assert rows[0] == ["total_tokens", "feature", "metadata"]
+    assert rows[1] == ["2", "ats_scoring", '{"latency_ms": 120}']
+    assert len(rows) == 3
+
+
+def test_parse_fields_rejects_unknown_fields():
+    """Only token usage fields can be selected."""
+    with pytest.raises(ValueError):
+        parse_fields("total_tokens,password")
+
+
+def test_export_endpoint_streams_filtered_records(monkeypatch, make_usage):
+    """format=ndjson streams the records matching the filters."""
+    records = deque([make_usage(1), make_usage(2, feature="optimization"), make_usage(3)])
+    monkeypatch.setattr(TokenTracker, "_use_database", False)
+    monkeypatch.setattr(TokenTracker, "_token_usage_records", records)
+    app = FastAPI()
+    app.include_router(router)
+
+    response = TestClient(app).get(
+        "/api/token-usage/export",
+        params={"format": "ndjson", "feature": "ats_scoring", "fields": "prompt_tokens,feature"},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert [json.loads(line) for line in response.text.splitlines()] == [
+        {"prompt_tokens": 1, "feature": "ats_scoring"},
+        {"prompt_tokens": 3, "feature": "ats_scoring"},
+    ]
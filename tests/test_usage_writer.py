@@ -0,0 +1,230 @@
+"""Test cases for the batched token usage writer."""
+import asyncio
+
+import pytest
+from pymongo.errors import AutoReconnect, BulkWriteError, ServerSelectionTimeoutError
+
+from app.utils.token_tracker import TokenTracker
+from app.utils.usage_writer import TokenUsageWriter
+
+
+class FakeRepository:
+    """Records the batches written, optionally failing the first attempts.
+
+    The failed attempts raise error. With write_errors, the first insert
+    writes every record except the ones at the listed indexes and raises a
+    BulkWriteError for those.
+    """
+
+    def __init__(self, failures=0, write_errors=None, error=None, idempotent_inserts=True):
+        self.batches = []
+        self.failures = failures
+        self.write_errors = write_errors
+        self.error = error or ConnectionError("database unavailable")
+        self.idempotent_inserts = idempotent_inserts
+
+    async def create_token_usages(self, token_usages):
+        if self.failures:
+            self.failures -= 1
+            raise self.error
+        if self.write_errors:
+            errors, self.write_errors = self.write_errors, None
+            failed = {error["index"] for error in errors}
+            self.batches.append([record for n, record in enumerate(token_usages) if n not in failed])
+            raise BulkWriteError({"writeErrors": errors})
+        self.batches.append(list(token_usages))
+        return len(token_usages)
+
+
+class FakeRollups:
+    """Records the batches added to the rollups, optionally failing the first attempts."""
+
+    def __init__(self, failures=0):
+        self.batches = []
+        self.live_since = None
+        self.failures = failures
+
+    async def mark_live(self, since):
+        self.live_since = since if self.live_since is None else min(self.live_since, since)
+
+    async def apply_records(self, records):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("database unavailable")
+        self.batches.append(list(records))
+        return len(records)
+
+
+def make_writer(repo, rollups=None, **kwargs):
+    """Build a writer that writes to the given fake repositories."""
+    options = {
+        "max_buffer": 100,
+        "batch_size": 10,
+        "flush_interval": 60,
+        "rollup_factory": lambda: rollups,
+        "rollups_enabled": rollups is not None,
+    }
+    options.update(kwargs)
+    return TokenUsageWriter(repository_factory=lambda: repo, **options)
+
+
+@pytest.mark.asyncio
+async def test_full_batch_is_written_without_waiting_for_interval(make_usage):
+    """Reaching the batch size wakes the flusher before the flush interval."""
+    repo = FakeRepository()
+    writer = make_writer(repo, batch_size=3)
+    writer.start()
+    try:
+        for n in range(3):
+            writer.submit(make_usage(n))
+        for _ in range(50):
+            if repo.batches:
+                break
+            await asyncio.sleep(0.01)
+        assert [len(batch) for batch in repo.batches] == [3]
+    finally:
+        await writer.close()
+
+
+@pytest.mark.asyncio
+async def test_close_flushes_remaining_records_in_batches(make_usage):
+    """Shutdown writes every buffered record with insert_many batches."""
+    repo = FakeRepository()
+    writer = make_writer(repo, batch_size=10)
+    writer.start()
+    for n in range(25):
+        writer.submit(make_usage(n))
+
+    await writer.close()
+
+    assert [len(batch) for batch in repo.batches] == [10, 10, 5]
+    stats = writer.get_stats()
+    assert stats["written"] == 25
+    assert stats["buffered"] == 0
+    assert stats["running"] is False
+
+
+@pytest.mark.asyncio
+async def test_full_buffer_drops_oldest_records_and_counts_them(make_usage):
+    """The ring buffer keeps the newest records and counts what it drops."""
+    repo = FakeRepository()
+    writer = make_writer(repo, max_buffer=5, batch_size=100)
+    for n in range(8):
+        writer.submit(make_usage(n))
+
+    await writer.flush()
+
+    assert [record.prompt_tokens for record in repo.batches[0]] == [3, 4, 5, 6, 7]
+    assert writer.get_stats()["dropped"] == 3
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_is_kept_for_next_flush(make_usage):
+    """A batch the database rejects is requeued in order and written later."""
+    repo = FakeRepository(failures=1)
+    writer = make_writer(repo)
+    for n in range(4):
+        writer.submit(make_usage(n))
+
+    assert await writer.flush() == 0
+    assert writer.get_stats()["failed_flushes"] == 1
+    assert writer.get_stats()["buffered"] == 4
+
+    assert await writer.flush() == 4
+    assert [record.prompt_tokens for record in repo.batches[0]] == [0, 1, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_partly_failed_batch_drops_rejected_records(make_usage):
+    """Rejected records are counted and dropped; duplicates were stored before."""
+    repo = FakeRepository(
+        write_errors=[
+            {"index": 1, "code": 121, "errmsg": "document failed validation"},
+            {"index": 3, "code": 11000, "errmsg": "duplicate key"},
+        ]
+    )
+    rollups = FakeRollups()
+    writer = make_writer(repo, rollups)
+    for n in range(4):
+        writer.submit(make_usage(n))
+
+    assert await writer.flush() == 3
+    assert writer.get_stats()["buffered"] == 0
+    assert writer.get_stats()["rejected"] == 1
+    assert [record.prompt_tokens for record in rollups.batches[0]] == [0, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_unknown_outcome_is_not_retried_without_idempotent_inserts(make_usage):
+    """A batch that may have been stored is not written again into a time-series collection."""
+    repo = FakeRepository(failures=1, error=AutoReconnect("connection reset"), idempotent_inserts=False)
+    rollups = FakeRollups()
+    writer = make_writer(repo, rollups)
+    for n in range(4):
+        writer.submit(make_usage(n))
+
+    assert await writer.flush() == 0
+    assert writer.get_stats()["unconfirmed"] == 4
+    assert writer.get_stats()["buffered"] == 0
+    assert rollups.batches == []
+
+
+@pytest.mark.asyncio
+async def test_unsent_batch_is_retried_without_idempotent_inserts(make_usage):
+    """A batch no server received is retried even when inserts are not idempotent."""
+    repo = FakeRepository(
+        failures=1, error=ServerSelectionTimeoutError("no primary"), idempotent_inserts=False
+    )
+    writer = make_writer(repo)
+    for n in range(2):
+        writer.submit(make_usage(n))
+
+    assert await writer.flush() == 0
+    assert writer.get_stats()["buffered"] == 2
+
+    assert await writer.flush() == 2
+
+
+@pytest.mark.asyncio
+async def test_written_batches_are_added_to_rollups_and_retried(make_usage):
+    """Written batches update the rollups; a failed update is retried next flush."""
+    repo = FakeRepository()
+    rollups = FakeRollups(failures=1)
+    writer = make_writer(repo, rollups)
+    records = [make_usage(n) for n in range(3)]
+    for record in records:
+        writer.submit(record)
+
+    await writer.flush()
+    assert rollups.batches == []
+    assert writer.get_stats()["rollup_backlog"] == 3
+    assert rollups.live_since == records[0].timestamp
+
+    await writer.flush()
+    assert [len(batch) for batch in rollups.batches] == [3]
+    assert len(repo.batches) == 1
+    assert writer.get_stats()["rollup_failures"] == 1
+
+
+@pytest.mark.asyncio
+async def test_log_token_usage_queues_record_without_database_io(monkeypatch):
+    """log_token_usage hands the record to the writer instead of inserting it."""
+    repo = FakeRepository()
+    writer = make_writer(repo)
+    monkeypatch.setattr("app.utils.token_tracker.usage_writer", writer)
+    monkeypatch.setattr(TokenTracker, "_token_usage_records", [])
+    monkeypatch.setattr(TokenTracker, "_use_database", True)
+
+    await TokenTracker.log_token_usage(
+        endpoint="test",
+        model_name="gpt-4o-mini",
+        prompt_tokens=10,
+        completion_tokens=5,
+        total_tokens=15,
+        feature="test",
+        cost_usd=0.0,
+    )
+
+    assert repo.batches == []
+    assert writer.get_stats()["buffered"] == 1
+    assert TokenTracker._token_usage_records[-1].total_tokens == 15